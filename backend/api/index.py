@@ -1,5 +1,32 @@
+import os
+import time
+
+# Measure how long importing the application takes on a cold start
+_import_started = time.perf_counter()
 from main import app
 from mangum import Mangum
+IMPORT_TIME_MS = (time.perf_counter() - _import_started) * 1000
+
+# Import-time budget for a cold start, in milliseconds
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+def report_import_time() -> dict:
+    """
+    Report the cold-start import time against the configured budget.
+
+    Returns:
+        dict: Import time, budget and whether the budget was exceeded
+    """
+    over_budget = IMPORT_TIME_MS > IMPORT_TIME_BUDGET_MS
+    status = "OVER BUDGET" if over_budget else "within budget"
+    print(f"Cold start import time: {IMPORT_TIME_MS:.1f} ms ({status}, budget {IMPORT_TIME_BUDGET_MS:.0f} ms)")
+    return {
+        "import_time_ms": round(IMPORT_TIME_MS, 1),
+        "budget_ms": IMPORT_TIME_BUDGET_MS,
+        "over_budget": over_budget,
+    }
+
+report_import_time()
 
 # This creates a Vercel-compatible server
-handler = Mangum(app)
\ No newline at end of file
+handler = Mangum(app)
@@ -0,0 +1,73 @@
+"""
+Completed task archiver for the Todo Application.
+
+Moves tasks completed more than ARCHIVE_AFTER_DAYS ago, with their
+subtasks, from the hot task tables into archived_task and
+archived_subtask, in batches of ARCHIVE_BATCH_SIZE. Task list reads never
+touch the archive; it is served by GET /api/{user_id}/tasks/archive.
+
+Run it inside the API process with ARCHIVE_ENABLED=true, or as a separate
+worker:
+    python archiver.py
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy.engine import Engine
+from cache import require_shared_cache
+from config import load_environment
+from db import get_user_data_engines
+from services.task_service import archive_completed_tasks
+
+# Load environment variables
+load_environment()
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_POLL_SECONDS = float(os.getenv("ARCHIVE_POLL_SECONDS", "3600"))
+
+def archive_once(engines: Optional[List[Engine]] = None, now: Optional[datetime] = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Archive every task completed before the cutoff.
+
+    Args:
+        engines: Task databases to archive (defaults to all of them)
+        now: Current time (defaults to the wall clock)
+        batch_size: Tasks per transaction
+
+    Returns:
+        int: Number of tasks archived
+    """
+    completed_before = (now or datetime.now(timezone.utc)) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    archived = 0
+    for engine in engines if engines is not None else get_user_data_engines():
+        while True:
+            moved = archive_completed_tasks(engine, completed_before, batch_size)
+            archived += moved
+            if moved < batch_size:
+                break
+    return archived
+
+async def run_forever(poll_seconds: float = ARCHIVE_POLL_SECONDS) -> None:
+    """
+    Archive every poll_seconds until cancelled, in a worker thread.
+
+    Args:
+        poll_seconds: Delay between the start of consecutive passes
+    """
+    while True:
+        try:
+            archived = await asyncio.to_thread(archive_once)
+            if archived:
+                print(f"Archived {archived} completed tasks")
+        except Exception as e:
+            print(f"Archive pass failed: {e}")
+        await asyncio.sleep(poll_seconds)
+
+if __name__ == "__main__":
+    require_shared_cache("The archiver")
+    print(f"Archiver polling every {ARCHIVE_POLL_SECONDS:.0f}s")
+    asyncio.run(run_forever())
@@ -0,0 +1,51 @@
+"""
+Per-request token verification cost by signing algorithm.
+
+Verifies the same claims signed with HS256 (shared secret), RS256, ES256
+and EdDSA through middleware.auth.decode_token, with the key set served
+from an in-memory JWKS cache. A final row decodes an RS256 token against
+the raw JWK dict, which rebuilds the key on every call, to show what the
+cache saves. Run from the backend directory:
+
+    python -m benchmarks.bench_jwt [--iterations N]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+# Verify JWKS tokens against a throwaway key set file
+_jwks_dir = tempfile.mkdtemp()
+os.environ["JWKS_URL"] = os.path.join(_jwks_dir, "jwks.json")
+
+from jose import jwt
+from benchmarks.bench_task_service import measure
+from jwt_test_keys import make_keys, sign
+from middleware.auth import create_access_token, decode_token
+import jwks
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark JWT verification per algorithm")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    private_keys, public_jwks = make_keys()
+    with open(os.environ["JWKS_URL"], "w") as jwks_file:
+        json.dump({"keys": public_jwks}, jwks_file)
+    print(f"Loaded {jwks.get_jwks_cache().refresh()} keys from {os.environ['JWKS_URL']}")
+
+    claims = {"sub": "bench-user", "exp": int((datetime.now(timezone.utc) + timedelta(hours=1)).timestamp())}
+    tokens = {"HS256 (shared secret)": create_access_token({"sub": "bench-user"})}
+    for kid, (algorithm, private_key) in private_keys.items():
+        tokens[f"{algorithm} (JWKS, kid {kid})"] = sign(claims, kid, algorithm, private_key)
+
+    n = args.iterations
+    for label, token in tokens.items():
+        measure(label, lambda i: decode_token(token), n)
+    rsa_token, rsa_jwk = tokens["RS256 (JWKS, kid rsa-1)"], public_jwks[0]
+    measure("RS256 (JWK rebuilt per call)", lambda i: jwt.decode(rsa_token, rsa_jwk, algorithms=["RS256"]), n)
+
+if __name__ == "__main__":
+    main()
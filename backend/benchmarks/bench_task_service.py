@@ -0,0 +1,76 @@
+"""
+Per-operation benchmarks for services.task_service.
+
+Runs every service operation against a throwaway SQLite database and
+prints the mean and p99 latency of each. Run from the backend directory:
+
+    python -m benchmarks.bench_task_service [--iterations N]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+# Use a throwaway database before any app module reads DATABASE_URL
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from sqlmodel import Session
+from db import get_engine, get_read_engine
+from startup import init_db
+from services import task_service
+
+def measure(label: str, func, iterations: int) -> None:
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        func(i)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<32} mean {statistics.mean(timings) * 1e6:9.1f} us   p99 {p99 * 1e6:9.1f} us")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark task service operations")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--tasks", type=int, default=200, help="Tasks in the benchmark user's list")
+    args = parser.parse_args()
+
+    init_db()
+    user_id = "bench-user"
+    engine, read_engine = get_engine(), get_read_engine()
+
+    with Session(engine, expire_on_commit=False) as session:
+        task_ids = [
+            task_service.create_task_for_user(session, user_id, {"title": f"Task {i}", "description": "x" * 200}).id
+            for i in range(args.tasks)
+        ]
+        subtask_ids = [
+            task_service.create_subtask_for_task(session, user_id, task_ids[0], {"title": f"Step {i}"}).id
+            for i in range(20)
+        ]
+
+    n = args.iterations
+    with Session(engine, expire_on_commit=False) as session:
+        measure("create_task_for_user", lambda i: task_service.create_task_for_user(session, "bench-writer", {"title": f"New {i}"}), n)
+        measure("update_user_task", lambda i: task_service.update_user_task(session, user_id, task_ids[i % len(task_ids)], {"title": f"Renamed {i}"}), n)
+        measure("toggle_user_task_completion", lambda i: task_service.toggle_user_task_completion(session, user_id, task_ids[i % len(task_ids)], bool(i % 2)), n)
+        measure("update_task_subtask", lambda i: task_service.update_task_subtask(session, user_id, task_ids[0], subtask_ids[i % len(subtask_ids)], {"completed": bool(i % 2)}), n)
+
+    with Session(read_engine) as session:
+        measure("get_user_task", lambda i: task_service.get_user_task(session, user_id, task_ids[i % len(task_ids)]), n)
+        measure(f"get_user_tasks ({args.tasks} rows)", lambda i: task_service.get_user_tasks(session, user_id), n)
+        # Fill the cache first so only hits are measured
+        task_service.get_user_tasks_json(session, user_id)
+        task_service.get_task_subtasks_json(session, user_id, task_ids[0])
+        measure("get_user_tasks_json (cached)", lambda i: task_service.get_user_tasks_json(session, user_id), n)
+        measure("get_task_subtasks (20 rows)", lambda i: task_service.get_task_subtasks(session, user_id, task_ids[0]), n)
+        measure("get_task_subtasks_json (cached)", lambda i: task_service.get_task_subtasks_json(session, user_id, task_ids[0]), n)
+
+    with Session(engine, expire_on_commit=False) as session:
+        new_ids = [task_service.create_task_for_user(session, "bench-deleter", {"title": f"Doomed {i}"}).id for i in range(n)]
+        measure("delete_user_task", lambda i: task_service.delete_user_task(session, "bench-deleter", new_ids[i]), n)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Webhook delivery throughput against a local stub receiver.
+
+Queues the same events for a few subscriptions with different batch sizes,
+then times webhooks.WebhookDispatcher draining them into a threaded HTTP
+server on localhost that answers after --latency-ms. Each row shows how
+batching and the per-endpoint concurrency limit trade POSTs for throughput.
+Run from the backend directory:
+
+    python -m benchmarks.bench_webhooks [--events N] [--latency-ms MS]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Use a throwaway database before any app module reads DATABASE_URL
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+# The stub receiver listens on localhost, which webhooks may not reach otherwise
+os.environ["WEBHOOK_ALLOW_PRIVATE_ADDRESSES"] = "true"
+
+from sqlmodel import Session
+from db import get_engine
+from startup import init_db
+from services import webhook_service
+import webhooks
+
+def start_receiver(latency: float) -> ThreadingHTTPServer:
+    class Receiver(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so the client's connection pool is used
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(latency)
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 128  # The default backlog of 5 drops connections under concurrency
+
+    server = Server(("127.0.0.1", 0), Receiver)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark webhook delivery")
+    parser.add_argument("--events", type=int, default=2000, help="Events per run")
+    parser.add_argument("--latency-ms", type=float, default=5, help="Receiver response time")
+    args = parser.parse_args()
+
+    init_db()
+    server = start_receiver(args.latency_ms / 1000)
+    url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+    engine = get_engine()
+    with Session(engine, expire_on_commit=False) as session:
+        webhook_service.create_subscription(session, "bench-user", url)
+    events = [
+        {"id": i, "event_type": "task.updated", "user_id": "bench-user", "task_id": i, "subtask_id": None,
+         "data": {"title": f"Task {i}", "completed": False}, "created_at": "2030-01-01T00:00:00"}
+        for i in range(args.events)
+    ]
+
+    for batch_size in (1, 10, 100):
+        for concurrency in (1, 4, 16):
+            with engine.begin() as conn:
+                posts = webhook_service.queue_deliveries(conn, events, batch_size)
+
+            async def drain():
+                dispatcher = webhooks.WebhookDispatcher(max_per_endpoint=concurrency)
+                try:
+                    return await dispatcher.dispatch_once(engines=[engine])
+                finally:
+                    await dispatcher.aclose()
+
+            started = time.perf_counter()
+            counts = asyncio.run(drain())
+            elapsed = time.perf_counter() - started
+            assert counts["delivered"] == posts, counts
+            print(f"batch {batch_size:>3}  concurrency {concurrency:>2}  {posts:>5} POSTs  "
+                  f"{elapsed:7.2f} s  {posts / elapsed:8.0f} POST/s  {args.events / elapsed:9.0f} events/s")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
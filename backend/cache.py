@@ -0,0 +1,344 @@
+"""
+Task list cache for the Todo Application.
+
+Holds the serialized JSON of each user's task list and of each task's
+subtask list. Keys are versioned by a per-list generation number: reads
+look up the current generation before querying the database, and every
+write path bumps the generation after commit. A read that raced with a
+write therefore stores its result under an old generation where nobody
+will find it, instead of overwriting the fresh list with stale data.
+
+The backend is selected with TASK_CACHE_BACKEND:
+- "memory" (default): a bounded in-process LRU, per worker process
+- "redis": a shared Redis instance for multi-worker deployments
+  (needs the optional `redis` package and TASK_CACHE_REDIS_URL)
+- "none": caching disabled
+
+Processes that write tasks outside the API (archiver.py, rebalancer.py,
+worker.py and the recurrence materializer, run as separate workers) can
+only invalidate lists that API processes will see through a shared backend,
+so they call require_shared_cache() and refuse to start with "memory".
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from config import load_environment
+
+# Load environment variables
+load_environment()
+
+TASK_CACHE_BACKEND = os.getenv("TASK_CACHE_BACKEND", "memory").lower()
+TASK_CACHE_MAX_ENTRIES = int(os.getenv("TASK_CACHE_MAX_ENTRIES", "10000"))
+TASK_CACHE_MAX_BYTES = int(os.getenv("TASK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TASK_CACHE_TTL_SECONDS = float(os.getenv("TASK_CACHE_TTL_SECONDS", "300"))
+TASK_CACHE_REDIS_URL = os.getenv("TASK_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+class CacheBackend:
+    """Interface for task cache backends. Values are bytes."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def get_generation(self, key: str) -> int:
+        """Get the current generation number of a list key."""
+        raise NotImplementedError
+
+    def bump_generation(self, key: str) -> int:
+        """Move a list key to a new generation and return the old one."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+class NullCacheBackend(CacheBackend):
+    """Backend that stores nothing, used when caching is disabled."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def get_generation(self, key: str) -> int:
+        return 0
+
+    def bump_generation(self, key: str) -> int:
+        return 0
+
+    def stats(self) -> dict:
+        return {"backend": "none"}
+
+class LRUCacheBackend(CacheBackend):
+    """Thread-safe in-process LRU bounded by entry count and total bytes, with a TTL."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generations: "OrderedDict[str, int]" = OrderedDict()
+        # Generations are drawn from one process-wide counter and never reused, so a
+        # generation that is evicted and re-created can never match an old entry
+        self._generation_counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.current_bytes += len(value)
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def get_generation(self, key: str) -> int:
+        with self._lock:
+            return self._generation(key)
+
+    def bump_generation(self, key: str) -> int:
+        with self._lock:
+            old_generation = self._generation(key)
+            self._generations[key] = next(self._generation_counter)
+            return old_generation
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _generation(self, key: str) -> int:
+        generation = self._generations.get(key)
+        if generation is None:
+            generation = next(self._generation_counter)
+            self._generations[key] = generation
+            # Generation numbers are tiny, but keep the map bounded all the same
+            if len(self._generations) > self.max_entries:
+                self._generations.popitem(last=False)
+        else:
+            self._generations.move_to_end(key)
+        return generation
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self.current_bytes -= len(value)
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared Redis backend so every worker process sees the same lists and invalidations.
+
+    List bodies expire after the TTL while generation counters never expire,
+    so run Redis with a volatile-* eviction policy to keep the counters.
+    """
+
+    def __init__(self, url: str, ttl_seconds: float):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.client.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.set(key, value, ex=int(self.ttl_seconds))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def get_generation(self, key: str) -> int:
+        return int(self.client.get(f"gen:{key}") or 0)
+
+    def bump_generation(self, key: str) -> int:
+        return int(self.client.incr(f"gen:{key}")) - 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        memory = self.client.info("memory")
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "used_memory": memory.get("used_memory"),
+        }
+
+class TaskCache:
+    """Per-user cache of serialized task lists and per-task subtask lists."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    @staticmethod
+    def task_list_key(user_id: str) -> str:
+        return f"tasks:{user_id}"
+
+    @staticmethod
+    def subtask_list_key(user_id: str, task_id: int) -> str:
+        return f"subtasks:{user_id}:{task_id}"
+
+    def generation(self, list_key: str) -> int:
+        """
+        Get the generation of a list, to be read before querying the database.
+
+        Args:
+            list_key: Key from task_list_key() or subtask_list_key()
+
+        Returns:
+            int: Generation to pass to get() and set()
+        """
+        return self.backend.get_generation(list_key)
+
+    def get(self, list_key: str, generation: int) -> Optional[bytes]:
+        """
+        Get a cached list body.
+
+        Args:
+            list_key: Key from task_list_key() or subtask_list_key()
+            generation: Generation returned by generation()
+
+        Returns:
+            bytes: Serialized JSON list, or None on a miss
+        """
+        return self.backend.get(f"{list_key}#{generation}")
+
+    def set(self, list_key: str, generation: int, body: bytes) -> None:
+        """
+        Store a list body under the generation it was read at.
+
+        Args:
+            list_key: Key from task_list_key() or subtask_list_key()
+            generation: Generation returned by generation() before the database read
+            body: Serialized JSON list
+        """
+        self.backend.set(f"{list_key}#{generation}", body)
+
+    def invalidate(self, list_key: str) -> None:
+        """
+        Invalidate a list after a committed write.
+
+        Args:
+            list_key: Key from task_list_key() or subtask_list_key()
+        """
+        old_generation = self.backend.bump_generation(list_key)
+        self.backend.delete(f"{list_key}#{old_generation}")
+
+    def invalidate_task_list(self, user_id: str) -> None:
+        """Invalidate a user's task list."""
+        self.invalidate(self.task_list_key(user_id))
+
+    def invalidate_subtask_list(self, user_id: str, task_id: int) -> None:
+        """Invalidate the subtask list of one of a user's tasks."""
+        self.invalidate(self.subtask_list_key(user_id, task_id))
+
+    def stats(self) -> dict:
+        """Get hit ratio and memory statistics from the backend."""
+        return self.backend.stats()
+
+_task_cache: Optional[TaskCache] = None
+_task_cache_lock = threading.Lock()
+
+def create_cache_backend(name: str) -> CacheBackend:
+    """
+    Create a cache backend by name.
+
+    Args:
+        name: "memory", "redis" or "none"
+
+    Returns:
+        CacheBackend: The backend
+    """
+    if name == "none":
+        return NullCacheBackend()
+    if name == "redis":
+        return RedisCacheBackend(TASK_CACHE_REDIS_URL, TASK_CACHE_TTL_SECONDS)
+    if name == "memory":
+        return LRUCacheBackend(TASK_CACHE_MAX_ENTRIES, TASK_CACHE_MAX_BYTES, TASK_CACHE_TTL_SECONDS)
+    raise ValueError(f"Unknown TASK_CACHE_BACKEND: {name}")
+
+def require_shared_cache(process: str) -> None:
+    """
+    Refuse to run a task-writing worker process against a per-process cache.
+
+    Its invalidations would only reach its own LRU, and API processes would
+    keep serving the lists it changed until their TTL ran out.
+
+    Args:
+        process: Name of the worker, for the error message
+
+    Raises:
+        SystemExit: If TASK_CACHE_BACKEND is "memory"
+    """
+    if TASK_CACHE_BACKEND == "memory":
+        raise SystemExit(
+            f"{process} writes tasks outside the API, so it needs a cache the API shares: "
+            "set TASK_CACHE_BACKEND=redis (or none) here and in the API, or run it in-process"
+        )
+
+def get_task_cache() -> TaskCache:
+    """
+    Get the process-wide task cache, creating it on first use.
+
+    Returns:
+        TaskCache: The task cache for TASK_CACHE_BACKEND
+    """
+    global _task_cache
+    if _task_cache is None:
+        with _task_cache_lock:
+            if _task_cache is None:
+                _task_cache = TaskCache(create_cache_backend(TASK_CACHE_BACKEND))
+    return _task_cache
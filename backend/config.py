@@ -0,0 +1,22 @@
+"""
+Configuration module for the Todo Application.
+
+This module loads environment variables from the .env file exactly once
+per process, so that every other module can call load_environment()
+without paying for repeated file lookups on cold start.
+"""
+
+from dotenv import load_dotenv
+
+_environment_loaded = False
+
+def load_environment() -> None:
+    """
+    Load environment variables from the .env file if not already loaded.
+    """
+    global _environment_loaded
+    if _environment_loaded:
+        return
+
+    load_dotenv()
+    _environment_loaded = True
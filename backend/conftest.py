@@ -0,0 +1,36 @@
+import os
+import tempfile
+import uuid
+
+# Point the app at a throwaway SQLite database before any app module is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+# Cheap password hashes keep login tests fast
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+import pytest
+from fastapi.testclient import TestClient
+
+@pytest.fixture(scope="session")
+def client():
+    from main import app
+    from startup import init_db
+
+    init_db()
+    return TestClient(app)
+
+@pytest.fixture
+def user_id():
+    return f"user-{uuid.uuid4().hex[:12]}"
+
+@pytest.fixture
+def auth_headers(user_id):
+    from middleware.auth import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+@pytest.fixture
+def stats_headers(monkeypatch):
+    import middleware.auth
+
+    monkeypatch.setattr(middleware.auth, "HEALTH_STATS_TOKEN", "test-stats-token")
+    return {"Authorization": "Bearer test-stats-token"}
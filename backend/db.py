@@ -1,26 +1,371 @@
 from sqlmodel import create_engine, Session
-from typing import Generator
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from fastapi import Request
+from fastapi.routing import APIRoute
+from typing import Dict, Generator, List, Optional, Tuple
+import asyncio
+import functools
+import itertools
 import os
-from dotenv import load_dotenv
+import threading
+import time
+from config import load_environment
+from sharding import ShardMap
 
 # Load environment variables
-load_dotenv()
+load_environment()
 
 # Get database URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./todo_app.db")
 
-# Create the database engine with connection pooling for PostgreSQL
-if DATABASE_URL.startswith("postgresql"):
+# Optional read replicas (comma-separated URLs) used by the read-only endpoints
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+# How long a user's reads stay on the primary after that user writes
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Optional task shards (comma-separated URLs); tasks and subtasks are split across them by user_id
+DATABASE_SHARD_URLS = [url.strip() for url in os.getenv("DATABASE_SHARD_URLS", "").split(",") if url.strip()]
+
+# Per-user shard overrides written by shard_tool.py
+SHARD_MAP_PATH = os.getenv("SHARD_MAP_PATH", "./shard_map.json")
+
+# Log every SQL statement only when explicitly requested
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+# SQLite production tuning (applied to file-backed SQLite databases only)
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 256 MiB
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))         # 64 MiB per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_WRITE_QUEUE_TIMEOUT = float(os.getenv("SQLITE_WRITE_QUEUE_TIMEOUT", "30"))
+SQLITE_READER_POOL_SIZE = int(os.getenv("SQLITE_READER_POOL_SIZE", str(os.cpu_count() or 4)))
+
+# Engines are created on first use so importing this module never opens a connection
+_engine: Optional[Engine] = None
+_read_engine: Optional[Engine] = None
+_replica_engines: Optional[List[Engine]] = None
+_replica_cycle = None
+_replica_lock = threading.Lock()
+
+_shard_engines: Optional[List[Tuple[Engine, Engine]]] = None
+_shard_map: Optional[ShardMap] = None
+_shard_lock = threading.Lock()
+
+# Per-user timestamp of the last write seen by this process (for read-your-writes)
+_last_write_at: Dict[str, float] = {}
+_last_write_lock = threading.Lock()
+
+def is_sqlite_file_url(url: str) -> bool:
+    """
+    Check whether a database URL points at a file-backed SQLite database.
+
+    Args:
+        url: Database URL
+
+    Returns:
+        bool: True for file-backed SQLite, False for in-memory SQLite and other databases
+    """
+    if not url.startswith("sqlite"):
+        return False
+    path = url.split("///", 1)[1] if "///" in url else ""
+    return path not in ("", ":memory:") and "mode=memory" not in path
+
+def _install_sqlite_pragmas(engine: Engine, read_only: bool) -> None:
+    """
+    Apply the SQLite production pragmas to every new connection of an engine.
+
+    Writers start transactions with BEGIN IMMEDIATE so the write lock is taken
+    up front instead of failing with "database is locked" on lock upgrade.
+    Readers are marked query_only and use plain deferred transactions, which
+    WAL lets run concurrently with the writer.
+
+    Args:
+        engine: The engine to configure
+        read_only: Whether the engine only serves reads
+    """
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself (see the "begin" listener below)
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def begin_transaction(conn):
+        conn.exec_driver_sql("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
+def create_sqlite_engine(url: str, read_only: bool = False) -> Engine:
+    """
+    Create a tuned engine for a file-backed SQLite database.
+
+    The writer engine holds a single connection; requests that want to write
+    wait in the pool's checkout queue, which serializes writes inside the
+    process. The reader engine holds one connection per core so reads scale
+    with the threadpool.
+
+    Args:
+        url: SQLite database URL
+        read_only: Create the reader pool instead of the single writer connection
+
+    Returns:
+        Engine: A SQLAlchemy engine
+    """
+    if read_only:
+        pool_size, max_overflow = SQLITE_READER_POOL_SIZE, SQLITE_READER_POOL_SIZE
+    else:
+        pool_size, max_overflow = 1, 0
+
     engine = create_engine(
-        DATABASE_URL,
-        echo=True,
-        pool_pre_ping=True,  # Verify connections before use
-        pool_recycle=300,    # Recycle connections every 5 minutes
-        pool_size=10,        # Number of connection pools
-        max_overflow=20      # Maximum number of connections
+        url,
+        echo=SQL_ECHO,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=SQLITE_WRITE_QUEUE_TIMEOUT,
+        connect_args={"check_same_thread": False}
     )
-else:
-    engine = create_engine(DATABASE_URL, echo=True)
+    _install_sqlite_pragmas(engine, read_only)
+    return engine
+
+def _create_engine(url: str = DATABASE_URL) -> Engine:
+    """
+    Create a database engine for a database URL.
+
+    Args:
+        url: Database URL (defaults to DATABASE_URL)
+
+    Returns:
+        Engine: A SQLAlchemy engine
+    """
+    # Create the database engine with connection pooling for PostgreSQL
+    if url.startswith("postgresql"):
+        return create_engine(
+            url,
+            echo=SQL_ECHO,
+            pool_pre_ping=True,  # Verify connections before use
+            pool_recycle=300,    # Recycle connections every 5 minutes
+            pool_size=10,        # Number of connection pools
+            max_overflow=20      # Maximum number of connections
+        )
+    if is_sqlite_file_url(url):
+        return create_sqlite_engine(url)
+    return create_engine(url, echo=SQL_ECHO)
+
+def get_engine() -> Engine:
+    """
+    Get the primary (read-write) database engine, creating it on first use.
+
+    Returns:
+        Engine: The shared SQLAlchemy engine
+    """
+    global _engine
+    if _engine is None:
+        _engine = _create_engine()
+    return _engine
+
+def get_read_engine() -> Engine:
+    """
+    Get the engine for read-only queries, creating it on first use.
+
+    File-backed SQLite gets a separate reader pool; every other database
+    reads through the primary engine.
+
+    Returns:
+        Engine: The SQLAlchemy engine for reads
+    """
+    global _read_engine
+    if _read_engine is None:
+        if is_sqlite_file_url(DATABASE_URL):
+            _read_engine = create_sqlite_engine(DATABASE_URL, read_only=True)
+        else:
+            _read_engine = get_engine()
+    return _read_engine
+
+def get_replica_engines() -> List[Engine]:
+    """
+    Get the read-replica engines, creating them on first use.
+
+    Returns:
+        List[Engine]: One engine per URL in DATABASE_REPLICA_URLS (may be empty)
+    """
+    global _replica_engines, _replica_cycle
+    if _replica_engines is None:
+        with _replica_lock:
+            if _replica_engines is None:
+                engines = [_create_engine(url) for url in DATABASE_REPLICA_URLS]
+                _replica_cycle = itertools.cycle(engines) if engines else None
+                _replica_engines = engines
+    return _replica_engines
+
+def sharding_enabled() -> bool:
+    """Check whether task data is split across DATABASE_SHARD_URLS."""
+    return bool(DATABASE_SHARD_URLS)
+
+def get_shard_map() -> ShardMap:
+    """
+    Get the shard map for DATABASE_SHARD_URLS, creating it on first use.
+
+    Returns:
+        ShardMap: The process-wide shard map
+    """
+    global _shard_map
+    if _shard_map is None:
+        with _shard_lock:
+            if _shard_map is None:
+                _shard_map = ShardMap(len(DATABASE_SHARD_URLS), SHARD_MAP_PATH)
+    return _shard_map
+
+def _get_shard_engine_pairs() -> List[Tuple[Engine, Engine]]:
+    global _shard_engines
+    if _shard_engines is None:
+        with _shard_lock:
+            if _shard_engines is None:
+                pairs = []
+                for url in DATABASE_SHARD_URLS:
+                    writer = _create_engine(url)
+                    reader = create_sqlite_engine(url, read_only=True) if is_sqlite_file_url(url) else writer
+                    pairs.append((writer, reader))
+                _shard_engines = pairs
+    return _shard_engines
+
+def get_shard_engines() -> List[Engine]:
+    """
+    Get the read-write engine of every shard, creating them on first use.
+
+    Returns:
+        List[Engine]: One engine per URL in DATABASE_SHARD_URLS (may be empty)
+    """
+    return [writer for writer, _ in _get_shard_engine_pairs()]
+
+def get_user_data_engines() -> List[Engine]:
+    """
+    Get every engine that holds task data: all shards, or just the primary.
+
+    Returns:
+        List[Engine]: Engines to visit for migrations and cross-user background jobs
+    """
+    return get_shard_engines() if sharding_enabled() else [get_engine()]
+
+def read_engine_paired_with(engine: Engine) -> Engine:
+    """
+    Get the reader pool that belongs to a read-write engine.
+
+    Background jobs that poll a task database read through it, so a pass
+    that finds nothing to do never takes SQLite's write lock.
+
+    Args:
+        engine: The primary engine or a shard's read-write engine
+
+    Returns:
+        Engine: Its reader pool, or the engine itself when it has none
+    """
+    if engine is _engine:
+        return get_read_engine()
+    if _shard_engines is not None:
+        for writer, reader in _shard_engines:
+            if writer is engine:
+                return reader
+    return engine
+
+def write_engine_for(user_id: str) -> Engine:
+    """
+    Get the engine for reads and writes of a user's tasks and subtasks.
+
+    Args:
+        user_id: The ID of the user the query is scoped to
+
+    Returns:
+        Engine: The user's shard, or the primary when sharding is off
+    """
+    if sharding_enabled():
+        return _get_shard_engine_pairs()[get_shard_map().shard_for(user_id)][0]
+    return get_engine()
+
+def record_user_write(user_id: str) -> None:
+    """
+    Remember that a user has just written, so their next reads go to the primary.
+
+    Args:
+        user_id: The ID of the user who wrote
+    """
+    now = time.monotonic()
+    with _last_write_lock:
+        _last_write_at[user_id] = now
+        # Keep the map bounded by dropping users whose window has passed
+        if len(_last_write_at) > 10000:
+            cutoff = now - READ_YOUR_WRITES_SECONDS
+            for stale_user_id in [uid for uid, at in _last_write_at.items() if at < cutoff]:
+                del _last_write_at[stale_user_id]
+
+def wrote_recently(user_id: str) -> bool:
+    """
+    Check whether a user wrote within the read-your-writes window.
+
+    Args:
+        user_id: The ID of the user
+
+    Returns:
+        bool: True if the user's reads must still go to the primary
+    """
+    last_write = _last_write_at.get(user_id)
+    return last_write is not None and time.monotonic() - last_write < READ_YOUR_WRITES_SECONDS
+
+def read_engine_for(user_id: str) -> Engine:
+    """
+    Route a read-only query for a user to a replica or the primary.
+
+    Reads go round-robin to the replicas, except within READ_YOUR_WRITES_SECONDS
+    of the user's own last write, when they go to the primary so the user sees
+    what they just wrote. The write timestamps are kept per process. When
+    sharding is on, reads go to the user's shard (its reader pool for SQLite).
+
+    Args:
+        user_id: The ID of the user the query is scoped to
+
+    Returns:
+        Engine: The engine the read should use
+    """
+    if sharding_enabled():
+        return _get_shard_engine_pairs()[get_shard_map().shard_for(user_id)][1]
+    replicas = get_replica_engines()
+    if not replicas:
+        return get_read_engine()
+    if wrote_recently(user_id):
+        return get_engine()
+    with _replica_lock:
+        return next(_replica_cycle)
+
+def read_engines_for_all_shards(user_id: str) -> List[Engine]:
+    """
+    Route a read that has to visit every task database, such as the tasks
+    other users have shared with a user.
+
+    Args:
+        user_id: The ID of the user the query is for
+
+    Returns:
+        List[Engine]: The reader of every shard, or just read_engine_for(user_id) when sharding is off
+    """
+    if sharding_enabled():
+        return [reader for _, reader in _get_shard_engine_pairs()]
+    return [read_engine_for(user_id)]
+
+def __getattr__(name: str):
+    # Keep `from db import engine` working without creating the engine at import time
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_session() -> Generator[Session, None, None]:
     """
@@ -29,5 +374,145 @@ def get_session() -> Generator[Session, None, None]:
     Yields:
         Session: A database session for interacting with the database.
     """
-    with Session(engine) as session:
-        yield session
\ No newline at end of file
+    with Session(get_engine()) as session:
+        yield session
+
+class RequestSession(Session):
+    """
+    Session opened once per request by get_read_session/get_write_session.
+
+    Like any Session it checks out a pool connection only when the first
+    statement runs, so requests rejected before touching the database (403,
+    422) never hold a connection. Routes built with ReleaseSessionsRoute
+    close it as soon as the endpoint returns, before the response is
+    serialized, and every connection hold is timed per route.
+    """
+
+# Connection hold times per route label ("GET /api/{user_id}/tasks")
+_hold_stats: Dict[str, Dict[str, float]] = {}
+_hold_stats_lock = threading.Lock()
+
+@event.listens_for(RequestSession, "after_begin")
+def _connection_acquired(session, transaction, connection):
+    session.info.setdefault("acquired_at", time.perf_counter())
+
+@event.listens_for(RequestSession, "after_transaction_end")
+def _connection_released(session, transaction):
+    # Only the outermost transaction returns the connection to the pool
+    if transaction.parent is not None:
+        return
+    acquired_at = session.info.pop("acquired_at", None)
+    if acquired_at is None:
+        return
+    held = time.perf_counter() - acquired_at
+    with _hold_stats_lock:
+        stats = _hold_stats.setdefault(session.info.get("route", "unknown"), {"checkouts": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["checkouts"] += 1
+        stats["total_seconds"] += held
+        stats["max_seconds"] = max(stats["max_seconds"], held)
+
+def get_connection_hold_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Get how long request sessions held pool connections, per route.
+
+    Returns:
+        dict: Route label mapped to checkouts, total, mean and max hold seconds
+    """
+    with _hold_stats_lock:
+        return {
+            route: {**stats, "mean_seconds": stats["total_seconds"] / stats["checkouts"]}
+            for route, stats in _hold_stats.items()
+        }
+
+def _route_label(request: Request) -> str:
+    route = request.scope.get("route")
+    return f"{request.method} {route.path if route else request.url.path}"
+
+def get_read_session(user_id: str, request: Request) -> Generator[Session, None, None]:
+    """
+    Get a request-scoped session for read-only queries on a user's tasks.
+
+    Used as a FastAPI dependency; `user_id` comes from the request path.
+
+    Args:
+        user_id: The ID of the user the request is scoped to
+        request: The current request (used to label hold-time statistics)
+
+    Yields:
+        Session: A session bound to the user's read engine
+    """
+    with RequestSession(read_engine_for(user_id), expire_on_commit=False) as session:
+        session.info["route"] = _route_label(request)
+        yield session
+
+def get_write_session(user_id: str, request: Request) -> Generator[Session, None, None]:
+    """
+    Get a request-scoped session for reads and writes of a user's tasks.
+
+    Objects are not expired on commit, so returning a freshly written row
+    does not cost another SELECT.
+
+    Args:
+        user_id: The ID of the user the request is scoped to
+        request: The current request (used to label hold-time statistics)
+
+    Yields:
+        Session: A session bound to the user's write engine
+    """
+    with RequestSession(write_engine_for(user_id), expire_on_commit=False) as session:
+        session.info["route"] = _route_label(request)
+        yield session
+
+def get_primary_session(request: Request) -> Generator[Session, None, None]:
+    """
+    Get a request-scoped session on the primary database, for data that is
+    not split by user across shards (accounts, tokens and jobs).
+
+    Args:
+        request: The current request (used to label hold-time statistics)
+
+    Yields:
+        Session: A session bound to the primary engine
+    """
+    with RequestSession(get_engine(), expire_on_commit=False) as session:
+        session.info["route"] = _route_label(request)
+        yield session
+
+def _close_request_sessions(kwargs: dict) -> None:
+    for value in kwargs.values():
+        if isinstance(value, RequestSession):
+            value.close()
+
+def _release_sessions_after(endpoint):
+    """Wrap an endpoint so its request sessions are closed as soon as it returns."""
+    if getattr(endpoint, "releases_sessions", False):
+        return endpoint
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _close_request_sessions(kwargs)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _close_request_sessions(kwargs)
+
+    wrapper.releases_sessions = True
+    return wrapper
+
+class ReleaseSessionsRoute(APIRoute):
+    """
+    APIRoute that returns request sessions' connections to the pool when
+    the endpoint returns, instead of after the response is serialized.
+
+    Endpoints must return fully loaded objects (no lazy relationship loads).
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _release_sessions_after(endpoint), **kwargs)
@@ -0,0 +1,266 @@
+"""
+JWKS cache for asymmetric access tokens.
+
+Tokens signed by an external issuer (such as Better Auth's JWT plugin) are
+verified against the issuer's public keys, so no replica needs a shared
+signing secret. The key set is read from JWKS_URL, a file path or an
+http(s) URL, parsed once into key objects and kept in memory by key ID.
+Verifying a token is a dictionary lookup plus one signature check; the
+request path never touches the network.
+
+The set is refreshed in the background every JWKS_REFRESH_SECONDS. A token
+whose kid is not in the set is rejected, and asks for an early refresh (at
+most once every JWKS_MIN_REFRESH_SECONDS), which picks up rotated keys.
+
+Supported algorithms are RS256/384/512 and ES256/384/512 through
+python-jose, and EdDSA (Ed25519) through cryptography.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+import urllib.request
+from typing import Dict, Optional, Tuple
+from config import load_environment
+
+# Load environment variables
+load_environment()
+
+JWKS_URL = os.getenv("JWKS_URL", "")  # File path, file:// URL or http(s):// URL; empty disables JWKS tokens
+JWKS_REFRESH_SECONDS = float(os.getenv("JWKS_REFRESH_SECONDS", "300"))
+JWKS_MIN_REFRESH_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_SECONDS", "30"))
+JWT_ISSUER = os.getenv("JWT_ISSUER", "")      # Required "iss" of JWKS tokens, if set
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "")  # Required "aud" of JWKS tokens, if set
+
+# Algorithm implied by a key's type and curve when the JWK has no "alg"
+DEFAULT_ALGORITHMS = {
+    ("RSA", None): "RS256",
+    ("EC", "P-256"): "ES256",
+    ("EC", "P-384"): "ES384",
+    ("EC", "P-521"): "ES512",
+    ("OKP", "Ed25519"): "EdDSA",
+}
+
+def _base64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+def _ed25519_key(jwk: dict):
+    # python-jose has no EdDSA support; verify Ed25519 with cryptography behind jose's Key interface
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    from jose.backends.base import Key
+
+    class Ed25519Key(Key):
+        def __init__(self, public_key: Ed25519PublicKey):
+            self.public_key_object = public_key
+
+        def verify(self, msg: bytes, sig: bytes) -> bool:
+            try:
+                self.public_key_object.verify(sig, msg)
+                return True
+            except InvalidSignature:
+                return False
+
+    return Ed25519Key(Ed25519PublicKey.from_public_bytes(_base64url_decode(jwk["x"])))
+
+def construct_key(jwk: dict) -> Tuple[str, object]:
+    """
+    Parse one JWK into its algorithm and a verification key object.
+
+    Args:
+        jwk: A public JWK (kty RSA, EC or OKP)
+
+    Returns:
+        tuple: (algorithm, key object accepted by jose's jwt.decode)
+
+    Raises:
+        ValueError: If the key type, curve or algorithm is unsupported
+    """
+    kty = jwk.get("kty")
+    algorithm = jwk.get("alg") or DEFAULT_ALGORITHMS.get((kty, jwk.get("crv") if kty != "RSA" else None))
+    if algorithm is None:
+        raise ValueError(f"Unsupported JWK: kty={kty} crv={jwk.get('crv')}")
+    if algorithm == "EdDSA":
+        if jwk.get("crv") != "Ed25519":
+            raise ValueError("Only Ed25519 EdDSA keys are supported")
+        return algorithm, _ed25519_key(jwk)
+    if not algorithm.startswith(("RS", "ES")):
+        raise ValueError(f"Unsupported JWK algorithm: {algorithm}")
+
+    from jose import jwk as jose_jwk
+    return algorithm, jose_jwk.construct(jwk, algorithm)
+
+def read_jwks(source: str, timeout: float = 10.0) -> dict:
+    """
+    Read a JSON Web Key Set from a file or URL.
+
+    Args:
+        source: File path, file:// URL or http(s):// URL
+        timeout: Seconds to wait for an HTTP response
+
+    Returns:
+        dict: The parsed key set
+    """
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source, timeout=timeout) as response:
+            return json.loads(response.read())
+    with open(source.removeprefix("file://")) as jwks_file:
+        return json.load(jwks_file)
+
+class JWKSCache:
+    """In-memory key set, looked up by key ID and refreshed in the background."""
+
+    def __init__(
+        self,
+        source: str,
+        refresh_seconds: float = JWKS_REFRESH_SECONDS,
+        min_refresh_seconds: float = JWKS_MIN_REFRESH_SECONDS
+    ):
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self._keys: Dict[str, Tuple[str, object]] = {}
+        self._refreshed_at = 0.0
+        self._refresh_requested = False
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.failed_refreshes = 0
+        self.unknown_kids = 0
+
+    def refresh(self) -> int:
+        """
+        Re-read the key set and swap it in.
+
+        Keys that fail to parse are skipped; if the source cannot be read the
+        current keys stay in place.
+
+        Returns:
+            int: Number of keys loaded
+        """
+        with self._lock:
+            self._refresh_requested = False
+            self._refreshed_at = time.monotonic()
+            try:
+                jwks = read_jwks(self.source)
+            except Exception as e:
+                self.failed_refreshes += 1
+                print(f"JWKS refresh from {self.source} failed: {e}")
+                raise
+            keys = {}
+            for jwk in jwks.get("keys", []):
+                if jwk.get("use", "sig") != "sig" or "kid" not in jwk:
+                    continue
+                try:
+                    keys[jwk["kid"]] = construct_key(jwk)
+                except Exception as e:
+                    print(f"Skipping JWK {jwk.get('kid')}: {e}")
+            # One assignment, so readers see the old set or the new one
+            self._keys = keys
+            self.refreshes += 1
+            return len(keys)
+
+    def get(self, kid: Optional[str]) -> Optional[Tuple[str, object]]:
+        """
+        Look up a key by ID, without any I/O.
+
+        Args:
+            kid: The token header's key ID
+
+        Returns:
+            tuple: (algorithm, key), or None if the key is unknown (which requests an early refresh)
+        """
+        key = self._keys.get(kid)
+        if key is None:
+            self.unknown_kids += 1
+            self._refresh_requested = True
+        return key
+
+    def refresh_due(self) -> bool:
+        """Whether the periodic refresh, or an early one asked for by an unknown kid, is due."""
+        elapsed = time.monotonic() - self._refreshed_at
+        return elapsed >= self.refresh_seconds or (self._refresh_requested and elapsed >= self.min_refresh_seconds)
+
+    async def run_forever(self) -> None:
+        """Refresh the key set whenever a refresh is due, until cancelled."""
+        while True:
+            if self.refresh_due():
+                try:
+                    await asyncio.to_thread(self.refresh)
+                except Exception:
+                    pass  # Already logged; keep serving the current keys
+            await asyncio.sleep(min(self.min_refresh_seconds, self.refresh_seconds))
+
+    def stats(self) -> dict:
+        """
+        Key set statistics.
+
+        Returns:
+            dict: Loaded key IDs, refresh counts and unknown kid lookups
+        """
+        return {
+            "source": self.source,
+            "kids": sorted(self._keys),
+            "refreshes": self.refreshes,
+            "failed_refreshes": self.failed_refreshes,
+            "unknown_kids": self.unknown_kids,
+            "seconds_since_refresh": round(time.monotonic() - self._refreshed_at, 1),
+        }
+
+_jwks_cache: Optional[JWKSCache] = None
+_jwks_cache_lock = threading.Lock()
+
+def get_jwks_cache() -> Optional[JWKSCache]:
+    """
+    Get the process-wide key set, loading it on first use.
+
+    Returns:
+        JWKSCache: The cache for JWKS_URL, or None if JWKS_URL is not set
+    """
+    global _jwks_cache
+    if not JWKS_URL:
+        return None
+    if _jwks_cache is None:
+        with _jwks_cache_lock:
+            if _jwks_cache is None:
+                cache = JWKSCache(JWKS_URL)
+                try:
+                    cache.refresh()
+                except Exception:
+                    pass  # Every token is rejected until the background refresh succeeds
+                _jwks_cache = cache
+    return _jwks_cache
+
+def decode_jwks_token(token: str, cache: JWKSCache) -> dict:
+    """
+    Verify an asymmetric token against the cached key set and return its claims.
+
+    The algorithm comes from the key, never from the token, so a token cannot
+    pick a weaker algorithm than its key was published for.
+
+    Args:
+        token: The encoded JWT
+        cache: Key set to verify against
+
+    Returns:
+        dict: The verified claims
+
+    Raises:
+        JWTError: If the key is unknown, the signature is wrong, or a claim is invalid
+    """
+    from jose import JWTError, jwt
+
+    key = cache.get(jwt.get_unverified_header(token).get("kid"))
+    if key is None:
+        raise JWTError("Unknown signing key")
+    algorithm, key_object = key
+    return jwt.decode(
+        token,
+        key_object,
+        algorithms=[algorithm],
+        audience=JWT_AUDIENCE or None,
+        issuer=JWT_ISSUER or None,
+        options={"verify_aud": bool(JWT_AUDIENCE)}
+    )
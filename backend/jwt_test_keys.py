@@ -0,0 +1,57 @@
+"""
+Throwaway JWT signing keys for the tests and benchmarks of the Todo Application.
+
+make_keys() creates one private key per JWKS algorithm the backend accepts
+(RS256, ES256 and EdDSA) and the public key set an issuer would publish for
+them; sign() issues tokens with those keys. Used by test_jwks.py and
+benchmarks/bench_jwt.py. Not imported by the application.
+"""
+
+import base64
+import json
+from typing import Dict, List, Tuple
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from jose import jwk, jwt
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def pem(private_key) -> str:
+    return private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode()
+
+def make_keys() -> Tuple[Dict[str, tuple], List[dict]]:
+    """
+    Create one signing key per algorithm, and the public key set an issuer would publish.
+
+    Returns:
+        tuple: (kid mapped to (algorithm, private key), public JWKs in rsa-1, ec-1, ed-1 order)
+    """
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ec_key = ec.generate_private_key(ec.SECP256R1())
+    ed_key = ed25519.Ed25519PrivateKey.generate()
+    public_jwks = [
+        {**jwk.construct(pem(rsa_key), "RS256").public_key().to_dict(), "kid": "rsa-1"},
+        {**jwk.construct(pem(ec_key), "ES256").public_key().to_dict(), "kid": "ec-1"},
+        {"kty": "OKP", "crv": "Ed25519", "kid": "ed-1", "x": b64url(ed_key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw))},
+    ]
+    return {"rsa-1": ("RS256", rsa_key), "ec-1": ("ES256", ec_key), "ed-1": ("EdDSA", ed_key)}, public_jwks
+
+def sign(claims: dict, kid: str, algorithm: str, private_key) -> str:
+    """
+    Sign claims into a token whose header names the key.
+
+    Args:
+        claims: Token claims
+        kid: Key ID for the token header
+        algorithm: RS256, ES256 or EdDSA
+        private_key: The key from make_keys()
+
+    Returns:
+        str: The encoded token
+    """
+    if algorithm != "EdDSA":
+        return jwt.encode(claims, pem(private_key), algorithm=algorithm, headers={"kid": kid})
+    # python-jose cannot sign EdDSA
+    signing_input = f"{b64url(json.dumps({'alg': 'EdDSA', 'typ': 'JWT', 'kid': kid}).encode())}.{b64url(json.dumps(claims).encode())}"
+    return f"{signing_input}.{b64url(private_key.sign(signing_input.encode()))}"
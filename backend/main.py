@@ -1,12 +1,14 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from routes import auth, tasks
-from middleware.auth import verify_token
-from dotenv import load_dotenv
+from middleware.compression import CompressionMiddleware
+from middleware.request_log import RequestLogMiddleware
+from routes import auth, jobs, projects, tasks, webhooks
+from middleware.auth import verify_stats_token, verify_token
+from config import load_environment
 import os
 
 # Load environment variables
-load_dotenv()
+load_environment()
 
 # Import models to register them with SQLModel
 from models import Task, Subtask
@@ -14,20 +16,82 @@ from models import Task, Subtask
 # Create FastAPI app instance
 app = FastAPI(title="Todo Application API", version="1.0.0")
 
-# Add logging middleware to see incoming requests
-@app.middleware("http")
-async def log_requests(request, call_next):
-    print(f"Incoming request: {request.method} {request.url.path}")
-    if request.query_params:
-        print(f"Query params: {request.query_params}")
-    response = await call_next(request)
-    print(f"Response status: {response.status_code}")
-    return response
-
-# Initialize the database
-from sqlmodel import SQLModel
-from db import engine
-SQLModel.metadata.create_all(bind=engine)
+# Add logging middleware to see incoming requests; plain ASGI, so compression still sees complete bodies
+app.add_middleware(RequestLogMiddleware)
+
+# Schema creation is an explicit migration step (`python startup.py`) so that
+# cold starts never issue DDL. Local SQLite databases are migrated on startup
+# for convenience unless AUTO_MIGRATE says otherwise.
+from db import DATABASE_URL
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", str(DATABASE_URL.startswith("sqlite"))).lower() == "true"
+
+@app.on_event("startup")
+def run_auto_migrate():
+    if AUTO_MIGRATE:
+        from startup import init_db
+        init_db()
+
+# Background jobs can run in-process; larger deployments run `python reminders.py`,
+# `python purger.py`, `python archiver.py`, `python rebalancer.py`, `python worker.py`,
+# `python outbox.py` and `python webhooks.py` as separate workers instead
+# (the outbox relay runs in-process by default: every task write records an
+# event, and task history and webhooks only see events the relay has passed on)
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "false").lower() == "true"
+PURGE_ENABLED = os.getenv("PURGE_ENABLED", "false").lower() == "true"
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+REBALANCE_ENABLED = os.getenv("REBALANCE_ENABLED", "false").lower() == "true"
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "false").lower() == "true"
+OUTBOX_RELAY_ENABLED = os.getenv("OUTBOX_RELAY_ENABLED", "true").lower() == "true"
+WEBHOOKS_ENABLED = os.getenv("WEBHOOKS_ENABLED", "false").lower() == "true"
+# Turn off where background tasks do not survive between requests; token checks then sync the list themselves
+REVOCATION_SYNC_ENABLED = os.getenv("REVOCATION_SYNC_ENABLED", "true").lower() == "true"
+
+@app.on_event("startup")
+async def start_background_jobs():
+    import asyncio
+    app.state.background_tasks = []
+    if REMINDERS_ENABLED:
+        from reminders import create_scheduler
+        app.state.background_tasks.append(asyncio.create_task(create_scheduler().run_forever()))
+    if PURGE_ENABLED:
+        import purger
+        app.state.background_tasks.append(asyncio.create_task(purger.run_forever()))
+    if ARCHIVE_ENABLED:
+        import archiver
+        app.state.background_tasks.append(asyncio.create_task(archiver.run_forever()))
+    if REBALANCE_ENABLED:
+        import rebalancer
+        app.state.background_tasks.append(asyncio.create_task(rebalancer.run_forever()))
+    if JOBS_ENABLED:
+        import worker
+        app.state.background_tasks.append(asyncio.create_task(worker.run_forever()))
+    if OUTBOX_RELAY_ENABLED:
+        import outbox
+        app.state.background_tasks.append(asyncio.create_task(outbox.run_forever()))
+    if WEBHOOKS_ENABLED:
+        import webhooks as webhook_dispatcher
+        app.state.background_tasks.append(asyncio.create_task(webhook_dispatcher.run_forever()))
+    if REVOCATION_SYNC_ENABLED:
+        # Keep this process's access token revocation list in step with the database, without delaying startup
+        import revocation
+        app.state.background_tasks.append(asyncio.create_task(revocation.run_forever()))
+    if os.getenv("JWKS_URL"):
+        # Load the signing keys before the first request, then keep them fresh
+        from jwks import get_jwks_cache
+        jwks_cache = await asyncio.to_thread(get_jwks_cache)
+        app.state.background_tasks.append(asyncio.create_task(jwks_cache.run_forever()))
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    for background_task in getattr(app.state, "background_tasks", []):
+        background_task.cancel()
+
+# Compress responses and answer ETag revalidation for unchanged GET responses
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "500")),
+    cache_max_bytes=int(os.getenv("COMPRESSION_CACHE_BYTES", str(8 * 1024 * 1024)))
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -57,6 +121,9 @@ app.add_middleware(
 # Include routers
 app.include_router(auth.router, prefix="/api", tags=["authentication"])
 app.include_router(tasks.router, prefix="/api", tags=["tasks"])
+app.include_router(projects.router, prefix="/api", tags=["projects"])
+app.include_router(jobs.router, prefix="/api", tags=["jobs"])
+app.include_router(webhooks.router, prefix="/api", tags=["webhooks"])
 
 @app.get("/")
 def read_root():
@@ -76,4 +143,40 @@ def health_check():
     Returns:
         dict: Health status
     """
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/health/cache", dependencies=[Depends(verify_stats_token)])
+def cache_stats():
+    """
+    Task list cache statistics (needs HEALTH_STATS_TOKEN).
+
+    Returns:
+        dict: Hit ratio, entry count and memory use of the task cache
+    """
+    from cache import get_task_cache
+    return get_task_cache().stats()
+
+@app.get("/health/operations", dependencies=[Depends(verify_stats_token)])
+def operation_stats():
+    """
+    Task service operation statistics (needs HEALTH_STATS_TOKEN).
+
+    Returns:
+        dict: Call counts and timings per service operation
+    """
+    from services.task_service import get_operation_stats
+    return get_operation_stats()
+
+@app.get("/health/connections", dependencies=[Depends(verify_stats_token)])
+def connection_stats():
+    """
+    Database connection statistics (needs HEALTH_STATS_TOKEN).
+
+    Returns:
+        dict: Pool status and per-route connection hold times
+    """
+    from db import get_connection_hold_stats, get_engine
+    return {
+        "pool": get_engine().pool.status(),
+        "routes": get_connection_hold_stats(),
+    }
\ No newline at end of file
@@ -1,21 +1,27 @@
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
-from jose import JWTError, jwt
 from datetime import datetime, timedelta
+import hmac
 import os
-from dotenv import load_dotenv
+import uuid
+from config import load_environment
 
 # Load environment variables
-load_dotenv()
+load_environment()
 
 # Initialize the security scheme
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Get secret key and algorithm from environment variables
 SECRET_KEY = os.getenv("BETTER_AUTH_SECRET", "your-default-secret-key-change-in-production")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))  # 7 days default
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))  # Short-lived; clients renew with a refresh token
+# Tokens signed with BETTER_AUTH_SECRET; turn off once every issuer signs with a JWKS key
+SHARED_SECRET_TOKENS_ENABLED = os.getenv("SHARED_SECRET_TOKENS_ENABLED", "true").lower() == "true"
+# Bearer token for the /health/* statistics endpoints; while unset they are hidden
+HEALTH_STATS_TOKEN = os.getenv("HEALTH_STATS_TOKEN", "")
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """
@@ -28,6 +34,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     Returns:
         str: Encoded JWT token
     """
+    # Imported lazily to keep python-jose off the cold-start import path
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -35,9 +44,72 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
+    to_encode.setdefault("jti", uuid.uuid4().hex)  # Lets the token be revoked
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_token(token: str) -> dict:
+    """
+    Verify a JWT and return its claims.
+
+    Tokens with a key ID are checked against the cached JWKS (see jwks.py)
+    when JWKS_URL is set; other tokens against the shared secret.
+
+    Args:
+        token: The encoded JWT
+
+    Returns:
+        dict: The verified claims
+
+    Raises:
+        JWTError: If the token is invalid or expired
+    """
+    from jose import JWTError, jwt
+    from jwks import get_jwks_cache, decode_jwks_token
+
+    jwks_cache = get_jwks_cache()
+    if jwks_cache is not None and "kid" in jwt.get_unverified_header(token):
+        return decode_jwks_token(token, jwks_cache)
+    if not SHARED_SECRET_TOKENS_ENABLED:
+        raise JWTError("Shared secret tokens are disabled")
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+def verify_token_claims(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """
+    Verify the JWT token from the request and return all of its claims.
+
+    Revoked tokens are rejected by a lookup in the in-memory revocation
+    list (see revocation.py), without a database query.
+
+    Args:
+        credentials: HTTP authorization credentials from the request
+
+    Returns:
+        dict: The verified claims, with the user ID in "sub"
+
+    Raises:
+        HTTPException: If token is invalid, expired or revoked
+    """
+    from jose import JWTError
+    from revocation import get_revocation_list
+
+    credentials_error = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        # Decode the token
+        payload = decode_token(credentials.credentials)
+    except JWTError:
+        raise credentials_error
+    if payload.get("sub") is None:
+        raise credentials_error
+    jti = payload.get("jti")
+    if jti is not None and get_revocation_list().is_revoked(jti):
+        raise credentials_error
+    return payload
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     """
     Verify the JWT token from the request.
@@ -49,24 +121,28 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
         str: User ID from the token
         
     Raises:
-        HTTPException: If token is invalid or expired
+        HTTPException: If token is invalid, expired or revoked
     """
-    try:
-        # Decode the token
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        return user_id
-    except JWTError:
+    return verify_token_claims(credentials)["sub"]
+
+def verify_stats_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> None:
+    """
+    Guard the operational statistics endpoints with HEALTH_STATS_TOKEN.
+
+    Their cache sizes, timings and pool state are not meant for users, so
+    user tokens are not accepted.
+
+    Args:
+        credentials: HTTP authorization credentials from the request, if any
+
+    Raises:
+        HTTPException: 404 if HEALTH_STATS_TOKEN is unset, 401 if the token is missing or wrong
+    """
+    if not HEALTH_STATS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), HEALTH_STATS_TOKEN.encode()):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
+            detail="Invalid statistics token",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
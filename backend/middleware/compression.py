@@ -0,0 +1,297 @@
+"""
+Response compression middleware for the Todo Application.
+
+Negotiates brotli (when the optional `brotli` package is installed) or gzip
+from Accept-Encoding, leaves bodies under a minimum size alone, and
+compresses streaming responses chunk by chunk. Complete GET responses get a
+content-hash ETag; a matching If-None-Match is answered with 304, and the
+compressed bytes of each body are kept in a bounded LRU cache, keyed by a
+hash of the uncompressed body, so repeated polls of an unchanged task list
+skip compression entirely. Upstream ETags are never used as cache keys:
+they need not be unique across resources (task ETags are version numbers).
+A strong upstream ETag is made weak on compressed responses, since the
+gzip, brotli and identity bytes differ while the ETag stays the same.
+"""
+
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best supported content encoding from an Accept-Encoding header.
+
+    Args:
+        accept_encoding: Value of the Accept-Encoding request header
+
+    Returns:
+        str: "br" or "gzip", or None if the client accepts neither
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    def is_accepted(encoding: str) -> bool:
+        return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+    if brotli is not None and is_accepted("br"):
+        return "br"
+    if is_accepted("gzip"):
+        return "gzip"
+    return None
+
+def weak_etag(etag: str) -> str:
+    """Mark an ETag weak (W/"..."), as it no longer names one exact byte sequence."""
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag using weak comparison.
+
+    Args:
+        if_none_match: Value of the If-None-Match request header
+        etag: The response's ETag
+
+    Returns:
+        bool: True if the client's cached copy is still current
+    """
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+class CompressedBodyCache:
+    """Thread-safe LRU cache of compressed bodies keyed by (uncompressed body hash, encoding), bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: Tuple[str, str], body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self.current_bytes += len(body)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses responses and serves ETag revalidation."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        cache_max_bytes: int = 8 * 1024 * 1024
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = CompressedBodyCache(cache_max_bytes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        responder = _CompressionResponder(
+            self,
+            send,
+            method=scope["method"],
+            encoding=choose_encoding(request_headers.get("accept-encoding", "")),
+            if_none_match=request_headers.get("if-none-match")
+        )
+        await self.app(scope, receive, responder.send)
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        """
+        Compress a complete body.
+
+        Args:
+            body: Uncompressed body
+            encoding: "br" or "gzip"
+
+        Returns:
+            bytes: Compressed body
+        """
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        # mtime=0 keeps the output deterministic for identical bodies
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def stream_compressor(self, encoding: str):
+        """
+        Create an incremental compressor for a streaming body.
+
+        Args:
+            encoding: "br" or "gzip"
+
+        Returns:
+            A (compress_chunk, finish) pair of callables returning bytes
+        """
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return (lambda chunk: compressor.process(chunk) + compressor.flush()), compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        return (lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)), compressor.flush
+
+class _CompressionResponder:
+    """Per-request send wrapper used by CompressionMiddleware."""
+
+    def __init__(self, middleware: CompressionMiddleware, send: Send, method: str, encoding: Optional[str], if_none_match: Optional[str]):
+        self.middleware = middleware
+        self._send = send
+        self.method = method
+        self.encoding = encoding
+        self.if_none_match = if_none_match
+        self.start_message: Optional[Message] = None
+        self.compress_chunk = None
+        self.finish = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk tells us what to do
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            if message.get("more_body", False):
+                await self._start_stream(start_message, message)
+            else:
+                await self._send_complete(start_message, message.get("body", b""))
+            return
+
+        if self.compress_chunk is None:
+            await self._send(message)
+            return
+
+        # Later chunks of a compressed stream
+        body = self.compress_chunk(message.get("body", b""))
+        more_body = message.get("more_body", False)
+        if not more_body:
+            body += self.finish()
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        if self.encoding is None or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def _send_complete(self, start_message: Message, body: bytes) -> None:
+        headers = MutableHeaders(raw=list(start_message["headers"]))
+        start_message["headers"] = headers.raw
+        status_code = start_message["status"]
+
+        compress = len(body) >= self.middleware.minimum_size and self._compressible(headers)
+        if compress and "etag" in headers:
+            headers["ETag"] = weak_etag(headers["etag"])
+        body_hash = None
+        if self.method == "GET" and status_code == 200:
+            body_hash = hashlib.blake2b(body, digest_size=16).hexdigest()
+            etag = headers.get("etag")
+            if etag is None:
+                etag = f'W/"{body_hash}"'
+                headers["ETag"] = etag
+            if self.if_none_match and etag_matches(self.if_none_match, etag):
+                not_modified_headers = MutableHeaders(raw=[])
+                not_modified_headers["ETag"] = etag
+                for name in ("cache-control", "vary"):
+                    if name in headers:
+                        not_modified_headers[name] = headers[name]
+                await self._send({"type": "http.response.start", "status": 304, "headers": not_modified_headers.raw})
+                await self._send({"type": "http.response.body", "body": b""})
+                return
+
+        if compress:
+            compressed = None
+            cache_key = (body_hash, self.encoding) if body_hash else None
+            if cache_key:
+                compressed = self.middleware.cache.get(cache_key)
+            if compressed is None:
+                compressed = self.middleware.compress(body, self.encoding)
+                if cache_key:
+                    self.middleware.cache.put(cache_key, compressed)
+            body = compressed
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+
+        await self._send(start_message)
+        await self._send({"type": "http.response.body", "body": body})
+
+    async def _start_stream(self, start_message: Message, message: Message) -> None:
+        headers = MutableHeaders(raw=list(start_message["headers"]))
+        start_message["headers"] = headers.raw
+        if not self._compressible(headers):
+            await self._send(start_message)
+            await self._send(message)
+            return
+
+        self.compress_chunk, self.finish = self.middleware.stream_compressor(self.encoding)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "etag" in headers:
+            headers["ETag"] = weak_etag(headers["etag"])
+        if "content-length" in headers:
+            del headers["content-length"]
+        await self._send(start_message)
+        await self._send({"type": "http.response.body", "body": self.compress_chunk(message.get("body", b"")), "more_body": True})
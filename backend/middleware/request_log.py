@@ -0,0 +1,33 @@
+"""
+Request logging middleware for the Todo Application.
+
+Prints each request's method, path and query, and the response status.
+Written as plain ASGI rather than with @app.middleware("http"): that wraps
+every response in a stream, which would hide complete bodies from
+CompressionMiddleware and so disable its ETags, 304s and compressed-body
+cache.
+"""
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+class RequestLogMiddleware:
+    """ASGI middleware that prints requests and response statuses, passing messages through untouched."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        print(f"Incoming request: {scope['method']} {scope['path']}")
+        if scope.get("query_string"):
+            print(f"Query params: {scope['query_string'].decode('latin-1')}")
+
+        async def send_logging_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                print(f"Response status: {message['status']}")
+            await send(message)
+
+        await self.app(scope, receive, send_logging_status)
@@ -1,6 +1,9 @@
 from sqlmodel import SQLModel, Field, create_engine, Session, Relationship
-from typing import Optional, List
+from sqlalchemy import Index, String, false, text
+from pydantic import BaseModel, field_validator
+from typing import Any, Optional, List
 from datetime import datetime, timezone
+import json
 import uuid
 
 from enum import Enum
@@ -18,6 +21,13 @@ class TaskBase(SQLModel):
     priority: PriorityEnum = Field(default=PriorityEnum.medium)  # Task priority
     category: Optional[str] = Field(default=None, max_length=50)  # Task category/tag
     due_date: Optional[datetime] = Field(default=None)  # Optional due date for the task
+    recurrence_rule: Optional[str] = Field(default=None, max_length=255)  # "daily", "weekly", "monthly" or an RRULE subset
+
+# Fractional position keys must compare byte by byte, not by a locale's collation
+POSITION_TYPE = String(255).with_variant(String(255, collation="C"), "postgresql")
+
+# Tag names are matched by prefix with range scans, which need byte order too
+TAG_NAME_TYPE = String(50).with_variant(String(50, collation="C"), "postgresql")
 
 class SubtaskBase(SQLModel):
     """Base class for Subtask model with common fields."""
@@ -26,18 +36,439 @@ class SubtaskBase(SQLModel):
 
 class Subtask(SubtaskBase, table=True):
     """Subtask model representing a subtask of a main task."""
+    __table_args__ = (
+        # Serves subtask lists in position order (and the foreign key lookups)
+        Index("ix_subtask_task_position", "task_id", "position"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    task_id: int = Field(foreign_key="task.id", nullable=False)  # Foreign key to parent task
+    task_id: int = Field(foreign_key="task.id", nullable=False, ondelete="CASCADE")  # Foreign key to parent task
+    position: Optional[str] = Field(default=None, sa_type=POSITION_TYPE)  # Fractional sort key within the task
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})  # Bumped by every update; the ETag
+
+class Project(SQLModel, table=True):
+    """A named list of tasks, with counts of its live tasks kept up to date by every task write."""
+    __table_args__ = (
+        # Project names are unique per user; also serves the project list in name order
+        Index("ix_project_user_name", "user_id", "name", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str = Field(nullable=False)
+    name: str = Field(min_length=1, max_length=100)
+    task_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})       # Tasks not deleted or archived
+    completed_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})  # Of those, the completed ones
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Task(TaskBase, table=True):
     """Task model representing a todo item."""
+    __table_args__ = (
+        # Serves every per-user read, already in position order; soft-deleted rows are left out
+        Index(
+            "ix_task_user_position", "user_id", "position",
+            sqlite_where=text("deleted_at IS NULL"),
+            postgresql_where=text("deleted_at IS NULL")
+        ),
+        # Serves project task lists in position order and bulk moves out of a project
+        Index(
+            "ix_task_user_project", "user_id", "project_id", "position",
+            sqlite_where=text("deleted_at IS NULL"),
+            postgresql_where=text("deleted_at IS NULL")
+        ),
+        # Serves the reminder scheduler's due-soon range scans
+        Index("ix_task_completed_due_date", "completed", "due_date"),
+        # Partial index over the latest occurrence of each recurring series
+        Index(
+            "ix_task_series_tail", "user_id", "due_date",
+            sqlite_where=text("recurrence_rule IS NOT NULL AND spawned_next = 0"),
+            postgresql_where=text("recurrence_rule IS NOT NULL AND spawned_next = false")
+        ),
+        # Partial index over soft-deleted tasks, for the purger
+        Index(
+            "ix_task_deleted_at", "deleted_at",
+            sqlite_where=text("deleted_at IS NOT NULL"),
+            postgresql_where=text("deleted_at IS NOT NULL")
+        ),
+        # Partial index over completed tasks, for the archiver
+        Index(
+            "ix_task_completed_at", "completed_at",
+            sqlite_where=text("completed = 1"),
+            postgresql_where=text("completed = true")
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: str = Field(nullable=False)  # Better Auth user ID (no FK constraint since users table is managed by Better Auth)
     due_date: Optional[datetime] = Field(default=None)  # Optional due date for the task
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    series_id: Optional[int] = Field(default=None)  # ID of the first occurrence of a recurring series
+    spawned_next: bool = Field(default=False, sa_column_kwargs={"server_default": false()})  # The next occurrence exists
+    deleted_at: Optional[datetime] = Field(default=None)  # Set by soft delete; purged later
+    completed_at: Optional[datetime] = Field(default=None)  # When the task was last marked completed
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})  # Bumped by every update; the ETag
+    position: Optional[str] = Field(default=None, sa_type=POSITION_TYPE)  # Fractional sort key within the user's list
+    project_id: Optional[int] = Field(default=None, foreign_key="project.id", ondelete="SET NULL")  # The task's project, if any
+
+    # Relationship to subtasks; the database cascades deletes, so the ORM never loads them to delete
+    subtasks: List["Subtask"] = Relationship(sa_relationship_kwargs={"cascade": "all, delete-orphan", "passive_deletes": True})
+
+class Tag(SQLModel, table=True):
+    """A user's tag. Names are stored lowercased."""
+    __table_args__ = (
+        # Unique per user; serves name lookups and prefix autocomplete as range scans
+        Index("ix_tag_user_name", "user_id", "name", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str = Field(nullable=False)
+    name: str = Field(sa_type=TAG_NAME_TYPE)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class TaskTag(SQLModel, table=True):
+    """A tag on a task."""
+    __tablename__ = "task_tag"
+    __table_args__ = (
+        # Covering index for "tasks tagged X"; the primary key covers "tags of task Y"
+        Index("ix_task_tag_tag_task", "tag_id", "task_id"),
+    )
+
+    task_id: int = Field(foreign_key="task.id", primary_key=True, ondelete="CASCADE")
+    tag_id: int = Field(foreign_key="tag.id", primary_key=True, ondelete="CASCADE")
+
+class ShareRoleEnum(str, Enum):
+    viewer = "viewer"  # Reads the task and its subtasks
+    editor = "editor"  # Also edits them
+    owner = "owner"    # Also shares the task with others
+
+class TaskShare(SQLModel, table=True):
+    """Access to a task granted to another user; lives next to the task, on its owner's shard."""
+    __tablename__ = "task_share"
+    __table_args__ = (
+        # Serves "shared with me", newest first; the primary key serves permission checks
+        Index("ix_task_share_user_created", "user_id", "created_at", "task_id"),
+    )
+
+    task_id: int = Field(foreign_key="task.id", primary_key=True, ondelete="CASCADE")
+    user_id: str = Field(primary_key=True, max_length=64)  # The collaborator
+    role: ShareRoleEnum = Field(default=ShareRoleEnum.viewer)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ReminderSent(SQLModel, table=True):
+    """Record of a due-date reminder, so each (task, due date) pair fires only once."""
+    __tablename__ = "reminder_sent"
+
+    task_id: int = Field(primary_key=True)
+    due_date: datetime = Field(primary_key=True)  # A new due date gets a new reminder
+    sent_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class OutboxEvent(SQLModel, table=True):
+    """A task or subtask change, written in the transaction that made it and relayed to consumers by outbox.py."""
+    __tablename__ = "outbox_event"
+    # Never reuse IDs, even after the newest events are purged: consumer cursors compare them
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)  # Relay order
+    event_type: str = Field(max_length=32)  # Such as task.created or subtask.deleted
+    user_id: str = Field(max_length=64)     # The task's owner
+    task_id: int
+    subtask_id: Optional[int] = Field(default=None)
+    data: str = Field(default="{}")  # JSON: the row after the change, or the changed fields for bulk writes
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class OutboxCursor(SQLModel, table=True):
+    """How far one outbox consumer has got, per task database."""
+    __tablename__ = "outbox_cursor"
+
+    consumer: str = Field(primary_key=True, max_length=64)
+    last_event_id: int = Field(default=0)  # Every event up to this one was delivered, except pending gaps
+    gaps: Optional[str] = Field(default=None)  # JSON: IDs skipped below last_event_id, mapped to when they were first missed
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class WebhookSubscription(SQLModel, table=True):
+    """A user's webhook endpoint; lives on the user's shard, next to the outbox events it is fed from."""
+    __tablename__ = "webhook_subscription"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str = Field(index=True, max_length=64)
+    url: str = Field(max_length=2048)
+    secret: str = Field(max_length=64)  # Signs every POST; shown to the user once, at creation
+    event_types: str = Field(default="", max_length=1024)  # Comma-separated; empty means every event type
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class WebhookDelivery(SQLModel, table=True):
+    """A batch of events waiting to be POSTed to a subscription, sent by webhooks.py."""
+    __tablename__ = "webhook_delivery"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    subscription_id: int = Field(foreign_key="webhook_subscription.id", index=True, ondelete="CASCADE")
+    payload: str  # The request body, signed as stored
+    event_count: int
+    attempts: int = Field(default=0)
+    # Next try, or lease expiry while a dispatcher is sending it; due deliveries are read off this index
+    next_attempt_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+    last_error: Optional[str] = Field(default=None)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class WebhookDeadLetter(SQLModel, table=True):
+    """A delivery that ran out of attempts or was refused; kept for inspection and redelivery."""
+    __tablename__ = "webhook_dead_letter"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    subscription_id: int = Field(foreign_key="webhook_subscription.id", index=True, ondelete="CASCADE")
+    payload: str
+    event_count: int
+    attempts: int
+    last_error: Optional[str] = Field(default=None)
+    created_at: datetime  # When the delivery was first queued
+    failed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)  # Purged after WEBHOOK_DEAD_LETTER_RETENTION_DAYS
+
+class ArchivedTask(TaskBase, table=True):
+    """A completed task moved out of the hot task table by the archiver."""
+    __tablename__ = "archived_task"
+    __table_args__ = (
+        # Serves the archive endpoint's newest-first keyset pagination
+        Index("ix_archived_task_user_completed", "user_id", "completed_at", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    task_id: int = Field(nullable=False)  # ID the task had in the task table
+    user_id: str = Field(nullable=False)
+    due_date: Optional[datetime] = Field(default=None)
+    series_id: Optional[int] = Field(default=None)
+    created_at: datetime
+    updated_at: datetime
+    completed_at: datetime
+    archived_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ArchivedSubtask(SubtaskBase, table=True):
+    """A subtask of an archived task."""
+    __tablename__ = "archived_subtask"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    archived_task_id: int = Field(foreign_key="archived_task.id", nullable=False, index=True, ondelete="CASCADE")
+    created_at: datetime
+    updated_at: datetime
+
+class IdempotencyKey(SQLModel, table=True):
+    """Stored response of a POST made with an Idempotency-Key header, replayed on retries."""
+    __tablename__ = "idempotency_key"
+
+    user_id: str = Field(primary_key=True)
+    key: str = Field(primary_key=True, max_length=255)
+    request_hash: str = Field(max_length=64)  # SHA-256 of the method, path and body
+    status_code: int
+    response_body: str
+    expires_at: datetime = Field(index=True)
+
+class User(SQLModel, table=True):
+    """A registered user. "user" is reserved in PostgreSQL, hence the table name."""
+    __tablename__ = "app_user"
+
+    id: str = Field(primary_key=True, max_length=64)
+    email: str = Field(nullable=False, max_length=255, unique=True, index=True)  # Stored lowercased; the login lookup
+    name: str = Field(max_length=255)
+    password_hash: Optional[str] = Field(default=None, max_length=255)  # None for users that sign in through another issuer
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class RefreshToken(SQLModel, table=True):
+    """A refresh token, stored by hash. Every refresh rotates it to a new token in the same family."""
+    __tablename__ = "refresh_token"
+
+    token_hash: str = Field(primary_key=True, max_length=64)  # SHA-256 of the token
+    user_id: str = Field(nullable=False, index=True)
+    family_id: str = Field(nullable=False, index=True, max_length=32)  # Shared by every rotation of one login
+    access_jti: Optional[str] = Field(default=None, max_length=32)  # Access token issued alongside it
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: datetime = Field(index=True)
+    used_at: Optional[datetime] = Field(default=None)     # Set when rotated; using it again is token theft
+    revoked_at: Optional[datetime] = Field(default=None)  # Set by logout or reuse detection
+
+class RevokedToken(SQLModel, table=True):
+    """A revoked access token, kept until the token would have expired anyway."""
+    __tablename__ = "revoked_token"
+
+    jti: str = Field(primary_key=True, max_length=32)
+    revoked_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)  # Sync cursor
+    expires_at: datetime = Field(index=True)
+
+class JobStatusEnum(str, Enum):
+    queued = "queued"        # Waiting for run_after
+    running = "running"      # Claimed by a worker until run_after (its lease)
+    succeeded = "succeeded"
+    failed = "failed"        # Out of attempts
+
+class Job(SQLModel, table=True):
+    """A background job, queued in the primary database and run by worker.py."""
+    __table_args__ = (
+        # Serves the workers' claim query: due jobs, oldest first
+        Index("ix_job_status_run_after", "status", "run_after"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: Optional[str] = Field(default=None, index=True, max_length=64)  # None for maintenance jobs
+    kind: str = Field(max_length=32)
+    payload: str = Field(default="{}")  # JSON arguments
+    status: JobStatusEnum = Field(default=JobStatusEnum.queued)
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=5)
+    run_after: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))  # Next try, or lease expiry while running
+    locked_by: Optional[str] = Field(default=None, max_length=64)  # Worker running it
+    result: Optional[str] = Field(default=None)  # JSON result
+    error: Optional[str] = Field(default=None)   # Last failure
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = Field(default=None, index=True)  # Finished jobs are purged after JOB_RETENTION_DAYS
+
+def as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Drop the timezone from an aware datetime, so freshly written rows serialize like rows read back from the database."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class TaskResponse(TaskBase):
+    """Response model for a task."""
+    id: int
+    user_id: str
+    due_date: Optional[datetime] = None
+    series_id: Optional[int] = None
+    completed_at: Optional[datetime] = None
+    position: Optional[str] = None
+    project_id: Optional[int] = None
+    tags: Optional[List[str]] = None  # Included by reads; None where a write response does not load them
+    version: int = 1
+    created_at: datetime
+    updated_at: datetime
+
+    _naive_timestamps = field_validator("due_date", "completed_at", "created_at", "updated_at")(as_naive_utc)
+
+class SharedTaskResponse(TaskResponse):
+    """Response model for a task shared with the current user."""
+    role: ShareRoleEnum
+    shared_at: datetime
+
+    _naive_shared_at = field_validator("shared_at")(as_naive_utc)
+
+class SharedTaskPage(BaseModel):
+    """One page of the tasks shared with a user."""
+    tasks: List[SharedTaskResponse]
+    next_cursor: Optional[str] = None  # Pass as `cursor` to get the next page
+
+class TaskShareResponse(BaseModel):
+    """Response model for one collaborator of a task."""
+    task_id: int
+    user_id: str
+    role: ShareRoleEnum
+    created_at: datetime
+
+    _naive_timestamps = field_validator("created_at")(as_naive_utc)
+
+class ProjectResponse(BaseModel):
+    """Response model for a project."""
+    id: int
+    name: str
+    task_count: int
+    completed_count: int
+    created_at: datetime
+    updated_at: datetime
+
+    _naive_timestamps = field_validator("created_at", "updated_at")(as_naive_utc)
+
+class ArchivedTaskResponse(TaskBase):
+    """Response model for an archived task."""
+    id: int
+    task_id: int
+    user_id: str
+    due_date: Optional[datetime] = None
+    completed_at: datetime
+    archived_at: datetime
+    created_at: datetime
+    updated_at: datetime
+
+class ArchivedTaskPage(BaseModel):
+    """One page of a user's archived tasks."""
+    tasks: List[ArchivedTaskResponse]
+    next_cursor: Optional[str] = None  # Pass as `cursor` to get the next page
+
+class TaskEventResponse(BaseModel):
+    """Response model for one entry of a task's history."""
+    id: int
+    event_type: str
+    subtask_id: Optional[int] = None
+    data: dict  # The task or subtask after the change, without null fields; changed fields for bulk writes
+    created_at: datetime
+
+class TaskHistoryPage(BaseModel):
+    """One page of a task's history."""
+    events: List[TaskEventResponse]
+    next_cursor: Optional[str] = None  # Pass as `cursor` to get the next page
+
+class SubtaskResponse(BaseModel):
+    """Response model for a subtask."""
+    id: int
+    task_id: int
+    title: str
+    completed: bool
+    position: Optional[str] = None
+    version: int = 1
+    created_at: datetime
+    updated_at: datetime
+
+    _naive_timestamps = field_validator("created_at", "updated_at")(as_naive_utc)
+
+class JobResponse(BaseModel):
+    """Response model for a background job's status."""
+    id: int
+    kind: str
+    status: JobStatusEnum
+    attempts: int
+    max_attempts: int
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+    _naive_timestamps = field_validator("created_at", "updated_at", "finished_at")(as_naive_utc)
+
+    @field_validator("result", mode="before")
+    @classmethod
+    def parse_result(cls, value):
+        # Stored as JSON text
+        return json.loads(value) if isinstance(value, str) else value
+
+class WebhookSubscriptionResponse(BaseModel):
+    """Response model for a webhook subscription; the secret is left out."""
+    id: int
+    url: str
+    event_types: List[str]  # Empty means every event type
+    created_at: datetime
+
+    _naive_timestamps = field_validator("created_at")(as_naive_utc)
+
+    @field_validator("event_types", mode="before")
+    @classmethod
+    def split_event_types(cls, value):
+        # Stored comma-separated
+        return [event_type for event_type in value.split(",") if event_type] if isinstance(value, str) else value
+
+class WebhookSubscriptionCreated(WebhookSubscriptionResponse):
+    """Response model for a new webhook subscription, with the signing secret."""
+    secret: str
+
+class WebhookDeadLetterResponse(BaseModel):
+    """Response model for a webhook delivery that was given up on."""
+    id: int
+    subscription_id: int
+    event_count: int
+    attempts: int
+    last_error: Optional[str] = None
+    events: List[Any]
+    created_at: datetime
+    failed_at: datetime
 
-    # Relationship to subtasks
-    subtasks: List["Subtask"] = Relationship(sa_relationship_kwargs={"cascade": "all, delete-orphan"})
\ No newline at end of file
+    _naive_timestamps = field_validator("created_at", "failed_at")(as_naive_utc)
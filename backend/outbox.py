@@ -0,0 +1,227 @@
+"""
+Outbox relay for the Todo Application.
+
+Task and subtask writes record events in the outbox_event table of their own
+database (see services/outbox_service.py). This relay reads them in batches
+of OUTBOX_BATCH_SIZE, in event order, and hands each batch to every
+registered consumer. Each consumer's cursor moves forward only after it
+accepts a batch. A failing consumer is retried from its cursor on the next
+pass, and the others carry on.
+
+Consumers are in-process callbacks registered with register_consumer(), the
+audit log consumer that keeps task history (unless AUDIT_LOG_ENABLED is
+false), a webhook consumer when OUTBOX_WEBHOOK_URL is set, and the webhook
+subscriptions consumer (webhooks.py) when WEBHOOKS_ENABLED is set. Delivery is at least
+once, so consumers should ignore events they have already seen (by event id
+and task database).
+
+It runs inside the API process unless OUTBOX_RELAY_ENABLED is false. Where
+the API cannot keep background tasks alive (such as the serverless entry
+point), set it to false and run the relay as a separate worker:
+    python outbox.py
+Every task write records an event whether or not a relay runs, so one must:
+task history and webhooks depend on it, and the purger only deletes events
+consumers have accepted.
+"""
+
+import asyncio
+import json
+import os
+import urllib.request
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from sqlalchemy.engine import Engine
+from config import load_environment
+from db import get_user_data_engines, read_engine_paired_with
+from services.audit_service import append_events
+from services.outbox_service import advance_cursor, get_cursor, next_position, read_cursor, read_events
+
+# Load environment variables
+load_environment()
+
+OUTBOX_RELAY_ENABLED = os.getenv("OUTBOX_RELAY_ENABLED", "true").lower() == "true"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+# Longer than any task write transaction: a skipped event ID that has not committed by then never will
+OUTBOX_GAP_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_GAP_TIMEOUT_SECONDS", "300"))
+OUTBOX_WEBHOOK_URL = os.getenv("OUTBOX_WEBHOOK_URL", "")
+AUDIT_LOG_ENABLED = os.getenv("AUDIT_LOG_ENABLED", "true").lower() == "true"
+
+class OutboxConsumer:
+    """Interface for outbox event consumers."""
+
+    def __init__(self, name: str):
+        self.name = name  # Keys the consumer's cursor; keep it stable across deploys
+
+    def deliver(self, events: List[dict]) -> None:
+        """
+        Handle a batch of events. Raising makes the batch retry on the next pass.
+
+        Args:
+            events: Events in order, with id, event_type, user_id, task_id, subtask_id, data and created_at
+        """
+        raise NotImplementedError
+
+    def deliver_from(self, engine: Engine, events: List[dict]) -> None:
+        """
+        Handle a batch read from a given task database; override to write next to the events.
+
+        Args:
+            engine: Engine of the task database the events were read from
+            events: Events in order, as for deliver()
+        """
+        self.deliver(events)
+
+class CallbackConsumer(OutboxConsumer):
+    """Consumer that calls a function in this process with each batch."""
+
+    def __init__(self, name: str, callback: Callable[[List[dict]], None]):
+        super().__init__(name)
+        self.callback = callback
+
+    def deliver(self, events: List[dict]) -> None:
+        self.callback(events)
+
+class WebhookConsumer(OutboxConsumer):
+    """Consumer that POSTs each batch of events as JSON to a webhook URL."""
+
+    def __init__(self, name: str, url: str, timeout: float = 10.0):
+        super().__init__(name)
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, events: List[dict]) -> None:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"events": events}).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+class AuditLogConsumer(OutboxConsumer):
+    """Consumer that appends every event to the task history log on the database it came from."""
+
+    def __init__(self, name: str = "audit_log"):
+        super().__init__(name)
+
+    def deliver(self, events: List[dict]) -> None:
+        raise NotImplementedError("The audit log is written next to the events; use deliver_from()")
+
+    def deliver_from(self, engine: Engine, events: List[dict]) -> None:
+        with engine.begin() as conn:
+            append_events(conn, events)
+
+_consumers: Dict[str, OutboxConsumer] = {}
+
+def register_consumer(consumer: OutboxConsumer) -> None:
+    """Attach a consumer to the relay; it starts at the oldest event still in the outbox."""
+    _consumers[consumer.name] = consumer
+
+def unregister_consumer(name: str) -> None:
+    """Detach a consumer. Its cursor is kept, so registering it again resumes where it stopped."""
+    _consumers.pop(name, None)
+
+def get_consumers() -> List[OutboxConsumer]:
+    """The registered consumers, including the audit log, OUTBOX_WEBHOOK_URL and webhook subscription ones when configured."""
+    if AUDIT_LOG_ENABLED and "audit_log" not in _consumers:
+        register_consumer(AuditLogConsumer())
+    if OUTBOX_WEBHOOK_URL and "webhook" not in _consumers:
+        register_consumer(WebhookConsumer("webhook", OUTBOX_WEBHOOK_URL))
+    # Imported here: webhooks.py builds on this module
+    import webhooks
+    if webhooks.WEBHOOKS_ENABLED and "webhook_subscriptions" not in _consumers:
+        register_consumer(webhooks.SubscriptionConsumer())
+    return list(_consumers.values())
+
+def relay_consumer(engine: Engine, consumer: OutboxConsumer, now: datetime, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Deliver one task database's pending events to one consumer.
+
+    Events that commit below the cursor (see services/outbox_service.py) are
+    delivered late, in the first batch read after they appear. No connection
+    is held while the consumer runs.
+
+    Args:
+        engine: Engine of the task database
+        consumer: The consumer
+        now: Current time, for the gap timeout
+        batch_size: Events per delivery
+
+    Returns:
+        int: Number of events delivered
+    """
+    reader = read_engine_paired_with(engine)
+    delivered = 0
+    while True:
+        with reader.connect() as conn:
+            position = read_cursor(conn, consumer.name)
+            if position is not None:
+                cursor, gaps = position
+                events = read_events(conn, cursor, batch_size, gaps)
+        if position is None:
+            # Created once, so the purger keeps the events a new consumer has yet to see
+            with engine.begin() as conn:
+                get_cursor(conn, consumer.name)
+            continue
+        to_id, to_gaps = next_position(cursor, gaps, events, now, OUTBOX_GAP_TIMEOUT_SECONDS)
+        if events:
+            try:
+                consumer.deliver_from(engine, events)
+            except Exception as e:
+                print(f"Outbox consumer {consumer.name} failed after event {cursor}: {e}")
+                return delivered
+        if (to_id, to_gaps) != (cursor, gaps):
+            with engine.begin() as conn:
+                if not advance_cursor(conn, consumer.name, cursor, to_id, to_gaps):
+                    return delivered  # Another relay got there first
+        delivered += len(events)
+        if to_id == cursor or len(events) < batch_size:
+            return delivered
+
+def relay_once(
+    engines: Optional[List[Engine]] = None,
+    consumers: Optional[List[OutboxConsumer]] = None,
+    now: Optional[datetime] = None,
+    batch_size: int = OUTBOX_BATCH_SIZE
+) -> int:
+    """
+    Deliver every pending event to every consumer.
+
+    Args:
+        engines: Task databases to relay (defaults to all of them)
+        consumers: Consumers to deliver to (defaults to the registered ones)
+        now: Current time (defaults to the wall clock)
+        batch_size: Events per delivery
+
+    Returns:
+        int: Number of deliveries, counting one per event and consumer
+    """
+    now = now or datetime.now(timezone.utc)
+    consumers = get_consumers() if consumers is None else consumers
+    if not consumers:
+        return 0
+    delivered = 0
+    for engine in engines if engines is not None else get_user_data_engines():
+        for consumer in consumers:
+            delivered += relay_consumer(engine, consumer, now, batch_size)
+    return delivered
+
+async def run_forever(poll_seconds: float = OUTBOX_POLL_SECONDS) -> None:
+    """
+    Relay every poll_seconds until cancelled, in a worker thread.
+
+    Args:
+        poll_seconds: Delay between the start of consecutive passes
+    """
+    while True:
+        try:
+            await asyncio.to_thread(relay_once)
+        except Exception as e:
+            print(f"Outbox relay pass failed: {e}")
+        await asyncio.sleep(poll_seconds)
+
+if __name__ == "__main__":
+    print(f"Outbox relay polling every {OUTBOX_POLL_SECONDS:.0f}s for {len(get_consumers())} consumers")
+    asyncio.run(run_forever())
@@ -0,0 +1,101 @@
+"""
+Soft-delete purger for the Todo Application.
+
+Deleting a task only sets its deleted_at, which keeps deletes instant and
+lets users undo them. This job hard-deletes tasks (and their subtasks) once
+they have been deleted for longer than SOFT_DELETE_RETENTION_SECONDS, in
+batches of PURGE_BATCH_SIZE so no transaction holds locks for long. It also
+deletes expired idempotency keys, refresh tokens and access token revocations,
+background jobs finished more than JOB_RETENTION_DAYS ago, outbox events
+every consumer has received once they are OUTBOX_RETENTION_SECONDS old, and
+webhook dead letters older than WEBHOOK_DEAD_LETTER_RETENTION_DAYS. Task
+history is dropped a month at a time once it is more than
+AUDIT_RETENTION_MONTHS months old.
+
+Run it inside the API process with PURGE_ENABLED=true, or as a separate
+worker:
+    python purger.py
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy.engine import Engine
+from config import load_environment
+from db import get_engine, get_user_data_engines
+from services.task_service import purge_deleted_tasks
+from services.idempotency_service import purge_expired_keys
+from services.token_service import purge_expired_tokens
+from services.job_service import purge_finished_jobs
+from services.outbox_service import purge_delivered_events
+from services.webhook_service import purge_dead_letters
+from services.audit_service import drop_expired_partitions
+
+# Load environment variables
+load_environment()
+
+PURGE_ENABLED = os.getenv("PURGE_ENABLED", "false").lower() == "true"
+SOFT_DELETE_RETENTION_SECONDS = float(os.getenv("SOFT_DELETE_RETENTION_SECONDS", str(7 * 24 * 3600)))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+PURGE_POLL_SECONDS = float(os.getenv("PURGE_POLL_SECONDS", "300"))
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+OUTBOX_RETENTION_SECONDS = float(os.getenv("OUTBOX_RETENTION_SECONDS", str(24 * 3600)))
+WEBHOOK_DEAD_LETTER_RETENTION_DAYS = float(os.getenv("WEBHOOK_DEAD_LETTER_RETENTION_DAYS", "30"))
+# Months of task history kept before the current one
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))
+
+def purge_once(engines: Optional[List[Engine]] = None, now: Optional[datetime] = None, batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """
+    Purge every task whose retention period has ended.
+
+    Args:
+        engines: Task databases to purge (defaults to all of them)
+        now: Current time (defaults to the wall clock)
+        batch_size: Tasks per delete transaction
+
+    Returns:
+        int: Number of tasks hard-deleted
+    """
+    now = now or datetime.now(timezone.utc)
+    deleted_before = now - timedelta(seconds=SOFT_DELETE_RETENTION_SECONDS)
+    purged = 0
+    for engine in engines if engines is not None else get_user_data_engines():
+        while True:
+            deleted = purge_deleted_tasks(engine, deleted_before, batch_size)
+            purged += deleted
+            if deleted < batch_size:
+                break
+        while purge_expired_keys(engine, now, batch_size) == batch_size:
+            pass
+        while purge_delivered_events(engine, now - timedelta(seconds=OUTBOX_RETENTION_SECONDS), batch_size) == batch_size:
+            pass
+        while purge_dead_letters(engine, now - timedelta(days=WEBHOOK_DEAD_LETTER_RETENTION_DAYS), batch_size) == batch_size:
+            pass
+        drop_expired_partitions(engine, now, AUDIT_RETENTION_MONTHS)
+    # Tokens and jobs live on the primary only
+    while purge_expired_tokens(get_engine(), now, batch_size) >= batch_size:
+        pass
+    while purge_finished_jobs(get_engine(), now - timedelta(days=JOB_RETENTION_DAYS), batch_size) == batch_size:
+        pass
+    return purged
+
+async def run_forever(poll_seconds: float = PURGE_POLL_SECONDS) -> None:
+    """
+    Purge every poll_seconds until cancelled, in a worker thread.
+
+    Args:
+        poll_seconds: Delay between the start of consecutive passes
+    """
+    while True:
+        try:
+            purged = await asyncio.to_thread(purge_once)
+            if purged:
+                print(f"Purged {purged} deleted tasks")
+        except Exception as e:
+            print(f"Purge pass failed: {e}")
+        await asyncio.sleep(poll_seconds)
+
+if __name__ == "__main__":
+    print(f"Purger polling every {PURGE_POLL_SECONDS:.0f}s")
+    asyncio.run(run_forever())
@@ -0,0 +1,67 @@
+"""
+Position rebalancer for the Todo Application.
+
+Moving a task or subtask gives it a fractional position key between its
+new neighbours, and keys grow when items keep landing in the same gap.
+This job renumbers every task list and subtask list that holds a key
+longer than POSITION_MAX_LENGTH, one short transaction per list, keeping
+the order users see.
+
+Run it inside the API process with REBALANCE_ENABLED=true, or as a separate
+worker:
+    python rebalancer.py
+"""
+
+import asyncio
+import os
+from typing import List, Optional
+from sqlalchemy.engine import Engine
+from cache import require_shared_cache
+from config import load_environment
+from db import get_user_data_engines
+from services.position_service import POSITION_MAX_LENGTH
+from services.task_service import rebalance_positions
+
+# Load environment variables
+load_environment()
+
+REBALANCE_ENABLED = os.getenv("REBALANCE_ENABLED", "false").lower() == "true"
+REBALANCE_POLL_SECONDS = float(os.getenv("REBALANCE_POLL_SECONDS", "3600"))
+
+def rebalance_once(engines: Optional[List[Engine]] = None, max_length: int = POSITION_MAX_LENGTH) -> int:
+    """
+    Renumber every list whose keys got longer than max_length.
+
+    Args:
+        engines: Task databases to rebalance (defaults to all of them)
+        max_length: Longest acceptable key
+
+    Returns:
+        int: Number of task and subtask lists renumbered
+    """
+    renumbered = 0
+    for engine in engines if engines is not None else get_user_data_engines():
+        task_lists, subtask_lists = rebalance_positions(engine, max_length)
+        renumbered += task_lists + subtask_lists
+    return renumbered
+
+async def run_forever(poll_seconds: float = REBALANCE_POLL_SECONDS) -> None:
+    """
+    Rebalance every poll_seconds until cancelled, in a worker thread.
+
+    Args:
+        poll_seconds: Delay between the start of consecutive passes
+    """
+    while True:
+        try:
+            renumbered = await asyncio.to_thread(rebalance_once)
+            if renumbered:
+                print(f"Renumbered {renumbered} task and subtask lists")
+        except Exception as e:
+            print(f"Rebalance pass failed: {e}")
+        await asyncio.sleep(poll_seconds)
+
+if __name__ == "__main__":
+    require_shared_cache("The rebalancer")
+    print(f"Rebalancer polling every {REBALANCE_POLL_SECONDS:.0f}s")
+    asyncio.run(run_forever())
@@ -0,0 +1,244 @@
+"""
+Due-date reminder scheduler for the Todo Application.
+
+Polls for incomplete tasks whose due date falls inside the reminder window
+[now - REMINDER_GRACE_SECONDS, now + REMINDER_LEAD_SECONDS) and hands them to
+a reminder sink. Each pass walks the window in time buckets of
+REMINDER_BUCKET_SECONDS and reads every bucket in keyset batches over the
+(completed, due_date) index, so the work per pass grows with the number of
+tasks due around now rather than with the size of the task table.
+
+Every reminder is claimed in the reminder_sent table before it is sent. The
+claim is keyed by (task_id, due_date), so overlapping passes, restarts and
+several scheduler processes never send the same reminder twice, while moving
+a task's due date earns it a new one. Claims of a batch the sink rejects are
+released and retried on the next pass.
+
+Run it inside the API process with REMINDERS_ENABLED=true, or as a separate
+worker:
+    python reminders.py
+"""
+
+import asyncio
+import json
+import os
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy import and_, delete, exists, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from config import load_environment
+from db import get_user_data_engines
+from models import Task, ReminderSent, as_naive_utc
+
+# Load environment variables
+load_environment()
+
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "false").lower() == "true"
+REMINDER_LEAD_SECONDS = float(os.getenv("REMINDER_LEAD_SECONDS", "900"))      # remind 15 minutes ahead
+REMINDER_GRACE_SECONDS = float(os.getenv("REMINDER_GRACE_SECONDS", "3600"))   # still remind up to an hour late
+REMINDER_POLL_SECONDS = float(os.getenv("REMINDER_POLL_SECONDS", "60"))
+REMINDER_BUCKET_SECONDS = float(os.getenv("REMINDER_BUCKET_SECONDS", "300"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+REMINDER_SINK = os.getenv("REMINDER_SINK", "log").lower()
+REMINDER_WEBHOOK_URL = os.getenv("REMINDER_WEBHOOK_URL", "")
+
+task_table = Task.__table__
+reminder_table = ReminderSent.__table__
+
+class ReminderSink:
+    """Interface for reminder destinations."""
+
+    def send(self, reminders: List[dict]) -> None:
+        """
+        Deliver a batch of reminders. Raising makes the batch retry on the next pass.
+
+        Args:
+            reminders: Reminder events with task_id, user_id, title and due_date
+        """
+        raise NotImplementedError
+
+class LogReminderSink(ReminderSink):
+    """Sink that prints reminders, the default for development."""
+
+    def send(self, reminders: List[dict]) -> None:
+        for reminder in reminders:
+            print(f"Reminder: task {reminder['task_id']} for {reminder['user_id']} is due at {reminder['due_date']}")
+
+class WebhookReminderSink(ReminderSink):
+    """Sink that POSTs each batch of reminders as JSON to a webhook URL."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, reminders: List[dict]) -> None:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"reminders": reminders}).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+def create_reminder_sink(name: str) -> ReminderSink:
+    """
+    Create a reminder sink by name.
+
+    Args:
+        name: "log" or "webhook"
+
+    Returns:
+        ReminderSink: The sink
+    """
+    if name == "log":
+        return LogReminderSink()
+    if name == "webhook":
+        if not REMINDER_WEBHOOK_URL:
+            raise ValueError("REMINDER_SINK=webhook needs REMINDER_WEBHOOK_URL")
+        return WebhookReminderSink(REMINDER_WEBHOOK_URL)
+    raise ValueError(f"Unknown REMINDER_SINK: {name}")
+
+def _insert_ignoring_duplicates(conn: Connection):
+    # Both supported dialects can skip conflicting rows and report the ones inserted
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    return dialect.insert(reminder_table).on_conflict_do_nothing()
+
+class ReminderScheduler:
+    """Finds tasks coming due and sends each reminder exactly once."""
+
+    def __init__(
+        self,
+        sink: ReminderSink,
+        engines: Optional[List[Engine]] = None,
+        lead_seconds: float = REMINDER_LEAD_SECONDS,
+        grace_seconds: float = REMINDER_GRACE_SECONDS,
+        bucket_seconds: float = REMINDER_BUCKET_SECONDS,
+        batch_size: int = REMINDER_BATCH_SIZE
+    ):
+        self.sink = sink
+        self.engines = engines
+        self.lead = timedelta(seconds=lead_seconds)
+        self.grace = timedelta(seconds=grace_seconds)
+        self.bucket = timedelta(seconds=bucket_seconds)
+        self.batch_size = batch_size
+        self.sent = 0
+        self.failed_batches = 0
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """
+        Send reminders for every unsent task due inside the current window.
+
+        Args:
+            now: Current time (defaults to the wall clock)
+
+        Returns:
+            int: Number of reminders sent by this pass
+        """
+        # Due dates are stored as naive UTC
+        now = as_naive_utc(now or datetime.now(timezone.utc))
+        window_start, window_end = now - self.grace, now + self.lead
+        sent = 0
+        for engine in self.engines if self.engines is not None else get_user_data_engines():
+            # Claims behind the window can never match again, so the claim table stays window-sized
+            with engine.begin() as conn:
+                conn.execute(delete(reminder_table).where(reminder_table.c.due_date < window_start))
+            bucket_start = window_start
+            while bucket_start < window_end:
+                bucket_end = min(bucket_start + self.bucket, window_end)
+                sent += self._run_bucket(engine, bucket_start, bucket_end)
+                bucket_start = bucket_end
+        self.sent += sent
+        return sent
+
+    def _due_batch(self, conn: Connection, start: datetime, end: datetime, after: Optional[tuple]) -> list:
+        # Range scan on (completed, due_date); the anti-join is a primary key probe per row
+        already_sent = exists().where(and_(
+            reminder_table.c.task_id == task_table.c.id,
+            reminder_table.c.due_date == task_table.c.due_date
+        ))
+        query = (
+            select(task_table.c.id, task_table.c.user_id, task_table.c.title, task_table.c.due_date)
+            .where(task_table.c.completed == False)  # noqa: E712
+            .where(task_table.c.deleted_at.is_(None))
+            .where(task_table.c.due_date >= start)
+            .where(task_table.c.due_date < end)
+            .where(~already_sent)
+            .order_by(task_table.c.due_date, task_table.c.id)
+            .limit(self.batch_size)
+        )
+        if after is not None:
+            due_date, task_id = after
+            query = query.where(or_(
+                task_table.c.due_date > due_date,
+                and_(task_table.c.due_date == due_date, task_table.c.id > task_id)
+            ))
+        return conn.execute(query).all()
+
+    def _run_bucket(self, engine: Engine, start: datetime, end: datetime) -> int:
+        sent = 0
+        after = None
+        while True:
+            with engine.connect() as conn:
+                rows = self._due_batch(conn, start, end, after)
+            if not rows:
+                return sent
+            after = (rows[-1].due_date, rows[-1].id)
+
+            # Claim before sending, so a concurrent scheduler skips what we claimed
+            with engine.begin() as conn:
+                claimed = set(conn.execute(
+                    _insert_ignoring_duplicates(conn).returning(reminder_table.c.task_id),
+                    [{"task_id": row.id, "due_date": row.due_date, "sent_at": datetime.now(timezone.utc)} for row in rows]
+                ).scalars())
+            reminders = [
+                {"task_id": row.id, "user_id": row.user_id, "title": row.title, "due_date": row.due_date.isoformat()}
+                for row in rows if row.id in claimed
+            ]
+            if reminders:
+                try:
+                    self.sink.send(reminders)
+                    sent += len(reminders)
+                except Exception as e:
+                    print(f"Reminder sink failed, retrying {len(reminders)} reminders next pass: {e}")
+                    self.failed_batches += 1
+                    with engine.begin() as conn:
+                        conn.execute(delete(reminder_table).where(
+                            tuple_(reminder_table.c.task_id, reminder_table.c.due_date).in_(
+                                [(row.id, row.due_date) for row in rows if row.id in claimed]
+                            )
+                        ))
+
+            if len(rows) < self.batch_size:
+                return sent
+
+    async def run_forever(self, poll_seconds: float = REMINDER_POLL_SECONDS) -> None:
+        """
+        Run a pass every poll_seconds until cancelled.
+
+        Passes run in a worker thread so the event loop keeps serving requests.
+
+        Args:
+            poll_seconds: Delay between the start of consecutive passes
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"Reminder pass failed: {e}")
+            await asyncio.sleep(poll_seconds)
+
+def create_scheduler() -> ReminderScheduler:
+    """
+    Create a scheduler configured from the environment.
+
+    Returns:
+        ReminderScheduler: Scheduler using REMINDER_SINK
+    """
+    return ReminderScheduler(create_reminder_sink(REMINDER_SINK))
+
+if __name__ == "__main__":
+    print(f"Reminder worker polling every {REMINDER_POLL_SECONDS:.0f}s")
+    asyncio.run(create_scheduler().run_forever())
@@ -0,0 +1,187 @@
+"""
+Access token revocation list for the Todo Application.
+
+Access tokens are short-lived and carry a `jti`. Revoking one (logout, or a
+refresh token family caught being reused) inserts its jti into the
+revoked_token table. Every API process keeps the revoked jtis that have not
+expired yet in an in-memory hash set, so checking a token is a set lookup
+and never a database query.
+
+The set is loaded on the first token check, not at startup, and synced
+from the table every REVOCATION_SYNC_SECONDS, reading only rows revoked
+since the previous sync (with REVOCATION_SYNC_OVERLAP_SECONDS of overlap for
+transactions that committed late). Long-running API processes sync in a
+background task (run_forever). Elsewhere, such as serverless functions whose
+background tasks do not survive between requests, the token check that
+finds the set older than REVOCATION_SYNC_SECONDS syncs it inline. Revocations
+made by this process apply immediately; other processes see them after
+their next sync.
+Entries drop out once the token they revoke has expired, so the set stays
+about as large as the number of revocations per access token lifetime.
+"""
+
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from config import load_environment
+from models import RevokedToken, as_naive_utc
+
+# Load environment variables
+load_environment()
+
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+REVOCATION_SYNC_OVERLAP_SECONDS = float(os.getenv("REVOCATION_SYNC_OVERLAP_SECONDS", "60"))
+
+revoked_table = RevokedToken.__table__
+
+class RevocationList:
+    """In-memory set of revoked access token jtis, synced from the database."""
+
+    def __init__(self, overlap_seconds: float = REVOCATION_SYNC_OVERLAP_SECONDS):
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._revoked: Dict[str, datetime] = {}  # jti -> token expiry (naive UTC)
+        self._synced_until: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.syncs = 0
+        self.in_background = False  # Set while run_forever keeps the set fresh
+
+    def is_revoked(self, jti: str) -> bool:
+        """Check a jti against the set (a dictionary lookup, no I/O)."""
+        return jti in self._revoked
+
+    def add(self, jti: str, expires_at: datetime) -> None:
+        """Apply a revocation made by this process without waiting for the next sync."""
+        with self._lock:
+            self._revoked[jti] = as_naive_utc(expires_at)
+
+    @property
+    def synced(self) -> bool:
+        return self._synced_until is not None
+
+    def sync(self, engine: Engine, now: Optional[datetime] = None) -> int:
+        """
+        Pull revocations made since the last sync and drop expired entries.
+
+        Args:
+            engine: Engine of the primary database
+            now: Current time (defaults to the wall clock)
+
+        Returns:
+            int: Number of revoked tokens now in the set
+        """
+        now = as_naive_utc(now or datetime.now(timezone.utc))
+        query = select(revoked_table.c.jti, revoked_table.c.expires_at).where(revoked_table.c.expires_at > now)
+        if self._synced_until is not None:
+            query = query.where(revoked_table.c.revoked_at >= self._synced_until - self.overlap)
+        with engine.connect() as conn:
+            rows = conn.execute(query).all()
+
+        with self._lock:
+            # Build a new dict and swap it in, so lookups never see it half-updated
+            revoked = {jti: expires_at for jti, expires_at in self._revoked.items() if expires_at > now}
+            revoked.update((row.jti, row.expires_at) for row in rows)
+            self._revoked = revoked
+            self._synced_until = now
+            self.syncs += 1
+            return len(revoked)
+
+    def sync_if_stale(self, engine: Engine, max_age_seconds: float) -> None:
+        """
+        Sync if the last sync is older than max_age_seconds.
+
+        One caller syncs while the others carry on with the current set. A
+        failed sync is logged and retried by the next check.
+
+        Args:
+            engine: Engine of the primary database
+            max_age_seconds: How old the set may be
+        """
+        now = as_naive_utc(datetime.now(timezone.utc))
+        if self._synced_until is not None and (now - self._synced_until).total_seconds() < max_age_seconds:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self.sync(engine)
+        except Exception as e:
+            print(f"Revocation sync failed: {e}")
+        finally:
+            self._sync_lock.release()
+
+    def stats(self) -> dict:
+        """
+        Revocation list statistics.
+
+        Returns:
+            dict: Entry count, sync count and time of the last sync
+        """
+        return {
+            "revoked": len(self._revoked),
+            "syncs": self.syncs,
+            "synced_until": self._synced_until.isoformat() if self._synced_until else None,
+        }
+
+    async def run_forever(self, engine: Engine, poll_seconds: float = REVOCATION_SYNC_SECONDS) -> None:
+        """
+        Sync every poll_seconds until cancelled, in a worker thread.
+
+        Args:
+            engine: Engine of the primary database
+            poll_seconds: Delay between the start of consecutive syncs
+        """
+        self.in_background = True
+        try:
+            while True:
+                try:
+                    await asyncio.to_thread(self.sync, engine)
+                except Exception as e:
+                    print(f"Revocation sync failed: {e}")
+                await asyncio.sleep(poll_seconds)
+        finally:
+            self.in_background = False
+
+_revocation_list: Optional[RevocationList] = None
+_revocation_list_lock = threading.Lock()
+
+def get_revocation_list() -> RevocationList:
+    """
+    Get the process-wide revocation list, loading it from the primary database on first use.
+
+    Without a background sync, a list older than REVOCATION_SYNC_SECONDS is
+    synced before it is returned.
+
+    Returns:
+        RevocationList: The revocation list
+    """
+    global _revocation_list
+    from db import get_engine
+
+    if _revocation_list is None:
+        with _revocation_list_lock:
+            if _revocation_list is None:
+                revocation_list = RevocationList()
+                try:
+                    revocation_list.sync(get_engine())
+                except Exception as e:
+                    print(f"Initial revocation sync failed, retrying on a later check: {e}")
+                _revocation_list = revocation_list
+    if not _revocation_list.in_background:
+        _revocation_list.sync_if_stale(get_engine(), REVOCATION_SYNC_SECONDS)
+    return _revocation_list
+
+async def run_forever(poll_seconds: float = REVOCATION_SYNC_SECONDS) -> None:
+    """
+    Load the process-wide revocation list, then keep it synced until cancelled.
+
+    Args:
+        poll_seconds: Delay between the start of consecutive syncs
+    """
+    from db import get_engine
+
+    revocation_list = await asyncio.to_thread(get_revocation_list)
+    await revocation_list.run_forever(get_engine(), poll_seconds)
@@ -1,23 +1,27 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from typing import Optional
+from datetime import datetime, timezone
 from pydantic import BaseModel
-from models import Task
-from middleware.auth import create_access_token, verify_token
-from jose import jwt, JWTError
-import os
-from dotenv import load_dotenv
+from sqlmodel import Session
+from sqlalchemy.exc import IntegrityError
+from db import ReleaseSessionsRoute, get_primary_session
+from middleware.auth import ACCESS_TOKEN_EXPIRE_MINUTES, verify_token_claims
+from services import auth_service, token_service
+from config import load_environment
 import hashlib
 from user_storage import get_user, update_user, create_user
 
 # Load environment variables
-load_dotenv()
+load_environment()
 
 # Initialize router
-router = APIRouter()
+router = APIRouter(route_class=ReleaseSessionsRoute)
 
-# Secret key for JWT
-SECRET_KEY = os.getenv("BETTER_AUTH_SECRET", "your-default-secret-key-change-in-production")
-ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+def user_id_for_email(email: str) -> str:
+    # Deterministic, so users keep the task data stored under IDs issued before accounts were persisted
+    email = auth_service.normalize_email(email)
+    email_hash = hashlib.sha256(email.encode()).hexdigest()[:16]  # Take first 16 chars
+    return f"mock-{email.split('@')[0]}-{email_hash}"
 
 class UserRegistration(BaseModel):
     """Request model for user registration."""
@@ -40,68 +44,120 @@ class TokenResponse(BaseModel):
     """Response model for authentication tokens."""
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None  # Single use; exchange at /auth/refresh for a new pair
+    expires_in: int = ACCESS_TOKEN_EXPIRE_MINUTES * 60  # Access token lifetime in seconds
+
+class RefreshRequest(BaseModel):
+    """Request model for refreshing tokens."""
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    """Request model for logging out."""
+    refresh_token: Optional[str] = None
 
 @router.post("/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user_data: UserRegistration):
+def register_user(user_data: UserRegistration, session: Session = Depends(get_primary_session)):
     """
     Register a new user.
 
     Args:
         user_data: User registration data
+        session: Request-scoped session on the primary database
 
     Returns:
         UserResponse: Created user data
     """
-    # In a real implementation, you would create the user in the database
-    # For now, we'll simulate the creation with a mock ID
-    # Using hashlib to ensure consistent user ID generation
-    email_hash = hashlib.sha256(user_data.email.encode()).hexdigest()[:16]  # Take first 16 chars
-    mock_user_id = f"mock-{user_data.email.split('@')[0]}-{email_hash}"
-
-    # Create user in storage
-    create_user(mock_user_id, user_data.name, user_data.email)
-
-    # Create access token
-    token_data = {"sub": mock_user_id, "email": user_data.email}
-    access_token = create_access_token(data=token_data)
+    try:
+        user = auth_service.register_user(
+            session, user_id_for_email(user_data.email), user_data.email, user_data.password, user_data.name
+        )
+    except auth_service.EmailAlreadyRegistered:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Email is already registered"
+        )
 
     return UserResponse(
-        id=mock_user_id,
-        email=user_data.email,
-        name=user_data.name
+        id=user.id,
+        email=user.email,
+        name=user.name
     )
 
 @router.post("/auth/login", response_model=TokenResponse)
-def login_user(user_data: UserLogin):
+def login_user(user_data: UserLogin, session: Session = Depends(get_primary_session)):
     """
-    Authenticate user and return access token.
+    Authenticate user and return an access token and a refresh token.
 
     Args:
         user_data: User login credentials
+        session: Request-scoped session on the primary database
 
     Returns:
-        TokenResponse: Authentication token
+        TokenResponse: Authentication tokens
     """
-    # In a real implementation, you would verify the user's credentials against the database
-    # For now, we'll simulate successful authentication
-    # Using the same consistent method as registration
-    email_hash = hashlib.sha256(user_data.email.encode()).hexdigest()[:16]  # Take first 16 chars
-    mock_user_id = f"mock-{user_data.email.split('@')[0]}-{email_hash}"
+    user = auth_service.authenticate_user(session, user_data.email, user_data.password)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-    # Check if user exists in storage, if not create a basic entry
-    user_info = get_user(mock_user_id)
-    if not user_info:
-        create_user(mock_user_id, user_data.email.split('@')[0], user_data.email)
+    # Create access token and start a refresh token family
+    access_token, refresh_token = token_service.issue_tokens(session, user.id, token_service.user_claims(user))
 
-    # Create access token
-    token_data = {"sub": mock_user_id, "email": user_data.email}
-    access_token = create_access_token(data=token_data)
+    return TokenResponse(
+        access_token=access_token,
+        token_type="bearer",
+        refresh_token=refresh_token
+    )
+
+@router.post("/auth/refresh", response_model=TokenResponse)
+def refresh_tokens(request_data: RefreshRequest, session: Session = Depends(get_primary_session)):
+    """
+    Exchange a refresh token for a new access token and refresh token.
 
+    Args:
+        request_data: The refresh token
+        session: Request-scoped session on the primary database
+
+    Returns:
+        TokenResponse: New authentication tokens
+    """
+    try:
+        _, access_token, refresh_token = token_service.rotate_refresh_token(session, request_data.refresh_token)
+    except token_service.InvalidRefreshToken:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token"
+        )
     return TokenResponse(
         access_token=access_token,
-        token_type="bearer"
+        token_type="bearer",
+        refresh_token=refresh_token
     )
 
+@router.post("/auth/logout")
+def logout_user(
+    request_data: LogoutRequest,
+    claims: dict = Depends(verify_token_claims),
+    session: Session = Depends(get_primary_session)
+):
+    """
+    Revoke the current access token and the given refresh token.
+
+    Args:
+        request_data: The refresh token to revoke (optional)
+        claims: Claims of the authenticated user's access token
+        session: Request-scoped session on the primary database
+
+    Returns:
+        dict: Success message
+    """
+    expires_at = datetime.fromtimestamp(claims["exp"], timezone.utc) if "exp" in claims else None
+    token_service.logout(session, claims["sub"], claims.get("jti"), expires_at, request_data.refresh_token)
+    return {"message": "Logged out successfully"}
+
 
 # User profile endpoints
 class UserProfileUpdate(BaseModel):
@@ -110,57 +166,54 @@ class UserProfileUpdate(BaseModel):
     email: Optional[str] = None
 
 
+def _current_user(session: Session, claims: dict) -> dict:
+    # Users that signed in through another issuer get a profile from their token on first use
+    user_info = get_user(session, claims["sub"])
+    if user_info is None:
+        user_id = claims["sub"]
+        email = claims.get("email") or f"{user_id}@example.com"
+        name = claims.get("name") or (user_id.split('-')[1] if '-' in user_id else user_id)
+        try:
+            user_info = create_user(session, user_id, name, email)
+        except IntegrityError:
+            # A concurrent first request created the profile, or the email belongs to another user
+            session.rollback()
+            user_info = get_user(session, user_id)
+            if user_info is None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Email is already registered"
+                )
+    return user_info
+
 @router.put("/users/me", response_model=UserResponse)
 def update_profile(
     user_data: UserProfileUpdate,
-    current_user_id: str = Depends(verify_token)
+    claims: dict = Depends(verify_token_claims),
+    session: Session = Depends(get_primary_session)
 ):
     """
     Update the authenticated user's profile.
 
     Args:
         user_data: User profile update data
-        current_user_id: The ID of the authenticated user (from token)
+        claims: Claims of the authenticated user's token
+        session: Request-scoped session on the primary database
 
     Returns:
         UserResponse: Updated user data
     """
-    # Get the current user data to use as defaults if fields aren't provided
-    current_user_info = get_user(current_user_id)
-    if not current_user_info:
-        # If user doesn't exist in storage, create a basic record
-        # Extract email from the token payload to reconstruct user info
-        try:
-            payload = jwt.decode(current_user_id, SECRET_KEY, algorithms=[ALGORITHM])
-            email = payload.get("email") or f"{current_user_id}@example.com"
-            name = payload.get("name") or current_user_id.split('-')[1] if '-' in current_user_id else current_user_id
-        except JWTError:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials"
-            )
-
-        create_user(current_user_id, name, email)
-        current_user_info = get_user(current_user_id)
-
-    # Update user in storage, using existing values if new ones aren't provided
-    update_user(
-        current_user_id,
-        name=user_data.name if user_data.name is not None else current_user_info.get("name"),
-        email=user_data.email if user_data.email is not None else current_user_info.get("email")
-    )
-
-    # Get the updated user data from storage
-    user_info = get_user(current_user_id)
-    if not user_info:
+    _current_user(session, claims)
+    try:
+        user_info = update_user(session, claims["sub"], name=user_data.name, email=user_data.email)
+    except IntegrityError:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Email is already registered"
         )
 
-    # Return updated user data
     return UserResponse(
-        id=current_user_id,
+        id=claims["sub"],
         email=user_info["email"],
         name=user_info["name"]
     )
@@ -168,37 +221,22 @@ def update_profile(
 
 @router.get("/users/me", response_model=UserResponse)
 def get_profile(
-    current_user_id: str = Depends(verify_token)
+    claims: dict = Depends(verify_token_claims),
+    session: Session = Depends(get_primary_session)
 ):
     """
     Get the authenticated user's profile.
 
     Args:
-        current_user_id: The ID of the authenticated user (from token)
+        claims: Claims of the authenticated user's token
+        session: Request-scoped session on the primary database
 
     Returns:
         UserResponse: Current user data
     """
-    # Get the current user data from storage
-    user_info = get_user(current_user_id)
-    if not user_info:
-        # If user doesn't exist in storage, create a basic record from token
-        try:
-            payload = jwt.decode(current_user_id, SECRET_KEY, algorithms=[ALGORITHM])
-            email = payload.get("email") or f"{current_user_id}@example.com"
-            name = payload.get("name") or current_user_id.split('-')[1] if '-' in current_user_id else current_user_id
-        except JWTError:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials"
-            )
-
-        create_user(current_user_id, name, email)
-        user_info = get_user(current_user_id)
-
-    # Return user data
+    user_info = _current_user(session, claims)
     return UserResponse(
-        id=current_user_id,
+        id=claims["sub"],
         email=user_info["email"],
         name=user_info["name"]
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,127 @@
+from fastapi import APIRouter, HTTPException, Depends, Response, status
+from typing import List
+from pydantic import BaseModel, Field
+from models import JobResponse
+from middleware.auth import verify_token
+from sqlmodel import Session
+from db import ReleaseSessionsRoute, get_primary_session
+from services import job_service
+from routes.tasks import TaskImport
+
+# Initialize router
+router = APIRouter(route_class=ReleaseSessionsRoute)
+
+MAX_IMPORT_TASKS = 5000
+
+class TasksImport(BaseModel):
+    """Request model for importing tasks."""
+    tasks: List[TaskImport] = Field(max_length=MAX_IMPORT_TASKS)
+
+def check_user(user_id: str, current_user_id: str) -> None:
+    # Verify that the requested user_id matches the authenticated user_id
+    if user_id != current_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied: Cannot start jobs for another user"
+        )
+
+def accepted(response: Response, job) -> JobResponse:
+    # 202 with the URL to poll
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return JobResponse.model_validate(job, from_attributes=True)
+
+@router.post("/{user_id}/jobs/export", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+def export_tasks(
+    user_id: str,
+    response: Response,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_primary_session)
+):
+    """
+    Start exporting the specified user's tasks. The finished job's result holds them.
+
+    Args:
+        user_id: The ID of the user whose tasks to export
+        response: The outgoing response (carries the job's Location)
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped session on the primary database
+
+    Returns:
+        JobResponse: The queued job
+    """
+    check_user(user_id, current_user_id)
+    return accepted(response, job_service.enqueue_job(session, "export", user_id=user_id))
+
+@router.post("/{user_id}/jobs/import", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+def import_tasks(
+    user_id: str,
+    tasks_import: TasksImport,
+    response: Response,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_primary_session)
+):
+    """
+    Start importing tasks for the specified user, at the end of their list.
+
+    The import is all or nothing: if any task fails, none is created.
+
+    Args:
+        user_id: The ID of the user to import tasks for
+        tasks_import: The tasks, with their tags
+        response: The outgoing response (carries the job's Location)
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped session on the primary database
+
+    Returns:
+        JobResponse: The queued job
+    """
+    check_user(user_id, current_user_id)
+    job = job_service.enqueue_job(session, "import", tasks_import.model_dump(mode="json"), user_id=user_id)
+    return accepted(response, job)
+
+@router.post("/{user_id}/jobs/recount-projects", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+def recount_projects(
+    user_id: str,
+    response: Response,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_primary_session)
+):
+    """
+    Start rebuilding the task counts of the specified user's projects from their tasks.
+
+    Args:
+        user_id: The ID of the user whose projects to recount
+        response: The outgoing response (carries the job's Location)
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped session on the primary database
+
+    Returns:
+        JobResponse: The queued job
+    """
+    check_user(user_id, current_user_id)
+    return accepted(response, job_service.enqueue_job(session, "recount_projects", user_id=user_id))
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(
+    job_id: int,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_primary_session)
+):
+    """
+    Get the status of one of the authenticated user's jobs, and its result once it has succeeded.
+
+    Args:
+        job_id: The ID of the job
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped session on the primary database
+
+    Returns:
+        JobResponse: The job's status
+    """
+    job = job_service.get_user_job(session, job_id, current_user_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
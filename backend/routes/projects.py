@@ -0,0 +1,199 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from models import ProjectResponse, TaskResponse
+from middleware.auth import verify_token
+from sqlmodel import Session
+from sqlalchemy.exc import IntegrityError
+from db import ReleaseSessionsRoute, get_read_session, get_write_session
+from services import project_service, task_service
+
+# Initialize router
+router = APIRouter(route_class=ReleaseSessionsRoute)
+
+class ProjectCreate(BaseModel):
+    """Request model for creating or renaming a project."""
+    name: str = Field(min_length=1, max_length=100)
+
+class ProjectTasksMove(BaseModel):
+    """Request model for moving many tasks into a project; give task_ids or from_project_id."""
+    project_id: Optional[int] = None  # Target project; null takes the tasks out of their projects
+    task_ids: Optional[List[int]] = Field(default=None, max_length=1000)
+    from_project_id: Optional[int] = None  # Move every task of this project
+
+    @model_validator(mode="after")
+    def one_source(self):
+        if (self.task_ids is None) == (self.from_project_id is None):
+            raise ValueError("Give either task_ids or from_project_id")
+        return self
+
+def check_user(user_id: str, current_user_id: str) -> None:
+    # Verify that the requested user_id matches the authenticated user_id
+    if user_id != current_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied: Cannot access another user's projects"
+        )
+
+def project_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Project not found"
+    )
+
+def duplicate_project_name() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A project with this name already exists"
+    )
+
+@router.get("/{user_id}/projects", response_model=List[ProjectResponse])
+def get_projects(
+    user_id: str,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session)
+):
+    """
+    Get the specified user's projects with their task counts.
+
+    Args:
+        user_id: The ID of the user whose projects to retrieve
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        List[ProjectResponse]: The projects, in name order
+    """
+    check_user(user_id, current_user_id)
+    return project_service.get_user_projects(session, user_id)
+
+@router.post("/{user_id}/projects", response_model=ProjectResponse, status_code=status.HTTP_201_CREATED)
+def create_project(
+    user_id: str,
+    project_data: ProjectCreate,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Create a project for the specified user.
+
+    Args:
+        user_id: The ID of the user creating the project
+        project_data: The project's name
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        ProjectResponse: The created project
+    """
+    check_user(user_id, current_user_id)
+    try:
+        return project_service.create_project(session, user_id, project_data.name)
+    except IntegrityError:
+        raise duplicate_project_name()
+
+# Registered before /{user_id}/projects/{project_id} routes
+@router.post("/{user_id}/projects/move-tasks")
+def move_tasks(
+    user_id: str,
+    move: ProjectTasksMove,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Move many tasks into a project with a single UPDATE.
+
+    Args:
+        user_id: The ID of the user who owns the tasks
+        move: The target project and the tasks to move
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        dict: Number of tasks moved
+    """
+    check_user(user_id, current_user_id)
+    try:
+        moved = task_service.move_tasks_to_project(session, user_id, move.project_id, move.task_ids, move.from_project_id)
+    except project_service.ProjectNotFound:
+        raise project_not_found()
+    return {"moved": moved}
+
+@router.patch("/{user_id}/projects/{project_id}", response_model=ProjectResponse)
+def rename_project(
+    user_id: str,
+    project_id: int,
+    project_data: ProjectCreate,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Rename a project; its tasks are not rewritten.
+
+    Args:
+        user_id: The ID of the user who owns the project
+        project_id: The ID of the project
+        project_data: The new name
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        ProjectResponse: The renamed project
+    """
+    check_user(user_id, current_user_id)
+    try:
+        project = project_service.rename_project(session, user_id, project_id, project_data.name)
+    except IntegrityError:
+        raise duplicate_project_name()
+    if not project:
+        raise project_not_found()
+    return project
+
+@router.delete("/{user_id}/projects/{project_id}")
+def delete_project(
+    user_id: str,
+    project_id: int,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Delete a project. Its tasks are kept, outside any project.
+
+    Args:
+        user_id: The ID of the user who owns the project
+        project_id: The ID of the project
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        dict: Success message
+    """
+    check_user(user_id, current_user_id)
+    if not task_service.delete_user_project(session, user_id, project_id):
+        raise project_not_found()
+    return {"message": "Project deleted successfully"}
+
+@router.get("/{user_id}/projects/{project_id}/tasks", response_model=List[TaskResponse])
+def get_project_tasks(
+    user_id: str,
+    project_id: int,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session)
+):
+    """
+    Get the tasks of a project, in list order.
+
+    Args:
+        user_id: The ID of the user who owns the project
+        project_id: The ID of the project
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        List[TaskResponse]: The project's tasks
+    """
+    check_user(user_id, current_user_id)
+    tasks = task_service.get_project_tasks(session, user_id, project_id)
+    if tasks is None:
+        raise project_not_found()
+    return tasks
@@ -1,18 +1,36 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List, Optional
-from pydantic import BaseModel
-from models import Task, TaskBase, Subtask
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
+from typing import Callable, List, Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+from models import TaskBase, TaskResponse, SubtaskResponse, ArchivedTaskPage, SharedTaskPage, ShareRoleEnum, TaskShareResponse, TaskHistoryPage
 from middleware.auth import verify_token
-from sqlmodel import Session, select
-from db import engine
-from datetime import datetime, timezone
+from sqlmodel import Session
+from sqlalchemy.exc import IntegrityError
+from db import ReleaseSessionsRoute, get_read_session, get_write_session, read_engines_for_all_shards
+from datetime import datetime, timedelta, timezone
+from services import idempotency_service, share_service, tag_service, task_service
+from services.project_service import ProjectNotFound
+from services.recurrence_service import RECURRENCE_MAX_WINDOW_DAYS, RECURRENCE_WINDOW_DAYS, validate_rule, validate_schedule
 
 # Initialize router
-router = APIRouter()
+router = APIRouter(route_class=ReleaseSessionsRoute)
 
 class TaskCreate(TaskBase):
     """Request model for creating a task."""
     due_date: Optional[datetime] = None
+    project_id: Optional[int] = None
+
+    _valid_rule = field_validator("recurrence_rule")(validate_rule)
+
+    @model_validator(mode="after")
+    def rule_recurs(self):
+        validate_schedule(self.recurrence_rule, self.due_date)
+        return self
+
+class TaskImport(TaskCreate):
+    """One task of an import, with its tags."""
+    tags: List[str] = Field(default_factory=list, max_length=tag_service.MAX_TAGS_PER_TASK)
+
+    _normalized = field_validator("tags")(tag_service.normalize_tags)
 
 class TaskUpdate(BaseModel):
     """Request model for updating a task."""
@@ -22,27 +40,153 @@ class TaskUpdate(BaseModel):
     priority: Optional[str] = None
     category: Optional[str] = None
     due_date: Optional[datetime] = None
+    recurrence_rule: Optional[str] = None
+    project_id: Optional[int] = None
+
+    _valid_rule = field_validator("recurrence_rule")(validate_rule)
+
+    @model_validator(mode="after")
+    def rule_recurs(self):
+        validate_schedule(self.recurrence_rule, self.due_date)
+        return self
 
 class TaskToggleComplete(BaseModel):
     """Request model for toggling task completion."""
     completed: bool
 
-class TaskResponse(TaskBase):
-    """Response model for a task."""
-    id: int
-    user_id: str
-    due_date: Optional[datetime] = None
-    created_at: datetime
-    updated_at: datetime
+class MoveRequest(BaseModel):
+    """Request model for moving a task or subtask; give either neighbour, or both."""
+    after_id: Optional[int] = None   # Item that should come right before it
+    before_id: Optional[int] = None  # Item that should come right after it
+
+def invalid_move(error: ValueError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=str(error)
+    )
+
+def idempotent_request(user_id: str, idempotency_key: Optional[str], request: Request, body: BaseModel) -> Optional[idempotency_service.IdempotentRequest]:
+    if not idempotency_key:
+        return None
+    return idempotency_service.IdempotentRequest(user_id, idempotency_key, request.method, request.url.path, body.model_dump(mode="json"))
+
+def _find_replay(session: Session, idempotency: idempotency_service.IdempotentRequest):
+    try:
+        return idempotency_service.find_replay(session, idempotency)
+    except idempotency_service.IdempotencyKeyReused as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+def run_idempotent(session: Session, idempotency: Optional[idempotency_service.IdempotentRequest], create):
+    """Run a create handler once per Idempotency-Key, replaying the stored response on retries."""
+    if idempotency is not None:
+        stored = _find_replay(session, idempotency)
+        if stored is not None:
+            return replayed_response(stored)
+    try:
+        return create()
+    except IntegrityError:
+        if idempotency is None:
+            raise
+        # A concurrent request with the same key committed first
+        session.rollback()
+        stored = _find_replay(session, idempotency)
+        if stored is None:
+            raise  # Some other constraint failed; the key was never stored
+        return replayed_response(stored)
+
+def replayed_response(stored) -> Response:
+    return Response(
+        content=stored.response_body,
+        status_code=stored.status_code,
+        media_type="application/json",
+        headers={"Idempotency-Replayed": "true"}
+    )
+
+def expected_version(if_match: Optional[str]) -> Optional[int]:
+    """Read the version a client expects from an If-Match header ("*" or absent means any)."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match must be an ETag returned by this API"
+        )
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+def version_conflict() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="The resource was modified by another request; fetch it again and retry"
+    )
+
+def task_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Task not found"
+    )
+
+def project_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Project not found"
+    )
+
+def share_role_denied(detail: str = "Access denied: Your role on this task does not allow this change") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=detail
+    )
+
+def invalid_tags(error: ValueError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=str(error)
+    )
+
+def with_tags(task, tags: List[str]) -> TaskResponse:
+    return TaskResponse.model_validate(task, from_attributes=True).model_copy(update={"tags": tags})
+
+def task_not_shared(user_id: str, current_user_id: str, not_found: Callable[[], HTTPException] = task_not_found) -> HTTPException:
+    # Callers other than the owner are refused whether or not the task exists, as before sharing
+    if task_service.is_collaborator(user_id, current_user_id):
+        return HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied: Cannot access another user's task"
+        )
+    return not_found()
+
+def task_not_changed(session: Session, user_id: str, task_id: int, current_user_id: str) -> HTTPException:
+    # Only runs on the error path, to tell a read-only collaborator from a missing task
+    if task_service.is_collaborator(user_id, current_user_id) and task_service.can_access_task(session, user_id, task_id, current_user_id):
+        return share_role_denied()
+    return task_not_shared(user_id, current_user_id)
 
 @router.get("/{user_id}/tasks", response_model=List[TaskResponse])
-def get_tasks(user_id: str, current_user_id: str = Depends(verify_token)):
+def get_tasks(
+    user_id: str,
+    until: Optional[datetime] = None,
+    tag: Optional[List[str]] = Query(None),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session),
+    write_session: Session = Depends(get_write_session)
+):
     """
     Get all tasks for the specified user.
 
+    Occurrences of recurring tasks due before `until` are created first.
+    Repeating `tag` keeps only the tasks that carry every given tag.
+
     Args:
         user_id: The ID of the user whose tasks to retrieve
+        until: Horizon for recurring task occurrences (default RECURRENCE_WINDOW_DAYS from now)
+        tag: Tags the returned tasks must all carry
         current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+        write_session: Request-scoped write session, only used to create occurrences
 
     Returns:
         List[TaskResponse]: List of tasks for the user
@@ -53,41 +197,49 @@ def get_tasks(user_id: str, current_user_id: str = Depends(verify_token)):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied: Cannot access another user's tasks"
         )
-
-    # Get database session
-    with Session(engine) as session:
-        # Query tasks for the authenticated user
-        statement = select(Task).where(Task.user_id == user_id)
-        tasks = session.exec(statement).all()
-
-        # Convert tasks to response model to avoid relationship issues
-        task_responses = []
-        for task in tasks:
-            task_response = TaskResponse(
-                id=task.id,
-                title=task.title,
-                description=task.description,
-                completed=task.completed,
-                priority=task.priority,
-                category=task.category,
-                due_date=task.due_date,
-                user_id=task.user_id,
-                created_at=task.created_at,
-                updated_at=task.updated_at
-            )
-            task_responses.append(task_response)
-
-    return task_responses
+    try:
+        tags = tag_service.normalize_tags(tag or [])
+    except ValueError as e:
+        raise invalid_tags(e)
+    if len(tags) > tag_service.MAX_TAG_FILTERS:
+        raise invalid_tags(ValueError(f"Filter by at most {tag_service.MAX_TAG_FILTERS} tags"))
+
+    # Materialize recurring occurrences inside the visible window, capped to bound storage
+    now = datetime.now(timezone.utc)
+    horizon = now + timedelta(days=RECURRENCE_WINDOW_DAYS)
+    if until is not None:
+        horizon = min(until if until.tzinfo else until.replace(tzinfo=timezone.utc), now + timedelta(days=RECURRENCE_MAX_WINDOW_DAYS))
+    if task_service.materialize_user_occurrences(session, write_session, user_id, horizon):
+        session = write_session  # The read session may not see the new rows yet
+
+    # The service returns the serialized list (cached when current and unfiltered)
+    if tags:
+        body = task_service.get_tagged_user_tasks_json(session, user_id, tags)
+    else:
+        body = task_service.get_user_tasks_json(session, user_id)
+    return Response(content=body, media_type="application/json")
 
 @router.post("/{user_id}/tasks", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
-def create_task(user_id: str, task_data: TaskCreate, current_user_id: str = Depends(verify_token)):
+def create_task(
+    user_id: str,
+    task_data: TaskCreate,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
     """
     Create a new task for the specified user.
 
+    Retries that repeat an Idempotency-Key get the original response back.
+
     Args:
         user_id: The ID of the user creating the task
         task_data: Task creation data
+        request: The current request
+        idempotency_key: Optional Idempotency-Key header
         current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
 
     Returns:
         TaskResponse: Created task
@@ -99,140 +251,178 @@ def create_task(user_id: str, task_data: TaskCreate, current_user_id: str = Depe
             detail="Access denied: Cannot create tasks for another user"
         )
 
-    # Create task instance
-    task = Task(
-        title=task_data.title,
-        description=task_data.description,
-        completed=task_data.completed,
-        priority=task_data.priority,
-        category=task_data.category,
-        due_date=task_data.due_date,
-        user_id=user_id
-    )
+    idempotency = idempotent_request(user_id, idempotency_key, request, task_data)
+    try:
+        return run_idempotent(
+            session, idempotency,
+            lambda: task_service.create_task_for_user(session, user_id, task_data.model_dump(), idempotency)
+        )
+    except ProjectNotFound:
+        raise project_not_found()
 
-    # Get database session and save the task
-    with Session(engine) as session:
-        session.add(task)
-        session.commit()
-        session.refresh(task)
+# Registered before /{user_id}/tasks/{task_id} so "archive" is not taken for a task ID
+@router.get("/{user_id}/tasks/archive", response_model=ArchivedTaskPage)
+def get_archived_tasks(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session)
+):
+    """
+    Get a page of the specified user's archived tasks, most recently completed first.
 
-    return task
+    Args:
+        user_id: The ID of the user whose archive to read
+        limit: Page size
+        cursor: next_cursor from the previous page
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        ArchivedTaskPage: The page and the cursor of the next one
+    """
+    # Verify that the requested user_id matches the authenticated user_id
+    if user_id != current_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied: Cannot access another user's tasks"
+        )
+
+    try:
+        tasks, next_cursor = task_service.get_archived_tasks(session, user_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return ArchivedTaskPage(tasks=tasks, next_cursor=next_cursor)
 
 @router.get("/{user_id}/tasks/{task_id}", response_model=TaskResponse)
-def get_task(user_id: str, task_id: int, current_user_id: str = Depends(verify_token)):
+def get_task(
+    user_id: str,
+    task_id: int,
+    response: Response,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session)
+):
     """
     Get a specific task for the specified user.
-    
+
+    The owner and every collaborator the task is shared with can read it;
+    a collaborator's share is checked by the same query that loads the task.
+
     Args:
         user_id: The ID of the user whose task to retrieve
         task_id: The ID of the task to retrieve
+        response: The outgoing response (carries the version ETag)
         current_user_id: The ID of the authenticated user (from token)
-        
+        session: Request-scoped database session
+
     Returns:
         TaskResponse: The requested task
     """
-    # Verify that the requested user_id matches the authenticated user_id
-    if user_id != current_user_id:
+    task = task_service.get_user_task(session, user_id, task_id, current_user_id)
+    if not task:
+        raise task_not_shared(user_id, current_user_id)
+    response.headers["ETag"] = version_etag(task.version)
+    return with_tags(task, tag_service.tag_names_for_tasks(session, [task.id]).get(task.id, []))
+
+@router.get("/{user_id}/tasks/{task_id}/history", response_model=TaskHistoryPage)
+def get_task_history(
+    user_id: str,
+    task_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session)
+):
+    """
+    Get a page of a task's history, newest first.
+
+    Every change to the task and its subtasks is listed, with the task or
+    subtask as it was after the change. History shows up once the outbox
+    relay has passed it on, a few seconds after the change.
+
+    Args:
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        limit: Page size
+        cursor: next_cursor from the previous page
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        TaskHistoryPage: The page and the cursor of the next one
+    """
+    try:
+        history = task_service.get_task_history(session, user_id, task_id, limit, cursor, current_user_id)
+    except ValueError:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: Cannot access another user's task"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
         )
-    
-    # Get database session
-    with Session(engine) as session:
-        # Query the specific task for the authenticated user
-        statement = select(Task).where(Task.id == task_id).where(Task.user_id == user_id)
-        task = session.exec(statement).first()
-        
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found"
-            )
-
-    task_response = TaskResponse(
-        id=task.id,
-        title=task.title,
-        description=task.description,
-        completed=task.completed,
-        priority=task.priority,
-        category=task.category,
-        due_date=task.due_date,
-        user_id=task.user_id,
-        created_at=task.created_at,
-        updated_at=task.updated_at
-    )
-    return task_response
+    if history is None:
+        raise task_not_shared(user_id, current_user_id)
+    events, next_cursor = history
+    return TaskHistoryPage(events=events, next_cursor=next_cursor)
 
 @router.put("/{user_id}/tasks/{task_id}", response_model=TaskResponse)
-def update_task(user_id: str, task_id: int, task_data: TaskUpdate, current_user_id: str = Depends(verify_token)):
+def update_task(
+    user_id: str,
+    task_id: int,
+    task_data: TaskUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
     """
     Update an existing task for the specified user.
-    
+
+    Collaborators with the editor or owner role can update it too.
+
     Args:
         user_id: The ID of the user whose task to update
         task_id: The ID of the task to update
         task_data: Task update data
+        response: The outgoing response (carries the new version ETag)
+        if_match: Optional ETag of the version the client edited; 409 if it is stale
         current_user_id: The ID of the authenticated user (from token)
-        
+        session: Request-scoped database session
+
     Returns:
         TaskResponse: Updated task
     """
-    # Verify that the requested user_id matches the authenticated user_id
-    if user_id != current_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: Cannot update another user's task"
+    try:
+        task = task_service.update_user_task(
+            session, user_id, task_id, task_data.model_dump(exclude_unset=True), expected_version(if_match), current_user_id
         )
-    
-    # Get database session
-    with Session(engine) as session:
-        # Query the specific task for the authenticated user
-        statement = select(Task).where(Task.id == task_id).where(Task.user_id == user_id)
-        task = session.exec(statement).first()
-        
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found"
-            )
-        
-        # Update task fields if provided
-        update_data = task_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(task, field, value)
-        
-        # Update the updated_at timestamp
-        task.updated_at = datetime.now(timezone.utc)
-
-        session.add(task)
-        session.commit()
-        session.refresh(task)
-
-    task_response = TaskResponse(
-        id=task.id,
-        title=task.title,
-        description=task.description,
-        completed=task.completed,
-        priority=task.priority,
-        category=task.category,
-        due_date=task.due_date,
-        user_id=task.user_id,
-        created_at=task.created_at,
-        updated_at=task.updated_at
-    )
-    return task_response
+    except task_service.VersionConflict:
+        raise version_conflict()
+    except ProjectNotFound:
+        raise project_not_found()
+    if not task:
+        raise task_not_changed(session, user_id, task_id, current_user_id)
+    response.headers["ETag"] = version_etag(task.version)
+    return task
 
 @router.delete("/{user_id}/tasks/{task_id}")
-def delete_task(user_id: str, task_id: int, current_user_id: str = Depends(verify_token)):
+def delete_task(
+    user_id: str,
+    task_id: int,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
     """
     Delete a specific task for the specified user.
-    
+
     Args:
         user_id: The ID of the user whose task to delete
         task_id: The ID of the task to delete
         current_user_id: The ID of the authenticated user (from token)
-        
+        session: Request-scoped database session
+
     Returns:
         dict: Success message
     """
@@ -242,38 +432,105 @@ def delete_task(user_id: str, task_id: int, current_user_id: str = Depends(verif
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied: Cannot delete another user's task"
         )
-    
-    # Get database session
-    with Session(engine) as session:
-        # Query the specific task for the authenticated user
-        statement = select(Task).where(Task.id == task_id).where(Task.user_id == user_id)
-        task = session.exec(statement).first()
-        
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found"
-            )
-        
-        session.delete(task)
-        session.commit()
-        
+
+    if not task_service.delete_user_task(session, user_id, task_id):
+        raise task_not_found()
     return {"message": "Task deleted successfully"}
 
+@router.post("/{user_id}/tasks/{task_id}/restore", response_model=TaskResponse)
+def restore_task(
+    user_id: str,
+    task_id: int,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Restore a deleted task (undo) before it is purged.
+
+    Args:
+        user_id: The ID of the user whose task to restore
+        task_id: The ID of the task to restore
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        TaskResponse: Restored task
+    """
+    # Verify that the requested user_id matches the authenticated user_id
+    if user_id != current_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied: Cannot restore another user's task"
+        )
+
+    task = task_service.restore_user_task(session, user_id, task_id)
+    if not task:
+        raise task_not_found()
+    return task
+
 @router.patch("/{user_id}/tasks/{task_id}/complete", response_model=TaskResponse)
-def toggle_task_complete(user_id: str, task_id: int, task_data: TaskToggleComplete, current_user_id: str = Depends(verify_token)):
+def toggle_task_complete(
+    user_id: str,
+    task_id: int,
+    task_data: TaskToggleComplete,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
     """
     Toggle the completion status of a specific task for the specified user.
 
+    Collaborators with the editor or owner role can toggle it too.
+
     Args:
         user_id: The ID of the user whose task to update
         task_id: The ID of the task to update
         task_data: Task completion data
+        response: The outgoing response (carries the new version ETag)
+        if_match: Optional ETag of the version the client edited; 409 if it is stale
         current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
 
     Returns:
         TaskResponse: Updated task
     """
+    try:
+        task = task_service.toggle_user_task_completion(
+            session, user_id, task_id, task_data.completed, expected_version(if_match), current_user_id
+        )
+    except task_service.VersionConflict:
+        raise version_conflict()
+    if not task:
+        raise task_not_changed(session, user_id, task_id, current_user_id)
+    response.headers["ETag"] = version_etag(task.version)
+    return task
+
+@router.patch("/{user_id}/tasks/{task_id}/move", response_model=TaskResponse)
+def move_task(
+    user_id: str,
+    task_id: int,
+    move: MoveRequest,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Move a task to a new place in the specified user's list.
+
+    Args:
+        user_id: The ID of the user whose task to move
+        task_id: The ID of the task to move
+        move: The task's new neighbours
+        response: The outgoing response (carries the new version ETag)
+        if_match: Optional ETag of the version the client moved; 409 if it is stale
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        TaskResponse: Moved task
+    """
     # Verify that the requested user_id matches the authenticated user_id
     if user_id != current_user_id:
         raise HTTPException(
@@ -281,41 +538,23 @@ def toggle_task_complete(user_id: str, task_id: int, task_data: TaskToggleComple
             detail="Access denied: Cannot update another user's task"
         )
 
-    # Get database session
-    with Session(engine) as session:
-        # Query the specific task for the authenticated user
-        statement = select(Task).where(Task.id == task_id).where(Task.user_id == user_id)
-        task = session.exec(statement).first()
-
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found"
-            )
-
-        # Update the completion status
-        task.completed = task_data.completed
-        # NOTE: We don't update updated_at here to distinguish between content updates and status changes
-
-        session.add(task)
-        session.commit()
-        session.refresh(task)
-
-    task_response = TaskResponse(
-        id=task.id,
-        title=task.title,
-        description=task.description,
-        completed=task.completed,
-        priority=task.priority,
-        category=task.category,
-        due_date=task.due_date,
-        user_id=task.user_id,
-        created_at=task.created_at,
-        updated_at=task.updated_at
-    )
-    return task_response
+    try:
+        task = task_service.move_user_task(
+            session, user_id, task_id, move.after_id, move.before_id, expected_version(if_match)
+        )
+    except task_service.VersionConflict:
+        raise version_conflict()
+    except ValueError as e:
+        raise invalid_move(e)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task or neighbouring task not found"
+        )
+    response.headers["ETag"] = version_etag(task.version)
+    return task
+
 # Subtask Routes
-from models import Subtask
 
 class SubtaskCreate(BaseModel):
     """Request model for creating a subtask."""
@@ -327,101 +566,92 @@ class SubtaskUpdate(BaseModel):
     title: Optional[str] = None
     completed: Optional[bool] = None
 
-class SubtaskResponse(BaseModel):
-    """Response model for a subtask."""
-    id: int
-    task_id: int
-    title: str
-    completed: bool
-    created_at: datetime
-    updated_at: datetime
+def parent_task_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Task not found or does not belong to user"
+    )
+
+def parent_task_not_changed(session: Session, user_id: str, task_id: int, current_user_id: str) -> HTTPException:
+    # Only runs on the error path, to tell a read-only collaborator from a missing task
+    if task_service.is_collaborator(user_id, current_user_id) and task_service.can_access_task(session, user_id, task_id, current_user_id):
+        return share_role_denied()
+    return task_not_shared(user_id, current_user_id, parent_task_not_found)
+
+def subtask_not_found(session: Session, user_id: str, task_id: int, current_user_id: str) -> HTTPException:
+    # Only runs on the error path, to tell a missing task from a missing subtask
+    if not task_service.can_access_task(session, user_id, task_id, current_user_id, task_service.WRITE_ROLES):
+        return parent_task_not_changed(session, user_id, task_id, current_user_id)
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Subtask not found or does not belong to the specified task"
+    )
 
 @router.post("/{user_id}/tasks/{task_id}/subtasks", response_model=SubtaskResponse, status_code=status.HTTP_201_CREATED)
 def create_subtask(
     user_id: str,
     task_id: int,
     subtask_data: SubtaskCreate,
-    current_user_id: str = Depends(verify_token)
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
 ):
     """
     Create a new subtask for the specified task.
 
+    Collaborators with the editor or owner role can add subtasks too.
+    Retries that repeat an Idempotency-Key get the original response back.
+
     Args:
         user_id: The ID of the user who owns the parent task
         task_id: The ID of the parent task
         subtask_data: Subtask creation data
+        request: The current request
+        idempotency_key: Optional Idempotency-Key header
         current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
 
     Returns:
         SubtaskResponse: Created subtask
     """
-    # Verify that the user_id matches the authenticated user_id
-    if user_id != current_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: Cannot create subtasks for another user's task"
-        )
-
-    # Verify that the task belongs to the user
-    with Session(engine) as session:
-        task = session.exec(select(Task).where(Task.id == task_id).where(Task.user_id == user_id)).first()
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found or does not belong to user"
-            )
-
-        # Create subtask instance
-        subtask = Subtask(
-            title=subtask_data.title,
-            completed=subtask_data.completed,
-            task_id=task_id
+    def create():
+        subtask = task_service.create_subtask_for_task(
+            session, user_id, task_id, subtask_data.model_dump(), idempotency, current_user_id
         )
+        if not subtask:
+            raise parent_task_not_changed(session, user_id, task_id, current_user_id)
+        return subtask
 
-        session.add(subtask)
-        session.commit()
-        session.refresh(subtask)
-
-    return subtask
+    # Keys are scoped to the caller, so collaborators' keys never collide with the owner's
+    idempotency = idempotent_request(current_user_id, idempotency_key, request, subtask_data)
+    return run_idempotent(session, idempotency, create)
 
 @router.get("/{user_id}/tasks/{task_id}/subtasks", response_model=List[SubtaskResponse])
 def get_subtasks(
     user_id: str,
     task_id: int,
-    current_user_id: str = Depends(verify_token)
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session)
 ):
     """
     Get all subtasks for the specified task.
 
+    The owner and every collaborator the task is shared with can read them.
+
     Args:
         user_id: The ID of the user who owns the parent task
         task_id: The ID of the parent task
         current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
 
     Returns:
         List[SubtaskResponse]: List of subtasks for the task
     """
-    # Verify that the user_id matches the authenticated user_id
-    if user_id != current_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: Cannot access another user's task subtasks"
-        )
-
-    # Verify that the task belongs to the user
-    with Session(engine) as session:
-        task = session.exec(select(Task).where(Task.id == task_id).where(Task.user_id == user_id)).first()
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found or does not belong to user"
-            )
-
-        # Query subtasks for the task
-        statement = select(Subtask).where(Subtask.task_id == task_id)
-        subtasks = session.exec(statement).all()
-
-    return subtasks
+    body = task_service.get_task_subtasks_json(session, user_id, task_id, current_user_id)
+    if body is None:
+        raise task_not_shared(user_id, current_user_id, parent_task_not_found)
+    return Response(content=body, media_type="application/json")
 
 @router.put("/{user_id}/tasks/{task_id}/subtasks/{subtask_id}", response_model=SubtaskResponse)
 def update_subtask(
@@ -429,59 +659,81 @@ def update_subtask(
     task_id: int,
     subtask_id: int,
     subtask_data: SubtaskUpdate,
-    current_user_id: str = Depends(verify_token)
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
 ):
     """
     Update an existing subtask for the specified task.
 
+    Collaborators with the editor or owner role can update it too.
+
     Args:
         user_id: The ID of the user who owns the parent task
         task_id: The ID of the parent task
         subtask_id: The ID of the subtask to update
         subtask_data: Subtask update data
+        response: The outgoing response (carries the new version ETag)
+        if_match: Optional ETag of the version the client edited; 409 if it is stale
         current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
 
     Returns:
         SubtaskResponse: Updated subtask
     """
-    # Verify that the user_id matches the authenticated user_id
-    if user_id != current_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: Cannot update another user's subtask"
+    try:
+        subtask = task_service.update_task_subtask(
+            session, user_id, task_id, subtask_id, subtask_data.model_dump(exclude_unset=True), expected_version(if_match),
+            current_user_id
         )
+    except task_service.VersionConflict:
+        raise version_conflict()
+    if not subtask:
+        raise subtask_not_found(session, user_id, task_id, current_user_id)
+    response.headers["ETag"] = version_etag(subtask.version)
+    return subtask
 
-    # Verify that the task belongs to the user and the subtask belongs to the task
-    with Session(engine) as session:
-        task = session.exec(select(Task).where(Task.id == task_id).where(Task.user_id == user_id)).first()
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found or does not belong to user"
-            )
-
-        subtask = session.exec(
-            select(Subtask).where(Subtask.id == subtask_id).where(Subtask.task_id == task_id)
-        ).first()
-
-        if not subtask:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Subtask not found or does not belong to the specified task"
-            )
-
-        # Update subtask fields if provided
-        update_data = subtask_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(subtask, field, value)
+@router.patch("/{user_id}/tasks/{task_id}/subtasks/{subtask_id}/move", response_model=SubtaskResponse)
+def move_subtask(
+    user_id: str,
+    task_id: int,
+    subtask_id: int,
+    move: MoveRequest,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Move a subtask to a new place in its task's list.
 
-        # Update the updated_at timestamp
-        subtask.updated_at = datetime.now(timezone.utc)
+    Collaborators with the editor or owner role can move it too.
 
-        session.add(subtask)
-        session.commit()
-        session.refresh(subtask)
+    Args:
+        user_id: The ID of the user who owns the parent task
+        task_id: The ID of the parent task
+        subtask_id: The ID of the subtask to move
+        move: The subtask's new neighbours
+        response: The outgoing response (carries the new version ETag)
+        if_match: Optional ETag of the version the client moved; 409 if it is stale
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
 
+    Returns:
+        SubtaskResponse: Moved subtask
+    """
+    try:
+        subtask = task_service.move_task_subtask(
+            session, user_id, task_id, subtask_id, move.after_id, move.before_id, expected_version(if_match), current_user_id
+        )
+    except task_service.VersionConflict:
+        raise version_conflict()
+    except ValueError as e:
+        raise invalid_move(e)
+    if not subtask:
+        raise subtask_not_found(session, user_id, task_id, current_user_id)
+    response.headers["ETag"] = version_etag(subtask.version)
     return subtask
 
 @router.delete("/{user_id}/tasks/{task_id}/subtasks/{subtask_id}")
@@ -489,47 +741,233 @@ def delete_subtask(
     user_id: str,
     task_id: int,
     subtask_id: int,
-    current_user_id: str = Depends(verify_token)
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
 ):
     """
     Delete a specific subtask for the specified task.
 
+    Collaborators with the editor or owner role can delete it too.
+
     Args:
         user_id: The ID of the user who owns the parent task
         task_id: The ID of the parent task
         subtask_id: The ID of the subtask to delete
         current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
 
     Returns:
         dict: Success message
     """
-    # Verify that the user_id matches the authenticated user_id
+    if not task_service.delete_task_subtask(session, user_id, task_id, subtask_id, current_user_id):
+        raise subtask_not_found(session, user_id, task_id, current_user_id)
+    return {"message": "Subtask deleted successfully"}
+
+# Tag Routes
+
+class TaskTagsUpdate(BaseModel):
+    """Request model for replacing a task's tags."""
+    tags: List[str] = Field(max_length=tag_service.MAX_TAGS_PER_TASK)
+
+    _normalized = field_validator("tags")(tag_service.normalize_tags)
+
+@router.put("/{user_id}/tasks/{task_id}/tags", response_model=TaskResponse)
+def set_task_tags(
+    user_id: str,
+    task_id: int,
+    tag_data: TaskTagsUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Replace the tags of a specific task.
+
+    Tag names are trimmed and lowercased. Collaborators with the editor or
+    owner role can set them too.
+
+    Args:
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        tag_data: The task's new tags (an empty list removes them all)
+        response: The outgoing response (carries the new version ETag)
+        if_match: Optional ETag of the version the client edited; 409 if it is stale
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        TaskResponse: The task with its new tags
+    """
+    try:
+        task = task_service.set_user_task_tags(
+            session, user_id, task_id, tag_data.tags, expected_version(if_match), current_user_id
+        )
+    except task_service.VersionConflict:
+        raise version_conflict()
+    if not task:
+        raise task_not_changed(session, user_id, task_id, current_user_id)
+    response.headers["ETag"] = version_etag(task.version)
+    return with_tags(task, sorted(tag_data.tags))
+
+@router.get("/{user_id}/tags", response_model=List[str])
+def get_tags(
+    user_id: str,
+    prefix: str = Query("", max_length=tag_service.MAX_TAG_LENGTH),
+    limit: int = Query(10, ge=1, le=100),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session)
+):
+    """
+    Autocomplete the specified user's tags.
+
+    Args:
+        user_id: The ID of the user whose tags to search
+        prefix: What the user has typed so far (empty lists the first tags)
+        limit: Maximum number of suggestions
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        List[str]: Tag names starting with the prefix, in name order
+    """
+    # Verify that the requested user_id matches the authenticated user_id
     if user_id != current_user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: Cannot delete another user's subtask"
+            detail="Access denied: Cannot access another user's tags"
         )
+    return tag_service.suggest_tags(session, user_id, prefix, limit)
 
-    # Verify that the task belongs to the user and the subtask belongs to the task
-    with Session(engine) as session:
-        task = session.exec(select(Task).where(Task.id == task_id).where(Task.user_id == user_id)).first()
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found or does not belong to user"
-            )
+# Sharing Routes
 
-        subtask = session.exec(
-            select(Subtask).where(Subtask.id == subtask_id).where(Subtask.task_id == task_id)
-        ).first()
+class ShareRequest(BaseModel):
+    """Request model for sharing a task with a collaborator."""
+    role: ShareRoleEnum = ShareRoleEnum.viewer
 
-        if not subtask:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Subtask not found or does not belong to the specified task"
-            )
+@router.get("/{user_id}/shared-tasks", response_model=SharedTaskPage)
+def get_shared_tasks(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user_id: str = Depends(verify_token)
+):
+    """
+    Get a page of the tasks other users have shared with the specified user, most recently shared first.
+
+    Args:
+        user_id: The ID of the collaborator
+        limit: Page size
+        cursor: next_cursor from the previous page
+        current_user_id: The ID of the authenticated user (from token)
 
-        session.delete(subtask)
-        session.commit()
+    Returns:
+        SharedTaskPage: The page and the cursor of the next one
+    """
+    # Verify that the requested user_id matches the authenticated user_id
+    if user_id != current_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied: Cannot access another user's shared tasks"
+        )
+
+    try:
+        tasks, next_cursor = share_service.get_shared_tasks(read_engines_for_all_shards(user_id), user_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return SharedTaskPage(tasks=tasks, next_cursor=next_cursor)
+
+@router.get("/{user_id}/tasks/{task_id}/shares", response_model=List[TaskShareResponse])
+def get_task_shares(
+    user_id: str,
+    task_id: int,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session)
+):
+    """
+    Get the collaborators of the specified task.
 
-    return {"message": "Subtask deleted successfully"}
\ No newline at end of file
+    Args:
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        List[TaskShareResponse]: The task's collaborators and their roles
+    """
+    shares = share_service.list_task_shares(session, user_id, task_id, current_user_id)
+    if shares is None:
+        raise task_not_shared(user_id, current_user_id)
+    return shares
+
+@router.put("/{user_id}/tasks/{task_id}/shares/{collaborator_id}", response_model=TaskShareResponse)
+def share_task(
+    user_id: str,
+    task_id: int,
+    collaborator_id: str,
+    share: ShareRequest,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Share the specified task with a collaborator, or change their role.
+
+    Only the owner and collaborators with the owner role can share a task.
+
+    Args:
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        collaborator_id: The ID of the user to share the task with
+        share: The collaborator's role
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        TaskShareResponse: The share
+    """
+    try:
+        task_share = share_service.share_task(session, user_id, task_id, current_user_id, collaborator_id, share.role)
+    except share_service.CannotShareWithOwner as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if not task_share:
+        if task_service.is_collaborator(user_id, current_user_id) and task_service.can_access_task(session, user_id, task_id, current_user_id):
+            raise share_role_denied("Access denied: Only the task's owners can share it")
+        raise task_not_shared(user_id, current_user_id)
+    return task_share
+
+@router.delete("/{user_id}/tasks/{task_id}/shares/{collaborator_id}")
+def unshare_task(
+    user_id: str,
+    task_id: int,
+    collaborator_id: str,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Stop sharing the specified task with a collaborator.
+
+    Owners can remove anyone; collaborators can remove themselves.
+
+    Args:
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        collaborator_id: The ID of the collaborator to remove
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        dict: Success message
+    """
+    if not share_service.unshare_task(session, user_id, task_id, current_user_id, collaborator_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Share not found"
+        )
+    return {"message": "Task unshared successfully"}
@@ -0,0 +1,180 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from typing import List
+from urllib.parse import urlsplit
+from pydantic import BaseModel, Field, field_validator
+from models import WebhookDeadLetterResponse, WebhookSubscriptionCreated, WebhookSubscriptionResponse
+from middleware.auth import verify_token
+from sqlmodel import Session
+from db import ReleaseSessionsRoute, get_read_session, get_write_session
+from services import webhook_service
+from services.outbox_service import EVENT_TYPES
+
+# Initialize router
+router = APIRouter(route_class=ReleaseSessionsRoute)
+
+class WebhookSubscriptionCreate(BaseModel):
+    """Request model for subscribing a URL to task change events."""
+    url: str = Field(max_length=2048)
+    event_types: List[str] = Field(default_factory=list, max_length=len(EVENT_TYPES))  # Empty for every event type
+
+    @field_validator("url")
+    @classmethod
+    def http_url(cls, value: str) -> str:
+        parts = urlsplit(value)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError("Must be an http or https URL")
+        parts.port  # Raises ValueError for a port out of range
+        return value
+
+    @field_validator("event_types")
+    @classmethod
+    def known_event_types(cls, value: List[str]) -> List[str]:
+        unknown = sorted(set(value) - set(EVENT_TYPES))
+        if unknown:
+            raise ValueError(f"Unknown event types: {', '.join(unknown)}")
+        return value
+
+def check_user(user_id: str, current_user_id: str) -> None:
+    # Verify that the requested user_id matches the authenticated user_id
+    if user_id != current_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied: Cannot access another user's webhooks"
+        )
+
+def subscription_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Webhook subscription not found"
+    )
+
+@router.get("/{user_id}/webhooks", response_model=List[WebhookSubscriptionResponse])
+def get_webhooks(
+    user_id: str,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session)
+):
+    """
+    Get the specified user's webhook subscriptions.
+
+    Args:
+        user_id: The ID of the user whose subscriptions to retrieve
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        List[WebhookSubscriptionResponse]: The subscriptions, oldest first
+    """
+    check_user(user_id, current_user_id)
+    return webhook_service.get_user_subscriptions(session, user_id)
+
+@router.post("/{user_id}/webhooks", response_model=WebhookSubscriptionCreated, status_code=status.HTTP_201_CREATED)
+def create_webhook(
+    user_id: str,
+    subscription_data: WebhookSubscriptionCreate,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Subscribe a URL to the specified user's task change events.
+
+    The response holds the secret that signs every request; it is not shown again.
+
+    Args:
+        user_id: The ID of the user subscribing
+        subscription_data: The URL and the event types to send
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        WebhookSubscriptionCreated: The subscription, with its secret
+    """
+    check_user(user_id, current_user_id)
+    try:
+        return webhook_service.create_subscription(session, user_id, subscription_data.url, subscription_data.event_types)
+    except webhook_service.TooManySubscriptions:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {webhook_service.MAX_SUBSCRIPTIONS_PER_USER} webhook subscriptions are allowed"
+        )
+    except webhook_service.UnsafeWebhookUrl as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.delete("/{user_id}/webhooks/{subscription_id}")
+def delete_webhook(
+    user_id: str,
+    subscription_id: int,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Delete a webhook subscription; its pending deliveries are dropped.
+
+    Args:
+        user_id: The ID of the user who owns the subscription
+        subscription_id: The ID of the subscription
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        dict: Success message
+    """
+    check_user(user_id, current_user_id)
+    if not webhook_service.delete_subscription(session, user_id, subscription_id):
+        raise subscription_not_found()
+    return {"message": "Webhook subscription deleted successfully"}
+
+@router.get("/{user_id}/webhooks/{subscription_id}/dead-letters", response_model=List[WebhookDeadLetterResponse])
+def get_dead_letters(
+    user_id: str,
+    subscription_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_read_session)
+):
+    """
+    Get the deliveries of a subscription that were given up on, newest first.
+
+    Args:
+        user_id: The ID of the user who owns the subscription
+        subscription_id: The ID of the subscription
+        limit: Maximum number of dead letters
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        List[WebhookDeadLetterResponse]: The dead letters, with their events
+    """
+    check_user(user_id, current_user_id)
+    dead_letters = webhook_service.get_dead_letters(session, user_id, subscription_id, limit)
+    if dead_letters is None:
+        raise subscription_not_found()
+    return dead_letters
+
+@router.post("/{user_id}/webhooks/{subscription_id}/dead-letters/redeliver")
+def redeliver_dead_letters(
+    user_id: str,
+    subscription_id: int,
+    current_user_id: str = Depends(verify_token),
+    session: Session = Depends(get_write_session)
+):
+    """
+    Queue every dead letter of a subscription for delivery again.
+
+    Args:
+        user_id: The ID of the user who owns the subscription
+        subscription_id: The ID of the subscription
+        current_user_id: The ID of the authenticated user (from token)
+        session: Request-scoped database session
+
+    Returns:
+        dict: Number of deliveries queued
+    """
+    check_user(user_id, current_user_id)
+    queued = webhook_service.redeliver_dead_letters(session, user_id, subscription_id)
+    if queued is None:
+        raise subscription_not_found()
+    return {"queued": queued}
@@ -0,0 +1,232 @@
+"""
+Audit service module for the Todo Application.
+
+Keeps the history of every task as an append-only log of its outbox
+events. The audit log consumer in outbox.py appends each batch the relay
+reads, in one INSERT per month, so task writes pay nothing beyond their
+outbox row.
+
+The log is split into one table per calendar month, task_event_YYYYMM, on
+the task database the events come from. Tables are created the first time
+an event for their month arrives, on SQLite and Postgres alike. Writes only
+touch the newest table, so its index stays small and hot. Old history is
+expired by dropping whole months (AUDIT_RETENTION_MONTHS, in the purger)
+instead of deleting rows.
+
+Rows are keyed by outbox event ID, so a batch that is relayed twice is
+stored once. The data column holds the event's snapshot as compact JSON,
+without null fields or the IDs that have columns of their own.
+"""
+
+import functools
+import json
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, Text, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import select
+from models import as_naive_utc
+
+PARTITION_PREFIX = "task_event_"
+_partition_pattern = re.compile(rf"^{PARTITION_PREFIX}(\d{{6}})$")
+# Snapshot fields already stored in columns, or meaningless in history
+_redundant_fields = {"id", "user_id", "task_id", "next_cursor"}
+
+# Kept apart from SQLModel.metadata: partitions are created on demand, not by startup.py
+audit_metadata = MetaData()
+
+# Partitions each database is known to have, by engine URL
+_known_partitions: Dict[str, Set[str]] = {}
+
+def month_of(value: datetime) -> str:
+    """The YYYYMM partition key of a time."""
+    return f"{value.year:04d}{value.month:02d}"
+
+@functools.lru_cache(maxsize=None)
+def partition_table(month: str) -> Table:
+    """
+    The log table of one month.
+
+    Args:
+        month: Partition key, YYYYMM
+
+    Returns:
+        Table: task_event_YYYYMM
+    """
+    name = f"{PARTITION_PREFIX}{month}"
+    return Table(
+        name,
+        audit_metadata,
+        Column("id", BigInteger, primary_key=True, autoincrement=False),  # The outbox event ID
+        Column("task_id", Integer, nullable=False),
+        Column("user_id", String(64), nullable=False),
+        Column("subtask_id", Integer),
+        Column("event_type", String(32), nullable=False),
+        Column("data", Text, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        # Serves a task's history, newest first
+        Index(f"ix_{name}_task_id", "task_id", "id"),
+    )
+
+def list_partitions(conn: Connection) -> List[str]:
+    """
+    List the months a database has log tables for.
+
+    Args:
+        conn: Connection of the task database
+
+    Returns:
+        List[str]: YYYYMM keys, newest first
+    """
+    months = [match.group(1) for match in map(_partition_pattern.match, inspect(conn).get_table_names()) if match]
+    return sorted(months, reverse=True)
+
+def _ensure_partition(conn: Connection, month: str) -> Table:
+    table = partition_table(month)
+    known = _known_partitions.setdefault(str(conn.engine.url), set())
+    if month not in known:
+        table.create(conn, checkfirst=True)
+        known.add(month)
+    return table
+
+def _compact(data: dict) -> str:
+    return json.dumps(
+        {key: value for key, value in data.items() if value is not None and key not in _redundant_fields},
+        separators=(",", ":")
+    )
+
+def append_events(conn: Connection, events: List[dict]) -> int:
+    """
+    Append outbox events to the log, without committing.
+
+    Args:
+        conn: Connection of the task database the events were read from
+        events: Outbox events, as read by the relay
+
+    Returns:
+        int: Number of events written (events already in the log are skipped)
+    """
+    by_month: Dict[str, List[dict]] = {}
+    for event in events:
+        created_at = datetime.fromisoformat(event["created_at"])
+        by_month.setdefault(month_of(created_at), []).append({
+            "id": event["id"],
+            "task_id": event["task_id"],
+            "user_id": event["user_id"],
+            "subtask_id": event["subtask_id"],
+            "event_type": event["event_type"],
+            "data": _compact(event["data"]),
+            "created_at": created_at,
+        })
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    written = 0
+    for month, rows in sorted(by_month.items()):
+        table = _ensure_partition(conn, month)
+        written += conn.execute(dialect.insert(table).on_conflict_do_nothing(), rows).rowcount
+    return written
+
+def copy_rows(conn: Connection, month: str, rows: List[dict]) -> None:
+    """
+    Insert log rows read from another database's month table, without committing.
+
+    Args:
+        conn: Connection of the task database to copy to
+        month: Partition key, YYYYMM
+        rows: Rows with every column of the month table
+    """
+    if rows:
+        conn.execute(_ensure_partition(conn, month).insert(), rows)
+
+def _encode_history_cursor(month: str, event_id: int) -> str:
+    return f"{month}_{event_id}"
+
+def _decode_history_cursor(cursor: str) -> Tuple[str, int]:
+    month, _, event_id = cursor.partition("_")
+    if not _partition_pattern.match(f"{PARTITION_PREFIX}{month}"):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return month, int(event_id)
+
+def get_task_history(
+    conn: Connection,
+    user_id: str,
+    task_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Get one page of a task's history, newest first.
+
+    Reads the month tables from the newest down, stopping once the page is
+    full. Each table is read off its (task_id, id) index.
+
+    Args:
+        conn: Connection of the task database
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        limit: Page size
+        cursor: next_cursor from the previous page
+        since: When the task was created, if known; older months are skipped
+
+    Returns:
+        tuple: (events with id, event_type, subtask_id, data and created_at, next page cursor or None)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    before_month, before_id = _decode_history_cursor(cursor) if cursor else (None, None)
+    oldest_month = month_of(since) if since is not None else None
+    rows: List[Tuple[str, dict]] = []
+    for month in list_partitions(conn):
+        if before_month is not None and month > before_month:
+            continue
+        if oldest_month is not None and month < oldest_month:
+            break
+        table = partition_table(month)
+        statement = (
+            select(table.c.id, table.c.event_type, table.c.subtask_id, table.c.data, table.c.created_at)
+            .where(table.c.task_id == task_id)
+            .where(table.c.user_id == user_id)
+            .order_by(table.c.id.desc())
+            .limit(limit + 1 - len(rows))
+        )
+        if month == before_month:
+            statement = statement.where(table.c.id < before_id)
+        rows.extend((month, dict(row)) for row in conn.execute(statement).mappings())
+        if len(rows) > limit:
+            break
+
+    page = [
+        {**row, "data": json.loads(row["data"]), "created_at": as_naive_utc(row["created_at"])}
+        for _, row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        month, row = rows[limit - 1]
+        next_cursor = _encode_history_cursor(month, row["id"])
+    return page, next_cursor
+
+def drop_expired_partitions(engine: Engine, now: datetime, keep_months: int) -> int:
+    """
+    Drop the log tables of months that have left the retention window.
+
+    Args:
+        engine: Engine of the task database
+        now: Current time
+        keep_months: Months kept before the current one
+
+    Returns:
+        int: Number of tables dropped
+    """
+    index = now.year * 12 + now.month - 1 - keep_months
+    oldest_kept = f"{index // 12:04d}{index % 12 + 1:02d}"
+    dropped = 0
+    with engine.begin() as conn:
+        for month in list_partitions(conn):
+            if month < oldest_kept:
+                partition_table(month).drop(conn)
+                _known_partitions.get(str(conn.engine.url), set()).discard(month)
+                dropped += 1
+    return dropped
@@ -1,27 +1,59 @@
 """
 Authentication service module for the Todo Application.
 
-This module provides functions for user authentication and authorization
-including registration, login, and token management.
+This module provides functions for user registration and login. Users are
+stored in the app_user table on the primary database with bcrypt password
+hashes. Tokens are issued by token_service.py and signed and checked by
+middleware/auth.py.
+
+Hashing is CPU-bound and slow by design (about 250 ms at the default 12
+rounds), so the auth routes are plain `def` endpoints: FastAPI runs them in
+its worker thread pool, off the event loop. Raising BCRYPT_ROUNDS
+rehashes each user's password at their next successful login.
 """
 
 from typing import Optional
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from datetime import datetime, timezone
+from functools import lru_cache
 import os
-from dotenv import load_dotenv
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from config import load_environment
+from models import User
 
 # Load environment variables
-load_dotenv()
+load_environment()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+_select_user_by_email = select(User).where(User.email == bindparam("email"))
+
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    """
+    Get the password hashing context, building it on first use.
+
+    passlib and bcrypt are imported here rather than at module level so
+    they stay off the cold-start import path.
+
+    Returns:
+        CryptContext: The password hashing context
+    """
+    from passlib.context import CryptContext
 
-# Initialize password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    # Hashes made with fewer rounds than BCRYPT_ROUNDS report that they need an update
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS
+    )
 
-# Get secret key and algorithm from environment variables
-SECRET_KEY = os.getenv("BETTER_AUTH_SECRET", "your-default-secret-key-change-in-production")
-ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))  # 7 days default
+@lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    # Verified against when the email is unknown, so both outcomes take as long
+    return get_password_hash("not-a-real-password")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -34,7 +66,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: True if passwords match, False otherwise
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """
@@ -46,72 +78,78 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: Hashed password
     """
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    """
-    Create a new access token.
-    
-    Args:
-        data: Data to encode in the token
-        expires_delta: Expiration time delta (optional)
-        
-    Returns:
-        str: Encoded JWT token
-    """
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+class EmailAlreadyRegistered(ValueError):
+    """Raised when registering an email that already has an account."""
 
-def verify_token(token: str) -> Optional[dict]:
+def normalize_email(email: str) -> str:
+    """Normalize an email address for storage and lookup."""
+    return email.strip().lower()
+
+def register_user(session: Session, user_id: str, email: str, password: str, name: str) -> User:
     """
-    Verify a JWT token and return the payload if valid.
-    
+    Create a user with a hashed password.
+
     Args:
-        token: JWT token to verify
-        
+        session: A session on the primary database
+        user_id: The ID to give the user
+        email: The user's email (unique, case-insensitive)
+        password: Plain text password
+        name: Display name
+
     Returns:
-        dict: Token payload if valid, None otherwise
+        User: The created user
+
+    Raises:
+        EmailAlreadyRegistered: If the email already has an account
     """
+    # Hash before touching the database, so no connection is held while hashing
+    password_hash = get_password_hash(password)
+    user = User(id=user_id, email=normalize_email(email), name=name, password_hash=password_hash)
+    session.add(user)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
-        return None
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise EmailAlreadyRegistered(f"{email} is already registered")
+    return user
 
-def authenticate_user(username: str, password: str) -> Optional[dict]:
+def authenticate_user(session: Session, email: str, password: str) -> Optional[User]:
     """
-    Authenticate a user by username and password.
-    
-    Note: This is a simplified implementation. In a real application,
-    you would look up the user in the database and verify the password.
-    
+    Authenticate a user by email and password.
+
+    One lookup on the unique email index and one hash check. If the stored
+    hash uses outdated parameters it is replaced with a fresh one.
+
     Args:
-        username: Username or email of the user
+        session: A session on the primary database
+        email: Email of the user
         password: Plain text password
-        
+
     Returns:
-        dict: User data if authentication successful, None otherwise
+        User: The user if the credentials are valid, None otherwise
     """
-    # In a real implementation, you would:
-    # 1. Look up the user in the database by username/email
-    # 2. Verify the password using verify_password()
-    # 3. Return user data if successful
-    
-    # For this example, we'll simulate successful authentication
-    # with mock user data
-    if username and password:  # Simplified check
-        return {
-            "id": f"mock-{username.split('@')[0]}-{hash(username)}",
-            "email": username,
-            "name": username.split('@')[0],
-            "created_at": datetime.utcnow().isoformat()
-        }
-    
-    return None
\ No newline at end of file
+    user = session.exec(_select_user_by_email, params={"email": normalize_email(email)}).first()
+    # Detach the user and end the read transaction, so no connection is held during the hash check
+    if user is not None:
+        session.expunge(user)
+    session.rollback()
+    if user is None or user.password_hash is None:
+        get_pwd_context().verify(password, _dummy_hash())
+        return None
+
+    valid, new_hash = get_pwd_context().verify_and_update(password, user.password_hash)
+    if not valid:
+        return None
+    if new_hash is not None:
+        # Rehash transparently; only replace the hash this check was made against
+        session.execute(
+            update(User.__table__)
+            .where(User.__table__.c.id == user.id)
+            .where(User.__table__.c.password_hash == user.password_hash)
+            .values(password_hash=new_hash, updated_at=datetime.now(timezone.utc))
+        )
+        session.commit()
+        user.password_hash = new_hash
+    return user
@@ -0,0 +1,119 @@
+"""
+Idempotency service module for the Todo Application.
+
+Clients may send an Idempotency-Key header with task and subtask POSTs.
+The first request stores its response in the idempotency_key table in the
+same transaction as the row it creates; a retry with the same key is
+answered from that row by primary key lookup, without running the insert
+again. Reusing a key for a different request is rejected. Keys expire after
+IDEMPOTENCY_TTL_SECONDS and are purged by purger.py.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import bindparam, delete, tuple_
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+from config import load_environment
+from models import IdempotencyKey, as_naive_utc
+
+# Load environment variables
+load_environment()
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+idempotency_table = IdempotencyKey.__table__
+
+_select_key = (
+    select(IdempotencyKey)
+    .where(IdempotencyKey.user_id == bindparam("user_id"))
+    .where(IdempotencyKey.key == bindparam("key"))
+)
+
+class IdempotencyKeyReused(ValueError):
+    """Raised when a key is sent again with a different request."""
+
+class IdempotentRequest:
+    """An incoming request that carries an Idempotency-Key."""
+
+    def __init__(self, user_id: str, key: str, method: str, path: str, body: dict):
+        self.user_id = user_id
+        self.key = key
+        canonical = json.dumps([method, path, body], sort_keys=True, default=str)
+        self.request_hash = hashlib.sha256(canonical.encode()).hexdigest()
+
+def find_replay(session: Session, request: IdempotentRequest) -> Optional[IdempotencyKey]:
+    """
+    Look up the stored response for a request's key.
+
+    An expired key is deleted so the request can run again.
+
+    Args:
+        session: The request's write session
+        request: The incoming request
+
+    Returns:
+        IdempotencyKey: The stored response, or None if the request should run
+
+    Raises:
+        IdempotencyKeyReused: If the key was used for a different request
+    """
+    stored = session.exec(_select_key, params={"user_id": request.user_id, "key": request.key}).first()
+    if stored is None:
+        return None
+    if as_naive_utc(stored.expires_at) <= as_naive_utc(datetime.now(timezone.utc)):
+        session.delete(stored)
+        session.flush()
+        return None
+    if stored.request_hash != request.request_hash:
+        raise IdempotencyKeyReused("Idempotency-Key was already used for a different request")
+    return stored
+
+def record_response(session: Session, request: IdempotentRequest, status_code: int, body: str) -> None:
+    """
+    Add a request's response to the session, to be committed with the row it created.
+
+    A concurrent request with the same key makes the commit fail with an
+    IntegrityError; the caller then replays the winner's response.
+
+    Args:
+        session: The request's write session
+        request: The incoming request
+        status_code: Response status code
+        body: Serialized JSON response body
+    """
+    session.add(IdempotencyKey(
+        user_id=request.user_id,
+        key=request.key,
+        request_hash=request.request_hash,
+        status_code=status_code,
+        response_body=body,
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    ))
+
+def purge_expired_keys(engine: Engine, now: datetime, batch_size: int = 500) -> int:
+    """
+    Delete one batch of expired keys.
+
+    Args:
+        engine: Engine of the task database to purge
+        now: Current time
+        batch_size: Maximum number of keys to delete
+
+    Returns:
+        int: Number of keys deleted
+    """
+    with engine.begin() as conn:
+        expired = conn.execute(
+            select(idempotency_table.c.user_id, idempotency_table.c.key)
+            .where(idempotency_table.c.expires_at < as_naive_utc(now))
+            .limit(batch_size)
+        ).all()
+        if expired:
+            conn.execute(delete(idempotency_table).where(
+                tuple_(idempotency_table.c.user_id, idempotency_table.c.key).in_([tuple(row) for row in expired])
+            ))
+    return len(expired)
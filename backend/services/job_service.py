@@ -0,0 +1,217 @@
+"""
+Job service module for the Todo Application.
+
+Work too slow for a request (imports, exports, archive and purge passes,
+counter repairs) is queued as a row in the job table on the primary
+database and run by worker.py, so no broker is needed and SQLite works too.
+
+A worker claims a due job with one conditional UPDATE ... RETURNING that
+marks it running and sets run_after to the end of a lease. If two workers
+pick the same job, only one UPDATE matches. A worker that dies leaves its
+job running with an expired lease, and the next claim picks it up again.
+Failed attempts are retried after an exponential backoff until the job
+runs out of attempts.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from sqlalchemy import bindparam, delete, update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+from config import load_environment
+from models import Job, JobStatusEnum, as_naive_utc
+
+# Load environment variables
+load_environment()
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "900"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "3600"))
+
+job_table = Job.__table__
+
+# Due jobs, oldest first, read from the (status, run_after) index; running jobs are due when their lease ends
+_select_due_jobs = (
+    select(job_table.c.id)
+    .where(job_table.c.status.in_([JobStatusEnum.queued, JobStatusEnum.running]))
+    .where(job_table.c.run_after <= bindparam("now"))
+    .order_by(job_table.c.run_after)
+    .limit(bindparam("limit"))
+)
+
+class PermanentJobError(Exception):
+    """Raised by a job handler for failures that retrying cannot fix."""
+
+def retry_delay(attempts: int) -> float:
+    """
+    Seconds to wait before retrying a job that has failed `attempts` times.
+
+    Args:
+        attempts: Attempts made so far (at least 1)
+
+    Returns:
+        float: JOB_RETRY_BASE_SECONDS doubled per failed attempt, capped at JOB_RETRY_MAX_SECONDS
+    """
+    return min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+def enqueue_job(
+    session: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    user_id: Optional[str] = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS
+) -> Job:
+    """
+    Queue a job to run as soon as a worker is free.
+
+    Args:
+        session: A session on the primary database
+        kind: The job handler to run
+        payload: JSON-serializable arguments for the handler
+        user_id: The user the job works for (None for maintenance jobs)
+        max_attempts: Attempts before the job is marked failed
+
+    Returns:
+        Job: The queued job
+    """
+    job = Job(user_id=user_id, kind=kind, payload=json.dumps(payload or {}), max_attempts=max_attempts)
+    session.add(job)
+    session.commit()
+    return job
+
+def get_user_job(session: Session, job_id: int, user_id: str) -> Optional[Job]:
+    """
+    Get one of a user's jobs.
+
+    Args:
+        session: A session on the primary database
+        job_id: The ID of the job
+        user_id: The ID of the user
+
+    Returns:
+        Job: The job, or None if there is none or it belongs to someone else
+    """
+    job = session.get(Job, job_id)
+    if job is None or job.user_id != user_id:
+        return None
+    return job
+
+def claim_job(engine: Engine, worker_id: str, now: Optional[datetime] = None, candidates: int = 10) -> Optional[Job]:
+    """
+    Claim the oldest due job for a worker.
+
+    Args:
+        engine: Engine of the primary database
+        worker_id: Name of the claiming worker
+        now: Current time (defaults to the wall clock)
+        candidates: Due jobs to try before giving up to other workers
+
+    Returns:
+        Job: The claimed job, now running under a lease, or None if nothing is due
+    """
+    now = as_naive_utc(now or datetime.now(timezone.utc))
+    with engine.begin() as conn:
+        # Jobs whose worker stopped during their last attempt are not retried
+        conn.execute(
+            update(job_table)
+            .where(job_table.c.status == JobStatusEnum.running)
+            .where(job_table.c.run_after <= now)
+            .where(job_table.c.attempts >= job_table.c.max_attempts)
+            .values(status=JobStatusEnum.failed, error="Worker stopped before the job finished",
+                    locked_by=None, finished_at=now, updated_at=now)
+        )
+        due = conn.execute(
+            _select_due_jobs.with_for_update(skip_locked=True), {"now": now, "limit": candidates}
+        ).scalars().all()
+        for job_id in due:
+            # Conditional on the job still being due, so only one worker wins it
+            row = conn.execute(
+                update(job_table)
+                .where(job_table.c.id == job_id)
+                .where(job_table.c.status.in_([JobStatusEnum.queued, JobStatusEnum.running]))
+                .where(job_table.c.run_after <= now)
+                .values(status=JobStatusEnum.running, attempts=job_table.c.attempts + 1, locked_by=worker_id,
+                        run_after=now + timedelta(seconds=JOB_LEASE_SECONDS), updated_at=now)
+                .returning(*job_table.c)
+            ).mappings().first()
+            if row is not None:
+                return Job(**row)
+    return None
+
+def complete_job(engine: Engine, job: Job, worker_id: str, result: Any = None) -> bool:
+    """
+    Record a claimed job's success.
+
+    Args:
+        engine: Engine of the primary database
+        job: The job, as returned by claim_job
+        worker_id: Name of the worker that ran it
+        result: JSON-serializable result for the job's status endpoint
+
+    Returns:
+        bool: False if the worker had lost the job's lease to another worker
+    """
+    now = as_naive_utc(datetime.now(timezone.utc))
+    with engine.begin() as conn:
+        return bool(conn.execute(
+            update(job_table)
+            .where(job_table.c.id == job.id)
+            .where(job_table.c.status == JobStatusEnum.running)
+            .where(job_table.c.locked_by == worker_id)
+            .values(status=JobStatusEnum.succeeded, result=json.dumps(result), error=None,
+                    locked_by=None, finished_at=now, updated_at=now)
+        ).rowcount)
+
+def fail_job(engine: Engine, job: Job, worker_id: str, error: str, permanent: bool = False, now: Optional[datetime] = None) -> bool:
+    """
+    Record a failed attempt: retry it after a backoff, or mark the job failed.
+
+    Args:
+        engine: Engine of the primary database
+        job: The job, as returned by claim_job
+        worker_id: Name of the worker that ran it
+        error: Description of the failure
+        permanent: Whether to give up without retrying
+        now: Current time (defaults to the wall clock)
+
+    Returns:
+        bool: True if the job will be retried
+    """
+    now = as_naive_utc(now or datetime.now(timezone.utc))
+    retry = not permanent and job.attempts < job.max_attempts
+    if retry:
+        values = {"status": JobStatusEnum.queued, "run_after": now + timedelta(seconds=retry_delay(job.attempts))}
+    else:
+        values = {"status": JobStatusEnum.failed, "finished_at": now}
+    with engine.begin() as conn:
+        conn.execute(
+            update(job_table)
+            .where(job_table.c.id == job.id)
+            .where(job_table.c.status == JobStatusEnum.running)
+            .where(job_table.c.locked_by == worker_id)
+            .values(**values, error=error[:1000], locked_by=None, updated_at=now)
+        )
+    return retry
+
+def purge_finished_jobs(engine: Engine, finished_before: datetime, batch_size: int = 500) -> int:
+    """
+    Delete one batch of jobs that finished before a cutoff.
+
+    Args:
+        engine: Engine of the primary database
+        finished_before: Only delete jobs finished before this time
+        batch_size: Maximum number of jobs to delete
+
+    Returns:
+        int: Number of jobs deleted
+    """
+    with engine.begin() as conn:
+        finished = (
+            select(job_table.c.id)
+            .where(job_table.c.finished_at < as_naive_utc(finished_before))
+            .limit(batch_size)
+        )
+        return conn.execute(delete(job_table).where(job_table.c.id.in_(finished))).rowcount
@@ -0,0 +1,286 @@
+"""
+Outbox service module for the Todo Application.
+
+Every task and subtask write also inserts an outbox_event row in the same
+transaction. Either both commit or neither does, so an event exists exactly
+when its change does. A request pays for that one insert no matter how many
+consumers are attached. Webhooks, search indexing and similar side effects
+run later: outbox.py relays the events in batches.
+
+Each consumer has its own cursor in outbox_cursor (per task database): the
+ID of the last event it accepted. A consumer that fails is retried from its
+cursor on the next pass, without holding up the others. Delivery is at least
+once: a consumer may see an event again if the relay stops between
+delivering and saving the cursor.
+
+Event IDs are taken at insert time but become visible at commit, so a long
+transaction can commit an event below one the cursor has already passed.
+The cursor therefore remembers the IDs it skipped (its gaps) and the relay
+reads them again on every pass, delivering them late if they turn up. A gap
+is forgotten once it has been missing for the relay's gap timeout: by then
+its transaction must have rolled back.
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, delete, func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import select
+from models import OutboxCursor, OutboxEvent, as_naive_utc
+
+outbox_table = OutboxEvent.__table__
+cursor_table = OutboxCursor.__table__
+
+# Every event type task_service records
+EVENT_TYPES = (
+    "task.created", "task.updated", "task.completed", "task.reopened",
+    "task.moved", "task.tagged", "task.deleted", "task.restored",
+    "task.archived", "task.purged",
+    "subtask.created", "subtask.updated", "subtask.moved", "subtask.deleted",
+)
+
+# Most skipped IDs a cursor remembers; beyond that the lowest are forgotten
+MAX_GAPS = 1000
+
+# Events after a cursor, in ID order, read off the primary key
+_select_events_after = (
+    select(outbox_table)
+    .where(outbox_table.c.id > bindparam("after_id"))
+    .order_by(outbox_table.c.id)
+    .limit(bindparam("limit"))
+)
+# Skipped events that have committed since
+_select_events_by_id = (
+    select(outbox_table)
+    .where(outbox_table.c.id.in_(bindparam("ids", expanding=True)))
+    .order_by(outbox_table.c.id)
+)
+_select_cursor = select(cursor_table.c.last_event_id, cursor_table.c.gaps).where(cursor_table.c.consumer == bindparam("consumer"))
+# UPDATE statements cannot bind parameters named after their columns
+_advance_cursor = (
+    update(cursor_table)
+    .where(cursor_table.c.consumer == bindparam("b_consumer"))
+    .where(cursor_table.c.last_event_id == bindparam("b_from_id"))
+    .values(last_event_id=bindparam("b_to_id"), gaps=bindparam("b_gaps"), updated_at=bindparam("b_now"))
+)
+
+def record_event(
+    session,
+    event_type: str,
+    user_id: str,
+    task_id: int,
+    subtask_id: Optional[int] = None,
+    data: Optional[dict] = None
+) -> None:
+    """
+    Add an event to the outbox inside the caller's transaction, without committing.
+
+    Args:
+        session: The session or connection of the transaction that made the change
+        event_type: What happened, such as task.updated
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        subtask_id: The ID of the subtask, for subtask events
+        data: JSON-serializable details of the change
+    """
+    record_events(session, [{
+        "event_type": event_type, "user_id": user_id, "task_id": task_id, "subtask_id": subtask_id, "data": data
+    }])
+
+def record_events(session, events: List[dict]) -> None:
+    """
+    Add many events to the outbox in one INSERT, without committing.
+
+    Args:
+        session: The session or connection of the transaction that made the changes
+        events: Dictionaries with record_event's arguments
+    """
+    if not events:
+        return
+    now = datetime.now(timezone.utc)
+    session.execute(outbox_table.insert(), [
+        {
+            "event_type": event["event_type"],
+            "user_id": event["user_id"],
+            "task_id": event["task_id"],
+            "subtask_id": event.get("subtask_id"),
+            "data": json.dumps(event.get("data") or {}),
+            "created_at": now,
+        }
+        for event in events
+    ])
+
+def _insert_cursor_ignoring_duplicates(conn: Connection):
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    return dialect.insert(cursor_table).on_conflict_do_nothing()
+
+def get_cursor(conn: Connection, consumer: str) -> Tuple[int, Dict[int, datetime]]:
+    """
+    Get a consumer's cursor, starting new consumers at the oldest retained event.
+
+    Args:
+        conn: Connection of the task database
+        consumer: The consumer's name
+
+    Returns:
+        tuple: (ID of the last event the consumer accepted, skipped IDs mapped to when they were first missed)
+    """
+    row = conn.execute(_select_cursor, {"consumer": consumer}).first()
+    if row is None:
+        conn.execute(_insert_cursor_ignoring_duplicates(conn), [{
+            "consumer": consumer, "last_event_id": 0, "updated_at": datetime.now(timezone.utc)
+        }])
+        row = conn.execute(_select_cursor, {"consumer": consumer}).first()
+    return row.last_event_id, _decode_gaps(row.gaps)
+
+def read_cursor(conn: Connection, consumer: str) -> Optional[Tuple[int, Dict[int, datetime]]]:
+    """
+    Get a consumer's cursor without writing.
+
+    Args:
+        conn: Connection of the task database, which may be read-only
+        consumer: The consumer's name
+
+    Returns:
+        tuple: Like get_cursor, or None if the consumer has no cursor yet
+    """
+    row = conn.execute(_select_cursor, {"consumer": consumer}).first()
+    if row is None:
+        return None
+    return row.last_event_id, _decode_gaps(row.gaps)
+
+def _decode_gaps(encoded: Optional[str]) -> Dict[int, datetime]:
+    return {int(event_id): datetime.fromisoformat(missed_at) for event_id, missed_at in json.loads(encoded or "{}").items()}
+
+def read_events(conn: Connection, after_id: int, limit: int, gap_ids: Iterable[int] = ()) -> List[dict]:
+    """
+    Read the next batch of events after a cursor, and any of its gaps that have committed since.
+
+    Args:
+        conn: Connection of the task database
+        after_id: The consumer's cursor
+        limit: Maximum number of events after the cursor
+        gap_ids: IDs the cursor skipped
+
+    Returns:
+        List[dict]: Events in ID order, with id, event_type, user_id, task_id, subtask_id, data and created_at
+    """
+    rows = conn.execute(_select_events_after, {"after_id": after_id, "limit": limit}).mappings().all()
+    gap_ids = list(gap_ids)
+    if gap_ids:
+        rows = [*conn.execute(_select_events_by_id, {"ids": gap_ids}).mappings().all(), *rows]
+    return [
+        {**row, "data": json.loads(row["data"]), "created_at": as_naive_utc(row["created_at"]).isoformat()}
+        for row in rows
+    ]
+
+def next_position(
+    after_id: int,
+    gaps: Dict[int, datetime],
+    events: List[dict],
+    now: datetime,
+    gap_timeout: float
+) -> Tuple[int, Dict[int, datetime]]:
+    """
+    Work out where a cursor moves once a batch from read_events is delivered.
+
+    IDs missing between the cursor and the batch's last event become gaps,
+    gaps found in the batch are closed, and gaps missing for longer than
+    gap_timeout are dropped. A new cursor (0) starts at the oldest retained
+    event, so nothing below it counts as a gap.
+
+    Args:
+        after_id: The cursor the batch was read after
+        gaps: The cursor's gaps before the batch
+        events: The batch, in ID order
+        now: Current time
+        gap_timeout: Seconds after which a missing event is assumed rolled back
+
+    Returns:
+        tuple: (new cursor, its gaps)
+    """
+    now = as_naive_utc(now)
+    found = {event["id"] for event in events}
+    gaps = {
+        event_id: missed_at for event_id, missed_at in gaps.items()
+        if event_id not in found and (now - missed_at).total_seconds() < gap_timeout
+    }
+    new_ids = [event["id"] for event in events if event["id"] > after_id]
+    if not new_ids:
+        return after_id, gaps
+    # Newest gaps first, so a long run of skipped IDs cannot crowd out recent ones
+    previous = after_id if after_id else new_ids[0]
+    missing: List[int] = []
+    for low, high in reversed(list(zip([previous, *new_ids], new_ids))):
+        missing.extend(range(high - 1, max(low, high - 1 - MAX_GAPS), -1))
+        if len(missing) >= MAX_GAPS:
+            break
+    gaps.update({event_id: now for event_id in missing})
+    if len(gaps) > MAX_GAPS:
+        print(f"Outbox cursor has more than {MAX_GAPS} gaps; forgetting the oldest")
+        gaps = dict(sorted(gaps.items())[-MAX_GAPS:])
+    return new_ids[-1], gaps
+
+def advance_cursor(conn: Connection, consumer: str, from_id: int, to_id: int, gaps: Optional[Dict[int, datetime]] = None) -> bool:
+    """
+    Move a consumer's cursor forward after a delivery.
+
+    Args:
+        conn: Connection of the task database
+        consumer: The consumer's name
+        from_id: The cursor the delivered batch was read after
+        to_id: ID of the last delivered event
+        gaps: The cursor's gaps from next_position
+
+    Returns:
+        bool: False if another relay moved the cursor in the meantime (the cursor is left alone)
+    """
+    encoded = json.dumps({str(event_id): missed_at.isoformat() for event_id, missed_at in gaps.items()}) if gaps else None
+    return bool(conn.execute(_advance_cursor, {
+        "b_consumer": consumer, "b_from_id": from_id, "b_to_id": to_id, "b_gaps": encoded, "b_now": datetime.now(timezone.utc)
+    }).rowcount)
+
+def get_cursors(engine: Engine) -> Dict[str, int]:
+    """
+    Get every consumer's cursor on a task database.
+
+    Args:
+        engine: Engine of the task database
+
+    Returns:
+        dict: Consumer name mapped to the ID of the last event it accepted
+    """
+    with engine.connect() as conn:
+        return dict(conn.execute(select(cursor_table.c.consumer, cursor_table.c.last_event_id)).all())
+
+def purge_delivered_events(engine: Engine, created_before: datetime, batch_size: int = 500) -> int:
+    """
+    Delete one batch of old events that every consumer has accepted.
+
+    A consumer that is gone for good holds events back until its
+    outbox_cursor row is deleted. While no consumer has a cursor at all,
+    nothing will ever read the events, so they are deleted by age alone.
+
+    Args:
+        engine: Engine of the task database
+        created_before: Only delete events created before this time
+        batch_size: Maximum number of events to delete
+
+    Returns:
+        int: Number of events deleted
+    """
+    with engine.begin() as conn:
+        delivered = conn.execute(select(func.min(cursor_table.c.last_event_id))).scalar()
+        if delivered == 0:
+            return 0
+        old = (
+            select(outbox_table.c.id)
+            .where(outbox_table.c.created_at < as_naive_utc(created_before))
+            .order_by(outbox_table.c.id)
+            .limit(batch_size)
+        )
+        if delivered is not None:
+            old = old.where(outbox_table.c.id <= delivered)
+        return conn.execute(delete(outbox_table).where(outbox_table.c.id.in_(old))).rowcount
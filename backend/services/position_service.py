@@ -0,0 +1,391 @@
+"""
+Position service module for the Todo Application.
+
+Tasks and subtasks are ordered by a `position` string compared byte by
+byte. Keys follow the fractional indexing scheme used by Figma and
+rocicorp's fractional-indexing library: a variable-length base62 integer
+part followed by a fraction, so a key can always be generated between any
+two others and moving an item rewrites only that item's row.
+
+Keys grow when items are repeatedly inserted into the same gap. The
+rebalancer (rebalancer.py) rewrites the lists that contain keys longer
+than POSITION_MAX_LENGTH with short, evenly spaced keys.
+"""
+
+import os
+from typing import Callable, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+from config import load_environment
+from models import Task, Subtask
+
+# Load environment variables
+load_environment()
+
+POSITION_MAX_LENGTH = int(os.getenv("POSITION_MAX_LENGTH", "24"))
+
+BASE_62_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+SMALLEST_INTEGER = "A" + BASE_62_DIGITS[0] * 26
+
+task_table = Task.__table__
+subtask_table = Subtask.__table__
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    # Fraction strictly between a and b ("" is the smallest fraction, None the largest)
+    zero = BASE_62_DIGITS[0]
+    if b is not None:
+        # Skip the common prefix, padding a with zeros
+        n = 0
+        while (a[n] if n < len(a) else zero) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    digit_a = BASE_62_DIGITS.index(a[0]) if a else 0
+    digit_b = BASE_62_DIGITS.index(b[0]) if b is not None else len(BASE_62_DIGITS)
+    if digit_b - digit_a > 1:
+        return BASE_62_DIGITS[round((digit_a + digit_b) / 2)]
+    # The digits are consecutive
+    if b is not None and len(b) > 1:
+        return b[:1]
+    return BASE_62_DIGITS[digit_a] + _midpoint(a[1:], None)
+
+def _integer_length(head: str) -> int:
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"Invalid position key head: {head!r}")
+
+def _split_key(key: str) -> tuple:
+    if not key or key == SMALLEST_INTEGER:
+        raise ValueError(f"Invalid position key: {key!r}")
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"Invalid position key: {key!r}")
+    integer, fraction = key[:length], key[length:]
+    if fraction.endswith(BASE_62_DIGITS[0]):
+        raise ValueError(f"Invalid position key: {key!r}")
+    return integer, fraction
+
+def _increment_integer(integer: str) -> Optional[str]:
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = BASE_62_DIGITS.index(digits[i]) + 1
+        if d < len(BASE_62_DIGITS):
+            digits[i] = BASE_62_DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = BASE_62_DIGITS[0]
+    # Carried out of the integer: move to the next length
+    if head == "Z":
+        return "a" + BASE_62_DIGITS[0]
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digits.append(BASE_62_DIGITS[0])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+def _decrement_integer(integer: str) -> Optional[str]:
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = BASE_62_DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = BASE_62_DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = BASE_62_DIGITS[-1]
+    # Borrowed out of the integer: move to the previous length
+    if head == "a":
+        return "Z" + BASE_62_DIGITS[-1]
+    if head == "A":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digits.append(BASE_62_DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+def key_between(a: Optional[str], b: Optional[str]) -> str:
+    """
+    Generate a position key that sorts strictly between two others.
+
+    Args:
+        a: Key of the item before (None for the start of the list)
+        b: Key of the item after (None for the end of the list)
+
+    Returns:
+        str: The new key
+
+    Raises:
+        ValueError: If a key is malformed or a is not before b
+    """
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"Position {a!r} is not before {b!r}")
+    if a is None and b is None:
+        return "a" + BASE_62_DIGITS[0]
+
+    if a is None:
+        integer_b, fraction_b = _split_key(b)
+        if integer_b == SMALLEST_INTEGER:
+            return integer_b + _midpoint("", fraction_b)
+        if integer_b < b:
+            return integer_b
+        decremented = _decrement_integer(integer_b)
+        if decremented is None:
+            raise ValueError("Cannot generate a position before the smallest key")
+        return decremented
+
+    integer_a, fraction_a = _split_key(a)
+    if b is None:
+        incremented = _increment_integer(integer_a)
+        return integer_a + _midpoint(fraction_a, None) if incremented is None else incremented
+
+    integer_b, fraction_b = _split_key(b)
+    if integer_a == integer_b:
+        return integer_a + _midpoint(fraction_a, fraction_b)
+    incremented = _increment_integer(integer_a)
+    if incremented is not None and incremented < b:
+        return incremented
+    return integer_a + _midpoint(fraction_a, None)
+
+def evenly_spaced_keys(count: int) -> List[str]:
+    """
+    Generate short ascending keys for a whole list, as used by the rebalancer.
+
+    Args:
+        count: Number of keys
+
+    Returns:
+        List[str]: Keys in ascending order
+    """
+    keys = []
+    key = None
+    for _ in range(count):
+        key = key_between(key, None)
+        keys.append(key)
+    return keys
+
+def renumber_user_tasks(conn: Connection, user_id: str) -> int:
+    """
+    Give every task of a user a fresh short key, keeping the current order.
+
+    Args:
+        conn: Connection inside the caller's transaction
+        user_id: The ID of the user
+
+    Returns:
+        int: Number of tasks renumbered
+    """
+    task_ids = conn.execute(
+        select(task_table.c.id)
+        .where(task_table.c.user_id == user_id)
+        .order_by(task_table.c.position, task_table.c.id)
+    ).scalars().all()
+    for task_id, key in zip(task_ids, evenly_spaced_keys(len(task_ids))):
+        conn.execute(task_table.update().where(task_table.c.id == task_id).values(position=key, version=task_table.c.version + 1))
+    return len(task_ids)
+
+def renumber_task_subtasks(conn: Connection, task_id: int) -> int:
+    """
+    Give every subtask of a task a fresh short key, keeping the current order.
+
+    Args:
+        conn: Connection inside the caller's transaction
+        task_id: The ID of the parent task
+
+    Returns:
+        int: Number of subtasks renumbered
+    """
+    subtask_ids = conn.execute(
+        select(subtask_table.c.id)
+        .where(subtask_table.c.task_id == task_id)
+        .order_by(subtask_table.c.position, subtask_table.c.id)
+    ).scalars().all()
+    for subtask_id, key in zip(subtask_ids, evenly_spaced_keys(len(subtask_ids))):
+        conn.execute(subtask_table.update().where(subtask_table.c.id == subtask_id).values(position=key, version=subtask_table.c.version + 1))
+    return len(subtask_ids)
+
+def _task_list(user_id: str) -> list:
+    # A user's visible task list; soft-deleted tasks keep their keys for a restore
+    return [task_table.c.user_id == user_id, task_table.c.deleted_at.is_(None)]
+
+def _subtask_list(task_id: int) -> list:
+    return [subtask_table.c.task_id == task_id]
+
+def _append_position(conn: Connection, table, scope: list) -> str:
+    last = conn.execute(select(func.max(table.c.position)).where(*scope)).scalar()
+    return key_between(last, None)
+
+def _position_between(
+    conn: Connection,
+    table,
+    scope: list,
+    item_id: int,
+    after_id: Optional[int],
+    before_id: Optional[int],
+    renumber: Callable[[], int]
+) -> Optional[str]:
+    if after_id is None and before_id is None:
+        raise ValueError("A move needs after_id or before_id")
+    if item_id in (after_id, before_id):
+        raise ValueError("An item cannot be moved next to itself")
+    others = [*scope, table.c.id != item_id]
+
+    for attempt in range(2):
+        neighbours = dict(conn.execute(
+            select(table.c.id, table.c.position).where(*others).where(table.c.id.in_([n for n in (after_id, before_id) if n is not None]))
+        ).all())
+        if any(neighbour is not None and neighbour not in neighbours for neighbour in (after_id, before_id)):
+            return None
+        after, before = neighbours.get(after_id), neighbours.get(before_id)
+
+        # With one neighbour given, the other side is whatever is adjacent to it now
+        if after_id is not None and before_id is None and after is not None:
+            before = conn.execute(select(func.min(table.c.position)).where(*others).where(table.c.position > after)).scalar()
+        elif before_id is not None and after_id is None and before is not None:
+            after = conn.execute(select(func.max(table.c.position)).where(*others).where(table.c.position < before)).scalar()
+
+        unkeyed = (after_id is not None and after is None) or (before_id is not None and before is None)
+        if not unkeyed:
+            try:
+                return key_between(after, before)
+            except ValueError:
+                if attempt:
+                    raise
+        elif attempt:
+            raise ValueError("Position keys are missing after renumbering")
+        # Neighbours share a key (concurrent moves into one gap) or have none yet
+        renumber()
+
+def append_task_position(conn: Connection, user_id: str) -> str:
+    """
+    Get the key that puts a new task at the end of a user's list.
+
+    Args:
+        conn: Connection inside the caller's transaction
+        user_id: The ID of the user
+
+    Returns:
+        str: The new key
+    """
+    return _append_position(conn, task_table, _task_list(user_id))
+
+def append_subtask_position(conn: Connection, task_id: int) -> str:
+    """
+    Get the key that puts a new subtask at the end of its task's list.
+
+    Args:
+        conn: Connection inside the caller's transaction
+        task_id: The ID of the parent task
+
+    Returns:
+        str: The new key
+    """
+    return _append_position(conn, subtask_table, _subtask_list(task_id))
+
+def task_position_between(
+    conn: Connection,
+    user_id: str,
+    task_id: int,
+    after_id: Optional[int],
+    before_id: Optional[int]
+) -> Optional[str]:
+    """
+    Get the key that moves a task between two of the user's other tasks.
+
+    With only after_id the task goes right after that task, with only
+    before_id right before it. Neighbours whose keys collide are fixed by
+    renumbering the list first, inside the caller's transaction.
+
+    Args:
+        conn: Connection inside the caller's write transaction
+        user_id: The ID of the user
+        task_id: The ID of the task being moved
+        after_id: The task that should come before it
+        before_id: The task that should come after it
+
+    Returns:
+        str: The new key, or None if a neighbour is not in the user's list
+
+    Raises:
+        ValueError: If no neighbour is given, the task is its own neighbour,
+            or after_id does not come before before_id
+    """
+    return _position_between(
+        conn, task_table, _task_list(user_id), task_id, after_id, before_id,
+        lambda: renumber_user_tasks(conn, user_id)
+    )
+
+def subtask_position_between(
+    conn: Connection,
+    task_id: int,
+    subtask_id: int,
+    after_id: Optional[int],
+    before_id: Optional[int]
+) -> Optional[str]:
+    """
+    Get the key that moves a subtask between two other subtasks of its task.
+
+    Args:
+        conn: Connection inside the caller's write transaction
+        task_id: The ID of the parent task
+        subtask_id: The ID of the subtask being moved
+        after_id: The subtask that should come before it
+        before_id: The subtask that should come after it
+
+    Returns:
+        str: The new key, or None if a neighbour is not a subtask of the task
+
+    Raises:
+        ValueError: If no neighbour is given, the subtask is its own neighbour,
+            or after_id does not come before before_id
+    """
+    return _position_between(
+        conn, subtask_table, _subtask_list(task_id), subtask_id, after_id, before_id,
+        lambda: renumber_task_subtasks(conn, task_id)
+    )
+
+def backfill_task_positions(conn: Connection) -> None:
+    """Migration step: number every user's existing tasks in creation order."""
+    for user_id in conn.execute(select(task_table.c.user_id).distinct()).scalars().all():
+        renumber_user_tasks(conn, user_id)
+
+def backfill_subtask_positions(conn: Connection) -> None:
+    """Migration step: number every task's existing subtasks in creation order."""
+    for task_id in conn.execute(select(subtask_table.c.task_id).distinct()).scalars().all():
+        renumber_task_subtasks(conn, task_id)
+
+def rebalance(engine, max_length: int = POSITION_MAX_LENGTH) -> tuple:
+    """
+    Renumber every list that holds a key longer than max_length.
+
+    Args:
+        engine: Engine of the task database to rebalance
+        max_length: Longest acceptable key
+
+    Returns:
+        tuple: (user IDs whose task lists were renumbered,
+        (user ID, task ID) pairs whose subtask lists were renumbered)
+    """
+    with engine.connect() as conn:
+        user_ids = conn.execute(
+            select(task_table.c.user_id).where(func.length(task_table.c.position) > max_length).distinct()
+        ).scalars().all()
+        subtask_lists = conn.execute(
+            select(task_table.c.user_id, subtask_table.c.task_id)
+            .join(task_table, task_table.c.id == subtask_table.c.task_id)
+            .where(func.length(subtask_table.c.position) > max_length)
+            .distinct()
+        ).all()
+
+    # One short transaction per list
+    for user_id in user_ids:
+        with engine.begin() as conn:
+            renumber_user_tasks(conn, user_id)
+    for _, task_id in subtask_lists:
+        with engine.begin() as conn:
+            renumber_task_subtasks(conn, task_id)
+    return user_ids, [tuple(row) for row in subtask_lists]
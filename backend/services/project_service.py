@@ -0,0 +1,222 @@
+"""
+Project service module for the Todo Application.
+
+Projects group a user's tasks by reference (Task.project_id) instead of by
+the free-text category string, so renaming a project is one row update.
+Each project keeps counts of its live tasks (not deleted or archived) and
+of the completed ones. Every task write that adds a task to a project, takes
+one out, or completes one applies the change to the counts in the same
+transaction through adjust_project_counts(), so reading the counts never
+scans tasks. recount_projects() rebuilds them from the tasks if they ever
+drift.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, case, func, update
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+from models import Project, Task
+
+project_table = Project.__table__
+task_table = Task.__table__
+
+# Projects in name order, read straight off the (user_id, name) index
+_select_user_projects = (
+    select(Project)
+    .where(Project.user_id == bindparam("user_id"))
+    .order_by(Project.name)
+)
+# UPDATE statements cannot bind parameters named after their columns
+_adjust_counts = (
+    update(project_table)
+    .where(project_table.c.id == bindparam("b_project_id"))
+    .where(project_table.c.user_id == bindparam("b_user_id"))
+    .values(
+        task_count=project_table.c.task_count + bindparam("b_tasks"),
+        completed_count=project_table.c.completed_count + bindparam("b_completed")
+    )
+)
+
+class ProjectNotFound(ValueError):
+    """Raised when a task is put in a project that does not exist or belongs to another user."""
+
+def count_changes(
+    before: Optional[Tuple[Optional[int], bool]],
+    after: Optional[Tuple[Optional[int], bool]]
+) -> Dict[int, List[int]]:
+    """
+    Work out the counter changes when a live task goes from one state to another.
+
+    Args:
+        before: (project_id, completed) before the write, or None if the task was not live
+        after: (project_id, completed) after the write, or None if the task is no longer live
+
+    Returns:
+        dict: Project ID mapped to [task count change, completed count change]
+    """
+    changes: Dict[int, List[int]] = {}
+    for state, sign in ((before, -1), (after, 1)):
+        if state is not None and state[0] is not None:
+            change = changes.setdefault(state[0], [0, 0])
+            change[0] += sign
+            change[1] += sign if state[1] else 0
+    return {project_id: change for project_id, change in changes.items() if change != [0, 0]}
+
+def adjust_project_counts(session, user_id: str, changes: Dict[int, List[int]]) -> None:
+    """
+    Apply counter changes to a user's projects, without committing.
+
+    Projects are updated in ID order, so concurrent writes lock them in the
+    same order.
+
+    Args:
+        session: The session or connection of the transaction that changed the tasks
+        user_id: The ID of the user who owns the projects
+        changes: Project ID mapped to [task count change, completed count change]
+
+    Raises:
+        ProjectNotFound: If a project gaining tasks does not belong to the user
+    """
+    for project_id in sorted(changes):
+        tasks, completed = changes[project_id]
+        updated = session.execute(_adjust_counts, {
+            "b_project_id": project_id, "b_user_id": user_id, "b_tasks": tasks, "b_completed": completed
+        }).rowcount
+        if not updated and tasks > 0:
+            raise ProjectNotFound(f"Project {project_id} not found")
+
+def get_user_projects(session: Session, user_id: str) -> List[Project]:
+    """
+    Get a user's projects with their task counts, in name order.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user
+
+    Returns:
+        List[Project]: The user's projects
+    """
+    return session.exec(_select_user_projects, params={"user_id": user_id}).all()
+
+def create_project(session: Session, user_id: str, name: str) -> Project:
+    """
+    Create an empty project for a user.
+
+    Args:
+        session: The request's write session
+        user_id: The ID of the user
+        name: The project's name
+
+    Returns:
+        Project: The created project
+
+    Raises:
+        IntegrityError: If the user already has a project with that name
+    """
+    project = Project(user_id=user_id, name=name)
+    session.add(project)
+    session.commit()
+    return project
+
+def rename_project(session: Session, user_id: str, project_id: int, name: str) -> Optional[Project]:
+    """
+    Rename a project with a single UPDATE; its tasks are not touched.
+
+    Args:
+        session: The request's write session
+        user_id: The ID of the user who owns the project
+        project_id: The ID of the project
+        name: The new name
+
+    Returns:
+        Project: The renamed project, or None if the user has no such project
+
+    Raises:
+        IntegrityError: If the user already has a project with that name
+    """
+    project = session.scalars(
+        update(Project)
+        .where(Project.id == project_id)
+        .where(Project.user_id == user_id)
+        .values(name=name, updated_at=datetime.now(timezone.utc))
+        .returning(Project),
+        execution_options={"synchronize_session": False}
+    ).first()
+    session.commit()
+    return project
+
+def _project_counts_query(project_ids: Optional[Iterable[int]] = None):
+    live = task_table.c.deleted_at.is_(None)
+    query = (
+        select(
+            task_table.c.project_id,
+            func.count().label("task_count"),
+            func.coalesce(func.sum(case((task_table.c.completed, 1), else_=0)), 0).label("completed_count")
+        )
+        .where(task_table.c.project_id.is_not(None))
+        .where(live)
+        .group_by(task_table.c.project_id)
+    )
+    if project_ids is not None:
+        query = query.where(task_table.c.project_id.in_(list(project_ids)))
+    return query
+
+def recount_projects(conn: Connection, project_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Rebuild project counters from the tasks, without committing.
+
+    Args:
+        conn: Connection of the task database, inside a transaction
+        project_ids: Projects to recount (default: every project)
+
+    Returns:
+        int: Number of projects recounted
+    """
+    if project_ids is not None:
+        project_ids = list(project_ids)
+        if not project_ids:
+            return 0
+    counts = {row.project_id: (row.task_count, row.completed_count) for row in conn.execute(_project_counts_query(project_ids))}
+    projects = select(project_table.c.id)
+    if project_ids is not None:
+        projects = projects.where(project_table.c.id.in_(project_ids))
+    recounted = 0
+    for project_id in conn.execute(projects).scalars().all():
+        task_count, completed_count = counts.get(project_id, (0, 0))
+        conn.execute(
+            update(project_table)
+            .where(project_table.c.id == project_id)
+            .values(task_count=task_count, completed_count=completed_count)
+        )
+        recounted += 1
+    return recounted
+
+def backfill_task_projects(conn: Connection) -> None:
+    """
+    Turn existing categories into projects when Task.project_id is first added.
+
+    Every distinct (user, category) pair becomes a project of that name, and
+    its tasks are pointed at it.
+
+    Args:
+        conn: Connection of the database being migrated, inside its transaction
+    """
+    now = datetime.now(timezone.utc)
+    pairs = conn.execute(
+        select(task_table.c.user_id, task_table.c.category)
+        .where(task_table.c.category.is_not(None))
+        .where(task_table.c.category != "")
+        .distinct()
+    ).all()
+    for user_id, category in pairs:
+        project_id = conn.execute(project_table.insert().values(
+            user_id=user_id, name=category, task_count=0, completed_count=0, created_at=now, updated_at=now
+        )).inserted_primary_key[0]
+        conn.execute(
+            update(task_table)
+            .where(task_table.c.user_id == user_id)
+            .where(task_table.c.category == category)
+            .values(project_id=project_id)
+        )
+    recount_projects(conn)
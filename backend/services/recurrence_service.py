@@ -0,0 +1,260 @@
+"""
+Recurrence service module for the Todo Application.
+
+This module parses task recurrence rules and computes occurrence dates.
+A rule is one of the shorthands "daily", "weekly" and "monthly", or an
+iCalendar RRULE using the subset FREQ (DAILY, WEEKLY, MONTHLY), INTERVAL,
+BYDAY (weekly rules), BYMONTHDAY (monthly rules) and UNTIL, for example
+"FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH". As in RFC 5545, a monthly rule on
+a day a month does not have (such as the 31st) skips that month; a rule
+whose interval only ever reaches such months (INTERVAL=12;BYMONTHDAY=31
+from February) is refused for that due date, and ends a series if met.
+
+Occurrences are stored as ordinary tasks. Only the latest occurrence of a
+series, its tail, may spawn the next one, and the spawned_next flag is
+flipped with a conditional UPDATE so concurrent readers never spawn the
+same occurrence twice.
+"""
+
+import argparse
+import functools
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session
+from config import load_environment
+from models import Task, as_naive_utc
+from services.position_service import append_task_position
+from services.project_service import adjust_project_counts
+
+# Load environment variables
+load_environment()
+
+RECURRENCE_WINDOW_DAYS = float(os.getenv("RECURRENCE_WINDOW_DAYS", "14"))
+RECURRENCE_MAX_WINDOW_DAYS = float(os.getenv("RECURRENCE_MAX_WINDOW_DAYS", "92"))
+
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+# (month, leap year) pairs repeat every 48 months, so a monthly rule that
+# finds no date within 48 steps never will; a second cycle covers century
+# years that skip their leap day
+MAX_MONTHLY_STEPS = 96
+SHORTHANDS = {"daily": "FREQ=DAILY", "weekly": "FREQ=WEEKLY", "monthly": "FREQ=MONTHLY"}
+
+class RecurrenceRule:
+    """A parsed recurrence rule."""
+
+    def __init__(
+        self,
+        freq: str,
+        interval: int = 1,
+        weekdays: Tuple[int, ...] = (),
+        month_day: Optional[int] = None,
+        until: Optional[datetime] = None
+    ):
+        self.freq = freq
+        self.interval = interval
+        self.weekdays = weekdays
+        self.month_day = month_day
+        self.until = until
+
+@functools.lru_cache(maxsize=1024)
+def parse_rule(rule: str) -> RecurrenceRule:
+    """
+    Parse a recurrence rule.
+
+    Args:
+        rule: A shorthand ("daily", "weekly", "monthly") or an RRULE string
+
+    Returns:
+        RecurrenceRule: The parsed rule
+
+    Raises:
+        ValueError: If the rule is malformed or uses unsupported parts
+    """
+    text = SHORTHANDS.get(rule.strip().lower(), rule.strip())
+    text = text.removeprefix("RRULE:")
+    parts = {}
+    for part in text.split(";"):
+        name, separator, value = part.partition("=")
+        if not separator or not value:
+            raise ValueError(f"Malformed recurrence rule part: {part!r}")
+        parts[name.strip().upper()] = value.strip().upper()
+
+    freq = parts.pop("FREQ", None)
+    if freq not in ("DAILY", "WEEKLY", "MONTHLY"):
+        raise ValueError("Recurrence FREQ must be DAILY, WEEKLY or MONTHLY")
+
+    interval = int(parts.pop("INTERVAL", "1"))
+    if not 1 <= interval <= 366:
+        raise ValueError("Recurrence INTERVAL must be between 1 and 366")
+
+    weekdays = ()
+    if "BYDAY" in parts:
+        if freq != "WEEKLY":
+            raise ValueError("BYDAY is only supported for weekly rules")
+        try:
+            weekdays = tuple(sorted({WEEKDAYS.index(day) for day in parts.pop("BYDAY").split(",")}))
+        except ValueError:
+            raise ValueError("BYDAY must be a list of MO, TU, WE, TH, FR, SA, SU")
+
+    month_day = None
+    if "BYMONTHDAY" in parts:
+        if freq != "MONTHLY":
+            raise ValueError("BYMONTHDAY is only supported for monthly rules")
+        month_day = int(parts.pop("BYMONTHDAY"))
+        if not 1 <= month_day <= 31:
+            raise ValueError("BYMONTHDAY must be between 1 and 31")
+
+    until = None
+    if "UNTIL" in parts:
+        value = parts.pop("UNTIL").rstrip("Z")
+        until = datetime.strptime(value, "%Y%m%dT%H%M%S" if "T" in value else "%Y%m%d")
+
+    if parts:
+        raise ValueError(f"Unsupported recurrence rule parts: {', '.join(sorted(parts))}")
+    return RecurrenceRule(freq, interval, weekdays, month_day, until)
+
+def validate_rule(rule: Optional[str]) -> Optional[str]:
+    """Pydantic validator helper: check a rule parses and return it stripped."""
+    if rule is None or not rule.strip():
+        return None
+    parse_rule(rule)
+    return rule.strip()
+
+def validate_schedule(rule: Optional[str], due_date: Optional[datetime]) -> None:
+    """
+    Check that a rule produces an occurrence after a due date.
+
+    A monthly rule can only ever land on some months, for example
+    "FREQ=MONTHLY;INTERVAL=12;BYMONTHDAY=31" starting in February, and such
+    a series would never recur.
+
+    Args:
+        rule: The recurrence rule, if any
+        due_date: The first occurrence's due date, if any
+
+    Raises:
+        ValueError: If the rule can never produce a date after the due date
+    """
+    if not rule or due_date is None:
+        return
+    parsed = parse_rule(rule)
+    due_date = as_naive_utc(due_date)
+    # UNTIL may legitimately end the series at once; only the pattern itself is checked
+    pattern = RecurrenceRule(parsed.freq, parsed.interval, parsed.weekdays, parsed.month_day)
+    if next_occurrence(pattern, due_date, due_date) is None:
+        raise ValueError("Recurrence rule never produces a date after the due date")
+
+def _add_months(value: datetime, months: int, day: int) -> Optional[datetime]:
+    month_index = value.year * 12 + value.month - 1 + months
+    try:
+        return value.replace(year=month_index // 12, month=month_index % 12 + 1, day=day)
+    except ValueError:
+        return None  # The month has no such day
+
+def next_occurrence(rule: RecurrenceRule, previous: datetime, not_before: datetime) -> Optional[datetime]:
+    """
+    Get the first occurrence after a previous one that is not before a given time.
+
+    Occurrences missed while nobody looked are skipped rather than back-filled.
+
+    Args:
+        rule: The series' rule
+        previous: Due date of the previous occurrence
+        not_before: Earliest acceptable due date (usually now)
+
+    Returns:
+        datetime: The next due date, or None if the series has ended
+    """
+    if rule.freq == "MONTHLY":
+        day = rule.month_day or previous.day
+        # Jump close to not_before in whole intervals before stepping
+        gap = (not_before.year - previous.year) * 12 + not_before.month - previous.month
+        step = max(1, gap // rule.interval)
+        for step in range(step, step + MAX_MONTHLY_STEPS):
+            candidate = _add_months(previous, step * rule.interval, day)
+            if candidate is not None and candidate > previous and candidate >= not_before:
+                break
+        else:
+            return None  # The interval never reaches a month with this day
+    elif rule.freq == "WEEKLY" and rule.weekdays:
+        anchor_monday = (previous - timedelta(days=previous.weekday())).date()
+        candidate = previous + timedelta(days=1)
+        if candidate < not_before:
+            candidate = previous + timedelta(days=(not_before - previous).days)
+        while True:
+            weeks = ((candidate - timedelta(days=candidate.weekday())).date() - anchor_monday).days // 7
+            if weeks % rule.interval == 0 and candidate.weekday() in rule.weekdays and candidate >= not_before:
+                break
+            candidate += timedelta(days=1)
+    else:
+        step = timedelta(days=rule.interval * (7 if rule.freq == "WEEKLY" else 1))
+        steps = 1
+        if previous + step < not_before:
+            steps = -(-(not_before - previous) // step)  # Ceiling division
+        candidate = previous + steps * step
+
+    if rule.until is not None and candidate > rule.until:
+        return None
+    return candidate
+
+def spawn_next_occurrence(session: Session, task: Task, not_before: datetime, before: Optional[datetime] = None) -> Optional[Task]:
+    """
+    Add the occurrence that follows a series tail to the session, without committing.
+
+    Args:
+        session: A write session
+        task: The tail occurrence (any session's copy)
+        not_before: Earliest acceptable due date of the new occurrence
+        before: Only spawn an occurrence due before this horizon
+
+    Returns:
+        Task: The new occurrence, or None if the series has ended, the next
+        occurrence is beyond the horizon, or another request spawned it first
+    """
+    if not task.recurrence_rule or task.due_date is None or task.spawned_next:
+        return None
+    due_date = next_occurrence(parse_rule(task.recurrence_rule), as_naive_utc(task.due_date), as_naive_utc(not_before))
+    if due_date is None or (before is not None and due_date >= as_naive_utc(before)):
+        return None
+
+    # Claim the right to spawn; a concurrent spawner finds the flag already set
+    claimed = session.execute(
+        update(Task.__table__)
+        .where(Task.__table__.c.id == task.id)
+        .where(Task.__table__.c.spawned_next == False)  # noqa: E712
+        .values(spawned_next=True)
+    ).rowcount
+    if not claimed:
+        return None
+    set_committed_value(task, "spawned_next", True)
+
+    next_task = Task(
+        title=task.title,
+        description=task.description,
+        priority=task.priority,
+        category=task.category,
+        due_date=due_date,
+        recurrence_rule=task.recurrence_rule,
+        user_id=task.user_id,
+        series_id=task.series_id or task.id,
+        position=append_task_position(session.connection(), task.user_id),
+        project_id=task.project_id
+    )
+    if task.project_id is not None:
+        adjust_project_counts(session, task.user_id, {task.project_id: [1, 0]})
+    session.add(next_task)
+    return next_task
+
+if __name__ == "__main__":
+    from cache import require_shared_cache
+    from services.task_service import materialize_all_occurrences
+
+    require_shared_cache("The recurrence materializer")
+
+    parser = argparse.ArgumentParser(description="Materialize upcoming occurrences of every recurring task")
+    parser.add_argument("--days", type=float, default=RECURRENCE_WINDOW_DAYS, help="How far ahead to materialize")
+    args = parser.parse_args()
+    print(f"Materialized {materialize_all_occurrences(timedelta(days=args.days))} occurrences")
@@ -0,0 +1,183 @@
+"""
+Share service module for the Todo Application.
+
+A task can be shared with other users as viewer, editor or owner. Each grant
+is a task_share row stored next to the task, on the task owner's shard, so
+the task routes check a collaborator's access by joining the share into the
+statement that reads or writes the task (see task_service.can_access_task).
+The task's creator needs no row; their requests run the same statements as
+before sharing existed.
+
+"Shared with me" is read newest first from the (user_id, created_at,
+task_id) index, with keyset pagination. When tasks are sharded, shares with
+one user can live on every shard, so each shard is read and the pages are
+merged.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import bindparam, delete
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+from models import Task, TaskShare, TaskResponse, SharedTaskResponse, as_naive_utc
+from db import record_user_write
+from services.task_service import READ_ROLES, SHARE_ROLES, can_access_task
+
+# Newest-first pages of the live tasks shared with a user, continued after a (created_at, task_id) cursor
+_select_shared_tasks = (
+    select(Task, TaskShare.role, TaskShare.created_at)
+    .join(TaskShare, TaskShare.task_id == Task.id)
+    .where(TaskShare.user_id == bindparam("user_id"))
+    .where(Task.deleted_at.is_(None))
+    .order_by(TaskShare.created_at.desc(), TaskShare.task_id.desc())
+    .limit(bindparam("limit"))
+)
+_select_shared_tasks_after = _select_shared_tasks.where(
+    (TaskShare.created_at < bindparam("shared_at"))
+    | ((TaskShare.created_at == bindparam("shared_at")) & (TaskShare.task_id < bindparam("task_id")))
+)
+_select_task_shares = (
+    select(TaskShare)
+    .where(TaskShare.task_id == bindparam("task_id"))
+    .order_by(TaskShare.created_at, TaskShare.user_id)
+)
+
+class CannotShareWithOwner(ValueError):
+    """Raised when a task's owner is named as its collaborator."""
+
+def list_task_shares(session: Session, user_id: str, task_id: int, current_user_id: str) -> Optional[List[TaskShare]]:
+    """
+    Get the collaborators of one of a user's tasks.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        current_user_id: The ID of the requesting user
+
+    Returns:
+        List[TaskShare]: The task's shares, or None if the requester cannot read the task
+    """
+    if not can_access_task(session, user_id, task_id, current_user_id, READ_ROLES):
+        return None
+    return session.exec(_select_task_shares, params={"task_id": task_id}).all()
+
+def share_task(
+    session: Session,
+    user_id: str,
+    task_id: int,
+    current_user_id: str,
+    collaborator_id: str,
+    role: str
+) -> Optional[TaskShare]:
+    """
+    Share one of a user's tasks with a collaborator, or change their role.
+
+    Args:
+        session: The request's write session
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        current_user_id: The ID of the requesting user (the owner, or a collaborator with the owner role)
+        collaborator_id: The ID of the user to share the task with
+        role: The collaborator's role
+
+    Returns:
+        TaskShare: The share, or None if the task was not found or the requester may not share it
+
+    Raises:
+        CannotShareWithOwner: If collaborator_id is the task's owner
+    """
+    if collaborator_id == user_id:
+        raise CannotShareWithOwner("The task's owner already has full access")
+    if not can_access_task(session, user_id, task_id, current_user_id, SHARE_ROLES):
+        return None
+
+    share = session.get(TaskShare, (task_id, collaborator_id))
+    if share is None:
+        share = TaskShare(task_id=task_id, user_id=collaborator_id, role=role)
+        session.add(share)
+    else:
+        share.role = role
+    session.commit()
+    # Both users' next reads should see the change, replica lag or not
+    record_user_write(user_id)
+    record_user_write(collaborator_id)
+    return share
+
+def unshare_task(session: Session, user_id: str, task_id: int, current_user_id: str, collaborator_id: str) -> bool:
+    """
+    Remove a collaborator from one of a user's tasks.
+
+    Collaborators can always remove themselves; removing anyone else needs
+    the owner role.
+
+    Args:
+        session: The request's write session
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        current_user_id: The ID of the requesting user
+        collaborator_id: The ID of the collaborator to remove
+
+    Returns:
+        bool: True if a share was removed, False if there was none or the requester may not remove it
+    """
+    if collaborator_id != current_user_id and not can_access_task(session, user_id, task_id, current_user_id, SHARE_ROLES):
+        return False
+    removed = session.execute(
+        delete(TaskShare)
+        .where(TaskShare.task_id == task_id)
+        .where(TaskShare.user_id == collaborator_id)
+        .where(TaskShare.task_id.in_(select(Task.id).where(Task.id == task_id).where(Task.user_id == user_id)))
+    ).rowcount
+    session.commit()
+    if removed:
+        record_user_write(user_id)
+        record_user_write(collaborator_id)
+    return bool(removed)
+
+def _encode_shared_cursor(shared_at: datetime, task_id: int) -> str:
+    return f"{as_naive_utc(shared_at).isoformat()}_{task_id}"
+
+def _decode_shared_cursor(cursor: str) -> Tuple[datetime, int]:
+    shared_at, _, task_id = cursor.rpartition("_")
+    return datetime.fromisoformat(shared_at), int(task_id)
+
+def get_shared_tasks(engines: List[Engine], user_id: str, limit: int, cursor: Optional[str] = None) -> tuple:
+    """
+    Get one page of the tasks shared with a user, most recently shared first.
+
+    Args:
+        engines: Read engines of every database that can hold shares with the user
+        user_id: The ID of the collaborator
+        limit: Page size
+        cursor: next_cursor from the previous page
+
+    Returns:
+        tuple: (list of SharedTaskResponse, next page cursor or None)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if cursor is None:
+        statement, params = _select_shared_tasks, {"user_id": user_id, "limit": limit}
+    else:
+        shared_at, task_id = _decode_shared_cursor(cursor)
+        statement = _select_shared_tasks_after
+        params = {"user_id": user_id, "limit": limit, "shared_at": shared_at, "task_id": task_id}
+
+    rows = []
+    for engine in engines:
+        with Session(engine) as session:
+            rows.extend(
+                SharedTaskResponse(
+                    **TaskResponse.model_validate(task, from_attributes=True).model_dump(),
+                    role=role,
+                    shared_at=created_at
+                )
+                for task, role, created_at in session.exec(statement, params=params).all()
+            )
+    # Every shard returned its own newest rows; keep the newest of them all
+    rows.sort(key=lambda row: (row.shared_at, row.id), reverse=True)
+    tasks = rows[:limit]
+    next_cursor = _encode_shared_cursor(tasks[-1].shared_at, tasks[-1].id) if len(tasks) == limit else None
+    return tasks, next_cursor
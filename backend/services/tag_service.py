@@ -0,0 +1,232 @@
+"""
+Tag service module for the Todo Application.
+
+Tasks can carry several tags. Tags are normalized into a per-user tag table
+(names stored lowercased, unique per user) and a task_tag link table whose
+primary key (task_id, tag_id) answers "tags of a task" and whose
+(tag_id, task_id) index answers "tasks with a tag" from the index alone.
+
+Tag filters on the task list are compiled into one IN (subquery) semi-join
+per tag, each resolving the tag name through the unique (user_id, name)
+index. The database can then start from the rarest tag's index range
+instead of walking every task of the user. Autocomplete is a range scan of
+the same index ([prefix, prefix with its last character incremented)),
+which works where LIKE 'prefix%' cannot use an index.
+"""
+
+import functools
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+from sqlalchemy import bindparam, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+from models import Tag, Task, TaskTag
+
+tag_table = Tag.__table__
+task_tag_table = TaskTag.__table__
+task_table = Task.__table__
+
+MAX_TAGS_PER_TASK = 20
+MAX_TAG_FILTERS = 10
+MAX_TAG_LENGTH = 50
+
+# Tag names of a set of tasks, and of every task of a user
+_select_task_tag_names = (
+    select(TaskTag.task_id, Tag.name)
+    .join(Tag, Tag.id == TaskTag.tag_id)
+    .where(TaskTag.task_id.in_(bindparam("task_ids", expanding=True)))
+    .order_by(TaskTag.task_id, Tag.name)
+)
+_select_user_tag_names = (
+    select(TaskTag.task_id, Tag.name)
+    .join(Tag, Tag.id == TaskTag.tag_id)
+    .where(Tag.user_id == bindparam("user_id"))
+    .order_by(Tag.name)  # Index order; each task's names still come out sorted
+)
+# Autocomplete: a range scan of the (user_id, name) index
+_select_tags_by_prefix = (
+    select(Tag.name)
+    .where(Tag.user_id == bindparam("user_id"))
+    .where(Tag.name >= bindparam("prefix"))
+    .where(Tag.name < bindparam("prefix_end"))
+    .order_by(Tag.name)
+    .limit(bindparam("limit"))
+)
+_select_tags = (
+    select(Tag.name)
+    .where(Tag.user_id == bindparam("user_id"))
+    .order_by(Tag.name)
+    .limit(bindparam("limit"))
+)
+
+def normalize_tags(names: Iterable[str]) -> List[str]:
+    """
+    Normalize tag names: trimmed, lowercased, without blanks or duplicates.
+
+    Args:
+        names: Tag names as given by the client
+
+    Returns:
+        List[str]: The normalized names, in their original order
+
+    Raises:
+        ValueError: If a name is longer than MAX_TAG_LENGTH
+    """
+    normalized = []
+    for name in names:
+        name = name.strip().lower()
+        if len(name) > MAX_TAG_LENGTH:
+            raise ValueError(f"Tags are at most {MAX_TAG_LENGTH} characters")
+        if name and name not in normalized:
+            normalized.append(name)
+    return normalized
+
+def prefix_end(prefix: str) -> str:
+    """The smallest string greater than every string starting with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+@functools.lru_cache(maxsize=MAX_TAG_FILTERS)
+def tagged_filter(count: int) -> list:
+    """
+    Build the WHERE clauses that keep only tasks carrying `count` tags.
+
+    The tag names bind as tag_0 ... tag_{count-1} and the owner as user_id,
+    so each filter width is built once and reused.
+
+    Args:
+        count: Number of tags every returned task must carry
+
+    Returns:
+        list: Clauses to add to a task query with .where(*clauses)
+    """
+    return [
+        Task.id.in_(
+            select(TaskTag.task_id).where(TaskTag.tag_id == (
+                select(Tag.id)
+                .where(Tag.user_id == bindparam("user_id"))
+                .where(Tag.name == bindparam(f"tag_{i}"))
+                .scalar_subquery()
+            ))
+        )
+        for i in range(count)
+    ]
+
+def tag_names_for_tasks(session: Session, task_ids: List[int]) -> Dict[int, List[str]]:
+    """
+    Get the tag names of some tasks in one query.
+
+    Args:
+        session: The request's database session
+        task_ids: IDs of the tasks
+
+    Returns:
+        dict: Task ID mapped to its tag names, in name order (tasks without tags are left out)
+    """
+    if not task_ids:
+        return {}
+    names: Dict[int, List[str]] = {}
+    for task_id, name in session.exec(_select_task_tag_names, params={"task_ids": list(task_ids)}).all():
+        names.setdefault(task_id, []).append(name)
+    return names
+
+def tag_names_for_user(session: Session, user_id: str) -> Dict[int, List[str]]:
+    """
+    Get the tag names of every task of a user in one query.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user
+
+    Returns:
+        dict: Task ID mapped to its tag names, in name order (tasks without tags are left out)
+    """
+    names: Dict[int, List[str]] = {}
+    for task_id, name in session.exec(_select_user_tag_names, params={"user_id": user_id}).all():
+        names.setdefault(task_id, []).append(name)
+    return names
+
+def suggest_tags(session: Session, user_id: str, prefix: str, limit: int = 10) -> List[str]:
+    """
+    Autocomplete a user's tag names.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user
+        prefix: What the user has typed so far
+        limit: Maximum number of suggestions
+
+    Returns:
+        List[str]: Tag names starting with the prefix, in name order
+    """
+    prefix = prefix.strip().lower()
+    if not prefix:
+        return session.exec(_select_tags, params={"user_id": user_id, "limit": limit}).all()
+    return session.exec(_select_tags_by_prefix, params={
+        "user_id": user_id, "prefix": prefix, "prefix_end": prefix_end(prefix), "limit": limit
+    }).all()
+
+def _insert_tags_ignoring_duplicates(session: Session):
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(tag_table).on_conflict_do_nothing()
+
+def replace_task_tags(session: Session, user_id: str, task_id: int, names: List[str]) -> None:
+    """
+    Set a task's tags to exactly the given names, without committing.
+
+    Missing tags are created; concurrent requests creating the same tag
+    both succeed.
+
+    Args:
+        session: The request's write session
+        user_id: The ID of the user who owns the task (and the tags)
+        task_id: The ID of the task
+        names: Normalized tag names
+    """
+    tag_ids = []
+    if names:
+        now = datetime.now(timezone.utc)
+        session.execute(
+            _insert_tags_ignoring_duplicates(session),
+            [{"user_id": user_id, "name": name, "created_at": now} for name in names]
+        )
+        tag_ids = session.execute(
+            select(tag_table.c.id).where(tag_table.c.user_id == user_id).where(tag_table.c.name.in_(names))
+        ).scalars().all()
+    remove = delete(task_tag_table).where(task_tag_table.c.task_id == task_id)
+    if tag_ids:
+        remove = remove.where(task_tag_table.c.tag_id.not_in(tag_ids))
+    session.execute(remove)
+    if tag_ids:
+        existing = set(session.execute(
+            select(task_tag_table.c.tag_id).where(task_tag_table.c.task_id == task_id)
+        ).scalars().all())
+        new = [{"task_id": task_id, "tag_id": tag_id} for tag_id in tag_ids if tag_id not in existing]
+        if new:
+            session.execute(task_tag_table.insert(), new)
+
+def backfill_task_tags(conn: Connection) -> None:
+    """
+    Turn existing categories into tags when the tag tables are first created.
+
+    Args:
+        conn: Connection of the database being migrated, inside its transaction
+    """
+    now = datetime.now(timezone.utc)
+    rows = conn.execute(
+        select(task_table.c.id, task_table.c.user_id, task_table.c.category)
+        .where(task_table.c.category.is_not(None))
+    ).all()
+    tag_ids: Dict[tuple, int] = {}
+    links = []
+    for task_id, user_id, category in rows:
+        name = category.strip().lower()[:MAX_TAG_LENGTH]
+        if not name:
+            continue
+        if (user_id, name) not in tag_ids:
+            tag_ids[(user_id, name)] = conn.execute(
+                tag_table.insert().values(user_id=user_id, name=name, created_at=now)
+            ).inserted_primary_key[0]
+        links.append({"task_id": task_id, "tag_id": tag_ids[(user_id, name)]})
+    if links:
+        conn.execute(task_tag_table.insert(), links)
@@ -1,147 +1,1406 @@
 """
 Task service module for the Todo Application.
 
-This module provides functions for managing tasks including
-creating, retrieving, updating, and deleting tasks.
+This module provides functions for managing tasks and subtasks including
+creating, retrieving, updating, and deleting them. It is the single data
+access path for routes/tasks.py: every function takes the request's
+session, runs prebuilt statements, and keeps the task cache and the
+read-your-writes bookkeeping in step after each commit. Every write also
+records an outbox event in its transaction (see outbox_service). Every
+operation is timed, and the timings are available from get_operation_stats().
 """
 
-from typing import List, Optional
+import functools
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, delete, exists, update
+from sqlalchemy.engine import Engine
 from sqlmodel import Session, select
-from datetime import datetime
-from ..models import Task, TaskBase
-from ..db import engine
+from datetime import datetime, timedelta, timezone
+from pydantic import TypeAdapter
+from models import (
+    Project, Task, Subtask, TaskShare, TaskTag, ArchivedTask, ArchivedSubtask, TaskResponse, SubtaskResponse, ShareRoleEnum, as_naive_utc
+)
+from db import get_user_data_engines, record_user_write
+from cache import get_task_cache
+from services.recurrence_service import spawn_next_occurrence
+from services.idempotency_service import IdempotentRequest, record_response
+from services.project_service import ProjectNotFound, adjust_project_counts, count_changes
+from services.tag_service import replace_task_tags, tag_names_for_tasks, tag_names_for_user, tagged_filter
+from services.outbox_service import record_event, record_events
+from services import audit_service
+from services.position_service import (
+    POSITION_MAX_LENGTH, append_subtask_position, append_task_position, rebalance,
+    subtask_position_between, task_position_between
+)
 
-def get_user_tasks(user_id: str) -> List[Task]:
+task_table = Task.__table__
+subtask_table = Subtask.__table__
+archived_task_table = ArchivedTask.__table__
+archived_subtask_table = ArchivedSubtask.__table__
+task_share_table = TaskShare.__table__
+task_tag_table = TaskTag.__table__
+
+# Roles that grant each kind of access to another user's task
+READ_ROLES: Tuple[str, ...] = (ShareRoleEnum.viewer.value, ShareRoleEnum.editor.value, ShareRoleEnum.owner.value)
+WRITE_ROLES: Tuple[str, ...] = (ShareRoleEnum.editor.value, ShareRoleEnum.owner.value)
+SHARE_ROLES: Tuple[str, ...] = (ShareRoleEnum.owner.value,)
+
+# Statements are built once at import time and executed with bound parameters,
+# so every request reuses the same statement objects and compiled SQL.
+# Soft-deleted tasks (deleted_at set) are invisible to every read. Lists come
+# back in position order, read straight off the (user_id, position) index.
+_select_user_tasks = (
+    select(Task)
+    .where(Task.user_id == bindparam("user_id"))
+    .where(Task.deleted_at.is_(None))
+    .order_by(Task.position, Task.id)
+)
+_select_user_task = (
+    select(Task)
+    .where(Task.id == bindparam("task_id"))
+    .where(Task.user_id == bindparam("user_id"))
+    .where(Task.deleted_at.is_(None))
+)
+_select_user_task_id = (
+    select(Task.id)
+    .where(Task.id == bindparam("task_id"))
+    .where(Task.user_id == bindparam("user_id"))
+    .where(Task.deleted_at.is_(None))
+)
+# UPDATE statements cannot bind parameters named after their columns
+# (RETURNING the project and status, which the project counters need)
+_soft_delete_user_task = (
+    update(task_table)
+    .where(task_table.c.id == bindparam("b_task_id"))
+    .where(task_table.c.user_id == bindparam("b_user_id"))
+    .where(task_table.c.deleted_at.is_(None))
+    .values(deleted_at=bindparam("b_deleted_at"), version=task_table.c.version + 1)
+    .returning(task_table.c.project_id, task_table.c.completed)
+)
+_restore_user_task = (
+    update(task_table)
+    .where(task_table.c.id == bindparam("b_task_id"))
+    .where(task_table.c.user_id == bindparam("b_user_id"))
+    .where(task_table.c.deleted_at.is_not(None))
+    .values(deleted_at=None, version=task_table.c.version + 1)
+    .returning(task_table.c.project_id, task_table.c.completed)
+)
+# Project and status of a live task, locked until the transaction ends
+_select_task_counted_state = (
+    select(Task.project_id, Task.completed)
+    .where(Task.id == bindparam("task_id"))
+    .where(Task.user_id == bindparam("user_id"))
+    .where(Task.deleted_at.is_(None))
+    .with_for_update()
+)
+# A project's live tasks in position order, read straight off the (user_id, project_id, position) index
+_select_project_tasks = (
+    select(Task)
+    .where(Task.user_id == bindparam("user_id"))
+    .where(Task.project_id == bindparam("project_id"))
+    .where(Task.deleted_at.is_(None))
+    .order_by(Task.position, Task.id)
+)
+# Latest occurrence of each of a user's recurring series that is due before a horizon (partial index)
+_select_user_series_tails = (
+    select(Task)
+    .where(Task.user_id == bindparam("user_id"))
+    .where(Task.recurrence_rule.is_not(None))
+    .where(Task.spawned_next == False)  # noqa: E712
+    .where(Task.deleted_at.is_(None))
+    .where(Task.due_date < bindparam("until"))
+)
+# Newest-first pages of a user's archived tasks, continued after a (completed_at, id) cursor
+_select_archived_tasks = (
+    select(ArchivedTask)
+    .where(ArchivedTask.user_id == bindparam("user_id"))
+    .order_by(ArchivedTask.completed_at.desc(), ArchivedTask.id.desc())
+    .limit(bindparam("limit"))
+)
+_select_archived_tasks_after = _select_archived_tasks.where(
+    (ArchivedTask.completed_at < bindparam("completed_at"))
+    | ((ArchivedTask.completed_at == bindparam("completed_at")) & (ArchivedTask.id < bindparam("archived_id")))
+)
+# Collaborators reach a task through their task_share row, joined into the
+# same statement on its primary key, so the permission check is not a
+# separate query. Owners keep using the plain statements above.
+_select_shared_task = (
+    select(Task)
+    .join(TaskShare, (TaskShare.task_id == Task.id) & (TaskShare.user_id == bindparam("current_user_id")))
+    .where(Task.id == bindparam("task_id"))
+    .where(Task.user_id == bindparam("user_id"))
+    .where(Task.deleted_at.is_(None))
+    .where(TaskShare.role.in_(bindparam("roles", expanding=True)))
+)
+_select_shared_task_id = _select_shared_task.with_only_columns(Task.id)
+_select_task_subtasks = (
+    select(Subtask)
+    .where(Subtask.task_id == bindparam("task_id"))
+    .order_by(Subtask.position, Subtask.id)
+)
+_select_task_subtask = (
+    select(Subtask)
+    .where(Subtask.id == bindparam("subtask_id"))
+    .where(Subtask.task_id == bindparam("task_id"))
+)
+
+# Serializers for cached list bodies
+_task_list_adapter = TypeAdapter(List[TaskResponse])
+_subtask_list_adapter = TypeAdapter(List[SubtaskResponse])
+
+# Per-operation call counts and timings
+_operation_stats: Dict[str, Dict[str, float]] = {}
+_operation_stats_lock = threading.Lock()
+
+def _instrumented(operation: str):
+    """Record the call count and wall time of a service operation."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with _operation_stats_lock:
+                    stats = _operation_stats.setdefault(operation, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+                    stats["calls"] += 1
+                    stats["total_seconds"] += elapsed
+                    stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+        return wrapper
+    return decorator
+
+def get_operation_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Get call counts and timings for every service operation.
+
+    Returns:
+        dict: Operation name mapped to calls, total, mean and max seconds
+    """
+    with _operation_stats_lock:
+        return {
+            operation: {**stats, "mean_seconds": stats["total_seconds"] / stats["calls"]}
+            for operation, stats in _operation_stats.items()
+        }
+
+def _after_task_write(user_id: str, task_id: Optional[int] = None, task_list: bool = True) -> None:
+    """Bookkeeping after a committed write: read-your-writes and cache invalidation."""
+    record_user_write(user_id)
+    task_cache = get_task_cache()
+    if task_list:
+        task_cache.invalidate_task_list(user_id)
+    if task_id is not None:
+        task_cache.invalidate_subtask_list(user_id, task_id)
+
+def _record_task_event(session, event_type: str, task: Task) -> None:
+    # Outbox event carrying the task as it is after the write
+    record_event(session, event_type, task.user_id, task.id, data=TaskResponse.model_validate(task, from_attributes=True).model_dump(mode="json"))
+
+def _record_subtask_event(session, event_type: str, user_id: str, subtask: Subtask) -> None:
+    record_event(session, event_type, user_id, subtask.task_id, subtask.id, SubtaskResponse.model_validate(subtask, from_attributes=True).model_dump(mode="json"))
+
+def _find_user_task(session: Session, user_id: str, task_id: int) -> Optional[Task]:
+    return session.exec(_select_user_task, params={"user_id": user_id, "task_id": task_id}).first()
+
+def is_collaborator(user_id: str, current_user_id: Optional[str]) -> bool:
+    """Whether a request on a user's task comes from someone other than its owner."""
+    return current_user_id is not None and current_user_id != user_id
+
+def shared_with(current_user_id: str, roles: Tuple[str, ...]):
+    """
+    EXISTS clause, correlated to the task of the enclosing statement, that
+    holds when the task is shared with a user in one of the given roles.
+    """
+    return (
+        exists()
+        .where(TaskShare.task_id == Task.id)
+        .where(TaskShare.user_id == current_user_id)
+        .where(TaskShare.role.in_(roles))
+    )
+
+def _find_task(session: Session, user_id: str, task_id: int, current_user_id: Optional[str], roles: Tuple[str, ...]) -> Optional[Task]:
+    if not is_collaborator(user_id, current_user_id):
+        return _find_user_task(session, user_id, task_id)
+    return session.exec(_select_shared_task, params={
+        "user_id": user_id, "task_id": task_id, "current_user_id": current_user_id, "roles": list(roles)
+    }).first()
+
+def can_access_task(
+    session: Session,
+    user_id: str,
+    task_id: int,
+    current_user_id: Optional[str] = None,
+    roles: Tuple[str, ...] = READ_ROLES
+) -> bool:
+    """
+    Check that a task exists, belongs to a user, and is open to the requester, without loading the row.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        current_user_id: The ID of the requesting user (None or user_id for the owner)
+        roles: Share roles that grant the access a collaborator needs
+
+    Returns:
+        bool: True if the owner, or a collaborator in one of the roles, may access the task
+    """
+    if not is_collaborator(user_id, current_user_id):
+        return user_owns_task(session, user_id, task_id)
+    return session.exec(_select_shared_task_id, params={
+        "user_id": user_id, "task_id": task_id, "current_user_id": current_user_id, "roles": list(roles)
+    }).first() is not None
+
+def user_owns_task(session: Session, user_id: str, task_id: int) -> bool:
+    """
+    Check that a task exists and belongs to a user, without loading the row.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user
+        task_id: The ID of the task
+
+    Returns:
+        bool: True if the user owns the task
+    """
+    return session.exec(_select_user_task_id, params={"user_id": user_id, "task_id": task_id}).first() is not None
+
+@_instrumented("get_user_tasks")
+def get_user_tasks(session: Session, user_id: str) -> List[Task]:
     """
     Get all tasks for a specific user.
-    
+
     Args:
+        session: The request's database session
         user_id: The ID of the user whose tasks to retrieve
-        
+
     Returns:
         List[Task]: List of tasks for the user
     """
-    with Session(engine) as session:
-        statement = select(Task).where(Task.user_id == user_id)
-        tasks = session.exec(statement).all()
-        return tasks
+    return session.exec(_select_user_tasks, params={"user_id": user_id}).all()
+
+@_instrumented("get_user_tasks_json")
+def get_user_tasks_json(session: Session, user_id: str) -> bytes:
+    """
+    Get a user's task list as serialized JSON, from the cache when current.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user whose tasks to retrieve
+
+    Returns:
+        bytes: JSON array of TaskResponse objects
+    """
+    task_cache = get_task_cache()
+    cache_key = task_cache.task_list_key(user_id)
+    generation = task_cache.generation(cache_key)
+    body = task_cache.get(cache_key, generation)
+    if body is None:
+        tasks = get_user_tasks(session, user_id)
+        body = _task_list_json(tasks, tag_names_for_user(session, user_id) if tasks else {})
+        task_cache.set(cache_key, generation, body)
+    return body
+
+def _task_list_json(tasks: List[Task], tag_names: Dict[int, List[str]]) -> bytes:
+    return _task_list_adapter.dump_json([
+        TaskResponse.model_validate(task, from_attributes=True).model_copy(update={"tags": tag_names.get(task.id, [])})
+        for task in tasks
+    ])
+
+@functools.lru_cache(maxsize=None)
+def _select_tagged_user_tasks(tag_count: int):
+    # One statement per number of tags, each tag a semi-join on the task_tag index
+    return _select_user_tasks.where(*tagged_filter(tag_count))
 
-def get_user_task(user_id: str, task_id: int) -> Optional[Task]:
+@_instrumented("get_tagged_user_tasks_json")
+def get_tagged_user_tasks_json(session: Session, user_id: str, tags: List[str]) -> bytes:
+    """
+    Get the tasks of a user that carry every one of the given tags, as serialized JSON.
+
+    Filtered lists are not cached; the filter runs in the database, so only
+    the matching tasks are read.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user whose tasks to retrieve
+        tags: Normalized tag names
+
+    Returns:
+        bytes: JSON array of TaskResponse objects, in list order
+    """
+    params = {"user_id": user_id, **{f"tag_{i}": tag for i, tag in enumerate(tags)}}
+    tasks = session.exec(_select_tagged_user_tasks(len(tags)), params=params).all()
+    return _task_list_json(tasks, tag_names_for_tasks(session, [task.id for task in tasks]))
+
+@_instrumented("get_user_task")
+def get_user_task(session: Session, user_id: str, task_id: int, current_user_id: Optional[str] = None) -> Optional[Task]:
     """
     Get a specific task for a user.
-    
+
     Args:
+        session: The request's database session
         user_id: The ID of the user who owns the task
         task_id: The ID of the task to retrieve
-        
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
     Returns:
-        Task: The requested task if found, None otherwise
+        Task: The requested task if found and readable by the requester, None otherwise
     """
-    with Session(engine) as session:
-        statement = select(Task).where(Task.id == task_id).where(Task.user_id == user_id)
-        task = session.exec(statement).first()
-        return task
+    return _find_task(session, user_id, task_id, current_user_id, READ_ROLES)
 
-def create_task_for_user(user_id: str, task_data: TaskBase) -> Task:
+@_instrumented("create_task_for_user")
+def create_task_for_user(session: Session, user_id: str, task_data: dict, idempotency: Optional[IdempotentRequest] = None) -> Task:
     """
-    Create a new task for a user.
-    
+    Create a new task for a user, at the end of the user's list.
+
     Args:
+        session: The request's database session
         user_id: The ID of the user creating the task
-        task_data: Task creation data
-        
+        task_data: Task field values
+        idempotency: Idempotency-Key request whose response is stored with the task
+
     Returns:
         Task: The created task
+
+    Raises:
+        ProjectNotFound: If task_data names a project the user does not have
     """
-    task = Task.from_orm(task_data)
-    task.user_id = user_id
-    task.created_at = datetime.utcnow()
-    task.updated_at = datetime.utcnow()
-    
-    with Session(engine) as session:
-        session.add(task)
-        session.commit()
-        session.refresh(task)
-        return task
+    changes = count_changes(None, (task_data.get("project_id"), task_data.get("completed", False)))
+    try:
+        adjust_project_counts(session, user_id, changes)
+    except ProjectNotFound:
+        session.rollback()
+        raise
+    task = Task(**task_data, user_id=user_id, position=append_task_position(session.connection(), user_id))
+    session.add(task)
+    session.flush()
+    _record_task_event(session, "task.created", task)
+    if idempotency is not None:
+        record_response(session, idempotency, 201, TaskResponse.model_validate(task, from_attributes=True).model_dump_json())
+    session.commit()
+    _after_task_write(user_id)
+    return task
+
+class VersionConflict(Exception):
+    """Raised when an update's expected version is no longer the row's current version."""
+
+def _owned_task_update(user_id: str, task_id: int, expected_version: Optional[int], current_user_id: Optional[str] = None):
+    # One conditional UPDATE does the ownership, sharing, soft-delete and version checks
+    statement = (
+        update(Task)
+        .where(Task.id == task_id)
+        .where(Task.user_id == user_id)
+        .where(Task.deleted_at.is_(None))
+    )
+    if is_collaborator(user_id, current_user_id):
+        statement = statement.where(shared_with(current_user_id, WRITE_ROLES))
+    if expected_version is not None:
+        statement = statement.where(Task.version == expected_version)
+    return statement
+
+def _execute_returning(session: Session, statement):
+    return session.scalars(statement, execution_options={"synchronize_session": False}).first()
 
-def update_user_task(user_id: str, task_id: int, task_data: dict) -> Optional[Task]:
+@_instrumented("update_user_task")
+def update_user_task(
+    session: Session,
+    user_id: str,
+    task_id: int,
+    task_data: dict,
+    expected_version: Optional[int] = None,
+    current_user_id: Optional[str] = None
+) -> Optional[Task]:
     """
     Update an existing task for a user.
-    
+
+    The task is changed with a single UPDATE ... RETURNING, without reading
+    it first. With expected_version, the update only applies if nobody has
+    changed the task since the client read that version.
+
     Args:
+        session: The request's database session
         user_id: The ID of the user who owns the task
         task_id: The ID of the task to update
         task_data: Dictionary of fields to update
-        
+        expected_version: Version from the client's If-Match header
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
     Returns:
         Task: The updated task if successful, None otherwise
+
+    Raises:
+        VersionConflict: If the task exists but is no longer at expected_version
+        ProjectNotFound: If task_data names a project the user does not have
     """
-    with Session(engine) as session:
-        statement = select(Task).where(Task.id == task_id).where(Task.user_id == user_id)
-        task = session.exec(statement).first()
-        
-        if not task:
-            return None
-        
-        # Update task fields
-        for field, value in task_data.items():
-            if hasattr(task, field) and value is not None:
-                setattr(task, field, value)
-        
-        # Update the updated_at timestamp
-        task.updated_at = datetime.utcnow()
-        
+    # Changing the project or status moves the task between project counters,
+    # which needs the values being replaced; only these updates read them first
+    before = None
+    if "project_id" in task_data or "completed" in task_data:
+        before = session.exec(_select_task_counted_state, params={"user_id": user_id, "task_id": task_id}).first()
+
+    now = datetime.now(timezone.utc)
+    values = dict(task_data)
+    if "completed" in values:
+        values["completed_at"] = now if values["completed"] else None
+    values["updated_at"] = now
+    values["version"] = Task.version + 1
+
+    task = _execute_returning(session, _owned_task_update(user_id, task_id, expected_version, current_user_id).values(**values).returning(Task))
+    if task is None:
+        session.rollback()
+        if expected_version is not None and can_access_task(session, user_id, task_id, current_user_id, WRITE_ROLES):
+            raise VersionConflict()
+        return None
+
+    if before is not None:
+        try:
+            adjust_project_counts(session, user_id, count_changes(tuple(before), (task.project_id, task.completed)))
+        except ProjectNotFound:
+            session.rollback()
+            raise
+    _record_task_event(session, "task.updated", task)
+    session.commit()
+    _after_task_write(user_id)
+    return task
+
+@_instrumented("toggle_user_task_completion")
+def toggle_user_task_completion(
+    session: Session,
+    user_id: str,
+    task_id: int,
+    completed: bool,
+    expected_version: Optional[int] = None,
+    current_user_id: Optional[str] = None
+) -> Optional[Task]:
+    """
+    Set the completion status of a task for a user.
+
+    updated_at is left alone to distinguish content updates from status changes.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task to update
+        completed: The new completion status
+        expected_version: Version from the client's If-Match header
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
+    Returns:
+        Task: The updated task if successful, None otherwise
+
+    Raises:
+        VersionConflict: If the task exists but is no longer at expected_version
+    """
+    now = datetime.now(timezone.utc)
+    statement = _owned_task_update(user_id, task_id, expected_version, current_user_id).values(
+        completed=completed,
+        completed_at=now if completed else None,
+        version=Task.version + 1
+    ).returning(Task)
+    # Try the update that changes the status first: if it matches, the task
+    # moved between its project's counters. The condition is checked again
+    # under the row lock, so concurrent toggles count once.
+    task = _execute_returning(session, statement.where(Task.completed != completed))
+    if task is not None:
+        if task.project_id is not None:
+            adjust_project_counts(session, user_id, {task.project_id: [0, 1 if completed else -1]})
+    else:
+        task = _execute_returning(session, statement)
+    if task is None:
+        session.rollback()
+        if expected_version is not None and can_access_task(session, user_id, task_id, current_user_id, WRITE_ROLES):
+            raise VersionConflict()
+        return None
+
+    _record_task_event(session, "task.completed" if completed else "task.reopened", task)
+    # Completing the latest occurrence of a recurring series spawns the next one
+    if completed:
+        spawned = spawn_next_occurrence(session, task, now)
+        if spawned is not None:
+            session.flush()
+            _record_task_event(session, "task.created", spawned)
+
+    session.commit()
+    _after_task_write(user_id)
+    return task
+
+@_instrumented("move_user_task")
+def move_user_task(
+    session: Session,
+    user_id: str,
+    task_id: int,
+    after_id: Optional[int],
+    before_id: Optional[int],
+    expected_version: Optional[int] = None
+) -> Optional[Task]:
+    """
+    Move a task to a new place in the user's list.
+
+    The task gets a fractional position key between its new neighbours, so
+    only its own row is updated; the list is renumbered first only when the
+    neighbours' keys leave no room.
+
+    Args:
+        session: The request's write session
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task to move
+        after_id: The task it should follow (None to move it to the top)
+        before_id: The task it should precede (None to move it to the bottom)
+        expected_version: Version from the client's If-Match header
+
+    Returns:
+        Task: The moved task, or None if it or a neighbour was not found
+
+    Raises:
+        VersionConflict: If the task exists but is no longer at expected_version
+        ValueError: If the neighbours are missing, the task itself, or out of order
+    """
+    position = task_position_between(session.connection(), user_id, task_id, after_id, before_id)
+    task = None
+    if position is not None:
+        task = _execute_returning(session, _owned_task_update(user_id, task_id, expected_version).values(
+            position=position,
+            version=Task.version + 1
+        ).returning(Task))
+    if task is None:
+        session.rollback()
+        if expected_version is not None and user_owns_task(session, user_id, task_id):
+            raise VersionConflict()
+        return None
+
+    _record_task_event(session, "task.moved", task)
+    session.commit()
+    _after_task_write(user_id)
+    return task
+
+@_instrumented("set_user_task_tags")
+def set_user_task_tags(
+    session: Session,
+    user_id: str,
+    task_id: int,
+    tags: List[str],
+    expected_version: Optional[int] = None,
+    current_user_id: Optional[str] = None
+) -> Optional[Task]:
+    """
+    Replace a task's tags.
+
+    The task's version is bumped by the same conditional UPDATE that checks
+    ownership, sharing and If-Match, so a tag change conflicts with other
+    edits like any update. Tags belong to the task's owner, also when an
+    editor sets them.
+
+    Args:
+        session: The request's write session
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task
+        tags: Normalized tag names (an empty list removes every tag)
+        expected_version: Version from the client's If-Match header
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
+    Returns:
+        Task: The updated task, or None if it was not found or the requester may not change it
+
+    Raises:
+        VersionConflict: If the task exists but is no longer at expected_version
+    """
+    task = _execute_returning(session, _owned_task_update(user_id, task_id, expected_version, current_user_id).values(
+        version=Task.version + 1, updated_at=datetime.now(timezone.utc)
+    ).returning(Task))
+    if task is None:
+        session.rollback()
+        if expected_version is not None and can_access_task(session, user_id, task_id, current_user_id, WRITE_ROLES):
+            raise VersionConflict()
+        return None
+    replace_task_tags(session, user_id, task_id, tags)
+    record_event(session, "task.tagged", user_id, task_id, data={
+        **TaskResponse.model_validate(task, from_attributes=True).model_dump(mode="json"), "tags": sorted(tags)
+    })
+    session.commit()
+    _after_task_write(user_id)
+    return task
+
+@_instrumented("export_user_tasks")
+def export_user_tasks(session: Session, user_id: str) -> List[dict]:
+    """
+    Get all of a user's tasks, with their tags, as JSON-ready dictionaries.
+
+    Args:
+        session: A session on the user's task database
+        user_id: The ID of the user
+
+    Returns:
+        List[dict]: TaskResponse dictionaries, in list order
+    """
+    tasks = get_user_tasks(session, user_id)
+    tag_names = tag_names_for_user(session, user_id) if tasks else {}
+    return [
+        TaskResponse.model_validate(task, from_attributes=True).model_copy(update={"tags": tag_names.get(task.id, [])}).model_dump(mode="json")
+        for task in tasks
+    ]
+
+@_instrumented("import_user_tasks")
+def import_user_tasks(session: Session, user_id: str, tasks: List[dict]) -> List[int]:
+    """
+    Create many tasks for a user in one transaction, at the end of the user's list.
+
+    Either every task is created or none is, so a failed import can be retried.
+
+    Args:
+        session: A session on the user's task database
+        user_id: The ID of the user
+        tasks: Task field values, each with an optional list of normalized tags
+
+    Returns:
+        List[int]: IDs of the created tasks, in the given order
+
+    Raises:
+        ProjectNotFound: If a task names a project the user does not have
+    """
+    changes: Dict[int, List[int]] = {}
+    for task_data in tasks:
+        for project_id, (task_count, completed_count) in count_changes(None, (task_data.get("project_id"), task_data.get("completed", False))).items():
+            change = changes.setdefault(project_id, [0, 0])
+            change[0] += task_count
+            change[1] += completed_count
+    try:
+        adjust_project_counts(session, user_id, changes)
+    except ProjectNotFound:
+        session.rollback()
+        raise
+    task_ids = []
+    for task_data in tasks:
+        task_data = dict(task_data)
+        tags = task_data.pop("tags", None)
+        task = Task(**task_data, user_id=user_id, position=append_task_position(session.connection(), user_id))
         session.add(task)
-        session.commit()
-        session.refresh(task)
-        return task
+        session.flush()  # The next task's position follows this one
+        if tags:
+            replace_task_tags(session, user_id, task.id, tags)
+        _record_task_event(session, "task.created", task)
+        task_ids.append(task.id)
+    session.commit()
+    _after_task_write(user_id)
+    return task_ids
+
+@_instrumented("get_project_tasks")
+def get_project_tasks(session: Session, user_id: str, project_id: int) -> Optional[List[Task]]:
+    """
+    Get the live tasks of one of a user's projects, in position order.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user who owns the project
+        project_id: The ID of the project
+
+    Returns:
+        List[Task]: The project's tasks, or None if the user has no such project
+    """
+    tasks = session.exec(_select_project_tasks, params={"user_id": user_id, "project_id": project_id}).all()
+    # Only an empty result needs to tell an empty project from a missing one
+    if not tasks:
+        project = session.get(Project, project_id)
+        if project is None or project.user_id != user_id:
+            return None
+    return tasks
+
+@_instrumented("move_tasks_to_project")
+def move_tasks_to_project(
+    session: Session,
+    user_id: str,
+    project_id: Optional[int],
+    task_ids: Optional[List[int]] = None,
+    from_project_id: Optional[int] = None
+) -> int:
+    """
+    Move many of a user's tasks into a project with a single bulk UPDATE.
+
+    Either give the tasks by ID, or move every live task out of another
+    project. Tasks already in the target project are left alone.
+
+    Args:
+        session: The request's write session
+        user_id: The ID of the user who owns the tasks
+        project_id: The target project (None takes the tasks out of their projects)
+        task_ids: The tasks to move
+        from_project_id: Move every task of this project instead
+
+    Returns:
+        int: Number of tasks moved
+
+    Raises:
+        ProjectNotFound: If the target project does not belong to the user
+    """
+    statement = (
+        update(Task)
+        .where(Task.user_id == user_id)
+        .where(Task.deleted_at.is_(None))
+        .where(Task.project_id.is_distinct_from(project_id))
+        .values(project_id=project_id, version=Task.version + 1)
+        .returning(Task.id, Task.completed)
+    )
+    if task_ids is not None:
+        # The counters need each task's current project; lock and read them first
+        moved_from = session.exec(
+            select(Task.project_id, Task.completed)
+            .where(Task.id.in_(task_ids))
+            .where(Task.user_id == user_id)
+            .where(Task.deleted_at.is_(None))
+            .where(Task.project_id.is_distinct_from(project_id))
+            .with_for_update()
+        ).all()
+        moved = session.execute(statement.where(Task.id.in_(task_ids)), execution_options={"synchronize_session": False}).all()
+    else:
+        moved = session.execute(statement.where(Task.project_id == from_project_id), execution_options={"synchronize_session": False}).all()
+        moved_from = [(from_project_id, done) for _, done in moved]
+
+    changes: Dict[int, List[int]] = {}
+    for old_project_id, done in moved_from:
+        for project, change in count_changes((old_project_id, done), (project_id, done)).items():
+            total = changes.setdefault(project, [0, 0])
+            total[0] += change[0]
+            total[1] += change[1]
+    try:
+        adjust_project_counts(session, user_id, changes)
+    except ProjectNotFound:
+        session.rollback()
+        raise
+    record_events(session, [
+        {"event_type": "task.updated", "user_id": user_id, "task_id": task_id, "data": {"project_id": project_id}}
+        for task_id, _ in moved
+    ])
+    session.commit()
+    if moved:
+        _after_task_write(user_id)
+    return len(moved)
+
+@_instrumented("delete_user_project")
+def delete_user_project(session: Session, user_id: str, project_id: int) -> bool:
+    """
+    Delete a project; its tasks stay, outside any project.
+
+    Args:
+        session: The request's write session
+        user_id: The ID of the user who owns the project
+        project_id: The ID of the project
+
+    Returns:
+        bool: True if the project was deleted, False if the user has no such project
+    """
+    # ON DELETE SET NULL covers this; clearing explicitly also works on
+    # databases where the column was added without the constraint
+    cleared = session.execute(
+        update(task_table)
+        .where(task_table.c.user_id == user_id)
+        .where(task_table.c.project_id == project_id)
+        .values(project_id=None, version=task_table.c.version + 1)
+        .returning(task_table.c.id)
+    ).scalars().all()
+    deleted = session.execute(
+        delete(Project).where(Project.id == project_id).where(Project.user_id == user_id)
+    ).rowcount
+    if not deleted:
+        session.rollback()
+        return False
+    record_events(session, [
+        {"event_type": "task.updated", "user_id": user_id, "task_id": task_id, "data": {"project_id": None}}
+        for task_id in cleared
+    ])
+    session.commit()
+    _after_task_write(user_id)
+    return True
+
+def _materialize_series(session: Session, tail: Task, until: datetime, now: datetime) -> int:
+    # Spawn occurrences after a tail until the next one would fall beyond the horizon
+    spawned = 0
+    current = spawn_next_occurrence(session, tail, now, before=until)
+    while current is not None:
+        session.flush()  # The next round needs the new occurrence's id
+        _record_task_event(session, "task.created", current)
+        spawned += 1
+        current = spawn_next_occurrence(session, current, now, before=until)
+    return spawned
 
-def delete_user_task(user_id: str, task_id: int) -> bool:
+@_instrumented("materialize_user_occurrences")
+def materialize_user_occurrences(read_session: Session, write_session: Session, user_id: str, until: datetime) -> int:
     """
-    Delete a task for a user.
-    
+    Create the occurrences of a user's recurring tasks that are due before a horizon.
+
+    The check is one query on the series-tail partial index, run on the read
+    session; the write session is only used when something is due.
+
     Args:
+        read_session: The request's read session
+        write_session: The request's write session
+        user_id: The ID of the user
+        until: Materialization horizon
+
+    Returns:
+        int: Number of occurrences created
+    """
+    until = as_naive_utc(until)
+    tails = read_session.exec(_select_user_series_tails, params={"user_id": user_id, "until": until}).all()
+    if not tails:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    spawned = sum(_materialize_series(write_session, tail, until, now) for tail in tails)
+    write_session.commit()
+    if spawned:
+        _after_task_write(user_id)
+    return spawned
+
+def materialize_all_occurrences(horizon: timedelta, batch_size: int = 500) -> int:
+    """
+    Batch job: create every user's occurrences due within a horizon.
+
+    Walks the series tails of every task database in id order, one batch
+    per transaction.
+
+    Args:
+        horizon: How far ahead of now to materialize
+        batch_size: Series tails per transaction
+
+    Returns:
+        int: Number of occurrences created
+    """
+    now = datetime.now(timezone.utc)
+    until = as_naive_utc(now + horizon)
+    spawned = 0
+    for engine in get_user_data_engines():
+        last_id = 0
+        while True:
+            with Session(engine, expire_on_commit=False) as session:
+                tails = session.exec(
+                    select(Task)
+                    .where(Task.recurrence_rule.is_not(None))
+                    .where(Task.spawned_next == False)  # noqa: E712
+                    .where(Task.deleted_at.is_(None))
+                    .where(Task.due_date < until)
+                    .where(Task.id > last_id)
+                    .order_by(Task.id)
+                    .limit(batch_size)
+                ).all()
+                if not tails:
+                    break
+                last_id = tails[-1].id
+                users = set()
+                for tail in tails:
+                    created = _materialize_series(session, tail, until, now)
+                    if created:
+                        users.add(tail.user_id)
+                        spawned += created
+                session.commit()
+            for user_id in users:
+                _after_task_write(user_id)
+    return spawned
+
+@_instrumented("delete_user_task")
+def delete_user_task(session: Session, user_id: str, task_id: int) -> bool:
+    """
+    Soft-delete a task for a user.
+
+    A single UPDATE sets deleted_at; neither the task nor its subtasks are
+    loaded. The rows are hard-deleted later by purge_deleted_tasks(), and
+    until then restore_user_task() undoes the delete.
+
+    Args:
+        session: The request's database session
         user_id: The ID of the user who owns the task
         task_id: The ID of the task to delete
-        
+
     Returns:
         bool: True if deletion was successful, False otherwise
     """
-    with Session(engine) as session:
-        statement = select(Task).where(Task.id == task_id).where(Task.user_id == user_id)
-        task = session.exec(statement).first()
-        
-        if not task:
-            return False
-        
-        session.delete(task)
+    deleted = session.execute(
+        _soft_delete_user_task,
+        {"b_user_id": user_id, "b_task_id": task_id, "b_deleted_at": datetime.now(timezone.utc)}
+    ).first()
+    if deleted is not None:
+        adjust_project_counts(session, user_id, count_changes(tuple(deleted), None))
+        record_event(session, "task.deleted", user_id, task_id)
+    session.commit()
+    if deleted is None:
+        return False
+    _after_task_write(user_id, task_id)
+    return True
+
+@_instrumented("restore_user_task")
+def restore_user_task(session: Session, user_id: str, task_id: int) -> Optional[Task]:
+    """
+    Undo the soft delete of a task that has not been purged yet.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user who owns the task
+        task_id: The ID of the task to restore
+
+    Returns:
+        Task: The restored task, or None if there is no deleted task to restore
+    """
+    restored = session.execute(_restore_user_task, {"b_user_id": user_id, "b_task_id": task_id}).first()
+    if restored is None:
         session.commit()
-        return True
+        return None
+    adjust_project_counts(session, user_id, count_changes(None, tuple(restored)))
+    task = _find_user_task(session, user_id, task_id)
+    _record_task_event(session, "task.restored", task)
+    session.commit()
+    _after_task_write(user_id, task_id)
+    return task
+
+def purge_deleted_tasks(engine: Engine, deleted_before: datetime, batch_size: int = 500) -> int:
+    """
+    Hard-delete one batch of tasks soft-deleted before a cutoff, with their subtasks.
 
-def toggle_user_task_completion(user_id: str, task_id: int, completed: bool) -> Optional[Task]:
+    The batch is found through the deleted_at partial index and deleted in
+    one short transaction; rows being purged are locked (and skipped by
+    other purgers) on databases that support it, so a concurrent restore
+    either wins or waits.
+
+    Args:
+        engine: Engine of the task database to purge
+        deleted_before: Only purge tasks deleted before this time
+        batch_size: Maximum number of tasks to delete
+
+    Returns:
+        int: Number of tasks deleted (0 when nothing is left to purge)
     """
-    Toggle the completion status of a task for a user.
-    
+    with engine.begin() as conn:
+        purged = conn.execute(
+            select(task_table.c.id, task_table.c.user_id)
+            .where(task_table.c.deleted_at.is_not(None))
+            .where(task_table.c.deleted_at < as_naive_utc(deleted_before))
+            .order_by(task_table.c.deleted_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not purged:
+            return 0
+        task_ids = [task_id for task_id, _ in purged]
+        record_events(conn, [
+            {"event_type": "task.purged", "user_id": user_id, "task_id": task_id}
+            for task_id, user_id in purged
+        ])
+        # ON DELETE CASCADE covers subtasks; deleting them explicitly also
+        # works on databases created before the constraint had it
+        conn.execute(delete(subtask_table).where(subtask_table.c.task_id.in_(task_ids)))
+        conn.execute(delete(task_share_table).where(task_share_table.c.task_id.in_(task_ids)))
+        conn.execute(delete(task_tag_table).where(task_tag_table.c.task_id.in_(task_ids)))
+        return conn.execute(delete(task_table).where(task_table.c.id.in_(task_ids))).rowcount
+
+def archive_completed_tasks(engine: Engine, completed_before: datetime, batch_size: int = 500) -> int:
+    """
+    Move one batch of tasks completed before a cutoff, with their subtasks, to the archive tables.
+
+    Candidates are found through the completed_at partial index and moved in
+    one transaction, so a task is always in exactly one of the two tiers.
+
     Args:
+        engine: Engine of the task database to archive
+        completed_before: Only archive tasks completed before this time
+        batch_size: Maximum number of tasks to move
+
+    Returns:
+        int: Number of tasks archived (0 when nothing is left to archive)
+    """
+    archived_at = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        task_rows = conn.execute(
+            select(task_table)
+            .where(task_table.c.completed == True)  # noqa: E712
+            .where(task_table.c.completed_at < as_naive_utc(completed_before))
+            .where(task_table.c.deleted_at.is_(None))
+            .order_by(task_table.c.completed_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).mappings().all()
+        if not task_rows:
+            return 0
+        task_ids = [row["id"] for row in task_rows]
+
+        # RETURNING maps each original task id to its archive id
+        archive_ids = dict(conn.execute(
+            archived_task_table.insert().returning(archived_task_table.c.task_id, archived_task_table.c.id),
+            [
+                {
+                    **{name: row[name] for name in archived_task_table.c.keys() if name in row and name != "id"},
+                    "task_id": row["id"],
+                    "archived_at": archived_at,
+                }
+                for row in task_rows
+            ]
+        ).all())
+        subtask_rows = conn.execute(
+            select(subtask_table).where(subtask_table.c.task_id.in_(task_ids))
+        ).mappings().all()
+        if subtask_rows:
+            conn.execute(archived_subtask_table.insert(), [
+                {
+                    "archived_task_id": archive_ids[row["task_id"]],
+                    "title": row["title"],
+                    "completed": row["completed"],
+                    "created_at": row["created_at"],
+                    "updated_at": row["updated_at"],
+                }
+                for row in subtask_rows
+            ])
+        # Archived tasks leave their projects' counts
+        project_changes: Dict[tuple, List[int]] = {}
+        for row in task_rows:
+            if row["project_id"] is not None:
+                change = project_changes.setdefault((row["user_id"], row["project_id"]), [0, 0])
+                change[0] -= 1
+                change[1] -= 1
+        for (user_id, project_id), change in sorted(project_changes.items()):
+            adjust_project_counts(conn, user_id, {project_id: change})
+
+        # Archived tasks are the owner's alone and keep only their category; shares and tags end here
+        conn.execute(delete(subtask_table).where(subtask_table.c.task_id.in_(task_ids)))
+        conn.execute(delete(task_share_table).where(task_share_table.c.task_id.in_(task_ids)))
+        conn.execute(delete(task_tag_table).where(task_tag_table.c.task_id.in_(task_ids)))
+        conn.execute(delete(task_table).where(task_table.c.id.in_(task_ids)))
+        record_events(conn, [
+            {"event_type": "task.archived", "user_id": row["user_id"], "task_id": row["id"], "data": {"archived_id": archive_ids[row["id"]]}}
+            for row in task_rows
+        ])
+
+    for user_id in {row["user_id"] for row in task_rows}:
+        _after_task_write(user_id)
+    # Owners' subtask lists are served from the cache without looking the task up
+    for row in task_rows:
+        _after_task_write(row["user_id"], row["id"], task_list=False)
+    return len(task_rows)
+
+def rebalance_positions(engine: Engine, max_length: int = POSITION_MAX_LENGTH) -> tuple:
+    """
+    Renumber every list of a task database that holds an overlong position key.
+
+    Args:
+        engine: Engine of the task database to rebalance
+        max_length: Longest acceptable key
+
+    Returns:
+        tuple: (number of task lists renumbered, number of subtask lists renumbered)
+    """
+    user_ids, subtask_lists = rebalance(engine, max_length)
+    for user_id in user_ids:
+        _after_task_write(user_id)
+    for user_id, task_id in subtask_lists:
+        _after_task_write(user_id, task_id, task_list=False)
+    return len(user_ids), len(subtask_lists)
+
+def _encode_archive_cursor(task: ArchivedTask) -> str:
+    return f"{as_naive_utc(task.completed_at).isoformat()}_{task.id}"
+
+def _decode_archive_cursor(cursor: str) -> tuple:
+    completed_at, _, archived_id = cursor.rpartition("_")
+    return datetime.fromisoformat(completed_at), int(archived_id)
+
+@_instrumented("get_archived_tasks")
+def get_archived_tasks(session: Session, user_id: str, limit: int, cursor: Optional[str] = None) -> tuple:
+    """
+    Get one page of a user's archived tasks, most recently completed first.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user whose archive to read
+        limit: Page size
+        cursor: next_cursor from the previous page
+
+    Returns:
+        tuple: (list of ArchivedTask, next page cursor or None)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if cursor is None:
+        tasks = session.exec(_select_archived_tasks, params={"user_id": user_id, "limit": limit}).all()
+    else:
+        completed_at, archived_id = _decode_archive_cursor(cursor)
+        tasks = session.exec(_select_archived_tasks_after, params={
+            "user_id": user_id, "limit": limit, "completed_at": completed_at, "archived_id": archived_id
+        }).all()
+    next_cursor = _encode_archive_cursor(tasks[-1]) if len(tasks) == limit else None
+    return tasks, next_cursor
+
+@_instrumented("get_task_history")
+def get_task_history(
+    session: Session,
+    user_id: str,
+    task_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    current_user_id: Optional[str] = None
+) -> Optional[tuple]:
+    """
+    Get one page of a task's history, newest first.
+
+    The owner can read the history of deleted, archived and purged tasks
+    too; collaborators only that of tasks still shared with them.
+
+    Args:
+        session: The request's database session
         user_id: The ID of the user who owns the task
-        task_id: The ID of the task to update
-        completed: The new completion status
-        
+        task_id: The ID of the task
+        limit: Page size
+        cursor: next_cursor from the previous page
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
     Returns:
-        Task: The updated task if successful, None otherwise
+        tuple: (list of event dicts, next page cursor or None), or None if the task is unknown or not readable by the requester
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if is_collaborator(user_id, current_user_id) and not can_access_task(session, user_id, task_id, current_user_id):
+        return None
+    # Months before the task was created cannot hold its history
+    created_at = session.exec(
+        select(Task.created_at).where(Task.id == task_id).where(Task.user_id == user_id)
+    ).first() or session.exec(
+        select(ArchivedTask.created_at).where(ArchivedTask.task_id == task_id).where(ArchivedTask.user_id == user_id)
+    ).first()
+    events, next_cursor = audit_service.get_task_history(session.connection(), user_id, task_id, limit, cursor, created_at)
+    if not events and cursor is None and created_at is None:
+        return None
+    return events, next_cursor
+
+@_instrumented("get_task_subtasks")
+def get_task_subtasks(session: Session, user_id: str, task_id: int, current_user_id: Optional[str] = None) -> Optional[List[Subtask]]:
     """
-    with Session(engine) as session:
-        statement = select(Task).where(Task.id == task_id).where(Task.user_id == user_id)
-        task = session.exec(statement).first()
-        
-        if not task:
+    Get all subtasks of one of a user's tasks.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user who owns the parent task
+        task_id: The ID of the parent task
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
+    Returns:
+        List[Subtask]: The subtasks, or None if the task does not belong to the user or is not readable by the requester
+    """
+    if not can_access_task(session, user_id, task_id, current_user_id):
+        return None
+    return session.exec(_select_task_subtasks, params={"task_id": task_id}).all()
+
+@_instrumented("get_task_subtasks_json")
+def get_task_subtasks_json(session: Session, user_id: str, task_id: int, current_user_id: Optional[str] = None) -> Optional[bytes]:
+    """
+    Get a task's subtask list as serialized JSON, from the cache when current.
+
+    The cached body is shared by the owner and every collaborator, so a
+    collaborator's access is checked before the cache is consulted.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user who owns the parent task
+        task_id: The ID of the parent task
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
+    Returns:
+        bytes: JSON array of SubtaskResponse objects, or None if the task does not belong to the user
+            or is not readable by the requester
+    """
+    checked = is_collaborator(user_id, current_user_id)
+    if checked and not can_access_task(session, user_id, task_id, current_user_id):
+        return None
+    task_cache = get_task_cache()
+    cache_key = task_cache.subtask_list_key(user_id, task_id)
+    generation = task_cache.generation(cache_key)
+    body = task_cache.get(cache_key, generation)
+    if body is None:
+        if checked:
+            subtasks = session.exec(_select_task_subtasks, params={"task_id": task_id}).all()
+        else:
+            subtasks = get_task_subtasks(session, user_id, task_id)
+        if subtasks is None:
             return None
-        
-        # Update the completion status
-        task.completed = completed
-        task.updated_at = datetime.utcnow()
-        
-        session.add(task)
-        session.commit()
-        session.refresh(task)
-        return task
\ No newline at end of file
+        body = _subtask_list_adapter.dump_json([SubtaskResponse.model_validate(subtask, from_attributes=True) for subtask in subtasks])
+        task_cache.set(cache_key, generation, body)
+    return body
+
+@_instrumented("create_subtask_for_task")
+def create_subtask_for_task(
+    session: Session,
+    user_id: str,
+    task_id: int,
+    subtask_data: dict,
+    idempotency: Optional[IdempotentRequest] = None,
+    current_user_id: Optional[str] = None
+) -> Optional[Subtask]:
+    """
+    Create a new subtask under one of a user's tasks, at the end of its list.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user who owns the parent task
+        task_id: The ID of the parent task
+        subtask_data: Subtask field values
+        idempotency: Idempotency-Key request whose response is stored with the subtask
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
+    Returns:
+        Subtask: The created subtask, or None if the task does not belong to the user or the requester may not edit it
+    """
+    if not can_access_task(session, user_id, task_id, current_user_id, WRITE_ROLES):
+        return None
+
+    subtask = Subtask(**subtask_data, task_id=task_id, position=append_subtask_position(session.connection(), task_id))
+    session.add(subtask)
+    session.flush()
+    _record_subtask_event(session, "subtask.created", user_id, subtask)
+    if idempotency is not None:
+        record_response(session, idempotency, 201, SubtaskResponse.model_validate(subtask, from_attributes=True).model_dump_json())
+    session.commit()
+    _after_task_write(user_id, task_id, task_list=False)
+    return subtask
+
+def _find_user_subtask(
+    session: Session, user_id: str, task_id: int, subtask_id: int, current_user_id: Optional[str] = None
+) -> Optional[Subtask]:
+    if not can_access_task(session, user_id, task_id, current_user_id, WRITE_ROLES):
+        return None
+    return session.exec(_select_task_subtask, params={"task_id": task_id, "subtask_id": subtask_id}).first()
+
+def _owned_subtask_update(
+    user_id: str, task_id: int, subtask_id: int, expected_version: Optional[int], current_user_id: Optional[str] = None
+):
+    # Ownership (or sharing) of the parent task is checked by the same UPDATE
+    parent = select(Task.id).where(Task.id == task_id).where(Task.user_id == user_id).where(Task.deleted_at.is_(None))
+    if is_collaborator(user_id, current_user_id):
+        parent = parent.where(shared_with(current_user_id, WRITE_ROLES))
+    statement = (
+        update(Subtask)
+        .where(Subtask.id == subtask_id)
+        .where(Subtask.task_id == task_id)
+        .where(Subtask.task_id.in_(parent))
+    )
+    if expected_version is not None:
+        statement = statement.where(Subtask.version == expected_version)
+    return statement
+
+@_instrumented("update_task_subtask")
+def update_task_subtask(
+    session: Session,
+    user_id: str,
+    task_id: int,
+    subtask_id: int,
+    subtask_data: dict,
+    expected_version: Optional[int] = None,
+    current_user_id: Optional[str] = None
+) -> Optional[Subtask]:
+    """
+    Update a subtask of one of a user's tasks.
+
+    Ownership of the parent task and the version are checked by the same
+    UPDATE ... RETURNING that changes the subtask.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user who owns the parent task
+        task_id: The ID of the parent task
+        subtask_id: The ID of the subtask to update
+        subtask_data: Dictionary of fields to update
+        expected_version: Version from the client's If-Match header
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
+    Returns:
+        Subtask: The updated subtask, or None if the task or subtask was not found
+
+    Raises:
+        VersionConflict: If the subtask exists but is no longer at expected_version
+    """
+    subtask = _execute_returning(session, _owned_subtask_update(user_id, task_id, subtask_id, expected_version, current_user_id).values(
+        **subtask_data,
+        updated_at=datetime.now(timezone.utc),
+        version=Subtask.version + 1
+    ).returning(Subtask))
+    if subtask is None:
+        session.rollback()
+        if expected_version is not None and _find_user_subtask(session, user_id, task_id, subtask_id, current_user_id):
+            raise VersionConflict()
+        return None
+
+    _record_subtask_event(session, "subtask.updated", user_id, subtask)
+    session.commit()
+    _after_task_write(user_id, task_id, task_list=False)
+    return subtask
+
+@_instrumented("move_task_subtask")
+def move_task_subtask(
+    session: Session,
+    user_id: str,
+    task_id: int,
+    subtask_id: int,
+    after_id: Optional[int],
+    before_id: Optional[int],
+    expected_version: Optional[int] = None,
+    current_user_id: Optional[str] = None
+) -> Optional[Subtask]:
+    """
+    Move a subtask to a new place in its task's list.
+
+    Args:
+        session: The request's write session
+        user_id: The ID of the user who owns the parent task
+        task_id: The ID of the parent task
+        subtask_id: The ID of the subtask to move
+        after_id: The subtask it should follow (None to move it to the top)
+        before_id: The subtask it should precede (None to move it to the bottom)
+        expected_version: Version from the client's If-Match header
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
+    Returns:
+        Subtask: The moved subtask, or None if the task, the subtask or a neighbour was not found
+
+    Raises:
+        VersionConflict: If the subtask exists but is no longer at expected_version
+        ValueError: If the neighbours are missing, the subtask itself, or out of order
+    """
+    if not can_access_task(session, user_id, task_id, current_user_id, WRITE_ROLES):
+        return None
+    position = subtask_position_between(session.connection(), task_id, subtask_id, after_id, before_id)
+    subtask = None
+    if position is not None:
+        subtask = _execute_returning(session, _owned_subtask_update(user_id, task_id, subtask_id, expected_version).values(
+            position=position,
+            version=Subtask.version + 1
+        ).returning(Subtask))
+    if subtask is None:
+        session.rollback()
+        if expected_version is not None and _find_user_subtask(session, user_id, task_id, subtask_id, current_user_id):
+            raise VersionConflict()
+        return None
+
+    _record_subtask_event(session, "subtask.moved", user_id, subtask)
+    session.commit()
+    _after_task_write(user_id, task_id, task_list=False)
+    return subtask
+
+@_instrumented("delete_task_subtask")
+def delete_task_subtask(session: Session, user_id: str, task_id: int, subtask_id: int, current_user_id: Optional[str] = None) -> bool:
+    """
+    Delete a subtask of one of a user's tasks.
+
+    Args:
+        session: The request's database session
+        user_id: The ID of the user who owns the parent task
+        task_id: The ID of the parent task
+        subtask_id: The ID of the subtask to delete
+        current_user_id: The ID of the requesting user, if it may be a collaborator
+
+    Returns:
+        bool: True if deletion was successful, False if the task or subtask was not found
+    """
+    subtask = _find_user_subtask(session, user_id, task_id, subtask_id, current_user_id)
+    if not subtask:
+        return False
+
+    session.delete(subtask)
+    record_event(session, "subtask.deleted", user_id, task_id, subtask_id)
+    session.commit()
+    _after_task_write(user_id, task_id, task_list=False)
+    return True
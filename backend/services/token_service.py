@@ -0,0 +1,211 @@
+"""
+Token service module for the Todo Application.
+
+Logins get a short-lived access token (ACCESS_TOKEN_EXPIRE_MINUTES) and a
+refresh token (REFRESH_TOKEN_EXPIRE_DAYS). Refresh tokens are random
+strings stored only as SHA-256 hashes. Each refresh marks the presented
+token used and issues a new one in the same family, so a refresh token
+works once. Presenting a used token again means it was copied, and the
+whole family is revoked along with the access tokens issued from it.
+
+Access tokens are revoked by jti through revocation.py.
+"""
+
+import hashlib
+import os
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from sqlalchemy import delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+from config import load_environment
+from models import RefreshToken, RevokedToken, User, as_naive_utc
+from middleware.auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token
+from revocation import get_revocation_list
+
+# Load environment variables
+load_environment()
+
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+refresh_table = RefreshToken.__table__
+revoked_table = RevokedToken.__table__
+
+class InvalidRefreshToken(Exception):
+    """Raised when a refresh token is unknown, expired, revoked or reused."""
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def user_claims(user: User) -> dict:
+    """The profile claims a user's access tokens carry, on login and on every refresh."""
+    return {"email": user.email, "name": user.name}
+
+def _issue(session: Session, user_id: str, claims: dict, family_id: str) -> Tuple[str, str]:
+    # Add an access token and a refresh token of the family to the session
+    jti = uuid.uuid4().hex
+    access_token = create_access_token({**claims, "sub": user_id, "jti": jti})
+    refresh_token = secrets.token_urlsafe(32)
+    session.add(RefreshToken(
+        token_hash=_hash_token(refresh_token),
+        user_id=user_id,
+        family_id=family_id,
+        access_jti=jti,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return access_token, refresh_token
+
+def issue_tokens(session: Session, user_id: str, claims: Optional[dict] = None) -> Tuple[str, str]:
+    """
+    Start a new refresh token family for a login.
+
+    Args:
+        session: A session on the primary database
+        user_id: The ID of the user logging in
+        claims: Extra access token claims (such as email)
+
+    Returns:
+        tuple: (access token, refresh token)
+    """
+    tokens = _issue(session, user_id, claims or {}, uuid.uuid4().hex)
+    session.commit()
+    return tokens
+
+def _insert_revocations_ignoring_duplicates(session: Session):
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(revoked_table).on_conflict_do_nothing()
+
+def revoke_access_token(session: Session, jti: str, expires_at: datetime) -> None:
+    """
+    Revoke one access token, without committing.
+
+    Args:
+        session: A session on the primary database
+        jti: The token's jti claim
+        expires_at: When the token expires (the revocation can be forgotten after that)
+    """
+    expires_at = as_naive_utc(expires_at)
+    session.execute(_insert_revocations_ignoring_duplicates(session), [{
+        "jti": jti, "revoked_at": as_naive_utc(datetime.now(timezone.utc)), "expires_at": expires_at
+    }])
+    session.info.setdefault("revoked_jtis", []).append((jti, expires_at))
+
+def _revoke_family(session: Session, family_id: str) -> None:
+    # Revoke every refresh token of the family and the access tokens still alive from it
+    now = datetime.now(timezone.utc)
+    rows = session.exec(
+        select(RefreshToken.access_jti, RefreshToken.created_at)
+        .where(RefreshToken.family_id == family_id)
+        .where(RefreshToken.access_jti.is_not(None))
+    ).all()
+    for access_jti, created_at in rows:
+        expires_at = as_naive_utc(created_at) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        if expires_at > as_naive_utc(now):
+            revoke_access_token(session, access_jti, expires_at)
+    session.execute(
+        update(refresh_table)
+        .where(refresh_table.c.family_id == family_id)
+        .where(refresh_table.c.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+
+def _commit_revocations(session: Session) -> None:
+    # Apply revocations to this process's list once they are durable
+    session.commit()
+    revocation_list = get_revocation_list()
+    for jti, expires_at in session.info.pop("revoked_jtis", []):
+        revocation_list.add(jti, expires_at)
+
+def rotate_refresh_token(session: Session, refresh_token: str) -> Tuple[str, str, str]:
+    """
+    Exchange a refresh token for a new access token and refresh token.
+
+    The new access token's profile claims are read from the user's current
+    record, so they survive rotation and pick up email or name changes.
+
+    Args:
+        session: A session on the primary database
+        refresh_token: The refresh token from the client
+
+    Returns:
+        tuple: (user ID, access token, refresh token)
+
+    Raises:
+        InvalidRefreshToken: If the token is unknown, expired or revoked, was
+            already used (which revokes its whole family), or its user is gone
+    """
+    now = datetime.now(timezone.utc)
+    token_hash = _hash_token(refresh_token)
+    stored = session.get(RefreshToken, token_hash)
+    if stored is None or stored.revoked_at is not None or as_naive_utc(stored.expires_at) <= as_naive_utc(now):
+        raise InvalidRefreshToken()
+
+    # Mark it used only if nobody else did; a concurrent refresh with the same token loses
+    claimed = session.execute(
+        update(refresh_table)
+        .where(refresh_table.c.token_hash == token_hash)
+        .where(refresh_table.c.used_at.is_(None))
+        .where(refresh_table.c.revoked_at.is_(None))
+        .values(used_at=now)
+    ).rowcount
+    if not claimed:
+        print(f"Refresh token reuse detected for {stored.user_id}; revoking family {stored.family_id}")
+        _revoke_family(session, stored.family_id)
+        _commit_revocations(session)
+        raise InvalidRefreshToken()
+
+    user = session.get(User, stored.user_id)
+    if user is None:
+        session.rollback()
+        raise InvalidRefreshToken()
+    access_token, new_refresh_token = _issue(session, stored.user_id, user_claims(user), stored.family_id)
+    session.commit()
+    return stored.user_id, access_token, new_refresh_token
+
+def logout(
+    session: Session,
+    user_id: str,
+    jti: Optional[str],
+    expires_at: Optional[datetime],
+    refresh_token: Optional[str] = None
+) -> None:
+    """
+    Revoke the current access token and, if given, the refresh token's family.
+
+    Args:
+        session: A session on the primary database
+        user_id: The ID of the user logging out
+        jti: jti of the access token used for the request
+        expires_at: Expiry of that access token
+        refresh_token: The refresh token to revoke along with it
+    """
+    if jti is not None and expires_at is not None:
+        revoke_access_token(session, jti, expires_at)
+    if refresh_token:
+        stored = session.get(RefreshToken, _hash_token(refresh_token))
+        if stored is not None and stored.user_id == user_id:
+            _revoke_family(session, stored.family_id)
+    _commit_revocations(session)
+
+def purge_expired_tokens(engine: Engine, now: datetime, batch_size: int = 500) -> int:
+    """
+    Delete one batch of expired refresh tokens and revocations.
+
+    Args:
+        engine: Engine of the primary database
+        now: Current time
+        batch_size: Maximum number of rows of each kind to delete
+
+    Returns:
+        int: Number of rows deleted
+    """
+    now = as_naive_utc(now)
+    deleted = 0
+    with engine.begin() as conn:
+        for table, key in ((refresh_table, refresh_table.c.token_hash), (revoked_table, revoked_table.c.jti)):
+            expired = select(key).where(table.c.expires_at < now).limit(batch_size)
+            deleted += conn.execute(delete(table).where(key.in_(expired))).rowcount
+    return deleted
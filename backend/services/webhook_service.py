@@ -0,0 +1,474 @@
+"""
+Webhook service module for the Todo Application.
+
+Users subscribe URLs to their task change events. The outbox relay hands
+each batch of events to the webhook consumer in webhooks.py, which calls
+queue_deliveries(). That function groups the events per subscription into
+webhook_delivery rows of up to WEBHOOK_BATCH_SIZE events, each sent as a
+single POST. A failing endpoint only delays its own deliveries, never the
+outbox or other subscribers.
+
+The dispatcher in webhooks.py claims due deliveries with a conditional
+UPDATE that leases them, like the job queue. It POSTs them and records the
+outcome. Failures are retried with exponential backoff. After
+WEBHOOK_MAX_ATTEMPTS failures, or when the endpoint refuses the request
+outright, the delivery moves to webhook_dead_letter, where the user can
+inspect it and queue it again.
+
+Webhook URLs must point outside the service's own network. Their host is
+resolved when a subscription is created and again for every request, and
+any loopback, private, link-local or reserved address is refused (unless
+WEBHOOK_ALLOW_PRIVATE_ADDRESSES is set, for local development).
+"""
+
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import secrets
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+from sqlalchemy import bindparam, delete, func, update
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import Session, select
+from config import load_environment
+from db import record_user_write
+from models import WebhookDeadLetter, WebhookDelivery, WebhookSubscription, as_naive_utc
+
+# Load environment variables
+load_environment()
+
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))  # Events per POST
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "300"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "10"))
+WEBHOOK_RETRY_MAX_SECONDS = float(os.getenv("WEBHOOK_RETRY_MAX_SECONDS", "3600"))
+WEBHOOK_ALLOW_PRIVATE_ADDRESSES = os.getenv("WEBHOOK_ALLOW_PRIVATE_ADDRESSES", "false").lower() == "true"
+MAX_SUBSCRIPTIONS_PER_USER = 10
+
+subscription_table = WebhookSubscription.__table__
+delivery_table = WebhookDelivery.__table__
+dead_letter_table = WebhookDeadLetter.__table__
+
+# Subscriptions of the users in an outbox batch, read off the user_id index
+_select_subscriptions_for_users = (
+    select(subscription_table.c.id, subscription_table.c.user_id, subscription_table.c.event_types)
+    .where(subscription_table.c.user_id.in_(bindparam("user_ids", expanding=True)))
+    .order_by(subscription_table.c.id)
+)
+# Due deliveries, oldest first, read off the next_attempt_at index
+_select_due_deliveries = (
+    select(delivery_table.c.id)
+    .where(delivery_table.c.next_attempt_at <= bindparam("now"))
+    .order_by(delivery_table.c.next_attempt_at)
+    .limit(bindparam("limit"))
+)
+# UPDATE statements cannot bind parameters named after their columns
+_reschedule_delivery = (
+    update(delivery_table)
+    .where(delivery_table.c.id == bindparam("b_id"))
+    .values(next_attempt_at=bindparam("b_next_attempt_at"), last_error=bindparam("b_last_error"))
+)
+
+class TooManySubscriptions(ValueError):
+    """Raised when a user already has MAX_SUBSCRIPTIONS_PER_USER webhook subscriptions."""
+
+class UnsafeWebhookUrl(ValueError):
+    """Raised when a webhook URL's host does not resolve, or resolves to an address inside the network."""
+
+def resolve_host(host: str, port: int) -> List[str]:
+    """
+    Look up the addresses of a host.
+
+    Args:
+        host: Host name or address literal
+        port: Port to connect to
+
+    Returns:
+        List[str]: The addresses, in the resolver's order
+
+    Raises:
+        OSError: If the name cannot be resolved
+    """
+    return [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])  # Without any IPv6 zone
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    # is_global leaves out loopback, private, link-local, shared and reserved ranges
+    return ip.is_global and not ip.is_multicast
+
+def public_address(host: str, port: int) -> str:
+    """
+    Resolve a webhook host to the address to connect to.
+
+    Every address of the host must be public, so a name with both a public
+    and an internal record is refused rather than tried.
+
+    Args:
+        host: Host name or address literal
+        port: Port to connect to
+
+    Returns:
+        str: The first address the host resolves to
+
+    Raises:
+        UnsafeWebhookUrl: If an address is loopback, private, link-local or reserved
+        OSError: If the name cannot be resolved
+    """
+    addresses = resolve_host(host, port)
+    if not WEBHOOK_ALLOW_PRIVATE_ADDRESSES:
+        for address in addresses:
+            if not _is_public(address):
+                raise UnsafeWebhookUrl(f"{host} resolves to a non-public address ({address})")
+    return addresses[0]
+
+def default_port(scheme: str) -> int:
+    """The port of an http or https URL that names none."""
+    return 443 if scheme == "https" else 80
+
+def check_url(url: str) -> None:
+    """
+    Check that a webhook URL points outside the network.
+
+    Args:
+        url: An http or https URL
+
+    Raises:
+        UnsafeWebhookUrl: If its host does not resolve, or resolves to a non-public address
+    """
+    parts = urlsplit(url)
+    try:
+        public_address(parts.hostname, parts.port or default_port(parts.scheme))
+    except OSError:
+        raise UnsafeWebhookUrl(f"{parts.hostname} could not be resolved")
+
+def sign_payload(secret: str, timestamp: int, body: bytes) -> str:
+    """
+    Sign a webhook request body.
+
+    Receivers recompute the signature with their copy of the secret and
+    reject requests whose timestamp is too old, which stops replays.
+
+    Args:
+        secret: The subscription's secret
+        timestamp: Unix time sent in the X-Webhook-Timestamp header
+        body: The request body
+
+    Returns:
+        str: The X-Webhook-Signature header value, "sha256=" and the hex HMAC of "<timestamp>.<body>"
+    """
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+def retry_delay(attempts: int) -> float:
+    """
+    Seconds to wait before retrying a delivery that has failed `attempts` times.
+
+    Args:
+        attempts: Attempts made so far (at least 1)
+
+    Returns:
+        float: WEBHOOK_RETRY_BASE_SECONDS doubled per failed attempt, capped at WEBHOOK_RETRY_MAX_SECONDS
+    """
+    return min(WEBHOOK_RETRY_MAX_SECONDS, WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+def create_subscription(session: Session, user_id: str, url: str, event_types: Iterable[str] = ()) -> WebhookSubscription:
+    """
+    Subscribe a URL to a user's task change events.
+
+    Args:
+        session: Database session on the user's shard
+        user_id: The ID of the user
+        url: The URL to POST events to
+        event_types: Event types to send (empty for all of them)
+
+    Returns:
+        WebhookSubscription: The subscription, with its new secret
+
+    Raises:
+        TooManySubscriptions: If the user already has MAX_SUBSCRIPTIONS_PER_USER subscriptions
+        UnsafeWebhookUrl: If the URL's host does not resolve, or resolves to a non-public address
+    """
+    count = session.exec(
+        select(func.count()).select_from(subscription_table).where(subscription_table.c.user_id == user_id)
+    ).one()
+    if count >= MAX_SUBSCRIPTIONS_PER_USER:
+        raise TooManySubscriptions()
+    check_url(url)
+    subscription = WebhookSubscription(
+        user_id=user_id,
+        url=url,
+        secret=secrets.token_hex(32),
+        event_types=",".join(sorted(set(event_types)))
+    )
+    session.add(subscription)
+    session.commit()
+    record_user_write(user_id)
+    return subscription
+
+def get_user_subscriptions(session: Session, user_id: str) -> List[WebhookSubscription]:
+    """
+    Get a user's webhook subscriptions.
+
+    Args:
+        session: Database session on the user's shard
+        user_id: The ID of the user
+
+    Returns:
+        List[WebhookSubscription]: The subscriptions, oldest first
+    """
+    return session.exec(
+        select(WebhookSubscription).where(WebhookSubscription.user_id == user_id).order_by(WebhookSubscription.id)
+    ).all()
+
+def _get_user_subscription(session: Session, user_id: str, subscription_id: int) -> Optional[WebhookSubscription]:
+    subscription = session.get(WebhookSubscription, subscription_id)
+    if subscription is None or subscription.user_id != user_id:
+        return None
+    return subscription
+
+def delete_subscription(session: Session, user_id: str, subscription_id: int) -> bool:
+    """
+    Delete a subscription with its pending deliveries and dead letters.
+
+    Args:
+        session: Database session on the user's shard
+        user_id: The ID of the user
+        subscription_id: The ID of the subscription
+
+    Returns:
+        bool: False if the user has no such subscription
+    """
+    subscription = _get_user_subscription(session, user_id, subscription_id)
+    if subscription is None:
+        return False
+    session.delete(subscription)
+    session.commit()
+    record_user_write(user_id)
+    return True
+
+def get_dead_letters(session: Session, user_id: str, subscription_id: int, limit: int = 50) -> Optional[List[dict]]:
+    """
+    Get the deliveries of a subscription that were given up on, newest first.
+
+    Args:
+        session: Database session on the user's shard
+        user_id: The ID of the user
+        subscription_id: The ID of the subscription
+        limit: Maximum number of dead letters
+
+    Returns:
+        List[dict]: The dead letters with their events, or None if the user has no such subscription
+    """
+    if _get_user_subscription(session, user_id, subscription_id) is None:
+        return None
+    rows = session.exec(
+        select(WebhookDeadLetter)
+        .where(WebhookDeadLetter.subscription_id == subscription_id)
+        .order_by(WebhookDeadLetter.id.desc())
+        .limit(limit)
+    ).all()
+    return [{**row.model_dump(), "events": json.loads(row.payload)["events"]} for row in rows]
+
+def redeliver_dead_letters(session: Session, user_id: str, subscription_id: int) -> Optional[int]:
+    """
+    Queue a subscription's dead letters again, with fresh attempts.
+
+    Args:
+        session: Database session on the user's shard
+        user_id: The ID of the user
+        subscription_id: The ID of the subscription
+
+    Returns:
+        int: Number of deliveries queued, or None if the user has no such subscription
+    """
+    if _get_user_subscription(session, user_id, subscription_id) is None:
+        return None
+    rows = session.execute(
+        select(dead_letter_table.c.id, dead_letter_table.c.payload, dead_letter_table.c.event_count, dead_letter_table.c.created_at)
+        .where(dead_letter_table.c.subscription_id == subscription_id)
+        .order_by(dead_letter_table.c.id)
+    ).all()
+    if not rows:
+        return 0
+    now = datetime.now(timezone.utc)
+    session.execute(delivery_table.insert(), [
+        {"subscription_id": subscription_id, "payload": row.payload, "event_count": row.event_count,
+         "attempts": 0, "next_attempt_at": now, "created_at": row.created_at}
+        for row in rows
+    ])
+    session.execute(delete(dead_letter_table).where(dead_letter_table.c.id.in_([row.id for row in rows])))
+    session.commit()
+    record_user_write(user_id)
+    return len(rows)
+
+def queue_deliveries(conn: Connection, events: List[dict], batch_size: int = WEBHOOK_BATCH_SIZE) -> int:
+    """
+    Queue a batch of outbox events for the subscriptions that want them, without committing.
+
+    Each subscription gets its events in order, split into deliveries of
+    up to batch_size events.
+
+    Args:
+        conn: Connection of the task database the events came from
+        events: Outbox events, as read by the relay
+        batch_size: Events per delivery
+
+    Returns:
+        int: Number of deliveries queued
+    """
+    user_ids = sorted({event["user_id"] for event in events})
+    if not user_ids:
+        return 0
+    subscriptions = conn.execute(_select_subscriptions_for_users, {"user_ids": user_ids}).all()
+    if not subscriptions:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    deliveries = []
+    for subscription in subscriptions:
+        wanted = set(filter(None, subscription.event_types.split(",")))
+        matching = [
+            event for event in events
+            if event["user_id"] == subscription.user_id and (not wanted or event["event_type"] in wanted)
+        ]
+        for start in range(0, len(matching), batch_size):
+            chunk = matching[start:start + batch_size]
+            deliveries.append({
+                "subscription_id": subscription.id,
+                "payload": json.dumps({"subscription_id": subscription.id, "events": chunk}, separators=(",", ":")),
+                "event_count": len(chunk),
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+            })
+    if deliveries:
+        conn.execute(delivery_table.insert(), deliveries)
+    return len(deliveries)
+
+def claim_deliveries(engine: Engine, now: Optional[datetime] = None, limit: int = 100) -> List[dict]:
+    """
+    Lease due deliveries to a dispatcher for WEBHOOK_LEASE_SECONDS.
+
+    A dispatcher that stops mid-send leaves its deliveries leased, and they
+    become due again when the lease ends.
+
+    Args:
+        engine: Engine of the task database
+        now: Current time (defaults to the wall clock)
+        limit: Maximum number of deliveries
+
+    Returns:
+        List[dict]: Deliveries with id, subscription_id, payload, event_count, attempts (including this one), created_at, url and secret
+    """
+    now = as_naive_utc(now or datetime.now(timezone.utc))
+    with engine.begin() as conn:
+        due = conn.execute(
+            _select_due_deliveries.with_for_update(skip_locked=True), {"now": now, "limit": limit}
+        ).scalars().all()
+        if not due:
+            return []
+        # Conditional on the deliveries still being due, so each is leased to one dispatcher
+        rows = conn.execute(
+            update(delivery_table)
+            .where(delivery_table.c.id.in_(due))
+            .where(delivery_table.c.next_attempt_at <= now)
+            .values(attempts=delivery_table.c.attempts + 1, next_attempt_at=now + timedelta(seconds=WEBHOOK_LEASE_SECONDS))
+            .returning(
+                delivery_table.c.id, delivery_table.c.subscription_id, delivery_table.c.payload,
+                delivery_table.c.event_count, delivery_table.c.attempts, delivery_table.c.created_at
+            )
+        ).mappings().all()
+        if not rows:
+            return []
+        endpoints = {
+            row.id: (row.url, row.secret)
+            for row in conn.execute(
+                select(subscription_table.c.id, subscription_table.c.url, subscription_table.c.secret)
+                .where(subscription_table.c.id.in_({row["subscription_id"] for row in rows}))
+            )
+        }
+    deliveries = []
+    for row in sorted(rows, key=lambda row: row["id"]):
+        url, secret = endpoints[row["subscription_id"]]
+        deliveries.append({**row, "url": url, "secret": secret})
+    return deliveries
+
+def record_outcomes(engine: Engine, outcomes: List[Tuple[dict, Optional[str], bool]], now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Record what happened to a round of claimed deliveries.
+
+    Delivered ones are deleted. Failed ones are retried after a backoff,
+    unless they are out of attempts or not retryable, in which case they
+    move to the dead letters.
+
+    Args:
+        engine: Engine of the task database
+        outcomes: (delivery from claim_deliveries, error or None if delivered, whether the error is worth retrying)
+        now: Current time (defaults to the wall clock)
+
+    Returns:
+        dict: Number of deliveries delivered, retrying and dead
+    """
+    now = as_naive_utc(now or datetime.now(timezone.utc))
+    delivered, retrying, dead = [], [], []
+    for delivery, error, retryable in outcomes:
+        if error is None:
+            delivered.append(delivery["id"])
+        elif retryable and delivery["attempts"] < WEBHOOK_MAX_ATTEMPTS:
+            retrying.append({
+                "b_id": delivery["id"],
+                "b_next_attempt_at": now + timedelta(seconds=retry_delay(delivery["attempts"])),
+                "b_last_error": error[:1000],
+            })
+        else:
+            dead.append({
+                "id": delivery["id"],
+                "subscription_id": delivery["subscription_id"],
+                "payload": delivery["payload"],
+                "event_count": delivery["event_count"],
+                "attempts": delivery["attempts"],
+                "last_error": error[:1000],
+                "created_at": delivery["created_at"],
+                "failed_at": now,
+            })
+    with engine.begin() as conn:
+        if delivered:
+            conn.execute(delete(delivery_table).where(delivery_table.c.id.in_(delivered)))
+        if retrying:
+            conn.execute(_reschedule_delivery, retrying)
+        if dead:
+            # Skip deliveries whose subscription was deleted while they were in flight
+            alive = set(conn.execute(
+                select(subscription_table.c.id).where(subscription_table.c.id.in_({row["subscription_id"] for row in dead}))
+            ).scalars())
+            letters = [{key: value for key, value in row.items() if key != "id"} for row in dead if row["subscription_id"] in alive]
+            if letters:
+                conn.execute(dead_letter_table.insert(), letters)
+            conn.execute(delete(delivery_table).where(delivery_table.c.id.in_([row["id"] for row in dead])))
+    return {"delivered": len(delivered), "retrying": len(retrying), "dead": len(dead)}
+
+def purge_dead_letters(engine: Engine, failed_before: datetime, batch_size: int = 500) -> int:
+    """
+    Delete one batch of dead letters that failed before a cutoff.
+
+    Args:
+        engine: Engine of the task database
+        failed_before: Only delete dead letters that failed before this time
+        batch_size: Maximum number of dead letters to delete
+
+    Returns:
+        int: Number of dead letters deleted
+    """
+    with engine.begin() as conn:
+        old = (
+            select(dead_letter_table.c.id)
+            .where(dead_letter_table.c.failed_at < as_naive_utc(failed_before))
+            .limit(batch_size)
+        )
+        return conn.execute(delete(dead_letter_table).where(dead_letter_table.c.id.in_(old))).rowcount
@@ -0,0 +1,403 @@
+"""
+Shard rebalancing tool for the Todo Application.
+
+Moves a user's projects, tags, tasks, subtasks, archived tasks, task
+history, reminders, idempotency keys and webhook subscriptions between the
+shards listed in DATABASE_SHARD_URLS and keeps the shard map overrides in
+step.
+
+Usage:
+    python shard_tool.py locate <user_id>
+    python shard_tool.py move <user_id> <target_shard>
+    python shard_tool.py pin-all
+    python shard_tool.py rebalance [--dry-run]
+
+To add a shard: run `pin-all` with the old DATABASE_SHARD_URLS so every user
+stays where their data is, deploy the new URL list, then run `rebalance` to
+move users to their new hash home. Pause writes for a user while they move;
+rows written to the source shard during a move are not copied. A user is
+only moved once every outbox consumer has accepted their events, so no
+webhook or history entry is lost with the source's outbox.
+"""
+
+import argparse
+import json
+from typing import Dict, List, Optional
+from sqlalchemy import func, or_, select
+from db import get_shard_engines, get_shard_map, sharding_enabled
+from models import Project, Task, Subtask, TaskShare, Tag, TaskTag, ArchivedTask, ArchivedSubtask
+from models import WebhookSubscription, WebhookDelivery, WebhookDeadLetter
+from models import OutboxEvent, OutboxCursor, ReminderSent, IdempotencyKey
+from services import audit_service
+from sharding import hash_user_id
+
+task_table = Task.__table__
+subtask_table = Subtask.__table__
+project_table = Project.__table__
+task_share_table = TaskShare.__table__
+tag_table = Tag.__table__
+task_tag_table = TaskTag.__table__
+subscription_table = WebhookSubscription.__table__
+delivery_table = WebhookDelivery.__table__
+dead_letter_table = WebhookDeadLetter.__table__
+archived_task_table = ArchivedTask.__table__
+archived_subtask_table = ArchivedSubtask.__table__
+outbox_table = OutboxEvent.__table__
+cursor_table = OutboxCursor.__table__
+reminder_table = ReminderSent.__table__
+idempotency_table = IdempotencyKey.__table__
+
+class PendingOutboxEvents(RuntimeError):
+    """Raised when a user still has outbox events some consumer has not accepted."""
+
+def find_user_shards(user_id: str) -> List[int]:
+    """
+    Find the shards that physically hold rows for a user.
+
+    Args:
+        user_id: The ID of the user
+
+    Returns:
+        List[int]: Indexes of shards with at least one task for the user
+    """
+    shards = []
+    for index, engine in enumerate(get_shard_engines()):
+        with engine.connect() as conn:
+            found = conn.execute(
+                select(task_table.c.id).where(task_table.c.user_id == user_id).limit(1)
+            ).first()
+        if found:
+            shards.append(index)
+    return shards
+
+def list_shard_users(shard: int) -> List[str]:
+    """
+    List the users that have tasks or archived tasks on a shard.
+
+    Args:
+        shard: Shard index
+
+    Returns:
+        List[str]: Distinct user IDs
+    """
+    with get_shard_engines()[shard].connect() as conn:
+        return list(conn.execute(
+            select(task_table.c.user_id).union(select(archived_task_table.c.user_id))
+        ).scalars())
+
+def count_pending_events(conn, user_id: str) -> int:
+    """
+    Count a user's outbox events that some consumer has not accepted yet.
+
+    Args:
+        conn: Connection of the shard
+        user_id: The ID of the user
+
+    Returns:
+        int: Events after the slowest cursor or in any cursor's gaps
+    """
+    cursors = conn.execute(select(cursor_table.c.last_event_id, cursor_table.c.gaps)).all()
+    if not cursors:
+        # Nothing reads the outbox of a shard without cursors
+        return 0
+    pending = outbox_table.c.id > min(last_event_id for last_event_id, _ in cursors)
+    gap_ids = {int(event_id) for _, gaps in cursors for event_id in json.loads(gaps or "{}")}
+    if gap_ids:
+        pending = or_(pending, outbox_table.c.id.in_(gap_ids))
+    return conn.execute(
+        select(func.count()).select_from(outbox_table).where(outbox_table.c.user_id == user_id).where(pending)
+    ).scalar()
+
+def _remap_response(body: str, id_map: Dict[int, int], subtask_id_map: Dict[int, int]) -> str:
+    # Stored create responses are a task or a subtask, both carrying IDs the move changed
+    response = json.loads(body)
+    if not isinstance(response, dict) or "id" not in response:
+        return body
+    if "task_id" in response:
+        response["id"] = subtask_id_map.get(response["id"], response["id"])
+        response["task_id"] = id_map.get(response["task_id"], response["task_id"])
+    else:
+        response["id"] = id_map.get(response["id"], response["id"])
+        response["series_id"] = id_map.get(response.get("series_id"), response.get("series_id"))
+    return json.dumps(response)
+
+def move_user(user_id: str, target_shard: int, source_shard: Optional[int] = None) -> Dict[int, int]:
+    """
+    Move everything a user owns on their shard to another shard.
+
+    Rows are copied to the target in one transaction, the shard map is then
+    pointed at the target, and only after that are the rows deleted from the
+    source. Task and subtask IDs are allocated by the target shard, so they
+    change; series, reminders, history and stored idempotent responses are
+    remapped to the new IDs. History of archived and purged tasks keeps its
+    task ID, like archived_task.task_id does.
+
+    History rows are keyed by outbox event ID, which the target shard
+    allocates too: each copied row gets a fresh ID from the target's outbox
+    sequence, so it cannot clash with the target's own events. The user's
+    source outbox events are dropped once delivered, which is why the move
+    is refused while any are pending.
+
+    Args:
+        user_id: The ID of the user to move
+        target_shard: Index of the shard to move the user to
+        source_shard: Index of the shard the data is on (defaults to the shard map's answer)
+
+    Returns:
+        Dict[int, int]: Mapping of old task IDs to new task IDs
+
+    Raises:
+        PendingOutboxEvents: If an outbox consumer has not accepted all of the user's events yet
+    """
+    shard_map = get_shard_map()
+    engines = get_shard_engines()
+    source = shard_map.shard_for(user_id) if source_shard is None else source_shard
+    if source == target_shard:
+        return {}
+
+    # Read everything the user owns on the source shard
+    with engines[source].connect() as src:
+        pending = count_pending_events(src, user_id)
+        if pending:
+            raise PendingOutboxEvents(
+                f"{user_id} has {pending} outbox events not yet relayed on shard {source}; retry once the relay catches up"
+            )
+        project_rows = src.execute(
+            project_table.select().where(project_table.c.user_id == user_id).order_by(project_table.c.id)
+        ).mappings().all()
+        tag_rows = src.execute(
+            tag_table.select().where(tag_table.c.user_id == user_id).order_by(tag_table.c.id)
+        ).mappings().all()
+        task_rows = src.execute(
+            task_table.select().where(task_table.c.user_id == user_id).order_by(task_table.c.id)
+        ).mappings().all()
+        task_ids = [row["id"] for row in task_rows]
+        subtask_rows = src.execute(
+            subtask_table.select().where(subtask_table.c.task_id.in_(task_ids)).order_by(subtask_table.c.id)
+        ).mappings().all() if task_ids else []
+        share_rows = src.execute(
+            task_share_table.select().where(task_share_table.c.task_id.in_(task_ids))
+        ).mappings().all() if task_ids else []
+        task_tag_rows = src.execute(
+            task_tag_table.select().where(task_tag_table.c.task_id.in_(task_ids))
+        ).mappings().all() if task_ids else []
+        reminder_rows = src.execute(
+            reminder_table.select().where(reminder_table.c.task_id.in_(task_ids))
+        ).mappings().all() if task_ids else []
+        archived_rows = src.execute(
+            archived_task_table.select().where(archived_task_table.c.user_id == user_id).order_by(archived_task_table.c.id)
+        ).mappings().all()
+        archived_ids = [row["id"] for row in archived_rows]
+        archived_subtask_rows = src.execute(
+            archived_subtask_table.select().where(archived_subtask_table.c.archived_task_id.in_(archived_ids))
+        ).mappings().all() if archived_ids else []
+        # Oldest month first, so fresh history IDs keep the events in order
+        history = []
+        for month in reversed(audit_service.list_partitions(src)):
+            table = audit_service.partition_table(month)
+            history.append((month, src.execute(
+                table.select().where(table.c.user_id == user_id).order_by(table.c.id)
+            ).mappings().all()))
+        idempotency_rows = src.execute(
+            idempotency_table.select().where(idempotency_table.c.user_id == user_id)
+        ).mappings().all()
+        subscription_rows = src.execute(
+            subscription_table.select().where(subscription_table.c.user_id == user_id).order_by(subscription_table.c.id)
+        ).mappings().all()
+        subscription_ids = [row["id"] for row in subscription_rows]
+        # Pending deliveries and dead letters go along with their subscription
+        webhook_rows = [
+            (table, src.execute(
+                table.select().where(table.c.subscription_id.in_(subscription_ids)).order_by(table.c.id)
+            ).mappings().all() if subscription_ids else [])
+            for table in (delivery_table, dead_letter_table)
+        ]
+
+    # Copy it to the target shard in a single transaction
+    id_map: Dict[int, int] = {}
+    with engines[target_shard].begin() as dst:
+        project_id_map = {}
+        for row in project_rows:
+            values = {key: value for key, value in row.items() if key != "id"}
+            project_id_map[row["id"]] = dst.execute(project_table.insert().values(**values)).inserted_primary_key[0]
+        tag_id_map = {}
+        for row in tag_rows:
+            values = {key: value for key, value in row.items() if key != "id"}
+            tag_id_map[row["id"]] = dst.execute(tag_table.insert().values(**values)).inserted_primary_key[0]
+        for row in task_rows:
+            values = {key: value for key, value in row.items() if key != "id"}
+            values["project_id"] = project_id_map.get(row["project_id"])
+            id_map[row["id"]] = dst.execute(task_table.insert().values(**values)).inserted_primary_key[0]
+        # A series is named after its first occurrence, which is only known once every task has its new ID
+        for row in task_rows:
+            if row["series_id"] in id_map:
+                dst.execute(
+                    task_table.update().where(task_table.c.id == id_map[row["id"]]).values(series_id=id_map[row["series_id"]])
+                )
+        subtask_id_map = {}
+        for row in subtask_rows:
+            values = {key: value for key, value in row.items() if key != "id"}
+            values["task_id"] = id_map[row["task_id"]]
+            subtask_id_map[row["id"]] = dst.execute(subtask_table.insert().values(**values)).inserted_primary_key[0]
+        if share_rows:
+            dst.execute(task_share_table.insert(), [
+                {**row, "task_id": id_map[row["task_id"]]}
+                for row in share_rows
+            ])
+        if task_tag_rows:
+            dst.execute(task_tag_table.insert(), [
+                {"task_id": id_map[row["task_id"]], "tag_id": tag_id_map[row["tag_id"]]}
+                for row in task_tag_rows
+            ])
+        if reminder_rows:
+            dst.execute(reminder_table.insert(), [
+                {**row, "task_id": id_map[row["task_id"]]}
+                for row in reminder_rows
+            ])
+        archived_id_map = {}
+        for row in archived_rows:
+            values = {key: value for key, value in row.items() if key != "id"}
+            values["series_id"] = id_map.get(row["series_id"], row["series_id"])
+            archived_id_map[row["id"]] = dst.execute(archived_task_table.insert().values(**values)).inserted_primary_key[0]
+        if archived_subtask_rows:
+            dst.execute(archived_subtask_table.insert(), [
+                {**{key: value for key, value in row.items() if key != "id"}, "archived_task_id": archived_id_map[row["archived_task_id"]]}
+                for row in archived_subtask_rows
+            ])
+        for month, rows in history:
+            copied = []
+            for row in rows:
+                values = {
+                    **row,
+                    "task_id": id_map.get(row["task_id"], row["task_id"]),
+                    "subtask_id": subtask_id_map.get(row["subtask_id"], row["subtask_id"]),
+                }
+                # Take an ID from the target's outbox sequence; the placeholder event is never committed
+                event = {key: values[key] for key in ("event_type", "user_id", "task_id", "subtask_id", "data", "created_at")}
+                values["id"] = dst.execute(outbox_table.insert().values(**event)).inserted_primary_key[0]
+                copied.append(values)
+            if copied:
+                dst.execute(outbox_table.delete().where(outbox_table.c.id.in_([values["id"] for values in copied])))
+                audit_service.copy_rows(dst, month, copied)
+        if idempotency_rows:
+            dst.execute(idempotency_table.insert(), [
+                {**row, "response_body": _remap_response(row["response_body"], id_map, subtask_id_map)}
+                for row in idempotency_rows
+            ])
+        subscription_id_map = {}
+        for row in subscription_rows:
+            values = {key: value for key, value in row.items() if key != "id"}
+            subscription_id_map[row["id"]] = dst.execute(subscription_table.insert().values(**values)).inserted_primary_key[0]
+        for table, rows in webhook_rows:
+            if rows:
+                dst.execute(table.insert(), [
+                    {**{key: value for key, value in row.items() if key != "id"}, "subscription_id": subscription_id_map[row["subscription_id"]]}
+                    for row in rows
+                ])
+
+    # Route the user to the target before removing the source copy
+    shard_map.pin(user_id, target_shard)
+
+    with engines[source].begin() as src:
+        if task_ids:
+            src.execute(subtask_table.delete().where(subtask_table.c.task_id.in_(task_ids)))
+            src.execute(task_share_table.delete().where(task_share_table.c.task_id.in_(task_ids)))
+            src.execute(task_tag_table.delete().where(task_tag_table.c.task_id.in_(task_ids)))
+            src.execute(reminder_table.delete().where(reminder_table.c.task_id.in_(task_ids)))
+            src.execute(task_table.delete().where(task_table.c.id.in_(task_ids)))
+        if project_rows:
+            src.execute(project_table.delete().where(project_table.c.user_id == user_id))
+        if tag_rows:
+            src.execute(tag_table.delete().where(tag_table.c.user_id == user_id))
+        if archived_ids:
+            src.execute(archived_subtask_table.delete().where(archived_subtask_table.c.archived_task_id.in_(archived_ids)))
+            src.execute(archived_task_table.delete().where(archived_task_table.c.id.in_(archived_ids)))
+        for month, rows in history:
+            if rows:
+                table = audit_service.partition_table(month)
+                src.execute(table.delete().where(table.c.user_id == user_id))
+        # Every consumer has accepted these, and their task IDs are gone
+        src.execute(outbox_table.delete().where(outbox_table.c.user_id == user_id))
+        if idempotency_rows:
+            src.execute(idempotency_table.delete().where(idempotency_table.c.user_id == user_id))
+        if subscription_ids:
+            for table, _ in webhook_rows:
+                src.execute(table.delete().where(table.c.subscription_id.in_(subscription_ids)))
+            src.execute(subscription_table.delete().where(subscription_table.c.id.in_(subscription_ids)))
+
+    return id_map
+
+def pin_all() -> int:
+    """
+    Pin every user to the shard their data is on right now.
+
+    Returns:
+        int: Number of users pinned
+    """
+    assignments = {}
+    for shard in range(len(get_shard_engines())):
+        for user_id in list_shard_users(shard):
+            assignments[user_id] = shard
+    get_shard_map().pin_many(assignments)
+    return len(assignments)
+
+def rebalance(dry_run: bool = False) -> List[tuple]:
+    """
+    Move every user whose data is not on their hash home shard.
+
+    Args:
+        dry_run: Only report the moves that would be made
+
+    Returns:
+        List[tuple]: (user_id, source_shard, target_shard) for every move; users with pending outbox events are skipped
+    """
+    num_shards = len(get_shard_engines())
+    moves = []
+    for shard in range(num_shards):
+        for user_id in list_shard_users(shard):
+            home = hash_user_id(user_id, num_shards)
+            if home != shard:
+                moves.append((user_id, shard, home))
+
+    if not dry_run:
+        for move in list(moves):
+            user_id, source, target = move
+            try:
+                move_user(user_id, target, source_shard=source)
+            except PendingOutboxEvents as e:
+                print(f"Skipped: {e}")
+                moves.remove(move)
+    return moves
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Move users' tasks between shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+    locate_parser = commands.add_parser("locate", help="Show the shard a user is routed to and where their rows are")
+    locate_parser.add_argument("user_id")
+    move_parser = commands.add_parser("move", help="Move a user's tasks and subtasks to a shard")
+    move_parser.add_argument("user_id")
+    move_parser.add_argument("target_shard", type=int)
+    commands.add_parser("pin-all", help="Pin every user to the shard their rows are on")
+    rebalance_parser = commands.add_parser("rebalance", help="Move users to their hash home shard")
+    rebalance_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not sharding_enabled():
+        parser.error("DATABASE_SHARD_URLS is not set")
+
+    if args.command == "locate":
+        print(f"Routed to shard {get_shard_map().shard_for(args.user_id)}; rows on shards {find_user_shards(args.user_id)}")
+    elif args.command == "move":
+        try:
+            id_map = move_user(args.user_id, args.target_shard)
+        except PendingOutboxEvents as e:
+            parser.exit(1, f"{e}\n")
+        print(f"Moved {len(id_map)} tasks for {args.user_id} to shard {args.target_shard}")
+    elif args.command == "pin-all":
+        print(f"Pinned {pin_all()} users")
+    elif args.command == "rebalance":
+        for user_id, source, target in rebalance(dry_run=args.dry_run):
+            print(f"{'Would move' if args.dry_run else 'Moved'} {user_id}: shard {source} -> {target}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Shard map for the Todo Application.
+
+Tasks and subtasks are always queried by user_id, so user_id is the shard
+key. A user's home shard comes from a jump consistent hash of the user_id,
+which moves only about 1/N of the users when a shard is added. Individual
+users can be pinned to another shard through an overrides file, which is
+what the rebalancing tool (shard_tool.py) writes when it moves a user.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+def jump_consistent_hash(key: int, num_buckets: int) -> int:
+    """
+    Map a 64-bit key to a bucket with Lamping and Veach's jump consistent hash.
+
+    Args:
+        key: 64-bit integer key
+        num_buckets: Number of buckets (must be positive)
+
+    Returns:
+        int: Bucket index in range(num_buckets)
+    """
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+def hash_user_id(user_id: str, num_shards: int) -> int:
+    """
+    Get the hash-based home shard for a user.
+
+    Args:
+        user_id: The ID of the user
+        num_shards: Number of shards
+
+    Returns:
+        int: Shard index
+    """
+    digest = hashlib.blake2b(user_id.encode(), digest_size=8).digest()
+    return jump_consistent_hash(int.from_bytes(digest, "big"), num_shards)
+
+class ShardMap:
+    """Maps user IDs to shard indexes, with per-user overrides persisted to a JSON file."""
+
+    # Minimum seconds between checks of the overrides file for changes
+    RELOAD_INTERVAL = 1.0
+
+    def __init__(self, num_shards: int, overrides_path: Optional[str] = None):
+        if num_shards < 1:
+            raise ValueError("A shard map needs at least one shard")
+        self.num_shards = num_shards
+        self.overrides_path = overrides_path
+        self._overrides: Dict[str, int] = {}
+        self._overrides_mtime: Optional[float] = None
+        self._last_checked = 0.0
+        self._lock = threading.Lock()
+        self._reload_if_changed(force=True)
+
+    def shard_for(self, user_id: str) -> int:
+        """
+        Get the shard that holds a user's tasks and subtasks.
+
+        Args:
+            user_id: The ID of the user
+
+        Returns:
+            int: Shard index
+        """
+        self._reload_if_changed()
+        shard = self._overrides.get(user_id)
+        if shard is not None and shard < self.num_shards:
+            return shard
+        return hash_user_id(user_id, self.num_shards)
+
+    def overrides(self) -> Dict[str, int]:
+        """Get a copy of the per-user shard overrides."""
+        self._reload_if_changed(force=True)
+        return dict(self._overrides)
+
+    def pin(self, user_id: str, shard: int) -> None:
+        """
+        Pin a user to a shard, or drop the pin if it is the user's hash home.
+
+        Args:
+            user_id: The ID of the user
+            shard: Shard index the user's data now lives on
+        """
+        if not 0 <= shard < self.num_shards:
+            raise ValueError(f"Shard {shard} is out of range for {self.num_shards} shards")
+        with self._lock:
+            self._reload_if_changed(force=True, locked=True)
+            if shard == hash_user_id(user_id, self.num_shards):
+                self._overrides.pop(user_id, None)
+            else:
+                self._overrides[user_id] = shard
+            self._save()
+
+    def pin_many(self, assignments: Dict[str, int]) -> None:
+        """
+        Pin many users at once with a single write of the overrides file.
+
+        Args:
+            assignments: Mapping of user ID to shard index
+        """
+        with self._lock:
+            self._reload_if_changed(force=True, locked=True)
+            for user_id, shard in assignments.items():
+                if shard == hash_user_id(user_id, self.num_shards):
+                    self._overrides.pop(user_id, None)
+                else:
+                    self._overrides[user_id] = shard
+            self._save()
+
+    def _save(self) -> None:
+        if not self.overrides_path:
+            return
+        # Write to a temporary file and rename so readers never see a partial file
+        tmp_path = f"{self.overrides_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._overrides, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.overrides_path)
+        self._overrides_mtime = os.path.getmtime(self.overrides_path)
+
+    def _reload_if_changed(self, force: bool = False, locked: bool = False) -> None:
+        if not self.overrides_path:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_checked < self.RELOAD_INTERVAL:
+            return
+        self._last_checked = now
+        try:
+            mtime = os.path.getmtime(self.overrides_path)
+        except OSError:
+            return
+        if mtime == self._overrides_mtime:
+            return
+        with open(self.overrides_path) as f:
+            overrides = {user_id: int(shard) for user_id, shard in json.load(f).items()}
+        if locked:
+            self._overrides = overrides
+        else:
+            with self._lock:
+                self._overrides = overrides
+        self._overrides_mtime = mtime
@@ -1,17 +1,87 @@
 from sqlmodel import SQLModel
-from db import engine
-from models import Task, Subtask  # Import all models to register them with SQLModel
+from db import get_engine, get_shard_engines
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+from models import Project, Task, Subtask, TaskShare, Tag, TaskTag, OutboxEvent, OutboxCursor, WebhookSubscription, WebhookDelivery, WebhookDeadLetter, ReminderSent, ArchivedTask, ArchivedSubtask, User, RefreshToken, RevokedToken, Job  # Import all models to register them with SQLModel
+from services.position_service import backfill_subtask_positions, backfill_task_positions
+from services.project_service import backfill_task_projects
+from services.tag_service import backfill_task_tags
+
+# Statements (or callables taking the connection) that fill in a column for
+# existing rows when it is first added
+COLUMN_BACKFILLS = {
+    ("task", "completed_at"): "UPDATE task SET completed_at = updated_at WHERE completed",
+    ("task", "position"): backfill_task_positions,
+    ("subtask", "position"): backfill_subtask_positions,
+    ("task", "project_id"): backfill_task_projects,
+}
+
+# Callables taking the connection that fill in a table when it is first created
+TABLE_BACKFILLS = {
+    "task_tag": backfill_task_tags,
+}
+
+# Indexes replaced by wider ones, dropped from existing databases
+OBSOLETE_INDEXES = {
+    "task": ["ix_task_user_live"],              # by ix_task_user_position
+    "subtask": ["ix_subtask_task_id"],          # by ix_subtask_task_position
+}
+
+def migrate_engine(engine: Engine) -> None:
+    """
+    Bring one database up to the current models.
+
+    create_all only creates missing tables, so columns and indexes added to
+    existing tables are created here as well. New columns must be nullable
+    or have a server default.
+
+    Args:
+        engine: Engine of the database to migrate
+    """
+    existing_tables = set(inspect(engine).get_table_names())
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {engine.dialect.identifier_preparer.format_table(table)} ADD COLUMN {column_ddl}"))
+                    backfill = COLUMN_BACKFILLS.get((table.name, column.name))
+                    if callable(backfill):
+                        backfill(conn)
+                    elif backfill:
+                        conn.execute(text(backfill))
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index_name in OBSOLETE_INDEXES.get(table.name, []):
+                if index_name in existing_indexes:
+                    conn.execute(text(f"DROP INDEX {engine.dialect.identifier_preparer.quote(index_name)}"))
+        for table_name, backfill in TABLE_BACKFILLS.items():
+            if table_name not in existing_tables:
+                backfill(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 def init_db():
-    """Initialize the database and create tables."""
+    """
+    Initialize the database and create tables.
+
+    This is the explicit migration step for the application. It is run
+    once per deployment (`python startup.py`) instead of on every import
+    of main.py, so cold starts never pay for DDL round trips.
+    """
     print("Initializing database...")
     try:
-        # Create all tables
-        SQLModel.metadata.create_all(engine)
+        # Create all tables on the primary and on every task shard
+        for engine in [get_engine(), *get_shard_engines()]:
+            migrate_engine(engine)
         print("Database initialized successfully.")
     except Exception as e:
         print(f"Error initializing database: {e}")
         raise
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    init_db()
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+from archiver import archive_once
+from db import get_engine
+
+def test_old_completed_tasks_move_to_the_archive(client, user_id, auth_headers):
+    ids = []
+    for title in ("Old one", "Old two", "Open"):
+        task = client.post(f"/api/{user_id}/tasks", json={"title": title}, headers=auth_headers).json()
+        ids.append(task["id"])
+    client.post(f"/api/{user_id}/tasks/{ids[0]}/subtasks", json={"title": "Step"}, headers=auth_headers)
+    # Fill the subtask list cache, which archiving must clear
+    assert len(client.get(f"/api/{user_id}/tasks/{ids[0]}/subtasks", headers=auth_headers).json()) == 1
+    for task_id in ids[:2]:
+        done = client.patch(f"/api/{user_id}/tasks/{task_id}/complete", json={"completed": True}, headers=auth_headers)
+        assert done.json()["completed_at"] is not None
+
+    assert archive_once(engines=[get_engine()]) == 0
+    assert archive_once(engines=[get_engine()], now=datetime.now(timezone.utc) + timedelta(days=365), batch_size=1) >= 2
+    assert [t["title"] for t in client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()] == ["Open"]
+    assert client.get(f"/api/{user_id}/tasks/{ids[0]}/subtasks", headers=auth_headers).status_code == 404
+
+    # Newest completion first, one task per page
+    page = client.get(f"/api/{user_id}/tasks/archive", params={"limit": 1}, headers=auth_headers).json()
+    assert [t["task_id"] for t in page["tasks"]] == [ids[1]]
+    page = client.get(f"/api/{user_id}/tasks/archive", params={"limit": 1, "cursor": page["next_cursor"]}, headers=auth_headers).json()
+    assert [t["task_id"] for t in page["tasks"]] == [ids[0]]
+    last = client.get(f"/api/{user_id}/tasks/archive", params={"limit": 1, "cursor": page["next_cursor"]}, headers=auth_headers).json()
+    assert last == {"tasks": [], "next_cursor": None}
+    assert client.get(f"/api/{user_id}/tasks/archive", params={"cursor": "bogus"}, headers=auth_headers).status_code == 400
@@ -0,0 +1,63 @@
+from datetime import datetime
+from db import get_engine
+from middleware.auth import create_access_token
+from services import audit_service
+import outbox
+
+def relay():
+    outbox.relay_once(consumers=[outbox.AuditLogConsumer("test-audit")])
+
+def test_history_lists_every_change_newest_first(client, user_id, auth_headers):
+    api = f"/api/{user_id}"
+    task = client.post(f"{api}/tasks", json={"title": "Draft"}, headers=auth_headers).json()
+    client.put(f"{api}/tasks/{task['id']}", json={"title": "Draft v2"}, headers=auth_headers)
+    client.patch(f"{api}/tasks/{task['id']}/complete", json={"completed": True}, headers=auth_headers)
+    subtask = client.post(f"{api}/tasks/{task['id']}/subtasks", json={"title": "Proofread"}, headers=auth_headers).json()
+    client.delete(f"{api}/tasks/{task['id']}", headers=auth_headers)
+    relay()
+
+    events, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get(f"{api}/tasks/{task['id']}/history", params=params, headers=auth_headers).json()
+        events.extend(page["events"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert [(e["event_type"], e["subtask_id"]) for e in events] == [
+        ("task.deleted", None), ("subtask.created", subtask["id"]), ("task.completed", None),
+        ("task.updated", None), ("task.created", None),
+    ]
+    assert events[3]["data"]["title"] == "Draft v2" and events[2]["data"]["completed"] is True
+    # Stored compactly: no IDs that have columns of their own, no null fields
+    assert not {"id", "user_id", "task_id", "due_date"} & set(events[4]["data"])
+
+    # Deleted tasks keep their history; other users see nothing, and bad cursors are refused
+    stranger = {"Authorization": f"Bearer {create_access_token({'sub': 'someone-else'})}"}
+    assert client.get(f"{api}/tasks/{task['id']}/history", headers=stranger).status_code == 403
+    assert client.get(f"{api}/tasks/999999999/history", headers=auth_headers).status_code == 404
+    assert client.get(f"{api}/tasks/{task['id']}/history", params={"cursor": "bogus"}, headers=auth_headers).status_code == 400
+
+def test_redelivered_events_are_stored_once_and_old_months_are_dropped():
+    engine = get_engine()
+    events = [
+        {"id": 10_000_000 + i, "event_type": "task.updated", "user_id": "audit-user", "task_id": 424242, "subtask_id": None,
+         "data": {"title": f"v{i}", "description": None}, "created_at": f"2020-0{1 + i // 2}-15T12:00:00"}
+        for i in range(4)
+    ]
+    with engine.begin() as conn:
+        assert audit_service.append_events(conn, events) == 4
+        assert audit_service.append_events(conn, events[2:]) == 0
+        assert {"202001", "202002"} <= set(audit_service.list_partitions(conn))
+
+        # Pages run across months, newest first
+        first, cursor = audit_service.get_task_history(conn, "audit-user", 424242, 3)
+        rest, end = audit_service.get_task_history(conn, "audit-user", 424242, 3, cursor)
+    assert [e["data"]["title"] for e in first + rest] == ["v3", "v2", "v1", "v0"] and end is None
+    assert first[0]["data"] == {"title": "v3"}
+
+    assert audit_service.drop_expired_partitions(engine, datetime(2021, 1, 10), keep_months=11) == 1
+    with engine.connect() as conn:
+        months = audit_service.list_partitions(conn)
+        assert "202001" not in months and "202002" in months
+        assert [e["data"]["title"] for e in audit_service.get_task_history(conn, "audit-user", 424242, 10)[0]] == ["v3", "v2"]
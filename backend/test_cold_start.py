@@ -0,0 +1,11 @@
+import subprocess
+import sys
+
+def test_import_does_not_touch_database_or_heavy_deps():
+    # Import the app in a fresh interpreter, exactly like a cold start
+    code = (
+        "import sys, db, main; "
+        "print(db._engine is None, 'jose' in sys.modules, 'passlib' in sys.modules)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "True False False"
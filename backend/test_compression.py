@@ -0,0 +1,91 @@
+import gzip
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from middleware.compression import CompressionMiddleware, choose_encoding
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/tasks")
+    def tasks():
+        return [{"id": i, "description": "x" * 50} for i in range(50)]
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/export")
+    def export():
+        return StreamingResponse((f"line {i}\n" * 20 for i in range(10)), media_type="text/plain")
+
+    return app, TestClient(app)
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+
+def test_large_bodies_are_compressed_and_small_ones_are_not():
+    _, client = make_client()
+    response = client.get("/tasks", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 50
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+def test_etag_revalidation_and_compressed_cache():
+    app, client = make_client()
+    first = client.get("/tasks", headers={"Accept-Encoding": "gzip"})
+    etag = first.headers["etag"]
+
+    second = client.get("/tasks", headers={"Accept-Encoding": "gzip"})
+    assert second.headers["etag"] == etag
+    middleware = app.middleware_stack
+    while not isinstance(middleware, CompressionMiddleware):
+        middleware = middleware.app
+    assert middleware.cache.stats()["hits"] == 1
+
+    not_modified = client.get("/tasks", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+def test_streaming_responses_are_compressed_incrementally():
+    _, client = make_client()
+    response = client.get("/export", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "".join(f"line {i}\n" * 20 for i in range(10))
+
+def test_main_app_serves_etags_and_304s(client, user_id, auth_headers):
+    # Through every middleware the real app stacks, not a bare app
+    for i in range(20):
+        client.post(f"/api/{user_id}/tasks", json={"title": f"Task {i}", "description": "x" * 50}, headers=auth_headers)
+    headers = {**auth_headers, "Accept-Encoding": "gzip"}
+    first = client.get(f"/api/{user_id}/tasks", headers=headers)
+    assert first.headers["content-encoding"] == "gzip" and "content-length" in first.headers
+    etag = first.headers["etag"]
+    not_modified = client.get(f"/api/{user_id}/tasks", headers={**headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+
+def test_cache_is_keyed_by_body_not_upstream_etag():
+    from fastapi import Response
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/t/{task_id}")
+    def task(task_id: int, response: Response):
+        # Version ETags repeat across resources
+        response.headers["ETag"] = '"1"'
+        return {"id": task_id, "description": str(task_id) * 200}
+
+    client = TestClient(app)
+    first = client.get("/t/1", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/t/2", headers={"Accept-Encoding": "gzip"})
+    assert first.json()["id"] == 1 and second.json()["id"] == 2
+    # The gzip bytes are not the identity bytes, so the version ETag is only weakly equal
+    assert first.headers["etag"] == 'W/"1"'
+    assert client.get("/t/1", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"1"'
+    assert client.get("/t/1", headers={"Accept-Encoding": "gzip", "If-None-Match": '"1"'}).status_code == 304
@@ -0,0 +1,51 @@
+from sqlmodel import Session, select
+from db import get_engine
+from models import User
+from services import auth_service
+
+def test_register_then_login_with_the_stored_hash(client):
+    registration = {"email": "Ada@Example.com", "password": "correct horse", "name": "Ada"}
+    created = client.post("/api/auth/register", json=registration)
+    assert created.status_code == 201 and created.json()["email"] == "ada@example.com"
+    assert client.post("/api/auth/register", json={**registration, "email": "ada@example.com"}).status_code == 409
+
+    assert client.post("/api/auth/login", json={"email": "ada@example.com", "password": "wrong"}).status_code == 401
+    assert client.post("/api/auth/login", json={"email": "nobody@example.com", "password": "x"}).status_code == 401
+    login = client.post("/api/auth/login", json={"email": "ADA@example.com", "password": "correct horse"})
+    assert login.status_code == 200
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert client.get("/api/users/me", headers=headers).json() == {"id": created.json()["id"], "email": "ada@example.com", "name": "Ada"}
+
+def test_hash_is_upgraded_when_the_cost_is_raised(client, monkeypatch):
+    client.post("/api/auth/register", json={"email": "grace@example.com", "password": "pw", "name": "Grace"})
+    monkeypatch.setattr(auth_service, "BCRYPT_ROUNDS", 5)
+    auth_service.get_pwd_context.cache_clear()
+    try:
+        assert client.post("/api/auth/login", json={"email": "grace@example.com", "password": "pw"}).status_code == 200
+        with Session(get_engine()) as session:
+            stored = session.exec(select(User).where(User.email == "grace@example.com")).one()
+        assert stored.password_hash.startswith("$2b$05$")
+        assert client.post("/api/auth/login", json={"email": "grace@example.com", "password": "pw"}).status_code == 200
+    finally:
+        monkeypatch.undo()
+        auth_service.get_pwd_context.cache_clear()
+
+def test_first_use_profile_survives_races_and_taken_emails(client, monkeypatch):
+    import routes.auth
+    import user_storage
+    from middleware.auth import create_access_token
+
+    client.post("/api/auth/register", json={"email": "taken@example.com", "password": "pw", "name": "Taken"})
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'sso-taken', 'email': 'taken@example.com'})}"}
+    assert client.get("/api/users/me", headers=headers).status_code == 409
+
+    # Another request creates the profile between our lookup and our insert
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'sso-racer', 'email': 'racer@example.com'})}"}
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+    lookups = []
+    def lose_the_race(session, user_id):
+        lookups.append(user_id)
+        return None if len(lookups) == 1 else user_storage.get_user(session, user_id)
+    monkeypatch.setattr(routes.auth, "get_user", lose_the_race)
+    assert client.get("/api/users/me", headers=headers).json()["email"] == "racer@example.com"
+    assert len(lookups) == 2
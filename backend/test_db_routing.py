@@ -0,0 +1,18 @@
+import itertools
+import db
+
+def test_reads_go_to_replicas_except_after_own_write(monkeypatch):
+    primary, replica_a, replica_b = object(), object(), object()
+    monkeypatch.setattr(db, "_engine", primary)
+    monkeypatch.setattr(db, "_replica_engines", [replica_a, replica_b])
+    monkeypatch.setattr(db, "_replica_cycle", itertools.cycle([replica_a, replica_b]))
+    monkeypatch.setattr(db, "_last_write_at", {})
+
+    assert [db.read_engine_for("alice") for _ in range(2)] == [replica_a, replica_b]
+
+    db.record_user_write("alice")
+    assert db.read_engine_for("alice") is primary
+    assert db.read_engine_for("bob") in (replica_a, replica_b)
+
+    monkeypatch.setattr(db, "READ_YOUR_WRITES_SECONDS", 0)
+    assert db.read_engine_for("alice") in (replica_a, replica_b)
@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from services import task_service
+
+def test_retried_posts_replay_the_first_response(client, user_id, auth_headers):
+    headers = {**auth_headers, "Idempotency-Key": "create-1"}
+    first = client.post(f"/api/{user_id}/tasks", json={"title": "Once"}, headers=headers)
+    retry = client.post(f"/api/{user_id}/tasks", json={"title": "Once"}, headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json() and retry.headers["Idempotency-Replayed"] == "true"
+    assert len(client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()) == 1
+
+    # Reusing the key for a different request is rejected
+    assert client.post(f"/api/{user_id}/tasks", json={"title": "Other"}, headers=headers).status_code == 422
+
+    task_id = first.json()["id"]
+    subtask_headers = {**auth_headers, "Idempotency-Key": "sub-1"}
+    subtask = client.post(f"/api/{user_id}/tasks/{task_id}/subtasks", json={"title": "Step"}, headers=subtask_headers)
+    assert client.post(f"/api/{user_id}/tasks/{task_id}/subtasks", json={"title": "Step"}, headers=subtask_headers).json() == subtask.json()
+    assert len(client.get(f"/api/{user_id}/tasks/{task_id}/subtasks", headers=auth_headers).json()) == 1
+
+def test_other_integrity_errors_are_not_taken_for_a_replay(client, user_id, auth_headers, monkeypatch):
+    def violate(*args, **kwargs):
+        raise IntegrityError("INSERT INTO task", {}, Exception("CHECK constraint failed"))
+    monkeypatch.setattr(task_service, "create_task_for_user", violate)
+    headers = {**auth_headers, "Idempotency-Key": "create-2"}
+    # The original error surfaces, not an AttributeError from a missing stored response
+    with pytest.raises(IntegrityError):
+        client.post(f"/api/{user_id}/tasks", json={"title": "Once"}, headers=headers)
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+from sqlmodel import Session
+from db import get_engine
+from middleware.auth import create_access_token
+from services import job_service
+import worker
+
+def test_export_import_and_recount_jobs(client, user_id, auth_headers):
+    api = f"/api/{user_id}"
+    project = client.post(f"{api}/projects", json={"name": "Inbox"}, headers=auth_headers).json()
+    queued = client.post(f"{api}/jobs/import", json={"tasks": [
+        {"title": "First", "project_id": project["id"], "tags": ["Home"]},
+        {"title": "Second", "completed": True, "project_id": project["id"], "due_date": "2030-01-01T09:00:00Z"},
+    ]}, headers=auth_headers)
+    assert queued.status_code == 202 and queued.json()["status"] == "queued"
+    assert queued.headers["Location"] == f"/api/jobs/{queued.json()['id']}"
+
+    worker.run_pending()
+    job = client.get(queued.headers["Location"], headers=auth_headers).json()
+    assert job["status"] == "succeeded" and job["attempts"] == 1 and len(job["result"]["task_ids"]) == 2
+    tasks = client.get(f"{api}/tasks", headers=auth_headers).json()
+    assert [(t["title"], t["tags"]) for t in tasks] == [("First", ["home"]), ("Second", [])]
+    assert client.get(f"{api}/projects", headers=auth_headers).json()[0]["task_count"] == 2
+
+    export = client.post(f"{api}/jobs/export", headers=auth_headers).json()
+    recount = client.post(f"{api}/jobs/recount-projects", headers=auth_headers).json()
+    worker.run_pending()
+    exported = client.get(f"/api/jobs/{export['id']}", headers=auth_headers).json()["result"]["tasks"]
+    assert [t["title"] for t in exported] == ["First", "Second"] and exported[0]["tags"] == ["home"]
+    assert client.get(f"/api/jobs/{recount['id']}", headers=auth_headers).json()["result"] == {"recounted": 1}
+
+    # Other users' jobs are invisible; other users cannot start jobs for someone
+    other_headers = {"Authorization": f"Bearer {create_access_token({'sub': 'someone-else'})}"}
+    assert client.get(f"/api/jobs/{export['id']}", headers=other_headers).status_code == 404
+    assert client.post("/api/someone-else/jobs/export", headers=auth_headers).status_code == 403
+
+def test_failed_jobs_retry_with_backoff_then_fail(monkeypatch):
+    calls = []
+    def flaky(job, payload):
+        calls.append(job.attempts)
+        if len(calls) < 2:
+            raise RuntimeError("temporary outage")
+        return {"ok": True}
+    monkeypatch.setitem(worker.JOB_HANDLERS, "flaky", flaky)
+    monkeypatch.setitem(worker.JOB_HANDLERS, "broken", lambda job, payload: 1 / 0)
+
+    engine = get_engine()
+    with Session(engine, expire_on_commit=False) as session:
+        retried = job_service.enqueue_job(session, "flaky", user_id="job-user")
+        broken = job_service.enqueue_job(session, "broken", user_id="job-user", max_attempts=2)
+        unknown = job_service.enqueue_job(session, "no-such-kind", user_id="job-user")
+
+    now = datetime.now(timezone.utc)
+    worker.run_pending(engine, "test-worker", now)
+    assert calls == [1]
+    # Not due again until the backoff has passed
+    assert worker.run_pending(engine, "test-worker", now + timedelta(seconds=1)) == 0
+    worker.run_pending(engine, "test-worker", now + timedelta(seconds=job_service.retry_delay(1) + 1))
+    worker.run_pending(engine, "test-worker", now + timedelta(hours=2))
+
+    with Session(engine) as session:
+        get = lambda job: job_service.get_user_job(session, job.id, "job-user")
+        assert (get(retried).status, get(retried).attempts, get(retried).result) == ("succeeded", 2, '{"ok": true}')
+        assert (get(broken).status, get(broken).attempts) == ("failed", 2)
+        assert "ZeroDivisionError" in get(broken).error
+        assert (get(unknown).status, get(unknown).attempts) == ("failed", 1)
+
+def test_expired_leases_are_reclaimed():
+    engine = get_engine()
+    with Session(engine, expire_on_commit=False) as session:
+        job = job_service.enqueue_job(session, "export", user_id="lease-user")
+    now = datetime.now(timezone.utc)
+    claimed = job_service.claim_job(engine, "crashed-worker", now)
+    assert claimed.id == job.id
+    assert job_service.claim_job(engine, "other-worker", now) is None
+    reclaimed = job_service.claim_job(engine, "other-worker", now + timedelta(seconds=job_service.JOB_LEASE_SECONDS + 1))
+    assert (reclaimed.id, reclaimed.attempts) == (job.id, 2)
+    # The first worker lost the lease, so its late result is dropped
+    assert not job_service.complete_job(engine, claimed, "crashed-worker", {})
+    assert job_service.complete_job(engine, reclaimed, "other-worker", {})
@@ -0,0 +1,48 @@
+import json
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from jose import jwt
+import jwks
+from jwt_test_keys import make_keys, sign
+
+def test_tokens_verify_against_the_cached_key_set(client, user_id, tmp_path, monkeypatch):
+    private_keys, public_jwks = make_keys()
+    jwks_path = tmp_path / "jwks.json"
+    jwks_path.write_text(json.dumps({"keys": public_jwks[:2]}))
+    cache = jwks.JWKSCache(str(jwks_path))
+    assert cache.refresh() == 2
+    monkeypatch.setattr(jwks, "JWKS_URL", str(jwks_path))
+    monkeypatch.setattr(jwks, "_jwks_cache", cache)
+
+    def get_tasks(token):
+        return client.get(f"/api/{user_id}/tasks", headers={"Authorization": f"Bearer {token}"}).status_code
+
+    for kid in ("rsa-1", "ec-1"):
+        algorithm, private_key = private_keys[kid]
+        assert get_tasks(sign({"sub": user_id}, kid, algorithm, private_key)) == 200
+
+    # A key that is not published yet is rejected and asks for an early refresh
+    ed_token = sign({"sub": user_id}, "ed-1", "EdDSA", private_keys["ed-1"][1])
+    assert get_tasks(ed_token) == 401
+    assert cache.stats()["unknown_kids"] == 1
+    jwks_path.write_text(json.dumps({"keys": public_jwks}))
+    cache.refresh()
+    assert get_tasks(ed_token) == 200
+
+    # Forged signatures, and a token naming a different algorithm than its key, are rejected
+    assert get_tasks(ed_token[:-4] + "AAAA") == 401
+    assert get_tasks(jwt.encode({"sub": user_id}, json.dumps(public_jwks[0]), algorithm="HS256", headers={"kid": "rsa-1"})) == 401
+
+def test_key_set_can_be_served_over_http(tmp_path):
+    _, public_jwks = make_keys()
+    (tmp_path / "jwks.json").write_text(json.dumps({"keys": public_jwks}))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(SimpleHTTPRequestHandler, directory=str(tmp_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        cache = jwks.JWKSCache(f"http://127.0.0.1:{server.server_port}/jwks.json", refresh_seconds=300, min_refresh_seconds=30)
+        assert cache.refresh() == 3 and not cache.refresh_due()
+        assert cache.get("missing") is None
+        assert cache.get("ed-1")[0] == "EdDSA"
+    finally:
+        server.shutdown()
@@ -8,6 +8,12 @@ def test_health_endpoint():
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
 
+def test_operation_stats_need_the_stats_token(client, user_id, auth_headers, stats_headers):
+    client.get(f"/api/{user_id}/tasks", headers=auth_headers)
+    assert client.get("/health/operations", headers=auth_headers).status_code == 401
+    stats = client.get("/health/operations", headers=stats_headers).json()
+    assert stats["get_user_tasks_json"]["calls"] >= 1
+
 if __name__ == "__main__":
     test_health_endpoint()
     print("All tests passed!")
\ No newline at end of file
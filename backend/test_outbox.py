@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, event, func, select
+from db import get_engine
+from services.outbox_service import cursor_table, get_cursor, get_cursors, outbox_table, purge_delivered_events, record_event
+import outbox
+
+def later(minutes=1):
+    # Ahead of the clock, so fresh events are old enough to purge
+    return datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+def test_every_write_reaches_each_consumer_at_least_once(client, user_id, auth_headers):
+    api = f"/api/{user_id}"
+    task = client.post(f"{api}/tasks", json={"title": "Write report"}, headers=auth_headers).json()
+    client.put(f"{api}/tasks/{task['id']}", json={"title": "Write the report"}, headers=auth_headers)
+    client.patch(f"{api}/tasks/{task['id']}/complete", json={"completed": True}, headers=auth_headers)
+    subtask = client.post(f"{api}/tasks/{task['id']}/subtasks", json={"title": "Outline"}, headers=auth_headers).json()
+    client.delete(f"{api}/tasks/{task['id']}/subtasks/{subtask['id']}", headers=auth_headers)
+    client.delete(f"{api}/tasks/{task['id']}", headers=auth_headers)
+    # A write that rolls back leaves no event
+    assert client.post(f"{api}/tasks", json={"title": "x", "project_id": 999999}, headers=auth_headers).status_code == 400
+
+    received, failures = [], []
+    def flaky(events):
+        if not failures:
+            failures.append(len(events))
+            raise RuntimeError("consumer down")
+        received.extend(events)
+    steady = []
+    consumers = [outbox.CallbackConsumer("test-flaky", flaky), outbox.CallbackConsumer("test-steady", steady.extend)]
+
+    outbox.relay_once(consumers=consumers, batch_size=3)
+    mine = lambda events: [(e["event_type"], e["subtask_id"] is not None) for e in events if e["user_id"] == user_id]
+    expected = [
+        ("task.created", False), ("task.updated", False), ("task.completed", False),
+        ("subtask.created", True), ("subtask.deleted", True), ("task.deleted", False),
+    ]
+    assert mine(steady) == expected
+    assert [e["data"]["title"] for e in steady if e["user_id"] == user_id and e["event_type"] != "task.deleted" and not e["subtask_id"]] == ["Write report", "Write the report", "Write the report"]
+    # The failed consumer did not hold the other one back, and gets everything on the next pass
+    assert failures and received == []
+    outbox.relay_once(consumers=consumers, batch_size=3)
+    assert mine(received) == expected
+    assert outbox.relay_once(consumers=consumers) == 0
+
+    # Events every consumer has accepted can be purged; IDs keep growing afterwards
+    cursors = get_cursors(get_engine())
+    assert cursors["test-flaky"] == cursors["test-steady"] == steady[-1]["id"]
+    while purge_delivered_events(get_engine(), later()):
+        pass
+    client.post(f"{api}/tasks", json={"title": "After purge"}, headers=auth_headers)
+    outbox.relay_once(consumers=consumers)
+    assert steady[-1]["event_type"] == "task.created" and steady[-1]["id"] > cursors["test-steady"]
+
+def test_events_committed_below_the_cursor_are_delivered_late():
+    engine = get_engine()
+    received = []
+    consumer = outbox.CallbackConsumer("test-gaps", received.extend)
+    outbox.relay_once(consumers=[consumer])
+    with engine.connect() as conn:
+        top = conn.execute(select(func.max(outbox_table.c.id))).scalar() or 0
+
+    def commit(event_id):
+        with engine.begin() as conn:
+            conn.execute(outbox_table.insert(), [{
+                "id": event_id, "event_type": "task.updated", "user_id": "gap-user", "task_id": event_id,
+                "data": "{}", "created_at": datetime.now(timezone.utc)
+            }])
+    def gaps():
+        with engine.connect() as conn:
+            return set(get_cursor(conn, "test-gaps")[1])
+
+    # top + 1 belongs to a transaction that is still open when top + 2 is relayed
+    commit(top + 2)
+    outbox.relay_once(consumers=[consumer])
+    assert [e["id"] for e in received[-1:]] == [top + 2] and gaps() == {top + 1}
+    commit(top + 1)
+    outbox.relay_once(consumers=[consumer])
+    assert received[-1]["id"] == top + 1 and gaps() == set()
+
+    # A gap that never fills (a rollback) is given up on after the timeout
+    commit(top + 4)
+    outbox.relay_once(consumers=[consumer])
+    assert gaps() == {top + 3}
+    outbox.relay_once(consumers=[consumer], now=later(minutes=outbox.OUTBOX_GAP_TIMEOUT_SECONDS / 60 + 1))
+    assert gaps() == set()
+    assert [e["id"] for e in received if e["user_id"] == "gap-user"] == [top + 2, top + 1, top + 4]
+
+def test_events_no_consumer_reads_are_purged_by_age(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'unconsumed.db'}")
+    outbox_table.metadata.create_all(engine, tables=[outbox_table, cursor_table])
+    with engine.begin() as conn:
+        for task_id in range(3):
+            record_event(conn, "task.created", "nobody", task_id)
+    assert purge_delivered_events(engine, datetime.now(timezone.utc) - timedelta(minutes=1)) == 0
+    assert purge_delivered_events(engine, later()) == 3
+
+def test_idle_passes_do_not_take_the_write_lock():
+    consumer = outbox.CallbackConsumer("test-idle", lambda events: None)
+    outbox.relay_once(consumers=[consumer])
+    begins = []
+    listener = lambda conn: begins.append(conn)
+    event.listen(get_engine(), "begin", listener)
+    try:
+        # Caught up: the cursor and events are read off the reader pool only
+        assert outbox.relay_once(consumers=[consumer]) == 0
+        assert begins == []
+        with get_engine().begin() as conn:
+            record_event(conn, "task.created", "idle-user", 1)
+        begins.clear()
+        # Only moving the cursor writes
+        assert outbox.relay_once(consumers=[consumer]) == 1
+        assert len(begins) == 1
+    finally:
+        event.remove(get_engine(), "begin", listener)
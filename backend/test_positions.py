@@ -0,0 +1,53 @@
+import random
+from db import get_engine
+from rebalancer import rebalance_once
+from services.position_service import key_between
+
+def test_keys_always_fit_between_neighbours():
+    rng = random.Random(40)
+    keys = [key_between(None, None)]
+    for _ in range(500):
+        i = rng.randrange(len(keys) + 1)
+        before = keys[i - 1] if i > 0 else None
+        after = keys[i] if i < len(keys) else None
+        keys.insert(i, key_between(before, after))
+    assert keys == sorted(keys) and len(set(keys)) == len(keys)
+    assert key_between("a0", "a1") == "a0V"
+
+def test_move_rewrites_one_task_and_lists_come_back_in_order(client, user_id, auth_headers):
+    ids = [client.post(f"/api/{user_id}/tasks", json={"title": title}, headers=auth_headers).json()["id"] for title in "ABCD"]
+    titles = lambda: [t["title"] for t in client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()]
+    assert titles() == ["A", "B", "C", "D"]
+
+    # D to the top, then A between C and D's old place (the bottom)
+    moved = client.patch(f"/api/{user_id}/tasks/{ids[3]}/move", json={"before_id": ids[0]}, headers=auth_headers)
+    assert moved.status_code == 200 and moved.headers["ETag"] == '"2"'
+    client.patch(f"/api/{user_id}/tasks/{ids[0]}/move", json={"after_id": ids[2]}, headers=auth_headers)
+    assert titles() == ["D", "B", "C", "A"]
+    versions = [t["version"] for t in client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()]
+    assert versions == [2, 1, 1, 2]
+
+    # Hammering one gap grows the keys until the rebalancer renumbers the list
+    for _ in range(30):
+        client.patch(f"/api/{user_id}/tasks/{ids[1]}/move", json={"after_id": ids[3], "before_id": ids[2]}, headers=auth_headers)
+        client.patch(f"/api/{user_id}/tasks/{ids[2]}/move", json={"after_id": ids[3], "before_id": ids[1]}, headers=auth_headers)
+    assert max(len(t["position"]) for t in client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()) > 8
+    assert rebalance_once(engines=[get_engine()], max_length=8) >= 1
+    tasks = client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()
+    assert [t["title"] for t in tasks] == ["D", "C", "B", "A"]
+    assert max(len(t["position"]) for t in tasks) == 2
+
+    # Bad neighbours
+    url = f"/api/{user_id}/tasks/{ids[0]}/move"
+    assert client.patch(url, json={}, headers=auth_headers).status_code == 400
+    assert client.patch(url, json={"after_id": ids[0]}, headers=auth_headers).status_code == 400
+    assert client.patch(url, json={"after_id": ids[0] + 1000}, headers=auth_headers).status_code == 404
+
+def test_subtasks_move_within_their_task(client, user_id, auth_headers):
+    task = client.post(f"/api/{user_id}/tasks", json={"title": "Trip"}, headers=auth_headers).json()
+    url = f"/api/{user_id}/tasks/{task['id']}/subtasks"
+    ids = [client.post(url, json={"title": title}, headers=auth_headers).json()["id"] for title in ("Pack", "Book", "Go")]
+    moved = client.patch(f"{url}/{ids[1]}/move", json={"before_id": ids[0]}, headers=auth_headers)
+    assert moved.status_code == 200
+    assert [s["title"] for s in client.get(url, headers=auth_headers).json()] == ["Book", "Pack", "Go"]
+    assert client.patch(f"{url}/{ids[1]}/move", json={"after_id": ids[2]}, headers={**auth_headers, "If-Match": '"1"'}).status_code == 409
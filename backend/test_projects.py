@@ -0,0 +1,41 @@
+from db import get_engine
+from services.project_service import recount_projects
+
+def test_project_counters_follow_every_task_write(client, user_id, auth_headers):
+    api = f"/api/{user_id}"
+    home = client.post(f"{api}/projects", json={"name": "Home"}, headers=auth_headers).json()
+    work = client.post(f"{api}/projects", json={"name": "Work"}, headers=auth_headers).json()
+    assert client.post(f"{api}/projects", json={"name": "Work"}, headers=auth_headers).status_code == 409
+    assert client.post(f"{api}/tasks", json={"title": "x", "project_id": 999999}, headers=auth_headers).status_code == 400
+
+    ids = [client.post(f"{api}/tasks", json={"title": f"Chore {i}", "project_id": home["id"]}, headers=auth_headers).json()["id"] for i in range(4)]
+    client.patch(f"{api}/tasks/{ids[0]}/complete", json={"completed": True}, headers=auth_headers)
+    client.patch(f"{api}/tasks/{ids[0]}/complete", json={"completed": True}, headers=auth_headers)  # No change, no count
+    client.put(f"{api}/tasks/{ids[1]}", json={"project_id": work["id"]}, headers=auth_headers)
+    client.delete(f"{api}/tasks/{ids[2]}", headers=auth_headers)
+    counts = lambda: {p["name"]: (p["task_count"], p["completed_count"]) for p in client.get(f"{api}/projects", headers=auth_headers).json()}
+    assert counts() == {"Home": (2, 1), "Work": (1, 0)}
+    client.post(f"{api}/tasks/{ids[2]}/restore", headers=auth_headers)
+    assert counts()["Home"] == (3, 1)
+
+    # Renaming touches only the project row
+    renamed = client.patch(f"{api}/projects/{home['id']}", json={"name": "House"}, headers=auth_headers).json()
+    assert renamed["name"] == "House" and renamed["task_count"] == 3
+
+    # Bulk moves by ID and by source project
+    assert client.post(f"{api}/projects/move-tasks", json={"project_id": work["id"], "task_ids": [ids[0], ids[1]]}, headers=auth_headers).json() == {"moved": 1}
+    assert counts() == {"House": (2, 0), "Work": (2, 1)}
+    assert client.post(f"{api}/projects/move-tasks", json={"project_id": home["id"], "from_project_id": work["id"]}, headers=auth_headers).json() == {"moved": 2}
+    assert [t["id"] for t in client.get(f"{api}/projects/{home['id']}/tasks", headers=auth_headers).json()] == ids
+    assert counts() == {"House": (4, 1), "Work": (0, 0)}
+    assert client.post(f"{api}/projects/move-tasks", json={"project_id": None}, headers=auth_headers).status_code == 422
+
+    # The maintained counts match a full recount
+    with get_engine().begin() as conn:
+        recount_projects(conn, [home["id"], work["id"]])
+    assert counts() == {"House": (4, 1), "Work": (0, 0)}
+
+    # Deleting a project keeps its tasks
+    assert client.delete(f"{api}/projects/{home['id']}", headers=auth_headers).status_code == 200
+    assert {t["project_id"] for t in client.get(f"{api}/tasks", headers=auth_headers).json()} == {None}
+    assert client.get(f"{api}/projects/{home['id']}/tasks", headers=auth_headers).status_code == 404
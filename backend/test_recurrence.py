@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+import pytest
+from services.recurrence_service import next_occurrence, parse_rule, validate_schedule
+
+def test_rule_parsing_and_next_occurrence():
+    monday = datetime(2030, 1, 7, 9, 0)
+    assert next_occurrence(parse_rule("daily"), monday, monday) == datetime(2030, 1, 8, 9, 0)
+    assert next_occurrence(parse_rule("FREQ=WEEKLY;INTERVAL=2"), monday, monday) == datetime(2030, 1, 21, 9, 0)
+    biweekly = parse_rule("RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH")
+    assert next_occurrence(biweekly, monday, monday) == datetime(2030, 1, 10, 9, 0)
+    assert next_occurrence(biweekly, datetime(2030, 1, 10, 9, 0), monday) == datetime(2030, 1, 21, 9, 0)
+    # Months without a 31st are skipped; missed occurrences are not back-filled
+    assert next_occurrence(parse_rule("monthly"), datetime(2030, 1, 31), datetime(2030, 1, 31)) == datetime(2030, 3, 31)
+    assert next_occurrence(parse_rule("daily"), monday, monday + timedelta(days=100, hours=1)) == monday + timedelta(days=101)
+    assert next_occurrence(parse_rule("FREQ=DAILY;UNTIL=20300108"), datetime(2030, 1, 8), monday) is None
+    with pytest.raises(ValueError):
+        parse_rule("FREQ=YEARLY")
+
+def test_monthly_rules_that_never_land_give_up():
+    february = datetime(2030, 2, 10)
+    never = "FREQ=MONTHLY;INTERVAL=12;BYMONTHDAY=31"
+    assert next_occurrence(parse_rule(never), february, february) is None
+    with pytest.raises(ValueError):
+        validate_schedule(never, february)
+    # The same rule works from a month that has a 31st, and leap days come round again
+    validate_schedule(never, datetime(2030, 1, 10))
+    leap_day = parse_rule("FREQ=MONTHLY;INTERVAL=12;BYMONTHDAY=29")
+    assert next_occurrence(leap_day, datetime(2096, 2, 29), datetime(2096, 2, 29)) == datetime(2104, 2, 29)
+
+def test_recurring_tasks_materialize_lazily(client, user_id, auth_headers):
+    due = (datetime.utcnow() + timedelta(days=1)).replace(microsecond=0)
+    created = client.post(
+        f"/api/{user_id}/tasks",
+        json={"title": "Standup", "due_date": due.isoformat(), "recurrence_rule": "daily"},
+        headers=auth_headers
+    )
+    assert created.status_code == 201
+
+    # A three-day window holds the original and the next two days; re-reading creates nothing
+    until = (due + timedelta(days=2, hours=1)).isoformat()
+    tasks = client.get(f"/api/{user_id}/tasks", params={"until": until}, headers=auth_headers).json()
+    assert [t["due_date"] for t in tasks] == [(due + timedelta(days=n)).isoformat() for n in range(3)]
+    assert {t["series_id"] for t in tasks[1:]} == {created.json()["id"]}
+    assert len(client.get(f"/api/{user_id}/tasks", params={"until": until}, headers=auth_headers).json()) == 3
+
+    # Completing the latest occurrence spawns the next one
+    client.patch(f"/api/{user_id}/tasks/{tasks[-1]['id']}/complete", json={"completed": True}, headers=auth_headers)
+    tasks = client.get(f"/api/{user_id}/tasks", params={"until": until}, headers=auth_headers).json()
+    assert tasks[-1]["due_date"] == (due + timedelta(days=3)).isoformat()
+
+    invalid = client.post(f"/api/{user_id}/tasks", json={"title": "Bad", "recurrence_rule": "FREQ=HOURLY"}, headers=auth_headers)
+    assert invalid.status_code == 422
+    never = {"title": "Bad", "due_date": "2030-02-10T09:00:00", "recurrence_rule": "FREQ=MONTHLY;INTERVAL=12;BYMONTHDAY=31"}
+    assert client.post(f"/api/{user_id}/tasks", json=never, headers=auth_headers).status_code == 422
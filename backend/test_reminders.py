@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from sqlmodel import Session
+from db import get_engine
+from models import Task
+from reminders import ReminderScheduler, ReminderSink
+
+class RecordingSink(ReminderSink):
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.reminders = []
+
+    def send(self, reminders):
+        if self.fail:
+            raise RuntimeError("sink down")
+        self.reminders.extend(reminders)
+
+def test_reminders_fire_once_per_due_date(client, user_id):
+    now = datetime(2030, 1, 1, 12, 0)
+    with Session(get_engine()) as session:
+        due_soon = Task(title="Due soon", user_id=user_id, due_date=now + timedelta(minutes=5))
+        later = Task(title="Later", user_id=user_id, due_date=now + timedelta(days=1))
+        done = Task(title="Done", user_id=user_id, completed=True, due_date=now + timedelta(minutes=5))
+        session.add_all([due_soon, later, done])
+        session.commit()
+        due_soon_id = due_soon.id
+
+    # A failing sink releases its claims so the reminder is retried
+    failing = ReminderScheduler(RecordingSink(fail=True), engines=[get_engine()], bucket_seconds=60, batch_size=1)
+    assert failing.run_once(now) == 0 and failing.failed_batches == 1
+
+    sink = RecordingSink()
+    scheduler = ReminderScheduler(sink, engines=[get_engine()], bucket_seconds=60, batch_size=1)
+    assert scheduler.run_once(now) == 1
+    assert scheduler.run_once(now + timedelta(minutes=1)) == 0
+    assert [r["task_id"] for r in sink.reminders] == [due_soon_id]
+
+    # Moving the due date earns the task a new reminder
+    with Session(get_engine()) as session:
+        task = session.get(Task, due_soon_id)
+        task.due_date = now + timedelta(minutes=10)
+        session.add(task)
+        session.commit()
+    assert scheduler.run_once(now) == 1
@@ -0,0 +1,23 @@
+from db import get_connection_hold_stats
+
+def checkouts(route):
+    return get_connection_hold_stats().get(route, {}).get("checkouts", 0)
+
+def test_rejected_requests_never_check_out_a_connection(client, auth_headers):
+    # Task lists are never shared, so another user's list is refused before any query
+    route = "GET /api/{user_id}/tasks"
+    before = checkouts(route)
+    response = client.get("/api/someone-else/tasks", headers=auth_headers)
+    assert response.status_code == 403
+    assert checkouts(route) == before
+
+def test_connection_hold_is_recorded_per_route(client, user_id, auth_headers, stats_headers):
+    task = client.post(f"/api/{user_id}/tasks", json={"title": "Measured"}, headers=auth_headers).json()
+    route = "GET /api/{user_id}/tasks/{task_id}"
+    before = checkouts(route)
+    assert client.get(f"/api/{user_id}/tasks/{task['id']}", headers=auth_headers).json()["title"] == "Measured"
+    assert checkouts(route) == before + 1
+
+    assert client.get("/health/connections").status_code == 401
+    stats = client.get("/health/connections", headers=stats_headers).json()
+    assert stats["routes"]["POST /api/{user_id}/tasks"]["checkouts"] >= 1
@@ -0,0 +1,116 @@
+import json
+from datetime import datetime
+import pytest
+from sqlmodel import SQLModel, Session, select
+import db
+import shard_tool
+from models import IdempotencyKey, OutboxCursor, OutboxEvent, Project, ReminderSent, Task, Subtask, WebhookDelivery, WebhookSubscription
+from services import audit_service
+from sharding import ShardMap, hash_user_id
+
+def test_hash_is_stable_and_moves_few_users_when_growing():
+    users = [f"user-{i}" for i in range(2000)]
+    before = {u: hash_user_id(u, 4) for u in users}
+    after = {u: hash_user_id(u, 5) for u in users}
+    moved = [u for u in users if before[u] != after[u]]
+    # Jump consistent hash moves ~1/5 of the users, and only onto the new shard
+    assert 0.1 < len(moved) / len(users) < 0.3
+    assert all(after[u] == 4 for u in moved)
+
+def test_route_and_move_user_between_sqlite_shards(tmp_path, monkeypatch):
+    urls = [f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(3)]
+    monkeypatch.setattr(db, "DATABASE_SHARD_URLS", urls)
+    monkeypatch.setattr(db, "SHARD_MAP_PATH", str(tmp_path / "shard_map.json"))
+    monkeypatch.setattr(db, "_shard_engines", None)
+    monkeypatch.setattr(db, "_shard_map", None)
+    for engine in db.get_shard_engines():
+        SQLModel.metadata.create_all(engine)
+
+    home = db.get_shard_map().shard_for("alice")
+    with Session(db.write_engine_for("alice")) as session:
+        project = Project(user_id="alice", name="Work", task_count=1)
+        session.add(project)
+        session.flush()
+        task = Task(title="Write report", user_id="alice", project_id=project.id)
+        session.add(task)
+        session.commit()
+        task_id = task.id
+        # The next occurrence of a recurring series, named after the first
+        next_task = Task(title="Write report", user_id="alice", series_id=task_id)
+        session.add(next_task)
+        session.commit()
+        next_id = next_task.id
+        session.add(Subtask(title="Outline", task_id=task_id))
+        session.add(ReminderSent(task_id=task_id, due_date=datetime(2026, 3, 1)))
+        session.add(IdempotencyKey(
+            user_id="alice", key="k1", request_hash="h", status_code=201,
+            response_body=json.dumps({"id": next_id, "series_id": task_id}), expires_at=datetime(2100, 1, 1)
+        ))
+        # One event the audit log has already accepted, and one it has not
+        session.add(OutboxCursor(consumer="audit_log", last_event_id=1))
+        session.add(OutboxEvent(event_type="task.created", user_id="alice", task_id=task_id))
+        session.add(OutboxEvent(event_type="task.updated", user_id="alice", task_id=task_id))
+        subscription = WebhookSubscription(user_id="alice", url="https://example.com/hook", secret="s")
+        session.add(subscription)
+        session.flush()
+        session.add(WebhookDelivery(subscription_id=subscription.id, payload="{}", event_count=0))
+        session.commit()
+    assert shard_tool.find_user_shards("alice") == [home]
+    target = (home + 1) % 3
+    history = [
+        {"id": 1, "task_id": task_id, "user_id": "alice", "subtask_id": None, "event_type": "task.created",
+         "data": {"title": "Draft"}, "created_at": "2026-01-05T00:00:00"},
+        {"id": 2, "task_id": task_id, "user_id": "alice", "subtask_id": None, "event_type": "task.updated",
+         "data": {"title": "Write report"}, "created_at": "2026-02-05T00:00:00"},
+    ]
+    with db.get_shard_engines()[home].begin() as conn:
+        audit_service.append_events(conn, history)
+    # The target's own history already uses event ID 1, taken from its outbox
+    with Session(db.get_shard_engines()[target]) as session:
+        session.add(OutboxEvent(event_type="task.created", user_id="bob", task_id=1))
+        session.commit()
+    with db.get_shard_engines()[target].begin() as conn:
+        audit_service.append_events(conn, [{**history[0], "user_id": "bob", "task_id": 1}])
+
+    # Users are not moved while a consumer has events of theirs to relay
+    with pytest.raises(shard_tool.PendingOutboxEvents):
+        shard_tool.move_user("alice", target)
+    assert shard_tool.find_user_shards("alice") == [home]
+    with Session(db.write_engine_for("alice")) as session:
+        session.get(OutboxCursor, "audit_log").last_event_id = 2
+        session.commit()
+
+    id_map = shard_tool.move_user("alice", target)
+    assert len(id_map) == 2
+    assert shard_tool.find_user_shards("alice") == [target]
+    assert db.get_shard_map().shard_for("alice") == target
+    # A fresh shard map reads the pin back from the overrides file
+    assert ShardMap(3, db.SHARD_MAP_PATH).shard_for("alice") == target
+
+    with Session(db.read_engine_for("alice")) as session:
+        subtasks = session.exec(select(Subtask).where(Subtask.task_id == id_map[task_id])).all()
+        moved_task = session.get(Task, id_map[task_id])
+        assert session.get(Project, moved_task.project_id).name == "Work"
+        [moved_subscription] = session.exec(select(WebhookSubscription).where(WebhookSubscription.user_id == "alice")).all()
+        assert moved_subscription.url == "https://example.com/hook"
+        assert len(session.exec(select(WebhookDelivery).where(WebhookDelivery.subscription_id == moved_subscription.id)).all()) == 1
+        assert session.get(Task, id_map[next_id]).series_id == id_map[task_id]
+        assert session.get(ReminderSent, (id_map[task_id], datetime(2026, 3, 1))) is not None
+        stored = session.get(IdempotencyKey, ("alice", "k1"))
+        assert json.loads(stored.response_body) == {"id": id_map[next_id], "series_id": id_map[task_id]}
+    assert [s.title for s in subtasks] == ["Outline"]
+
+    # History follows the task to its new ID, in order, without touching the target's own
+    with db.get_shard_engines()[target].connect() as conn:
+        events, _ = audit_service.get_task_history(conn, "alice", id_map[task_id], 10)
+        assert [e["data"]["title"] for e in events] == ["Write report", "Draft"]
+        assert all(e["id"] != 1 for e in events)
+        assert [e["data"]["title"] for e in audit_service.get_task_history(conn, "bob", 1, 10)[0]] == ["Draft"]
+    with db.get_shard_engines()[home].connect() as conn:
+        assert audit_service.get_task_history(conn, "alice", task_id, 10)[0] == []
+        assert conn.execute(select(OutboxEvent.id).where(OutboxEvent.user_id == "alice")).all() == []
+
+    # Rebalancing sends the user back to their hash home and drops the pin
+    assert shard_tool.rebalance() == [("alice", target, home)]
+    assert shard_tool.find_user_shards("alice") == [home]
+    assert db.get_shard_map().overrides() == {}
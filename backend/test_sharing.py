@@ -0,0 +1,56 @@
+import uuid
+from middleware.auth import create_access_token
+
+def test_collaborators_get_the_access_their_role_grants(client, user_id, auth_headers):
+    viewer, editor = f"user-{uuid.uuid4().hex[:12]}", f"user-{uuid.uuid4().hex[:12]}"
+    viewer_headers = {"Authorization": f"Bearer {create_access_token({'sub': viewer})}"}
+    editor_headers = {"Authorization": f"Bearer {create_access_token({'sub': editor})}"}
+    task = client.post(f"/api/{user_id}/tasks", json={"title": "Plan trip"}, headers=auth_headers).json()
+    url = f"/api/{user_id}/tasks/{task['id']}"
+
+    # Nobody else sees the task until it is shared
+    assert client.get(url, headers=viewer_headers).status_code == 403
+    assert client.put(url, json={"title": "x"}, headers=viewer_headers).status_code == 403
+    assert client.get(f"{url}/subtasks", headers=viewer_headers).status_code == 403
+    assert client.put(f"{url}/shares/{viewer}", json={"role": "viewer"}, headers=viewer_headers).status_code == 403
+    # The owner still gets 404 for tasks that do not exist
+    assert client.get(f"/api/{user_id}/tasks/999999999", headers=auth_headers).status_code == 404
+    assert client.put(f"{url}/shares/{viewer}", json={"role": "viewer"}, headers=auth_headers).json()["role"] == "viewer"
+    assert client.put(f"{url}/shares/{editor}", json={"role": "editor"}, headers=auth_headers).status_code == 200
+    assert client.put(f"{url}/shares/{user_id}", json={"role": "editor"}, headers=auth_headers).status_code == 400
+
+    # Viewers read; editors also write; only owners share
+    assert client.get(url, headers=viewer_headers).json()["title"] == "Plan trip"
+    assert client.put(url, json={"title": "x"}, headers=viewer_headers).status_code == 403
+    assert client.put(url, json={"title": "Plan holiday"}, headers=editor_headers).json()["version"] == 2
+    subtask = client.post(f"{url}/subtasks", json={"title": "Book hotel"}, headers=editor_headers)
+    assert subtask.status_code == 201
+    assert client.post(f"{url}/subtasks", json={"title": "x"}, headers=viewer_headers).status_code == 403
+    assert [s["title"] for s in client.get(f"{url}/subtasks", headers=viewer_headers).json()] == ["Book hotel"]
+    assert client.put(f"{url}/subtasks/{subtask.json()['id']}", json={"completed": True}, headers=viewer_headers).status_code == 403
+    assert client.put(f"{url}/shares/{viewer}", json={"role": "editor"}, headers=editor_headers).status_code == 403
+    assert client.delete(url, headers=editor_headers).status_code == 403
+    assert {s["user_id"] for s in client.get(f"{url}/shares", headers=viewer_headers).json()} == {viewer, editor}
+
+    # The owner's list picks up the editor's change
+    assert client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()[0]["title"] == "Plan holiday"
+
+    # A collaborator can leave, which ends their access
+    assert client.delete(f"{url}/shares/{viewer}", headers=viewer_headers).status_code == 200
+    assert client.get(url, headers=viewer_headers).status_code == 403
+
+def test_shared_with_me_pages_newest_first(client, user_id, auth_headers):
+    owners = [f"user-{uuid.uuid4().hex[:12]}" for _ in range(2)]
+    shared = []
+    for i in range(5):
+        owner = owners[i % 2]
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': owner})}"}
+        task = client.post(f"/api/{owner}/tasks", json={"title": f"Task {i}"}, headers=headers).json()
+        client.put(f"/api/{owner}/tasks/{task['id']}/shares/{user_id}", json={"role": "editor"}, headers=headers)
+        shared.append(task["id"])
+
+    page = client.get(f"/api/{user_id}/shared-tasks?limit=3", headers=auth_headers).json()
+    rest = client.get(f"/api/{user_id}/shared-tasks?limit=3&cursor={page['next_cursor']}", headers=auth_headers).json()
+    assert [t["id"] for t in page["tasks"] + rest["tasks"]] == shared[::-1]
+    assert page["tasks"][0]["role"] == "editor" and rest["next_cursor"] is None
+    assert client.get(f"/api/{owners[0]}/shared-tasks", headers=auth_headers).status_code == 403
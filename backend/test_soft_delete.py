@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+from sqlmodel import Session, select
+from db import get_engine
+from models import Task, Subtask
+from purger import purge_once
+
+def test_delete_is_soft_until_purged(client, user_id, auth_headers):
+    task = client.post(f"/api/{user_id}/tasks", json={"title": "Oops"}, headers=auth_headers).json()
+    for n in range(3):
+        client.post(f"/api/{user_id}/tasks/{task['id']}/subtasks", json={"title": f"Step {n}"}, headers=auth_headers)
+
+    assert client.delete(f"/api/{user_id}/tasks/{task['id']}", headers=auth_headers).status_code == 200
+    assert client.get(f"/api/{user_id}/tasks", headers=auth_headers).json() == []
+    assert client.get(f"/api/{user_id}/tasks/{task['id']}/subtasks", headers=auth_headers).status_code == 404
+    assert client.delete(f"/api/{user_id}/tasks/{task['id']}", headers=auth_headers).status_code == 404
+
+    # Undo brings the task and its subtasks back
+    restored = client.post(f"/api/{user_id}/tasks/{task['id']}/restore", headers=auth_headers)
+    assert restored.status_code == 200 and restored.json()["title"] == "Oops"
+    assert len(client.get(f"/api/{user_id}/tasks/{task['id']}/subtasks", headers=auth_headers).json()) == 3
+
+    # The purger only removes rows past the retention period, in batches
+    client.delete(f"/api/{user_id}/tasks/{task['id']}", headers=auth_headers)
+    assert purge_once(engines=[get_engine()]) == 0
+    assert purge_once(engines=[get_engine()], now=datetime.now(timezone.utc) + timedelta(days=30), batch_size=1) >= 1
+    with Session(get_engine()) as session:
+        assert session.get(Task, task["id"]) is None
+        assert session.exec(select(Subtask).where(Subtask.task_id == task["id"])).all() == []
+    assert client.post(f"/api/{user_id}/tasks/{task['id']}/restore", headers=auth_headers).status_code == 404
@@ -0,0 +1,47 @@
+from db import get_engine
+from models import Tag
+from services.tag_service import suggest_tags
+from sqlmodel import Session
+
+def test_tags_filter_the_task_list_and_autocomplete(client, user_id, auth_headers):
+    api = f"/api/{user_id}"
+    ids = [client.post(f"{api}/tasks", json={"title": f"Task {i}"}, headers=auth_headers).json()["id"] for i in range(3)]
+    tagged = client.put(f"{api}/tasks/{ids[0]}/tags", json={"tags": [" Urgent", "home", "urgent", ""]}, headers=auth_headers)
+    assert tagged.status_code == 200
+    assert tagged.json()["tags"] == ["home", "urgent"] and tagged.headers["ETag"] == '"2"'
+    client.put(f"{api}/tasks/{ids[1]}/tags", json={"tags": ["home"]}, headers=auth_headers)
+    client.put(f"{api}/tasks/{ids[2]}/tags", json={"tags": ["work"]}, headers=auth_headers)
+
+    # Stale If-Match, too many tags and unknown tasks are rejected
+    assert client.put(f"{api}/tasks/{ids[0]}/tags", json={"tags": []}, headers={**auth_headers, "If-Match": '"1"'}).status_code == 409
+    assert client.put(f"{api}/tasks/{ids[0]}/tags", json={"tags": [f"t{i}" for i in range(21)]}, headers=auth_headers).status_code == 422
+    assert client.put(f"{api}/tasks/999999/tags", json={"tags": ["x"]}, headers=auth_headers).status_code == 404
+
+    listed = {t["id"]: t["tags"] for t in client.get(f"{api}/tasks", headers=auth_headers).json()}
+    assert listed == {ids[0]: ["home", "urgent"], ids[1]: ["home"], ids[2]: ["work"]}
+    assert client.get(f"{api}/tasks/{ids[1]}", headers=auth_headers).json()["tags"] == ["home"]
+
+    # Repeated tag parameters must all match
+    filtered = lambda *tags: [t["id"] for t in client.get(f"{api}/tasks", params={"tag": list(tags)}, headers=auth_headers).json()]
+    assert filtered("HOME") == [ids[0], ids[1]]
+    assert filtered("home", "urgent") == [ids[0]]
+    assert filtered("home", "work") == []
+    assert filtered("missing") == []
+
+    # Replacing tags drops the old links and keeps the list cache current
+    client.put(f"{api}/tasks/{ids[0]}/tags", json={"tags": ["work"]}, headers=auth_headers)
+    assert filtered("work") == [ids[0], ids[2]]
+    assert filtered("urgent") == []
+
+    assert client.get(f"{api}/tags", params={"prefix": "Ho"}, headers=auth_headers).json() == ["home"]
+    assert client.get(f"{api}/tags", headers=auth_headers).json() == ["home", "urgent", "work"]
+    assert client.get("/api/someone-else/tags", headers=auth_headers).status_code == 403
+
+def test_autocomplete_is_a_prefix_range():
+    with Session(get_engine()) as session:
+        for name in ["ab", "abc", "abd", "ac", "b"]:
+            session.add(Tag(user_id="prefix-user", name=name))
+        session.commit()
+        assert suggest_tags(session, "prefix-user", "ab") == ["ab", "abc", "abd"]
+        assert suggest_tags(session, "prefix-user", "ab", limit=2) == ["ab", "abc"]
+        assert suggest_tags(session, "prefix-user", "z") == []
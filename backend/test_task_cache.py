@@ -0,0 +1,56 @@
+import pytest
+import cache
+from cache import LRUCacheBackend, TaskCache, get_task_cache, require_shared_cache
+
+def test_lru_backend_is_bounded_and_counts_hits():
+    cache = TaskCache(LRUCacheBackend(max_entries=2, max_bytes=1024, ttl_seconds=60))
+    for user in ("a", "b", "c"):
+        key = cache.task_list_key(user)
+        cache.set(key, cache.generation(key), b"[]")
+
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    key = cache.task_list_key("c")
+    assert cache.get(key, cache.generation(key)) == b"[]"
+    assert cache.stats()["hits"] == 1
+
+def test_stale_fill_after_invalidation_is_never_served():
+    cache = TaskCache(LRUCacheBackend(max_entries=10, max_bytes=1024, ttl_seconds=60))
+    key = cache.task_list_key("a")
+    generation = cache.generation(key)
+    cache.invalidate(key)                      # a write commits while the read is in flight
+    cache.set(key, generation, b"stale")       # the read stores what it saw
+    assert cache.get(key, cache.generation(key)) is None
+
+def test_task_list_is_cached_and_invalidated_by_writes(client, user_id, auth_headers, stats_headers):
+    client.post(f"/api/{user_id}/tasks", json={"title": "First"}, headers=auth_headers)
+    assert [t["title"] for t in client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()] == ["First"]
+
+    hits = get_task_cache().stats()["hits"]
+    assert len(client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()) == 1
+    assert get_task_cache().stats()["hits"] == hits + 1
+
+    task = client.post(f"/api/{user_id}/tasks", json={"title": "Second"}, headers=auth_headers).json()
+    assert len(client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()) == 2
+
+    subtask = client.post(f"/api/{user_id}/tasks/{task['id']}/subtasks", json={"title": "Step"}, headers=auth_headers).json()
+    assert len(client.get(f"/api/{user_id}/tasks/{task['id']}/subtasks", headers=auth_headers).json()) == 1
+    client.delete(f"/api/{user_id}/tasks/{task['id']}/subtasks/{subtask['id']}", headers=auth_headers)
+    assert client.get(f"/api/{user_id}/tasks/{task['id']}/subtasks", headers=auth_headers).json() == []
+    client.delete(f"/api/{user_id}/tasks/{task['id']}", headers=auth_headers)
+    assert len(client.get(f"/api/{user_id}/tasks", headers=auth_headers).json()) == 1
+    assert client.get("/health/cache", headers=stats_headers).json()["backend"] == "memory"
+    # User tokens do not open the statistics
+    assert client.get("/health/cache", headers=auth_headers).status_code == 401
+
+def test_out_of_process_writers_need_a_shared_cache(monkeypatch):
+    monkeypatch.setattr(cache, "TASK_CACHE_BACKEND", "memory")
+    with pytest.raises(SystemExit, match="TASK_CACHE_BACKEND=redis"):
+        require_shared_cache("The archiver")
+    for backend in ("redis", "none"):
+        monkeypatch.setattr(cache, "TASK_CACHE_BACKEND", backend)
+        require_shared_cache("The archiver")
+
+def test_statistics_are_hidden_without_a_stats_token(client):
+    assert client.get("/health/cache").status_code == 404
+    assert client.get("/health").json() == {"status": "healthy"}
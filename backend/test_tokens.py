@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+from jose import jwt
+from db import get_engine
+from revocation import RevocationList, get_revocation_list
+
+def login(client, email):
+    client.post("/api/auth/register", json={"email": email, "password": "secret", "name": "Tess"})
+    response = client.post("/api/auth/login", json={"email": email, "password": "secret"})
+    assert response.status_code == 200
+    return response.json()
+
+def test_refresh_tokens_rotate_and_reuse_revokes_the_family(client):
+    tokens = login(client, "rotate@example.com")
+    assert tokens["expires_in"] == 15 * 60
+
+    rotated = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rotated.status_code == 200
+    rotated = rotated.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    headers = {"Authorization": f"Bearer {rotated['access_token']}"}
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+    # The profile claims carry over to refreshed access tokens
+    claims = jwt.get_unverified_claims(rotated["access_token"])
+    assert (claims["email"], claims["name"]) == ("rotate@example.com", "Tess")
+
+    # Replaying the used token revokes every token of the login, including the fresh access token
+    assert client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    assert client.post("/api/auth/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+    assert client.get("/api/users/me", headers=headers).status_code == 401
+    assert client.post("/api/auth/refresh", json={"refresh_token": "made-up"}).status_code == 401
+
+def test_logout_revokes_the_access_token_everywhere(client):
+    tokens = login(client, "logout@example.com")
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+
+    # Another process learns about the revocation on its next sync
+    other_process = RevocationList()
+    other_process.sync(get_engine())
+    assert client.post("/api/auth/logout", json={"refresh_token": tokens["refresh_token"]}, headers=headers).status_code == 200
+    assert client.get("/api/users/me", headers=headers).status_code == 401
+    assert client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+    jti = jwt.get_unverified_claims(tokens["access_token"])["jti"]
+    assert get_revocation_list().is_revoked(jti) and not other_process.is_revoked(jti)
+    other_process.sync(get_engine())
+    assert other_process.is_revoked(jti)
+
+    # Entries are forgotten once the tokens they revoke have expired
+    assert other_process.sync(get_engine(), now=datetime.now(timezone.utc) + timedelta(hours=1)) == 0
+
+def test_lists_without_a_background_sync_refresh_when_stale(client):
+    tokens = login(client, "stale@example.com")
+    jti = jwt.get_unverified_claims(tokens["access_token"])["jti"]
+    other_process = RevocationList()
+    other_process.sync_if_stale(get_engine(), max_age_seconds=60)
+    assert client.post("/api/auth/logout", json={}, headers={"Authorization": f"Bearer {tokens['access_token']}"}).status_code == 200
+
+    # Fresh enough: no query, so the revocation is not seen yet
+    other_process.sync_if_stale(get_engine(), max_age_seconds=60)
+    assert other_process.syncs == 1 and not other_process.is_revoked(jti)
+    other_process.sync_if_stale(get_engine(), max_age_seconds=0)
+    assert other_process.syncs == 2 and other_process.is_revoked(jti)
@@ -0,0 +1,25 @@
+def test_if_match_rejects_stale_updates(client, user_id, auth_headers):
+    task = client.post(f"/api/{user_id}/tasks", json={"title": "Draft"}, headers=auth_headers).json()
+    assert task["version"] == 1
+    fetched = client.get(f"/api/{user_id}/tasks/{task['id']}", headers=auth_headers)
+    etag = fetched.headers["ETag"]
+    assert etag == '"1"'
+
+    # The first device's edit wins and bumps the version
+    first = client.put(f"/api/{user_id}/tasks/{task['id']}", json={"title": "Phone"}, headers={**auth_headers, "If-Match": etag})
+    assert first.status_code == 200 and first.json()["version"] == 2 and first.headers["ETag"] == '"2"'
+
+    # The second device still holds version 1
+    second = client.put(f"/api/{user_id}/tasks/{task['id']}", json={"title": "Laptop"}, headers={**auth_headers, "If-Match": etag})
+    assert second.status_code == 409
+    assert client.get(f"/api/{user_id}/tasks/{task['id']}", headers=auth_headers).json()["title"] == "Phone"
+
+    # Unknown tasks are still 404, and updates without If-Match still apply
+    assert client.put(f"/api/{user_id}/tasks/999999", json={"title": "x"}, headers={**auth_headers, "If-Match": etag}).status_code == 404
+    done = client.patch(f"/api/{user_id}/tasks/{task['id']}/complete", json={"completed": True}, headers=auth_headers)
+    assert done.json()["version"] == 3
+
+    subtask = client.post(f"/api/{user_id}/tasks/{task['id']}/subtasks", json={"title": "Step"}, headers=auth_headers).json()
+    url = f"/api/{user_id}/tasks/{task['id']}/subtasks/{subtask['id']}"
+    assert client.put(url, json={"completed": True}, headers={**auth_headers, "If-Match": '"1"'}).json()["version"] == 2
+    assert client.put(url, json={"completed": False}, headers={**auth_headers, "If-Match": '"1"'}).status_code == 409
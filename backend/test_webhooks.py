@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta, timezone
+import httpx
+import pytest
+from db import get_engine
+from services import webhook_service
+import outbox
+import webhooks
+
+# Where test hosts resolve to; anything else falls through to the real resolver
+addresses = {}
+
+@pytest.fixture(autouse=True)
+def fake_dns(monkeypatch):
+    real = webhook_service.resolve_host
+    def resolve_host(host, port):
+        if host in addresses:
+            return [addresses[host]]
+        return ["93.184.216.34"] if host.endswith(".example") else real(host, port)
+    monkeypatch.setattr(webhook_service, "resolve_host", resolve_host)
+    yield
+    addresses.clear()
+
+def later(minutes=1):
+    # Ahead of the clock, so queued deliveries are due
+    return datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+def relay():
+    outbox.relay_once(consumers=[webhooks.SubscriptionConsumer("test-webhooks")])
+
+def dispatch(handler, now=None, **kwargs):
+    async def run():
+        dispatcher = webhooks.WebhookDispatcher(transport=httpx.MockTransport(handler), **kwargs)
+        try:
+            return await dispatcher.dispatch_once(engines=[get_engine()], now=now or later())
+        finally:
+            await dispatcher.aclose()
+    return asyncio.run(run())
+
+def test_subscribers_get_signed_batches_of_the_events_they_want(client, user_id, auth_headers):
+    api = f"/api/{user_id}"
+    assert client.post(f"{api}/webhooks", json={"url": "ftp://example.com"}, headers=auth_headers).status_code == 422
+    assert client.post(f"{api}/webhooks", json={"url": "https://a.example", "event_types": ["task.exploded"]}, headers=auth_headers).status_code == 422
+    every = client.post(f"{api}/webhooks", json={"url": f"https://{user_id}.all.example/hook"}, headers=auth_headers)
+    assert every.status_code == 201 and len(every.json()["secret"]) == 64
+    done = client.post(f"{api}/webhooks", json={"url": f"https://{user_id}.done.example/hook", "event_types": ["task.completed"]}, headers=auth_headers).json()
+    listed = client.get(f"{api}/webhooks", headers=auth_headers).json()
+    assert [(s["id"], s["event_types"]) for s in listed] == [(every.json()["id"], []), (done["id"], ["task.completed"])]
+    assert all("secret" not in s for s in listed)
+
+    tasks = [client.post(f"{api}/tasks", json={"title": f"Task {i}"}, headers=auth_headers).json() for i in range(3)]
+    client.patch(f"{api}/tasks/{tasks[0]['id']}/complete", json={"completed": True}, headers=auth_headers)
+    relay()
+
+    received = {}
+    def handler(request):
+        received.setdefault(request.headers["host"], []).append(request)
+        return httpx.Response(204)
+    assert dispatch(handler)["delivered"] >= 2
+
+    # One POST per subscription, holding every matching event in order
+    [batch] = received[f"{user_id}.all.example"]
+    body = json.loads(batch.content)
+    assert [e["event_type"] for e in body["events"]] == ["task.created"] * 3 + ["task.completed"]
+    assert [e["task_id"] for e in body["events"]][:3] == [t["id"] for t in tasks]
+    [completed] = received[f"{user_id}.done.example"]
+    assert [e["event_type"] for e in json.loads(completed.content)["events"]] == ["task.completed"]
+
+    timestamp = batch.headers["X-Webhook-Timestamp"]
+    expected = hmac.new(every.json()["secret"].encode(), f"{timestamp}.".encode() + batch.content, hashlib.sha256).hexdigest()
+    assert batch.headers["X-Webhook-Signature"] == f"sha256={expected}"
+    # Sent deliveries are gone
+    assert dispatch(handler)["delivered"] == 0
+
+def test_failing_endpoints_back_off_then_dead_letter(client, user_id, auth_headers, monkeypatch):
+    api = f"/api/{user_id}"
+    flaky = client.post(f"{api}/webhooks", json={"url": f"https://{user_id}.flaky.example/hook"}, headers=auth_headers).json()
+    gone = client.post(f"{api}/webhooks", json={"url": f"https://{user_id}.gone.example/hook"}, headers=auth_headers).json()
+    client.post(f"{api}/tasks", json={"title": "Ping"}, headers=auth_headers)
+    relay()
+
+    statuses = {f"{user_id}.flaky.example": 503, f"{user_id}.gone.example": 410}
+    handler = lambda request: httpx.Response(statuses.get(request.headers["host"], 200))
+    # 5xx is retried after a backoff; 410 will not change, so it is given up on straight away
+    counts = dispatch(handler)
+    assert counts["retrying"] >= 1 and counts["dead"] >= 1
+    assert dispatch(handler)["retrying"] == 0  # Not due again yet
+    [refused] = client.get(f"{api}/webhooks/{gone['id']}/dead-letters", headers=auth_headers).json()
+    assert refused["attempts"] == 1 and refused["last_error"] == "HTTP 410"
+
+    monkeypatch.setattr(webhook_service, "WEBHOOK_MAX_ATTEMPTS", 2)
+    dispatch(handler, now=later(60))
+    [dead] = client.get(f"{api}/webhooks/{flaky['id']}/dead-letters", headers=auth_headers).json()
+    assert dead["attempts"] == 2 and dead["last_error"] == "HTTP 503"
+    assert [e["data"]["title"] for e in dead["events"]] == ["Ping"]
+
+    # Once the endpoint recovers, dead letters can be sent again
+    statuses[f"{user_id}.flaky.example"] = 200
+    assert client.post(f"{api}/webhooks/{flaky['id']}/dead-letters/redeliver", headers=auth_headers).json() == {"queued": 1}
+    assert dispatch(handler)["delivered"] >= 1
+    assert client.get(f"{api}/webhooks/{flaky['id']}/dead-letters", headers=auth_headers).json() == []
+
+    assert client.delete(f"{api}/webhooks/{gone['id']}", headers=auth_headers).status_code == 200
+    assert client.get(f"{api}/webhooks/{gone['id']}/dead-letters", headers=auth_headers).status_code == 404
+    assert client.delete(f"/api/other/webhooks/{flaky['id']}", headers=auth_headers).status_code == 403
+
+def test_requests_in_flight_are_capped_per_endpoint(client, user_id, auth_headers):
+    api = f"/api/{user_id}"
+    for name in ("one", "two"):
+        client.post(f"{api}/webhooks", json={"url": f"https://{user_id}.{name}.example/hook"}, headers=auth_headers)
+    with get_engine().begin() as conn:
+        events = [{"id": i, "event_type": "task.updated", "user_id": user_id, "task_id": i} for i in range(10)]
+        assert webhook_service.queue_deliveries(conn, events, batch_size=1) == 20
+
+    in_flight, peak = {}, {}
+    async def handler(request):
+        host = request.headers["host"]
+        in_flight[host] = in_flight.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return httpx.Response(200)
+    assert dispatch(handler, max_per_endpoint=3)["delivered"] >= 20
+    assert peak[f"{user_id}.one.example"] == peak[f"{user_id}.two.example"] == 3
+
+def test_urls_inside_the_network_are_refused(client, user_id, auth_headers):
+    api = f"/api/{user_id}"
+    addresses[f"{user_id}.internal.example"] = "10.0.0.5"
+    for url in ("http://127.0.0.1:8000/hook", "http://169.254.169.254/latest", "http://[::ffff:127.0.0.1]/",
+                f"https://{user_id}.internal.example/hook"):
+        refused = client.post(f"{api}/webhooks", json={"url": url}, headers=auth_headers)
+        assert refused.status_code == 400, url
+    assert client.post(f"{api}/webhooks", json={"url": "https://does-not-exist.invalid/hook"}, headers=auth_headers).status_code == 400
+
+    # A name re-pointed inside after subscribing is refused when sent, never connected to
+    rebound = client.post(f"{api}/webhooks", json={"url": f"https://{user_id}.rebound.example/hook"}, headers=auth_headers).json()
+    pinned = client.post(f"{api}/webhooks", json={"url": f"https://{user_id}.pinned.example/hook"}, headers=auth_headers).json()
+    client.post(f"{api}/tasks", json={"title": "Ping"}, headers=auth_headers)
+    relay()
+    addresses[f"{user_id}.rebound.example"] = "127.0.0.1"
+
+    received = []
+    def handler(request):
+        received.append(request)
+        return httpx.Response(204)
+    assert dispatch(handler)["dead"] >= 1
+    [dead] = client.get(f"{api}/webhooks/{rebound['id']}/dead-letters", headers=auth_headers).json()
+    assert "non-public" in dead["last_error"]
+    # The other request went to the checked address, named by Host and SNI
+    [sent] = [r for r in received if r.headers["host"] == f"{user_id}.pinned.example"]
+    assert sent.url.host == "93.184.216.34" and sent.extensions["sni_hostname"] == f"{user_id}.pinned.example"
+    assert client.get(f"{api}/webhooks/{pinned['id']}/dead-letters", headers=auth_headers).json() == []
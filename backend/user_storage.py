@@ -1,35 +1,48 @@
 """
-Simple in-memory user storage for demo purposes.
-In a real application, this would be replaced with a database.
+User profile storage for the Todo Application.
+
+Profiles live in the app_user table on the primary database (see
+services/auth_service.py for registration and login). These helpers keep
+the dictionary shape the profile routes use.
 """
 
-# Simple in-memory storage for user data
-user_data_store = {}
+from datetime import datetime, timezone
+from typing import Optional
+from sqlmodel import Session
+from models import User
+from services.auth_service import normalize_email
+
+def _as_dict(user: User) -> dict:
+    return {"id": user.id, "name": user.name, "email": user.email}
 
-def get_user(user_id: str):
+def get_user(session: Session, user_id: str) -> Optional[dict]:
     """Get user data by user ID."""
-    return user_data_store.get(user_id)
+    user = session.get(User, user_id)
+    return _as_dict(user) if user else None
+
+def update_user(session: Session, user_id: str, name: str = None, email: str = None) -> dict:
+    """
+    Update user data, creating the user if it does not exist.
 
-def update_user(user_id: str, name: str = None, email: str = None):
-    """Update user data."""
-    if user_id not in user_data_store:
-        # Create a new user record if it doesn't exist
-        user_data_store[user_id] = {
-            "id": user_id,
-            "name": name,
-            "email": email
-        }
+    Raises:
+        IntegrityError: If the new email belongs to another user
+    """
+    user = session.get(User, user_id)
+    if user is None:
+        user = User(id=user_id, name=name, email=normalize_email(email))
+        session.add(user)
     else:
-        # Update existing user record
         if name is not None:
-            user_data_store[user_id]["name"] = name
+            user.name = name
         if email is not None:
-            user_data_store[user_id]["email"] = email
+            user.email = normalize_email(email)
+        user.updated_at = datetime.now(timezone.utc)
+    session.commit()
+    return _as_dict(user)
 
-def create_user(user_id: str, name: str, email: str):
-    """Create a new user record."""
-    user_data_store[user_id] = {
-        "id": user_id,
-        "name": name,
-        "email": email
-    }
\ No newline at end of file
+def create_user(session: Session, user_id: str, name: str, email: str) -> dict:
+    """Create a user record without a password (for users signed in through another issuer)."""
+    user = User(id=user_id, name=name, email=normalize_email(email))
+    session.add(user)
+    session.commit()
+    return _as_dict(user)
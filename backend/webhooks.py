@@ -0,0 +1,231 @@
+"""
+Webhook dispatcher for the Todo Application.
+
+Sends the deliveries queued in webhook_delivery (see
+services/webhook_service.py) to users' webhook subscriptions. An outbox
+consumer, SubscriptionConsumer, queues them: the relay in outbox.py adds it
+when WEBHOOKS_ENABLED is set.
+
+Deliveries are claimed in rounds of WEBHOOK_CLAIM_SIZE and POSTed
+concurrently through one pooled HTTP client. Each endpoint (scheme, host and
+port) gets at most WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT requests in flight,
+so a slow receiver neither gets flooded nor takes every connection. Every
+request carries:
+    X-Webhook-Id          the delivery ID, the same on every retry
+    X-Webhook-Timestamp   Unix time of this attempt
+    X-Webhook-Signature   sha256=<HMAC-SHA256 of "<timestamp>.<body>" with the subscription secret>
+A 2xx response delivers the batch. Timeouts, connection errors, 408, 429 and
+5xx responses are retried with backoff, and any other response sends the
+batch straight to the dead letters. Delivery is at least once and batches may
+arrive out of order, so receivers should ignore event IDs they have seen.
+
+Requests go through PinnedTransport, which resolves each host, refuses
+non-public addresses and connects to the address it checked, so a name
+cannot be re-pointed at an internal service between the check and the
+connection. Such deliveries go straight to the dead letters. Redirects are
+not followed.
+
+Run it inside the API process with WEBHOOKS_ENABLED=true, or as a separate
+worker (with WEBHOOKS_ENABLED=true wherever the outbox relay runs):
+    python webhooks.py
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+from sqlalchemy.engine import Engine
+from config import load_environment
+from db import get_user_data_engines, write_engine_for
+from outbox import OutboxConsumer
+from services.webhook_service import (
+    UnsafeWebhookUrl, claim_deliveries, default_port, public_address, queue_deliveries, record_outcomes, sign_payload
+)
+
+# Load environment variables
+load_environment()
+
+WEBHOOKS_ENABLED = os.getenv("WEBHOOKS_ENABLED", "false").lower() == "true"
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "1"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT = int(os.getenv("WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT", "4"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "100"))
+WEBHOOK_CLAIM_SIZE = int(os.getenv("WEBHOOK_CLAIM_SIZE", "200"))
+
+# Statuses worth retrying; other non-2xx responses will not change on their own
+RETRYABLE_STATUSES = {408, 429}
+
+class SubscriptionConsumer(OutboxConsumer):
+    """Outbox consumer that queues each batch of events for the webhook subscriptions that want them."""
+
+    def __init__(self, name: str = "webhook_subscriptions"):
+        super().__init__(name)
+
+    def deliver(self, events: List[dict]) -> None:
+        # Queue on the shard that holds each user's subscriptions
+        by_engine: Dict[Engine, List[dict]] = {}
+        for event in events:
+            by_engine.setdefault(write_engine_for(event["user_id"]), []).append(event)
+        for engine, engine_events in by_engine.items():
+            with engine.begin() as conn:
+                queue_deliveries(conn, engine_events)
+
+def endpoint_of(url: str) -> str:
+    """The scheme, host and port of a URL, which share a concurrency limit."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+class PinnedTransport(httpx.AsyncBaseTransport):
+    """
+    Transport that connects to a checked address of each request's host.
+
+    The host is resolved once per request and refused unless every address
+    is public (see webhook_service.public_address). The request is then sent
+    to that address, with the original host kept in the Host header and as
+    the TLS server name, so certificates are still checked against it.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        port = request.url.port or default_port(request.url.scheme)
+        try:
+            address = await asyncio.to_thread(public_address, host, port)
+        except OSError as e:
+            raise httpx.ConnectError(f"Could not resolve {host}: {e}", request=request)
+        request.url = request.url.copy_with(host=address)
+        if request.url.scheme == "https":
+            request.extensions = {**request.extensions, "sni_hostname": host}
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+class WebhookDispatcher:
+    """Sends claimed deliveries through a pooled HTTP client, with a concurrency limit per endpoint."""
+
+    def __init__(
+        self,
+        max_per_endpoint: int = WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT,
+        timeout: float = WEBHOOK_TIMEOUT_SECONDS,
+        max_connections: int = WEBHOOK_MAX_CONNECTIONS,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.max_per_endpoint = max_per_endpoint
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            transport=PinnedTransport(transport or httpx.AsyncHTTPTransport(limits=limits))
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def send(self, delivery: dict) -> Tuple[dict, Optional[str], bool]:
+        """
+        POST one delivery, waiting for a free slot at its endpoint.
+
+        Args:
+            delivery: A delivery from claim_deliveries
+
+        Returns:
+            tuple: (delivery, error or None if delivered, whether the error is worth retrying)
+        """
+        endpoint = endpoint_of(delivery["url"])
+        semaphore = self._semaphores.setdefault(endpoint, asyncio.Semaphore(self.max_per_endpoint))
+        body = delivery["payload"].encode()
+        async with semaphore:
+            # Signed when sent, so the timestamp is fresh on every attempt
+            timestamp = int(time.time())
+            headers = {
+                "Content-Type": "application/json",
+                "X-Webhook-Id": str(delivery["id"]),
+                "X-Webhook-Timestamp": str(timestamp),
+                "X-Webhook-Signature": sign_payload(delivery["secret"], timestamp, body),
+            }
+            try:
+                response = await self.client.post(delivery["url"], content=body, headers=headers)
+            except UnsafeWebhookUrl as e:
+                return delivery, str(e), False
+            except httpx.HTTPError as e:
+                return delivery, f"{type(e).__name__}: {e}", True
+        if response.is_success:
+            return delivery, None, True
+        retryable = response.status_code >= 500 or response.status_code in RETRYABLE_STATUSES
+        return delivery, f"HTTP {response.status_code}", retryable
+
+    async def dispatch_engine(self, engine: Engine, now: Optional[datetime] = None, claim_size: int = WEBHOOK_CLAIM_SIZE) -> Dict[str, int]:
+        """
+        Send one task database's due deliveries until none is left.
+
+        Args:
+            engine: Engine of the task database
+            now: Time at which to consider deliveries due (defaults to the wall clock at each claim)
+            claim_size: Deliveries claimed per round
+
+        Returns:
+            dict: Number of deliveries delivered, retrying and dead
+        """
+        totals = {"delivered": 0, "retrying": 0, "dead": 0}
+        while True:
+            # No connection is held while the requests are in flight
+            deliveries = await asyncio.to_thread(claim_deliveries, engine, now, claim_size)
+            if not deliveries:
+                return totals
+            outcomes = await asyncio.gather(*(self.send(delivery) for delivery in deliveries))
+            counts = await asyncio.to_thread(record_outcomes, engine, outcomes, now)
+            for key, count in counts.items():
+                totals[key] += count
+            if len(deliveries) < claim_size:
+                return totals
+
+    async def dispatch_once(
+        self,
+        engines: Optional[List[Engine]] = None,
+        now: Optional[datetime] = None,
+        claim_size: int = WEBHOOK_CLAIM_SIZE
+    ) -> Dict[str, int]:
+        """
+        Send every due delivery, from all task databases at once.
+
+        Args:
+            engines: Task databases to send from (defaults to all of them)
+            now: Time at which to consider deliveries due (defaults to the wall clock at each claim)
+            claim_size: Deliveries claimed per round and database
+
+        Returns:
+            dict: Number of deliveries delivered, retrying and dead
+        """
+        engines = engines if engines is not None else get_user_data_engines()
+        results = await asyncio.gather(*(self.dispatch_engine(engine, now, claim_size) for engine in engines))
+        return {key: sum(result[key] for result in results) for key in ("delivered", "retrying", "dead")}
+
+async def run_forever(poll_seconds: float = WEBHOOK_POLL_SECONDS) -> None:
+    """
+    Send due deliveries every poll_seconds until cancelled.
+
+    Args:
+        poll_seconds: Delay between passes
+    """
+    dispatcher = WebhookDispatcher()
+    try:
+        while True:
+            try:
+                counts = await dispatcher.dispatch_once()
+                if counts["retrying"] or counts["dead"]:
+                    print(f"Webhooks: {counts['delivered']} delivered, {counts['retrying']} retrying, {counts['dead']} dead")
+            except Exception as e:
+                print(f"Webhook pass failed: {e}")
+            await asyncio.sleep(poll_seconds)
+    finally:
+        await dispatcher.aclose()
+
+if __name__ == "__main__":
+    print(f"Webhook dispatcher polling every {WEBHOOK_POLL_SECONDS:.0f}s, {WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT} requests per endpoint")
+    asyncio.run(run_forever())
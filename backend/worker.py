@@ -0,0 +1,181 @@
+"""
+Background job worker for the Todo Application.
+
+Runs the jobs queued in the job table (see services/job_service.py):
+exports, imports and project recounts started through the API, and archive,
+purge and recount passes queued by operators. Polls every JOB_POLL_SECONDS,
+runs due jobs one at a time, and retries failures with exponential backoff.
+Run as many workers as needed; each claims jobs with a conditional UPDATE,
+so a job runs on one worker at a time.
+
+Run it inside the API process with JOBS_ENABLED=true, or as a separate
+worker:
+    python worker.py
+    python worker.py enqueue <kind>   # Queue a maintenance job (archive, purge, recount_projects)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from cache import require_shared_cache
+from config import load_environment
+from db import get_engine, get_user_data_engines, write_engine_for
+from models import Job, Project
+from services import job_service, task_service
+from services.project_service import ProjectNotFound, recount_projects
+
+# Load environment variables
+load_environment()
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "false").lower() == "true"
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+
+project_table = Project.__table__
+
+def _user_id(job: Job) -> str:
+    if job.user_id is None:
+        raise job_service.PermanentJobError(f"{job.kind} jobs need a user")
+    return job.user_id
+
+def export_job(job: Job, payload: dict) -> Any:
+    user_id = _user_id(job)
+    with Session(write_engine_for(user_id)) as session:
+        return {"tasks": task_service.export_user_tasks(session, user_id)}
+
+def import_job(job: Job, payload: dict) -> Any:
+    # Imported here: the request model lives with the task routes
+    from routes.tasks import TaskImport
+    user_id = _user_id(job)
+    try:
+        tasks = TypeAdapter(List[TaskImport]).validate_python(payload.get("tasks", []))
+    except ValidationError as e:
+        raise job_service.PermanentJobError(str(e))
+    with Session(write_engine_for(user_id)) as session:
+        try:
+            task_ids = task_service.import_user_tasks(session, user_id, [task.model_dump() for task in tasks])
+        except ProjectNotFound as e:
+            raise job_service.PermanentJobError(str(e))
+    return {"task_ids": task_ids}
+
+def recount_projects_job(job: Job, payload: dict) -> Any:
+    # A user's projects, or every project when queued without a user
+    engines = get_user_data_engines() if job.user_id is None else [write_engine_for(job.user_id)]
+    recounted = 0
+    for engine in engines:
+        with engine.begin() as conn:
+            project_ids = None
+            if job.user_id is not None:
+                project_ids = conn.execute(
+                    select(project_table.c.id).where(project_table.c.user_id == job.user_id)
+                ).scalars().all()
+            recounted += recount_projects(conn, project_ids)
+    return {"recounted": recounted}
+
+def archive_job(job: Job, payload: dict) -> Any:
+    import archiver
+    return {"archived": archiver.archive_once()}
+
+def purge_job(job: Job, payload: dict) -> Any:
+    import purger
+    return {"purged": purger.purge_once()}
+
+# Job kind -> handler(job, payload) returning the JSON result
+JOB_HANDLERS: Dict[str, Callable[[Job, dict], Any]] = {
+    "export": export_job,
+    "import": import_job,
+    "recount_projects": recount_projects_job,
+    "archive": archive_job,
+    "purge": purge_job,
+}
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"[:64]
+
+def run_job(engine: Engine, job: Job, worker_id: str) -> bool:
+    """
+    Run a claimed job and record the outcome.
+
+    Args:
+        engine: Engine of the primary database
+        job: The claimed job
+        worker_id: Name of this worker
+
+    Returns:
+        bool: True if the job succeeded
+    """
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise job_service.PermanentJobError(f"Unknown job kind {job.kind}")
+        result = handler(job, json.loads(job.payload))
+    except Exception as e:
+        permanent = isinstance(e, job_service.PermanentJobError)
+        retrying = job_service.fail_job(engine, job, worker_id, f"{type(e).__name__}: {e}", permanent)
+        print(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {e}{'; will retry' if retrying else ''}")
+        return False
+    job_service.complete_job(engine, job, worker_id, result)
+    return True
+
+def run_pending(engine: Optional[Engine] = None, worker_id: Optional[str] = None, now: Optional[datetime] = None) -> int:
+    """
+    Run jobs until none is due.
+
+    Args:
+        engine: Engine of the primary database (defaults to the configured one)
+        worker_id: Name of this worker (defaults to host and process ID)
+        now: Time at which to consider jobs due (defaults to the wall clock at each claim)
+
+    Returns:
+        int: Number of jobs run, successful or not
+    """
+    engine = engine or get_engine()
+    worker_id = worker_id or default_worker_id()
+    ran = 0
+    while (job := job_service.claim_job(engine, worker_id, now)) is not None:
+        run_job(engine, job, worker_id)
+        ran += 1
+    return ran
+
+async def run_forever(poll_seconds: float = JOB_POLL_SECONDS) -> None:
+    """
+    Run due jobs every poll_seconds until cancelled, in a worker thread.
+
+    Args:
+        poll_seconds: Delay between polls that found nothing to do
+    """
+    worker_id = default_worker_id()
+    while True:
+        try:
+            ran = await asyncio.to_thread(run_pending, None, worker_id)
+            if ran:
+                print(f"Ran {ran} jobs")
+        except Exception as e:
+            print(f"Job poll failed: {e}")
+        await asyncio.sleep(poll_seconds)
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run background jobs")
+    commands = parser.add_subparsers(dest="command")
+    enqueue = commands.add_parser("enqueue", help="queue a maintenance job")
+    enqueue.add_argument("kind", choices=["archive", "purge", "recount_projects"])
+    args = parser.parse_args(argv)
+
+    if args.command == "enqueue":
+        with Session(get_engine()) as session:
+            job = job_service.enqueue_job(session, args.kind)
+            print(f"Queued job {job.id} ({job.kind})")
+        return
+    require_shared_cache("The job worker")
+    print(f"Worker {default_worker_id()} polling every {JOB_POLL_SECONDS:.0f}s")
+    asyncio.run(run_forever())
+
+if __name__ == "__main__":
+    main()